@@ -0,0 +1,153 @@
+"""
+Teklif isteklerinde kabul kontrolü (admission control)
+
+/api/v1/scrape/run her isteği kabul edip BackgroundTasks'a ekliyordu; yoğunlukta yüzlerce iş birkaç
+Playwright worker'ının arkasında bekliyor, istemci başlamamış iş için sonuç sorgularken zaman aşımına
+düşüyordu. Kabul edilmiş ama bitmemiş şirket işleri burada sayılır; yeni isteğin başlama süresi
+kuyruk derinliği, şirketlerin p50 süresi ve scraper kapasitesinden tahmin edilir. Tahmin
+ADMISSION_MAX_WAIT_SECONDS'ı geçerse istek 429 + Retry-After ile reddedilir.
+"""
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.company_stats import company_stats
+from backend.metrics import registry
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Tahmini bekleme bunu geçerse istek reddedilir
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "300"))
+# Şirketin süre istatistiği yoksa kullanılan p50
+ADMISSION_DEFAULT_LATENCY_SECONDS = float(os.getenv("ADMISSION_DEFAULT_LATENCY_SECONDS", "60"))
+# Şirket için açık oturumu olan (warm) worker yoksa eklenen giriş süresi
+ADMISSION_COLD_START_SECONDS = float(os.getenv("ADMISSION_COLD_START_SECONDS", "20"))
+# Scraper kapasitesi yokken (worker yok) önerilen tekrar deneme süresi
+ADMISSION_NO_CAPACITY_RETRY_SECONDS = int(os.getenv("ADMISSION_NO_CAPACITY_RETRY_SECONDS", "30"))
+
+admission_queue_depth = registry.gauge(
+    "scraper_admission_queue_depth",
+    "Kabul edilmiş, henüz bitmemiş şirket işleri",
+    ("company",)
+)
+admission_estimated_wait = registry.gauge(
+    "scraper_admission_estimated_wait_seconds",
+    "Son istek için tahmini başlama süresi"
+)
+admission_total = registry.counter(
+    "scraper_admission_total",
+    "Kabul kontrolü kararları (accepted, rejected, unavailable)",
+    ("result",)
+)
+
+
+class AdmissionDecision:
+    """Kabul kararı ve tahmin"""
+
+    def __init__(self, accepted: bool, status_code: int, wait_seconds: float, queue_depth: int,
+                 capacity: int, retry_after: Optional[int] = None):
+        self.accepted = accepted
+        self.status_code = status_code
+        self.wait_seconds = wait_seconds
+        self.queue_depth = queue_depth
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.estimated_start = datetime.now() + timedelta(seconds=wait_seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "estimated_wait_seconds": round(self.wait_seconds, 1),
+            "estimated_start": self.estimated_start.isoformat(),
+            "queue_depth": self.queue_depth,
+            "capacity": self.capacity,
+            "retry_after": self.retry_after,
+        }
+
+
+class AdmissionController:
+    """Kabul edilmiş isteklerin bekleyen şirket işleri ve bekleme tahmini (thread-safe)"""
+
+    def __init__(self, enabled: bool = ADMISSION_ENABLED, max_wait_seconds: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.enabled = enabled
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        # request_id -> şirket -> bekleyen iş sayısı
+        self._requests: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[str, int] = {}
+
+    def queue_depth(self, company: Optional[str] = None) -> int:
+        with self._lock:
+            if company is not None:
+                return self._pending.get(company, 0)
+            return sum(self._pending.values())
+
+    def _backlog_seconds(self) -> float:
+        with self._lock:
+            pending = dict(self._pending)
+        return sum(count * _p50(company) for company, count in pending.items() if count > 0)
+
+    def estimate(self, companies: Iterable[str], capacity: int,
+                 warm: Optional[Dict[str, int]] = None) -> AdmissionDecision:
+        """
+        Yeni isteğin tahmini başlama süresi ve kabul kararı
+        capacity: eşzamanlı scraper slotu; warm: şirket -> açık oturumu olan worker sayısı
+        (bilinmiyorsa None, giriş süresi eklenmez)
+        """
+        companies = list(companies)
+        depth = self.queue_depth()
+        if capacity <= 0:
+            if self.enabled:
+                admission_total.inc(result="unavailable")
+                return AdmissionDecision(False, 503, float(ADMISSION_NO_CAPACITY_RETRY_SECONDS), depth, capacity,
+                                         ADMISSION_NO_CAPACITY_RETRY_SECONDS)
+            capacity = 1
+        wait = self._backlog_seconds() / capacity
+        if warm is not None and any(warm.get(company, 0) == 0 for company in companies):
+            wait += ADMISSION_COLD_START_SECONDS
+        admission_estimated_wait.set(round(wait, 1))
+        if not self.enabled or wait <= self.max_wait_seconds:
+            admission_total.inc(result="accepted")
+            return AdmissionDecision(True, 200, wait, depth, capacity)
+        admission_total.inc(result="rejected")
+        retry_after = max(1, math.ceil(wait - self.max_wait_seconds))
+        return AdmissionDecision(False, 429, wait, depth, capacity, retry_after)
+
+    def admit(self, request_id: str, jobs: Dict[str, int]) -> None:
+        """İsteğin şirket işlerini bekleyenlere ekle (şirket -> iş sayısı)"""
+        with self._lock:
+            self._requests[request_id] = dict(jobs)
+            for company, count in jobs.items():
+                self._pending[company] = self._pending.get(company, 0) + count
+            snapshot = {company: self._pending[company] for company in jobs}
+        for company, count in snapshot.items():
+            admission_queue_depth.set(count, company=company)
+
+    def release(self, request_id: str, company: str) -> None:
+        """İsteğin bir şirketteki işleri bitti"""
+        with self._lock:
+            jobs = self._requests.get(request_id)
+            if not jobs or company not in jobs:
+                return
+            count = jobs.pop(company)
+            self._pending[company] = max(0, self._pending.get(company, 0) - count)
+            remaining = self._pending[company]
+        admission_queue_depth.set(remaining, company=company)
+
+    def finish(self, request_id: str) -> None:
+        """İstek bitti: kalan işlerini bırak"""
+        with self._lock:
+            companies: List[str] = list(self._requests.get(request_id, {}))
+        for company in companies:
+            self.release(request_id, company)
+        with self._lock:
+            self._requests.pop(request_id, None)
+
+
+def _p50(company: str) -> float:
+    value = company_stats.duration_percentile(company, 0.5)
+    return value if value is not None else ADMISSION_DEFAULT_LATENCY_SECONDS
+
+
+# Uygulama genelinde tek controller
+admission_controller = AdmissionController()
@@ -0,0 +1,167 @@
+"""
+Async Playwright browser pool
+
+Tek bir playwright.async_api driver'ı FastAPI event loop'unda çalışır, birkaç browser
+başlatılır ve her teklif kendi context'inde çalışır. Eşzamanlı teklifler thread ya da ayrı
+driver process'i gerektirmez; context sayısı browser başına sınırlanır.
+Giriş yapılmış hesapların storage_state'i pool'da tutulur: aynı hesabın teklifleri bu durumla
+açılır, oturum yoksa hesap başına tek giriş yapılır (diğerleri bekleyip aynı oturumu kullanır).
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from backend.scraper_workers import SESSION_IDLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ASYNC_BROWSERS = int(os.getenv("ASYNC_BROWSERS", "3"))
+ASYNC_CONTEXTS_PER_BROWSER = int(os.getenv("ASYNC_CONTEXTS_PER_BROWSER", "10"))
+HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+
+
+class _BrowserSlot:
+    """Pool'daki tek bir browser ve üzerindeki açık context sayısı"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.open_contexts = 0
+        self.contexts_served = 0
+
+
+class _AccountSession:
+    """Hesabın son storage_state'i ve girişleri tekilleştiren kilit"""
+
+    def __init__(self):
+        self.state: Optional[Dict[str, Any]] = None
+        self.saved_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class AsyncBrowserPool:
+    """Ortak async driver üzerinde sabit sayıda browser"""
+
+    def __init__(self, browsers: int = ASYNC_BROWSERS, contexts_per_browser: int = ASYNC_CONTEXTS_PER_BROWSER):
+        self.size = browsers
+        self.contexts_per_browser = contexts_per_browser
+        self.playwright = None
+        self.slots: List[_BrowserSlot] = [_BrowserSlot(i) for i in range(browsers)]
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        # Oturum anahtarı (session_key: şirket[:hesap]) -> oturum
+        self._sessions: Dict[str, _AccountSession] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self.size * self.contexts_per_browser
+
+    @property
+    def started(self) -> bool:
+        return self.playwright is not None
+
+    async def start(self):
+        """Driver'ı başlat (browser'lar ilk kullanımda açılır)"""
+        if self.playwright is not None:
+            return
+        from playwright.async_api import async_playwright
+        self._semaphore = asyncio.Semaphore(self.capacity)
+        self._lock = asyncio.Lock()
+        self.playwright = await async_playwright().start()
+        logger.info(f"✅ Async Playwright başlatıldı ({self.size} browser x {self.contexts_per_browser} context)")
+
+    async def stop(self):
+        self._sessions.clear()
+        for slot in self.slots:
+            await self._close_slot(slot)
+        if self.playwright is not None:
+            try:
+                await self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+    async def _close_slot(self, slot: _BrowserSlot):
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+            slot.browser = None
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        """En az yüklü browser'ı seç; yoksa ya da kopmuşsa yeniden başlat"""
+        async with self._lock:
+            slot = min(self.slots, key=lambda s: s.open_contexts)
+            if slot.browser is not None and not slot.browser.is_connected():
+                logger.warning(f"⚠️ Async browser #{slot.index} bağlantısı koptu, yeniden başlatılıyor")
+                await self._close_slot(slot)
+            if slot.browser is None:
+                slot.browser = await self.playwright.chromium.launch(headless=HEADLESS)
+                logger.info(f"[async-browser-{slot.index}] Browser başlatıldı")
+            slot.open_contexts += 1
+            return slot
+
+    def open_contexts(self) -> int:
+        return sum(s.open_contexts for s in self.slots)
+
+    def session_state(self, key: str) -> Optional[Dict[str, Any]]:
+        """Hesabın SESSION_IDLE_SECONDS içinde kaydedilmiş storage_state'i ya da None"""
+        session = self._sessions.get(key)
+        if session is None or session.state is None or time.monotonic() - session.saved_at >= SESSION_IDLE_SECONDS:
+            return None
+        return session.state
+
+    def login_lock(self, key: str) -> asyncio.Lock:
+        """Aynı hesap için aynı anda tek giriş (TOTP kodu pencere başına bir kez üretilir)"""
+        return self._sessions.setdefault(key, _AccountSession()).lock
+
+    async def save_session(self, key: str, context):
+        """Context'in oturumunu hesabın yeni teklifleri için sakla"""
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            logger.debug(f"Async oturum durumu alınamadı ({key}): {e}")
+            return
+        session = self._sessions.setdefault(key, _AccountSession())
+        session.state, session.saved_at = state, time.monotonic()
+
+    def drop_session(self, key: str):
+        """Düşmüş oturumu unut; sonraki teklif yeniden giriş yapar"""
+        session = self._sessions.get(key)
+        if session is not None:
+            session.state = None
+
+    @asynccontextmanager
+    async def context(self, session: Optional[str] = None, **context_options):
+        """
+        Yeni bir browser context'i ver, blok bitince kapat
+        session (session_key) verilirse context hesabın saklanan oturumuyla açılır
+        Kapasite doluysa context açılana kadar bekler
+        """
+        if self.playwright is None:
+            await self.start()
+        async with self._semaphore:
+            slot = await self._acquire_slot()
+            context = None
+            state = self.session_state(session) if session is not None else None
+            if state is not None:
+                context_options.setdefault("storage_state", state)
+            try:
+                context = await slot.browser.new_context(**context_options)
+                yield context
+            finally:
+                slot.open_contexts -= 1
+                slot.contexts_served += 1
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+
+
+# Uygulama genelinde tek pool (SCRAPER_EXECUTION_MODE=async iken startup'ta başlatılır)
+async_browser_pool = AsyncBrowserPool()
@@ -0,0 +1,125 @@
+"""
+Async scraper runner'ları - playwright.async_api ile yazılmış akışlar
+
+Her runner kendisine verilen browser context'inde çalışır ve StandardOffer döndürür.
+Async sürümü olmayan (şirket, branş) çiftleri thread worker'larında sync runner ile çalışır.
+Şimdilik sadece Sompo trafik/kasko taşındı; Koru, Doğa, Şeker, Atlas, Anadolu ve Referans akışları
+önce adım planına (quote_steps) geçirilip selector'ları paylaşılacak şekilde taşınacak.
+"""
+import logging
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.async_browser_pool import async_browser_pool
+from backend.error_taxonomy import ErrorCategory
+from backend.quote_sessions import session_logins_total
+from backend.schemas import InsuranceCompany, StandardOffer
+from backend.scraper_workers import session_key
+from backend.scrapers import ScraperLoginError, _sompo_failed
+
+logger = logging.getLogger(__name__)
+
+_SCRAPERS_EVENT_DIR = os.path.join(os.path.dirname(__file__), '..', 'scrapers_event')
+
+
+async def _sompo_login(page, context, credential=None):
+    """
+    Context hesabın saklanan oturumuyla açıldıysa ve oturum geçerliyse girişi atla
+    Değilse hesap kilidiyle tek giriş: beklerken başka teklif giriş yaptıysa onun çerezleri kullanılır
+    """
+    from sompo_async import login_and_save, session_alive
+
+    company = InsuranceCompany.SOMPO.value
+    key = session_key(company, credential.account if credential else None)
+    opened_with = async_browser_pool.session_state(key)
+    if opened_with is not None and await session_alive(page):
+        session_logins_total.inc(company=company, result="reused")
+        return
+    async with async_browser_pool.login_lock(key):
+        state = async_browser_pool.session_state(key)
+        if state is not None and state is not opened_with:
+            await context.add_cookies(state.get("cookies", []))
+            if await session_alive(page):
+                session_logins_total.inc(company=company, result="reused")
+                return
+        async_browser_pool.drop_session(key)
+        try:
+            logged_in = await login_and_save(
+                page,
+                username=credential.username if credential else None,
+                password=credential.password if credential else None,
+                secret_key=credential.totp_secret if credential else None,
+                save_state=False
+            )
+        except Exception as e:
+            session_logins_total.inc(company=company, result="failed")
+            raise ScraperLoginError(f"Giriş başarısız: {e}") from e
+        if not logged_in:
+            session_logins_total.inc(company=company, result="failed")
+            raise ScraperLoginError("Giriş başarısız")
+        session_logins_total.inc(company=company, result="login")
+        await async_browser_pool.save_session(key, context)
+
+
+async def run_sompo_scraper_async(branch: str, data: Dict[str, Any], request_id: str, context,
+                                  credential=None) -> Optional[StandardOffer]:
+    """
+    Sompo akışını verilen async context'te çalıştır (credential verilirse o hesapla)
+    Context hesabın oturumuyla açılmalıdır: async_browser_pool.context(session=session_key(...))
+    """
+    try:
+        logger.info(f"[Sompo/async] Scraper başlatılıyor - branch: {branch}")
+        if _SCRAPERS_EVENT_DIR not in sys.path:
+            sys.path.append(_SCRAPERS_EVENT_DIR)
+        from sompo_async import (
+            handle_popups, open_new_offer_page, process_trafik_sigortasi, process_kasko_sigortasi
+        )
+        from quote_steps import StepCheckpoint
+
+        page = await context.new_page()
+        await _sompo_login(page, context, credential)
+
+        await handle_popups(page)
+        new_page = await open_new_offer_page(page)
+        if not new_page:
+            return _sompo_failed(branch, data, "Yeni teklif sayfası açılamadı")
+
+        # Adım checkpoint'i: geçici hatada akış aynı sayfada başarısız adımdan devam eder
+        checkpoint = StepCheckpoint(f"sompo_{branch}")
+        if branch == "trafik":
+            result = await process_trafik_sigortasi(new_page, data, checkpoint=checkpoint)
+        elif branch == "kasko":
+            result = await process_kasko_sigortasi(new_page, data, checkpoint=checkpoint)
+        else:
+            return _sompo_failed(branch, data, f"Desteklenmeyen branş: {branch}")
+
+        if result and result.get('basarili'):
+            return StandardOffer.from_sompo_result(result, data.get('tckn', ''), data.get('plaka'))
+        error_msg = (result.get('hata') if result else None) or 'Teklif alınamadı'
+        if checkpoint.failed_step:
+            error_msg = f"{error_msg} (adım: {checkpoint.failed_step})"
+        offer = _sompo_failed(branch, data, error_msg)
+        # Girdi hatası (StepInputError) aynı girdilerle tekrar denenmez
+        if not checkpoint.retryable:
+            offer.error_category = ErrorCategory.INPUT_INVALID
+        return offer
+
+    except ScraperLoginError:
+        raise
+    except Exception as e:
+        logger.error(f"Sompo async scraper hatası: {e}", exc_info=True)
+        return _sompo_failed(branch, data, str(e) or f"Sompo scraper exception: {type(e).__name__}")
+
+
+AsyncScraper = Callable[..., Awaitable[Optional[StandardOffer]]]
+
+# (şirket, branş) -> async runner; akışlar taşındıkça buraya eklenir
+ASYNC_SCRAPER_FUNCTIONS: Dict[Tuple[InsuranceCompany, str], AsyncScraper] = {
+    (InsuranceCompany.SOMPO, "trafik"): run_sompo_scraper_async,
+    (InsuranceCompany.SOMPO, "kasko"): run_sompo_scraper_async,
+}
+
+
+def get_async_scraper(company: InsuranceCompany, branch: str) -> Optional[AsyncScraper]:
+    return ASYNC_SCRAPER_FUNCTIONS.get((company, branch))
@@ -0,0 +1,233 @@
+"""
+Toplu (yenileme dönemi) teklif işleri
+
+CSV/NDJSON dosyasındaki her satır x şirket için scrape_jobs'a bir iş eklenir (request_id = batch id).
+İşler satır sırasıyla eklendiği için şirketler iç içe geçer; her şirketin işleri sıcak oturumu
+olan worker'lara akar. Durum veritabanında tutulduğu için API/worker yeniden başlasa da
+kalan işlerle devam edilir (kirası dolan işler requeue_expired ile kuyruğa döner).
+"""
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func
+
+from backend.job_queue import TERMINAL_STATUSES
+from backend.models import (
+    InsuranceBranch as DBInsuranceBranch, InsuranceCompany as DBInsuranceCompany, Offer,
+    ScrapeBatch, ScrapeBatchStatus, ScrapeJob, ScrapeJobStatus
+)
+from backend.priorities import JobPriority
+from backend.schemas import InsuranceBranch, KaskoSigortasiRequest, TrafikSigortasiRequest
+from backend.scraper_workers import SCRAPER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Tek dosyadaki en fazla satır sayısı
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "20000"))
+# İşler bu büyüklükte parçalar halinde eklenir
+BATCH_INSERT_CHUNK = int(os.getenv("BATCH_INSERT_CHUNK", "500"))
+BATCH_EXPORT_YIELD_PER = 500
+# API içindeki gömülü worker'ın aynı anda çalıştırdığı batch işi (canlı isteklere yer bırakır)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(1, SCRAPER_WORKERS // 2))))
+
+BATCH_ROW_SCHEMAS = {
+    InsuranceBranch.TRAFIK: TrafikSigortasiRequest,
+    InsuranceBranch.KASKO: KaskoSigortasiRequest,
+}
+
+BATCH_RESULT_COLUMNS = [
+    "row_index", "company", "branch", "tckn", "plaka", "status",
+    "price", "currency", "policy_no", "error", "finished_at"
+]
+
+
+def parse_batch_rows(content: bytes, file_format: str,
+                     branch: InsuranceBranch) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Dosyayı satırlara ayır ve branşın istek şemasıyla doğrula
+    Dönüş: (geçerli satırlar, reddedilen satırlar [{row, error}]); satır numaraları 1'den başlar
+    """
+    schema = BATCH_ROW_SCHEMAS[branch]
+    text = content.decode("utf-8-sig")
+    if file_format == "csv":
+        raw_rows = ({k.strip(): (v or "").strip() for k, v in row.items() if k}
+                    for row in csv.DictReader(io.StringIO(text)))
+    else:
+        raw_rows = (line for line in text.splitlines() if line.strip())
+
+    rows, rejected = [], []
+    for index, raw in enumerate(raw_rows, start=1):
+        if index > BATCH_MAX_ROWS:
+            raise ValueError(f"Dosya en fazla {BATCH_MAX_ROWS} satır içerebilir")
+        try:
+            if isinstance(raw, str):
+                raw = json.loads(raw)
+            # Boş CSV hücreleri opsiyonel alanlar için None sayılır
+            values = {k: (None if v == "" else v) for k, v in raw.items()}
+            rows.append({"row": index, "data": schema(**values).dict()})
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            rejected.append({"row": index, "error": errors})
+        except (ValueError, TypeError, AttributeError) as e:
+            rejected.append({"row": index, "error": str(e) or type(e).__name__})
+    return rows, rejected
+
+
+def create_batch(session_factory, batch_id: str, branch: InsuranceBranch, companies: List[str],
+                 rows: List[Dict[str, Any]], rejected: List[Dict[str, Any]],
+                 source_name: Optional[str] = None) -> Dict[str, Any]:
+    """Batch kaydını ve satır x şirket işlerini oluştur"""
+    db = session_factory()
+    try:
+        batch = ScrapeBatch(
+            id=batch_id,
+            branch=DBInsuranceBranch(branch.value),
+            companies=companies,
+            status=ScrapeBatchStatus.RUNNING if rows else ScrapeBatchStatus.COMPLETED,
+            source_name=source_name,
+            total_rows=len(rows),
+            rejected_rows=rejected,
+            finished_at=None if rows else datetime.now()
+        )
+        db.add(batch)
+        db.flush()
+        company_enums = [DBInsuranceCompany(c) for c in companies]
+        pending = []
+        for row in rows:
+            for company in company_enums:
+                pending.append({
+                    "request_id": batch_id,
+                    "company": company,
+                    "branch": DBInsuranceBranch(branch.value),
+                    "payload": row["data"],
+                    "status": ScrapeJobStatus.QUEUED,
+                    "attempts": 0,
+                    # Toplu işler canlı tekliflere yol verir
+                    "priority": int(JobPriority.BATCH),
+                    "row_index": row["row"],
+                })
+                if len(pending) >= BATCH_INSERT_CHUNK:
+                    db.bulk_insert_mappings(ScrapeJob, pending)
+                    pending = []
+        if pending:
+            db.bulk_insert_mappings(ScrapeJob, pending)
+        db.commit()
+        return batch.to_dict()
+    finally:
+        db.close()
+
+
+def batch_progress(session_factory, batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Batch durumu: şirket bazında iş sayaçları ve saatlik teklif hızı
+    Tüm işler bittiyse batch tamamlandı olarak işaretlenir
+    """
+    db = session_factory()
+    try:
+        batch = db.query(ScrapeBatch).get(batch_id)
+        if batch is None:
+            return None
+
+        counts = (
+            db.query(ScrapeJob.company, ScrapeJob.status, func.count(ScrapeJob.id))
+            .filter(ScrapeJob.request_id == batch_id)
+            .group_by(ScrapeJob.company, ScrapeJob.status)
+            .all()
+        )
+        windows = (
+            db.query(ScrapeJob.company, func.min(ScrapeJob.started_at), func.max(ScrapeJob.finished_at))
+            .filter(ScrapeJob.request_id == batch_id, ScrapeJob.finished_at.isnot(None))
+            .group_by(ScrapeJob.company)
+            .all()
+        )
+
+        per_company: Dict[str, Dict[str, Any]] = {}
+        for company, status, count in counts:
+            entry = per_company.setdefault(company.value, {s.value: 0 for s in ScrapeJobStatus})
+            entry[status.value] = count
+        for company, first_started, last_finished in windows:
+            entry = per_company.setdefault(company.value, {s.value: 0 for s in ScrapeJobStatus})
+            hours = (last_finished - first_started).total_seconds() / 3600 if first_started and last_finished else 0
+            finished = entry[ScrapeJobStatus.COMPLETED.value] + entry[ScrapeJobStatus.FAILED.value]
+            entry["quotes_per_hour"] = round(finished / hours, 1) if hours > 0 else None
+
+        totals = {s.value: sum(e[s.value] for e in per_company.values()) for s in ScrapeJobStatus}
+        total_jobs = sum(totals.values())
+        done = sum(totals[s.value] for s in TERMINAL_STATUSES)
+
+        if batch.status == ScrapeBatchStatus.RUNNING and total_jobs and done == total_jobs:
+            batch.status = ScrapeBatchStatus.COMPLETED
+            batch.finished_at = datetime.now()
+            db.commit()
+            logger.info(f"✅ Batch {batch_id} tamamlandı ({total_jobs} iş)")
+
+        result = batch.to_dict()
+        result.update({
+            "total_jobs": total_jobs,
+            "done_jobs": done,
+            "progress": round(done / total_jobs, 4) if total_jobs else 1.0,
+            "jobs": totals,
+            "companies_progress": per_company,
+        })
+        return result
+    finally:
+        db.close()
+
+
+def iter_batch_results(session_factory, batch_id: str, file_format: str) -> Iterator[bytes]:
+    """Batch sonuçlarını (satır x şirket) server-side cursor ile CSV/NDJSON parçaları olarak üret"""
+    db = session_factory()
+    try:
+        query = (
+            db.query(ScrapeJob, Offer)
+            .outerjoin(Offer, Offer.id == ScrapeJob.offer_id)
+            .filter(ScrapeJob.request_id == batch_id)
+            .order_by(ScrapeJob.row_index, ScrapeJob.id)
+            .execution_options(stream_results=True)
+            .yield_per(BATCH_EXPORT_YIELD_PER)
+        )
+        buffer = io.StringIO()
+        writer = None
+        if file_format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(BATCH_RESULT_COLUMNS)
+
+        rows_in_buffer = 0
+        for job, offer in query:
+            payload = job.payload or {}
+            values = [
+                job.row_index,
+                job.company.value,
+                job.branch.value,
+                payload.get("tckn"),
+                payload.get("plaka"),
+                job.status.value,
+                offer.price if offer else None,
+                offer.currency if offer else None,
+                offer.policy_no if offer else None,
+                job.error if job.status != ScrapeJobStatus.COMPLETED else None,
+                job.finished_at.isoformat() if job.finished_at else None,
+            ]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(BATCH_RESULT_COLUMNS, values)), ensure_ascii=False))
+                buffer.write("\n")
+            rows_in_buffer += 1
+            if rows_in_buffer >= BATCH_EXPORT_YIELD_PER:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+                rows_in_buffer = 0
+
+        chunk = buffer.getvalue()
+        if chunk:
+            yield chunk.encode("utf-8")
+    finally:
+        db.close()
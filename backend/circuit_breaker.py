@@ -0,0 +1,279 @@
+"""
+Şirket bazlı devre kesici (circuit breaker)
+
+Portal çöktüğünde ya da sayfa yapısı değiştiğinde her istek login/selector zaman aşımlarını
+bekleyip worker'ı dakikalarca meşgul eder. Art arda CIRCUIT_FAILURE_THRESHOLD hata ya da son
+CIRCUIT_WINDOW sonuçta CIRCUIT_ERROR_RATE üstü hata oranında devre açılır; açıkken istekler
+hemen reddedilir. Süre dolunca tek bir deneme (half-open) işine izin verilir: başarılıysa devre
+kapanır, başarısızsa bekleme süresi ikiye katlanarak tekrar açılır. Durum geçişleri
+CompanySettings ve system_logs'a yazılır.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from backend.error_taxonomy import DETERMINISTIC_CATEGORIES
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+# Art arda bu kadar hata devreyi açar
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Son CIRCUIT_WINDOW sonuçta hata oranı bu değeri geçerse devre açılır (en az CIRCUIT_MIN_CALLS sonuçla)
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.6"))
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+# İlk açılışta bekleme süresi; başarısız her denemede ikiye katlanır
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "120"))
+CIRCUIT_OPEN_MAX_SECONDS = float(os.getenv("CIRCUIT_OPEN_MAX_SECONDS", "1800"))
+
+# Portal sağlığıyla ilgisi olmayan hatalar devreyi etkilemez
+CIRCUIT_IGNORED_ERRORS = {"NoCredentialAvailable", "CircuitOpenError", "JobPreempted"}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state_gauge = registry.gauge(
+    "scraper_circuit_state",
+    "Şirket devre durumu (0=kapalı, 1=deneme, 2=açık)",
+    ("company",)
+)
+circuit_transitions_total = registry.counter(
+    "scraper_circuit_transitions_total",
+    "Devre durum geçişleri",
+    ("company", "state")
+)
+circuit_rejected_total = registry.counter(
+    "scraper_circuit_rejected_total",
+    "Devre açıkken hemen reddedilen istekler",
+    ("company",)
+)
+
+
+class CircuitOpenError(Exception):
+    """Şirketin devresi açık - istek portala gönderilmeden reddedildi"""
+
+    def __init__(self, company: str, retry_in: float, reason: Optional[str] = None):
+        self.company = company
+        self.retry_in = retry_in
+        self.reason = reason
+        detail = f" ({reason})" if reason else ""
+        retry = f", {retry_in:.0f} sn sonra tekrar denenecek" if retry_in > 0 else ""
+        super().__init__(f"Devre açık: {company} portalı art arda hata veriyor{detail}{retry}")
+
+
+class _Circuit:
+    """Tek bir şirketin devre durumu"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.results: Deque[bool] = deque(maxlen=CIRCUIT_WINDOW)
+        self.open_until = 0.0
+        self.opened_count = 0
+        self.probing = False
+        self.reason: Optional[str] = None
+        self.changed_at: Optional[datetime] = None
+
+    def error_rate(self) -> Optional[float]:
+        if len(self.results) < CIRCUIT_MIN_CALLS:
+            return None
+        return self.results.count(False) / len(self.results)
+
+
+class CircuitBreakerRegistry:
+    """Thread-safe, şirket başına devre kesici"""
+
+    def __init__(self, enabled: bool = CIRCUIT_BREAKER_ENABLED):
+        self.enabled = enabled
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+        # Geçiş kayıtları sırayla, istek akışını bloklamadan yazılır
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="circuit-log")
+
+    def _get(self, company: str) -> _Circuit:
+        circuit = self._circuits.get(company)
+        if circuit is None:
+            circuit = self._circuits[company] = _Circuit()
+        return circuit
+
+    def available(self, company: str) -> bool:
+        """İstek kabul edilir mi (durumu değiştirmez) - worker'lar iş kiralamadan önce bakar"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            circuit = self._circuits.get(company)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            if circuit.state == OPEN:
+                return time.monotonic() >= circuit.open_until
+            return not circuit.probing
+
+    def before_call(self, company: str) -> None:
+        """
+        İstekten önce çağrılır; devre açıksa CircuitOpenError
+        Açık devrenin süresi dolduysa bu istek deneme (half-open) işi olur
+        """
+        if not self.enabled:
+            return
+        transition = None
+        with self._lock:
+            circuit = self._get(company)
+            now = time.monotonic()
+            if circuit.state == OPEN and now >= circuit.open_until:
+                transition = self._transition(company, circuit, HALF_OPEN, circuit.reason)
+            if circuit.state == OPEN or (circuit.state == HALF_OPEN and circuit.probing):
+                retry_in = circuit.open_until - now if circuit.state == OPEN else 0.0
+                error = CircuitOpenError(company, retry_in, "deneme işi sürüyor" if circuit.state == HALF_OPEN else None)
+            else:
+                error = None
+                if circuit.state == HALF_OPEN:
+                    circuit.probing = True
+        if transition:
+            self._publish(*transition)
+        if error is not None:
+            circuit_rejected_total.inc(company=company)
+            raise error
+
+    def release(self, company: str) -> None:
+        """Sonucu sayılmayan istek (iptal, hesap yok): deneme hakkını geri ver"""
+        if not self.enabled:
+            return
+        with self._lock:
+            circuit = self._circuits.get(company)
+            if circuit is not None and circuit.state == HALF_OPEN:
+                circuit.probing = False
+
+    def record(self, company: str, success: bool, error_class: Optional[str] = None,
+               error_category=None) -> None:
+        """
+        İstek sonucunu kaydet, gerekirse devreyi aç/kapat
+        Girdiye bağlı (deterministik) hatalarda portal yanıt vermiştir; sonuç başarılı sayılır
+        """
+        if not self.enabled:
+            return
+        if not success and error_class in CIRCUIT_IGNORED_ERRORS:
+            self.release(company)
+            return
+        if not success and error_category in DETERMINISTIC_CATEGORIES:
+            success = True
+        transition = None
+        with self._lock:
+            circuit = self._get(company)
+            if circuit.state == OPEN:
+                # Açılmadan önce başlamış isteklerin sonuçları süreyi uzatmaz
+                return
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+                if success:
+                    circuit.opened_count = 0
+                    transition = self._transition(company, circuit, CLOSED, None)
+                else:
+                    transition = self._open(company, circuit, f"deneme işi başarısız: {error_class or 'hata'}")
+            else:
+                circuit.results.append(success)
+                if success:
+                    circuit.consecutive_failures = 0
+                else:
+                    circuit.consecutive_failures += 1
+                    rate = circuit.error_rate()
+                    if circuit.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                        transition = self._open(
+                            company, circuit,
+                            f"art arda {circuit.consecutive_failures} hata, son: {error_class or 'hata'}"
+                        )
+                    elif rate is not None and rate > CIRCUIT_ERROR_RATE:
+                        transition = self._open(company, circuit, f"hata oranı %{rate * 100:.0f}")
+        if transition:
+            self._publish(*transition)
+
+    def _open(self, company: str, circuit: _Circuit, reason: str):
+        duration = min(CIRCUIT_OPEN_SECONDS * (2 ** circuit.opened_count), CIRCUIT_OPEN_MAX_SECONDS)
+        circuit.open_until = time.monotonic() + duration
+        circuit.opened_count += 1
+        return self._transition(company, circuit, OPEN, f"{reason} ({duration:.0f} sn)")
+
+    def _transition(self, company: str, circuit: _Circuit, state: str, reason: Optional[str]):
+        """Durumu değiştir (kilit altında); yayınlanacak geçişi döndür"""
+        previous = circuit.state
+        circuit.state = state
+        circuit.reason = reason
+        circuit.changed_at = datetime.now()
+        if state == CLOSED:
+            circuit.consecutive_failures = 0
+            circuit.results.clear()
+        return company, previous, state, reason
+
+    def _publish(self, company: str, previous: str, state: str, reason: Optional[str]) -> None:
+        circuit_state_gauge.set(_STATE_VALUES[state], company=company)
+        circuit_transitions_total.inc(company=company, state=state)
+        if state == OPEN:
+            logger.warning(f"🔌 {company} devresi açıldı: {reason}")
+        elif state == HALF_OPEN:
+            logger.info(f"🔌 {company} devresi deneme durumunda (half-open)")
+        else:
+            logger.info(f"✅ {company} devresi kapandı")
+        try:
+            self._writer.submit(_persist_transition, company, previous, state, reason)
+        except RuntimeError:
+            pass  # Kapanışta executor durdurulmuş olabilir
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Şirket -> devre durumu"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                company: {
+                    "circuit_state": circuit.state,
+                    "circuit_reason": circuit.reason,
+                    "circuit_changed_at": circuit.changed_at.isoformat() if circuit.changed_at else None,
+                    "circuit_retry_in": round(max(0.0, circuit.open_until - now), 1) if circuit.state == OPEN else None,
+                    "consecutive_failures": circuit.consecutive_failures,
+                }
+                for company, circuit in self._circuits.items()
+            }
+
+
+def _persist_transition(company: str, previous: str, state: str, reason: Optional[str]) -> None:
+    """Geçişi CompanySettings (son durum) ve system_logs'a (geçmiş) yaz"""
+    try:
+        from backend.database import SessionLocal
+        from backend.models import (
+            CompanySettings, CompanyStatus, LogLevel, SystemLog, InsuranceCompany as DBInsuranceCompany
+        )
+        if SessionLocal is None:
+            return
+        db = SessionLocal()
+        try:
+            company_enum = DBInsuranceCompany(company)
+            setting = db.query(CompanySettings).filter(CompanySettings.company == company_enum).first()
+            if setting is None:
+                setting = CompanySettings(company=company_enum, status=CompanyStatus.ACTIVE,
+                                          success_rate=0.0, total_queries=0)
+                db.add(setting)
+            setting.circuit_state = state
+            setting.circuit_changed_at = datetime.now()
+            db.add(SystemLog(
+                level=LogLevel.WARNING if state == OPEN else LogLevel.INFO,
+                message=f"{company} devresi: {previous} -> {state}" + (f" ({reason})" if reason else ""),
+                user="system",
+                action=f"CIRCUIT_{state.upper()}",
+                log_metadata={"company": company, "from": previous, "to": state, "reason": reason}
+            ))
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Devre geçişi kaydedilemedi: {e}")
+
+
+# Uygulama genelinde tek registry
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,273 @@
+"""
+Şirket bazlı scraper istatistikleri (başarı oranı, süre dağılımı, son hata)
+
+Her scraper tamamlanmasında bellekteki istatistikler O(1) güncellenir, veritabanına
+periyodik olarak toplu (tek transaction) yazılır. Okumalar bellekteki snapshot'tan yapılır.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# EWMA katsayısı: yeni sonucun ağırlığı
+COMPANY_STATS_EWMA_ALPHA = float(os.getenv("COMPANY_STATS_EWMA_ALPHA", "0.1"))
+# Percentile hesabı için tutulan son süre sayısı
+COMPANY_STATS_WINDOW = int(os.getenv("COMPANY_STATS_WINDOW", "200"))
+# Yeniden başlatmadan sonra pencerede bu kadar süre birikene kadar kalıcı p50/p95 kullanılır
+COMPANY_STATS_MIN_PERCENTILE_SAMPLES = int(os.getenv("COMPANY_STATS_MIN_PERCENTILE_SAMPLES", "20"))
+COMPANY_STATS_FLUSH_SECONDS = int(os.getenv("COMPANY_STATS_FLUSH_SECONDS", "15"))
+
+quote_duration_seconds = registry.histogram(
+    "scraper_quote_duration_seconds",
+    "Şirket ve branş bazında teklif süresi (başarılı ve başarısız)",
+    ("company", "branch")
+)
+quote_results_total = registry.counter(
+    "scraper_quote_results_total",
+    "Teklif sonuçları (success/failure) ve hata sınıfı",
+    ("company", "result", "error_class")
+)
+stats_buffer_pending = registry.gauge(
+    "scraper_stats_buffer_pending",
+    "Veritabanına yazılmayı bekleyen şirket istatistiği sonuçları"
+)
+stats_buffer_lag_seconds = registry.gauge(
+    "scraper_stats_buffer_lag_seconds",
+    "Yazılmayı bekleyen en eski sonucun yaşı (toplu yazma gecikmesi)"
+)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Sıralı olmayan listeden basit (nearest-rank) percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class _CompanyStats:
+    """Tek bir şirketin bellekteki istatistikleri"""
+
+    def __init__(self):
+        self.success_rate: float = 0.0
+        self.total_queries: int = 0
+        self.last_query: Optional[datetime] = None
+        self.durations: Deque[float] = deque(maxlen=COMPANY_STATS_WINDOW)
+        # Veritabanından yüklenen p50/p95 (yeniden başlatma öncesi pencereden)
+        self.loaded_p50: Optional[float] = None
+        self.loaded_p95: Optional[float] = None
+        self.last_error_class: Optional[str] = None
+        self.last_error_at: Optional[datetime] = None
+        # Henüz veritabanına yazılmamış sonuçlar: (başarılı mı, zaman)
+        self.pending: List[Tuple[bool, datetime]] = []
+
+    def percentiles(self, durations: List[float]) -> Tuple[Optional[float], Optional[float]]:
+        """p50/p95; pencere az örnekliyken yüklenen değerler (varsa) korunur"""
+        if len(durations) < COMPANY_STATS_MIN_PERCENTILE_SAMPLES and self.loaded_p50 is not None:
+            return self.loaded_p50, self.loaded_p95
+        return percentile(durations, 0.5), percentile(durations, 0.95)
+
+
+class CompanyStatsTracker:
+    """Thread-safe şirket istatistik takipçisi"""
+
+    def __init__(self, alpha: float = COMPANY_STATS_EWMA_ALPHA):
+        self.alpha = alpha
+        self._stats: Dict[str, _CompanyStats] = {}
+        self._lock = threading.Lock()
+        self.last_flush_at: Optional[float] = None
+
+    def _get(self, company: str) -> _CompanyStats:
+        stats = self._stats.get(company)
+        if stats is None:
+            stats = self._stats[company] = _CompanyStats()
+        return stats
+
+    def _ewma(self, rate: float, success: bool, count: int) -> float:
+        """EWMA güncellemesi - ilk sonuçta oran doğrudan sonuçtan başlar"""
+        value = 1.0 if success else 0.0
+        if count == 0:
+            return value
+        return self.alpha * value + (1 - self.alpha) * rate
+
+    def record(self, company: str, success: bool, duration: float, error_class: Optional[str] = None,
+               branch: Optional[str] = None):
+        """Bir scraper sonucunu kaydet (hot path - sadece bellek)"""
+        now = datetime.now()
+        quote_duration_seconds.observe(duration, company=company, branch=branch or "")
+        quote_results_total.inc(
+            company=company, result="success" if success else "failure",
+            error_class="" if success else (error_class or "unknown")
+        )
+        with self._lock:
+            stats = self._get(company)
+            stats.success_rate = self._ewma(stats.success_rate, success, stats.total_queries)
+            stats.total_queries += 1
+            stats.last_query = now
+            stats.durations.append(duration)
+            if not success:
+                stats.last_error_class = error_class or "unknown"
+                stats.last_error_at = now
+            stats.pending.append((success, now))
+
+    def duration_percentile(self, company: str, q: float) -> Optional[float]:
+        """Şirketin son süreleri üzerinden percentile (saniye)"""
+        with self._lock:
+            stats = self._stats.get(company)
+            values = list(stats.durations) if stats else []
+        return percentile(values, q)
+
+    def duration_samples(self, company: str) -> int:
+        """Şirket için tutulan süre örneği sayısı"""
+        with self._lock:
+            stats = self._stats.get(company)
+            return len(stats.durations) if stats else 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Tüm şirketlerin istatistiklerini döndür (DB sorgusu yok)"""
+        with self._lock:
+            items = [(company, stats, list(stats.durations)) for company, stats in self._stats.items()]
+        result = {}
+        for company, stats, durations in items:
+            p50, p95 = stats.percentiles(durations)
+            result[company] = {
+                "success_rate": round(stats.success_rate, 4),
+                "total_queries": stats.total_queries,
+                "last_query": stats.last_query.isoformat() if stats.last_query else None,
+                "p50_duration": p50,
+                "p95_duration": p95,
+                "last_error_class": stats.last_error_class,
+                "last_error_at": stats.last_error_at.isoformat() if stats.last_error_at else None,
+            }
+        return result
+
+    def pending_count(self) -> int:
+        """Veritabanına yazılmayı bekleyen sonuç sayısı"""
+        with self._lock:
+            return sum(len(s.pending) for s in self._stats.values())
+
+    def pending_lag_seconds(self) -> float:
+        """Yazılmayı bekleyen en eski sonucun yaşı (bekleyen yoksa 0)"""
+        with self._lock:
+            oldest = min((s.pending[0][1] for s in self._stats.values() if s.pending), default=None)
+        return max(0.0, (datetime.now() - oldest).total_seconds()) if oldest else 0.0
+
+    def collect_metrics(self) -> None:
+        """/metrics scrape'inde yazma tamponu göstergelerini güncelle"""
+        stats_buffer_pending.set(self.pending_count())
+        stats_buffer_lag_seconds.set(round(self.pending_lag_seconds(), 1))
+
+    def load(self, session_factory) -> None:
+        """Başlangıçta kalıcı istatistikleri veritabanından yükle"""
+        if session_factory is None:
+            return
+        from backend.models import CompanySettings
+
+        db = session_factory()
+        try:
+            with self._lock:
+                for setting in db.query(CompanySettings).all():
+                    stats = self._get(setting.company.value)
+                    stats.success_rate = setting.success_rate or 0.0
+                    stats.total_queries = setting.total_queries or 0
+                    stats.last_query = setting.last_query
+                    stats.last_error_class = setting.last_error_class
+                    stats.last_error_at = setting.last_error_at
+                    stats.loaded_p50 = setting.p50_duration
+                    stats.loaded_p95 = setting.p95_duration
+        finally:
+            db.close()
+
+    def flush(self, session_factory) -> int:
+        """
+        Bekleyen sonuçları tek transaction'da CompanySettings'e yaz
+        Satır kilitlenir (FOR UPDATE), böylece birden fazla worker aynı anda yazsa da
+        total_queries ve EWMA kaybolmaz. Yazılan sonuç sayısını döndürür.
+        """
+        if session_factory is None:
+            return 0
+        from backend.models import CompanySettings, CompanyStatus, InsuranceCompany as DBInsuranceCompany
+
+        with self._lock:
+            batch = {}
+            for company, stats in self._stats.items():
+                if stats.pending:
+                    p50, p95 = stats.percentiles(list(stats.durations))
+                    batch[company] = {
+                        "pending": stats.pending,
+                        "p50": p50,
+                        "p95": p95,
+                        "last_error_class": stats.last_error_class,
+                        "last_error_at": stats.last_error_at,
+                    }
+                    stats.pending = []
+        if not batch:
+            self.last_flush_at = time.time()
+            return 0
+
+        written = 0
+        db = session_factory()
+        try:
+            for company, item in batch.items():
+                company_enum = DBInsuranceCompany(company)
+                setting = db.query(CompanySettings).filter(
+                    CompanySettings.company == company_enum
+                ).with_for_update().first()
+                if setting is None:
+                    setting = CompanySettings(company=company_enum, status=CompanyStatus.ACTIVE,
+                                              success_rate=0.0, total_queries=0)
+                    db.add(setting)
+
+                rate = setting.success_rate or 0.0
+                count = setting.total_queries or 0
+                for success, _ in item["pending"]:
+                    rate = self._ewma(rate, success, count)
+                    count += 1
+                setting.success_rate = rate
+                setting.total_queries = count
+                setting.last_query = item["pending"][-1][1]
+                if item["p50"] is not None:
+                    setting.p50_duration = item["p50"]
+                    setting.p95_duration = item["p95"]
+                if item["last_error_class"]:
+                    setting.last_error_class = item["last_error_class"]
+                    setting.last_error_at = item["last_error_at"]
+                written += len(item["pending"])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Yazılamayan sonuçları geri koy, bir sonraki flush'ta tekrar denensin
+            with self._lock:
+                for company, item in batch.items():
+                    stats = self._get(company)
+                    stats.pending = item["pending"] + stats.pending
+            raise
+        finally:
+            db.close()
+        self.last_flush_at = time.time()
+        return written
+
+
+# Uygulama genelinde tek tracker
+company_stats = CompanyStatsTracker()
+registry.collector(company_stats.collect_metrics)
+
+
+async def company_stats_flush_loop(session_factory, interval_seconds: int = COMPANY_STATS_FLUSH_SECONDS) -> None:
+    """Arka plan görevi: istatistikleri periyodik olarak veritabanına yaz"""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await loop.run_in_executor(None, company_stats.flush, session_factory)
+        except Exception as e:
+            logger.error(f"❌ Şirket istatistikleri yazılamadı: {e}")
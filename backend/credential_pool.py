@@ -0,0 +1,205 @@
+"""
+Şirket başına birden fazla acente hesabı (credential pool)
+
+Hesaplar .env'den okunur: ilk hesap mevcut <PREFIX>_USER / <PREFIX>_PASS / <PREFIX>_TOTP_SECRET
+değişkenleri, ek hesaplar aynı isimlerin _2, _3, ... ekli halleri (örn. SOMPO_USER_2).
+İşler en az meşgul hesaba verilir; girişi art arda başarısız olan hesap bir süre karantinaya alınır.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Art arda bu kadar giriş hatasından sonra hesap karantinaya alınır
+CREDENTIAL_MAX_LOGIN_FAILURES = int(os.getenv("CREDENTIAL_MAX_LOGIN_FAILURES", "2"))
+CREDENTIAL_QUARANTINE_SECONDS = float(os.getenv("CREDENTIAL_QUARANTINE_SECONDS", "900"))
+# Karantina her tekrarda ikiye katlanır, en fazla bu süreye kadar
+CREDENTIAL_QUARANTINE_MAX_SECONDS = float(os.getenv("CREDENTIAL_QUARANTINE_MAX_SECONDS", "7200"))
+# Taranacak en yüksek ek hesap numarası
+CREDENTIAL_MAX_ACCOUNTS = 20
+
+# Şirket -> .env değişken öneki
+CREDENTIAL_PREFIXES = {
+    "Sompo": "SOMPO",
+    "Koru": "KORU",
+    "Doğa": "DOGA",
+    "Şeker": "SEKER",
+    "Referans": "REFERANS",
+    "Anadolu": "ANADOLU",
+    "Atlas": "ATLAS",
+}
+
+credential_quarantine_total = registry.counter(
+    "scraper_credential_quarantine_total",
+    "Giriş hataları nedeniyle karantinaya alınan hesap sayısı",
+    ("company", "account")
+)
+
+
+class NoCredentialAvailable(Exception):
+    """Şirket için tanımlı ya da karantinada olmayan hesap yok"""
+
+
+class Credential:
+    """Tek bir acente hesabı ve kullanım durumu"""
+
+    def __init__(self, company: str, username: str, password: str, totp_secret: str):
+        self.company = company
+        self.username = username
+        self.password = password
+        self.totp_secret = totp_secret
+        self.in_use = 0
+        self.jobs_done = 0
+        self.last_used = 0.0
+        self.login_failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+
+    def __getstate__(self):
+        # Child process'lere sadece giriş bilgileri gider, sayaçlar API process'inde kalır
+        return {
+            "company": self.company, "username": self.username,
+            "password": self.password, "totp_secret": self.totp_secret,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["company"], state["username"], state["password"], state["totp_secret"])
+
+    @property
+    def account(self) -> str:
+        return self.username
+
+    def quarantined(self, now: Optional[float] = None) -> bool:
+        return self.quarantined_until > (now if now is not None else time.monotonic())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Şifre/secret içermeyen durum bilgisi"""
+        remaining = max(0.0, self.quarantined_until - time.monotonic())
+        return {
+            "company": self.company,
+            "account": self.username,
+            "in_use": self.in_use,
+            "jobs_done": self.jobs_done,
+            "login_failures": self.login_failures,
+            "quarantined": remaining > 0,
+            "quarantine_remaining_seconds": round(remaining) if remaining else 0,
+        }
+
+
+def _env(name: str) -> str:
+    return os.getenv(name, "").strip()
+
+
+def load_credentials(company: str, prefix: str) -> List[Credential]:
+    """<PREFIX>_USER, <PREFIX>_USER_2, ... değişkenlerinden hesapları oku"""
+    credentials = []
+    for index in range(1, CREDENTIAL_MAX_ACCOUNTS + 1):
+        suffix = "" if index == 1 else f"_{index}"
+        username = _env(f"{prefix}_USER{suffix}")
+        password = _env(f"{prefix}_PASS{suffix}")
+        if not username or not password:
+            continue
+        credentials.append(Credential(company, username, password, _env(f"{prefix}_TOTP_SECRET{suffix}")))
+    return credentials
+
+
+class CredentialPool:
+    """Thread-safe hesap havuzu"""
+
+    def __init__(self):
+        self._accounts: Dict[str, List[Credential]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        for company, prefix in CREDENTIAL_PREFIXES.items():
+            accounts = load_credentials(company, prefix)
+            if accounts:
+                self._accounts[company] = accounts
+        self._loaded = True
+
+    def has_accounts(self, company: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return bool(self._accounts.get(company))
+
+    def acquire(self, company: str) -> Credential:
+        """En az meşgul, karantinada olmayan hesabı al"""
+        now = time.monotonic()
+        with self._lock:
+            self._ensure_loaded()
+            accounts = self._accounts.get(company) or []
+            if not accounts:
+                raise NoCredentialAvailable(f"{company} için hesap tanımlı değil")
+            available = [c for c in accounts if not c.quarantined(now)]
+            if not available:
+                soonest = min(c.quarantined_until for c in accounts) - now
+                raise NoCredentialAvailable(
+                    f"{company} hesaplarının tümü karantinada (en erken {soonest:.0f} sn sonra)"
+                )
+            credential = min(available, key=lambda c: (c.in_use, c.last_used))
+            credential.in_use += 1
+            credential.last_used = now
+            return credential
+
+    def release(self, credential: Credential, login_failed: bool = False) -> None:
+        """Hesabı geri ver; giriş hatası sayacını güncelle, gerekirse karantinaya al"""
+        with self._lock:
+            credential.in_use = max(0, credential.in_use - 1)
+            credential.jobs_done += 1
+            if not login_failed:
+                credential.login_failures = 0
+                return
+            credential.login_failures += 1
+            if credential.login_failures < CREDENTIAL_MAX_LOGIN_FAILURES:
+                return
+            duration = min(
+                CREDENTIAL_QUARANTINE_SECONDS * (2 ** credential.quarantines),
+                CREDENTIAL_QUARANTINE_MAX_SECONDS
+            )
+            credential.quarantined_until = time.monotonic() + duration
+            credential.quarantines += 1
+            credential.login_failures = 0
+        credential_quarantine_total.inc(company=credential.company, account=credential.username)
+        logger.warning(
+            f"⚠️ {credential.company} hesabı {credential.username} giriş hataları nedeniyle "
+            f"{duration:.0f} sn karantinada"
+        )
+
+    @contextmanager
+    def lease(self, company: str):
+        """
+        with credential_pool.lease("Sompo") as credential: ...
+        ScraperLoginError ile çıkılırsa giriş hatası olarak sayılır
+        """
+        credential = self.acquire(company)
+        login_failed = False
+        try:
+            yield credential
+        except Exception as e:
+            login_failed = is_login_error(e)
+            raise
+        finally:
+            self.release(credential, login_failed=login_failed)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            return [c.to_dict() for accounts in self._accounts.values() for c in accounts]
+
+
+def is_login_error(error: BaseException) -> bool:
+    """Hata (child process'ten gelenler dahil) bir giriş hatası mı"""
+    return getattr(error, "error_class", type(error).__name__) == "ScraperLoginError"
+
+
+# Uygulama genelinde tek havuz
+credential_pool = CredentialPool()
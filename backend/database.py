@@ -129,11 +129,35 @@ def init_db():
     try:
         from backend.models import Base
         Base.metadata.create_all(bind=engine)
+        add_missing_columns()
         print("[OK] Database tables created successfully")
     except Exception as e:
         print(f"[WARNING] Failed to create database tables: {e}")
 
 
+def add_missing_columns():
+    """
+    Mevcut tablolara modelde sonradan eklenen (nullable) kolonları ekle
+    create_all var olan tabloları değiştirmediği için gerekli
+    """
+    from sqlalchemy import inspect
+    from backend.models import Base
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"[OK] Column added: {table.name}.{column.name}")
+
+
 def drop_db():
     """
     Drop all tables (DANGER: Use only in development!)
@@ -149,3 +173,44 @@ def drop_db():
     except Exception as e:
         print(f"[WARNING] Failed to drop database tables: {e}")
 
+
+
+def migrate_legacy_raw_data(batch_size: int = 500) -> int:
+    """
+    offers.raw_data kolonundaki eski ham verileri offer_raw_data tablosuna taşı
+    Küçük batch'ler halinde çalışır, taşınan kayıt sayısını döndürür
+    Kullanım: python -c "from backend.database import migrate_legacy_raw_data; migrate_legacy_raw_data()"
+    """
+    if SessionLocal is None:
+        print("[WARNING] Database not available, cannot migrate raw data")
+        return 0
+
+    from sqlalchemy import null
+    from sqlalchemy.orm import undefer
+    from backend.models import Offer
+
+    moved = 0
+    db = SessionLocal()
+    try:
+        while True:
+            offers = (
+                db.query(Offer)
+                .options(undefer(Offer.raw_data))
+                .filter(Offer.raw_data.isnot(None))
+                .order_by(Offer.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not offers:
+                break
+            for offer in offers:
+                if offer.raw_payload is None and offer.raw_data is not None:
+                    offer.set_raw_data(offer.raw_data)
+                # JSON 'null' değil, SQL NULL yaz (aksi halde filtre tekrar yakalar)
+                offer.raw_data = null()
+            db.commit()
+            moved += len(offers)
+            print(f"[OK] {moved} offer raw_data kaydı taşındı")
+    finally:
+        db.close()
+    return moved
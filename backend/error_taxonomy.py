@@ -0,0 +1,202 @@
+"""
+Scraper hata sınıflandırması ve deterministik hatalar için negatif önbellek
+
+Scraper'lar hatayı serbest metin (Türkçe) ya da exception olarak döndürür. classify_error bunları
+sabit kategorilere çevirir: transient (zaman aşımı, ağ), auth (giriş/TOTP), input_invalid
+(portala uymayan girdi), portal_rejected (portalın kesin "teklif verilemez" yanıtı),
+layout_changed (beklenen ekran/selector yok). Tekrar deneme politikası kategoriye göre
+belirlenir; input_invalid ve portal_rejected sonuçları aynı girdiler için NEGATIVE_CACHE_TTL_SECONDS
+boyunca önbellekten döner, portala tekrar gidilmez.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from backend.metrics import registry
+
+
+class ErrorCategory(str, Enum):
+    """Scraper hata kategorisi"""
+    TRANSIENT = "transient"
+    AUTH = "auth"
+    INPUT_INVALID = "input_invalid"
+    PORTAL_REJECTED = "portal_rejected"
+    LAYOUT_CHANGED = "layout_changed"
+
+
+# Aynı istek kategoriye göre en fazla bu kadar kez denenir (ilk deneme dahil)
+ERROR_MAX_ATTEMPTS = {
+    ErrorCategory.TRANSIENT: int(os.getenv("ERROR_TRANSIENT_ATTEMPTS", "2")),
+    ErrorCategory.AUTH: int(os.getenv("ERROR_AUTH_ATTEMPTS", "2")),
+    ErrorCategory.INPUT_INVALID: 1,
+    ErrorCategory.PORTAL_REJECTED: 1,
+    ErrorCategory.LAYOUT_CHANGED: 1,
+}
+# Tekrar denemeden önce beklenen süre
+ERROR_RETRY_DELAY_SECONDS = float(os.getenv("ERROR_RETRY_DELAY_SECONDS", "2"))
+# Bu kategoriler girdiye bağlıdır: aynı girdiyle tekrar denemek aynı sonucu verir
+DETERMINISTIC_CATEGORIES = {ErrorCategory.INPUT_INVALID, ErrorCategory.PORTAL_REJECTED}
+
+NEGATIVE_CACHE_ENABLED = os.getenv("NEGATIVE_CACHE_ENABLED", "true").lower() == "true"
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "21600"))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+
+# Exception sınıf adı -> kategori (child process'ten gelenlerde error_class kullanılır)
+_EXCEPTION_CATEGORIES = {
+    "ScraperLoginError": ErrorCategory.AUTH,
+    "NoCredentialAvailable": ErrorCategory.AUTH,
+    "StepInputError": ErrorCategory.INPUT_INVALID,
+    "ValidationError": ErrorCategory.INPUT_INVALID,
+    "QuoteSessionError": ErrorCategory.LAYOUT_CHANGED,
+    "CircuitOpenError": ErrorCategory.TRANSIENT,
+    "ScraperTimeout": ErrorCategory.TRANSIENT,
+    "ScraperCrashed": ErrorCategory.TRANSIENT,
+    "TimeoutError": ErrorCategory.TRANSIENT,
+    "LeaseExpired": ErrorCategory.TRANSIENT,
+    "JobPreempted": ErrorCategory.TRANSIENT,
+}
+
+# Mesaj kalıpları (regex, küçük harf), sırayla denenir; ilk eşleşen kategori kazanır.
+# Zaman aşımı ve ağ hataları önce bakılır: Playwright mesajları selector'ı ve gidilen URL'yi
+# (örn. .../login) de içerir, bunlar hatanın kategorisini belirlememeli.
+_MESSAGE_RULES: Tuple[Tuple[ErrorCategory, Tuple[str, ...]], ...] = (
+    (ErrorCategory.TRANSIENT, (
+        "timeout", "zaman aşımı", "net::err", "connection", "bağlantı", "yanıt vermedi",
+        "çöktü", "beklenmedik şekilde", "devre açık",
+    )),
+    (ErrorCategory.AUTH, (
+        "giriş başarısız", "giriş yapılamadı", r"\blogin\b", "totp", "2fa", "doğrulama kodu",
+        "oturum süresi", "şifre", "kullanıcı adı",
+    )),
+    (ErrorCategory.INPUT_INVALID, (
+        "geçersiz", "desteklenmeyen branş", "formatı", "seçilemedi", "zorunlu alan",
+        "hatalı tc", "hatalı plaka",
+    )),
+    (ErrorCategory.PORTAL_REJECTED, (
+        "araç bulunamadı", "kayıt bulunamadı", "poliçe mevcut", "poliçesi mevcut", "poliçesi bulunmaktadır",
+        "teklif verilemez", "teklif verilememektedir", "sigortalanamaz", "kabul edilmemektedir",
+        "egm kaydı", "yetkiniz yok", "riskli",
+    )),
+    (ErrorCategory.LAYOUT_CHANGED, (
+        "selector", "butonu bulunamadı", "alanı bulunamadı", "dropdown", "sayfası açılamadı",
+        "görünür değil", "strict mode violation",
+    )),
+)
+
+_URL_PATTERN = re.compile(r"\b[a-z][a-z0-9+.-]*://\S+")
+
+
+def normalize_message(text: Optional[str]) -> str:
+    """
+    Eşleştirme için küçük harf: Türkçe İ/I/ı tek harfe (i) indirilir
+    (str.lower() "İ"yi "i̇" yapar, "I"yı "ı" yerine "i" yapar), URL'ler çıkarılır
+    """
+    text = (text or "").replace("İ", "i").replace("I", "i").lower()
+    text = text.replace("\u0307", "").replace("ı", "i")
+    return _URL_PATTERN.sub(" ", text)
+
+
+_COMPILED_RULES = tuple(
+    (category, re.compile("|".join(normalize_message(pattern) for pattern in patterns)))
+    for category, patterns in _MESSAGE_RULES
+)
+
+negative_cache_total = registry.counter(
+    "scraper_negative_cache_total",
+    "Negatif önbellek sonuçları (hit, store)",
+    ("company", "result")
+)
+
+
+def classify_error(message: Optional[str], error_class: Optional[str] = None) -> ErrorCategory:
+    """Hata mesajı ve (varsa) exception sınıf adından kategori; eşleşme yoksa transient"""
+    if error_class and error_class in _EXCEPTION_CATEGORIES:
+        return _EXCEPTION_CATEGORIES[error_class]
+    text = normalize_message(message)
+    for category, pattern in _COMPILED_RULES:
+        if pattern.search(text):
+            return category
+    return ErrorCategory.TRANSIENT
+
+
+def classify_exception(error: BaseException) -> ErrorCategory:
+    return classify_error(str(error), getattr(error, "error_class", type(error).__name__))
+
+
+def is_retryable(category: Optional[ErrorCategory], attempts: int) -> bool:
+    """attempts deneme yapıldıktan sonra kategori tekrar denemeye izin veriyor mu"""
+    if category is None:
+        return False
+    return attempts < ERROR_MAX_ATTEMPTS.get(ErrorCategory(category), 1)
+
+
+def request_fingerprint(company: str, branch: str, data: Dict[str, Any]) -> str:
+    """Şirket + branş + girdilerden (büyük/küçük harf ve boşluktan bağımsız) anahtar"""
+    normalized = {
+        key: value.strip().upper() if isinstance(value, str) else value
+        for key, value in (data or {}).items()
+        if value not in (None, "")
+    }
+    payload = json.dumps([company, branch, normalized], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NegativeCache:
+    """Deterministik hataların TTL'li, boyutu sınırlı (LRU) önbelleği - thread-safe"""
+
+    def __init__(self, ttl: float = NEGATIVE_CACHE_TTL_SECONDS, max_entries: int = NEGATIVE_CACHE_MAX_ENTRIES,
+                 enabled: bool = NEGATIVE_CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, company: str, branch: str, data: Dict[str, Any]):
+        """Önbellekteki başarısız StandardOffer'ın kopyası ya da None"""
+        if not self.enabled:
+            return None
+        key = request_fingerprint(company, branch, data)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, offer = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        negative_cache_total.inc(company=company, result="hit")
+        raw_data = dict(offer.raw_data or {})
+        raw_data["negative_cache"] = {"expires_in": round(expires_at - now)}
+        return offer.copy(update={"raw_data": raw_data})
+
+    def put(self, company: str, branch: str, data: Dict[str, Any], offer) -> bool:
+        """Deterministik kategorideki başarısız sonucu sakla; saklandıysa True"""
+        if not self.enabled or offer is None or offer.status == "completed":
+            return False
+        if offer.error_category not in DETERMINISTIC_CATEGORIES:
+            return False
+        key = request_fingerprint(company, branch, data)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, offer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        negative_cache_total.inc(company=company, result="store")
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Uygulama genelinde tek önbellek
+negative_cache = NegativeCache()
@@ -0,0 +1,152 @@
+"""
+Uzun kuyruklu (tail latency) şirketler için hedge'lenmiş ikinci deneme
+
+Bazı portallarda tekliflerin çoğu kısa sürede biter ama bir kısmı hesaplama adımında
+dakikalarca takılır. HEDGE_COMPANIES içindeki şirketlerde teklif, şirketin geçmiş sürelerinin
+HEDGE_PERCENTILE değerini geçtiyse ikinci bir deneme başka bir oturumda başlatılır; ilk başarılı
+sonuç kazanır, diğerinin beklemesi iptal edilir. Thread worker'ında kaybeden akış sıradaki adım
+sınırında durur, process modunda child öldürülür; deneme hesap kirasını iş gerçekten bitene kadar
+tutar. Portal yükünü sınırlamak için şirket başına eşzamanlı hedge sayısı ve son isteklere oranla
+hedge sayısı sınırlıdır.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from backend.company_stats import company_stats
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Hedge uygulanacak şirketler (virgülle ayrılmış, örn. "Şeker,Atlas"); boşsa hedge yok
+HEDGE_COMPANIES = {c.strip() for c in os.getenv("HEDGE_COMPANIES", "").split(",") if c.strip()}
+# İkinci deneme, süre bu percentile'ı geçince başlar
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+# Percentile bundan kısa çıksa da en az bu kadar beklenir
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "30"))
+# Percentile için gereken en az süre örneği (yoksa hedge yapılmaz)
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Şirket başına aynı anda çalışan en fazla hedge denemesi
+HEDGE_MAX_INFLIGHT = int(os.getenv("HEDGE_MAX_INFLIGHT", "2"))
+# Son HEDGE_WINDOW istekte hedge oranı üst sınırı
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "100"))
+
+hedge_total = registry.counter(
+    "scraper_hedge_total",
+    "Hedge denemeleri (started, won, lost, skipped)",
+    ("company", "result")
+)
+
+
+def _succeeded(task: "asyncio.Future") -> bool:
+    if task.cancelled() or task.exception() is not None:
+        return False
+    result = task.result()
+    return bool(result and getattr(result, "status", None) == "completed")
+
+
+class HedgePolicy:
+    """Şirket bazında hedge gecikmesi ve hedge bütçesi (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, int] = {}
+        # Son istekler: hedge yapıldı mı
+        self._recent: Dict[str, Deque[bool]] = {}
+
+    def delay(self, company: str) -> Optional[float]:
+        """Hedge'e kadar beklenecek süre; şirket hedge'li değilse ya da yeterli veri yoksa None"""
+        if company not in HEDGE_COMPANIES:
+            return None
+        if company_stats.duration_samples(company) < HEDGE_MIN_SAMPLES:
+            return None
+        threshold = company_stats.duration_percentile(company, HEDGE_PERCENTILE)
+        if threshold is None:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, threshold)
+
+    def note_request(self, company: str) -> None:
+        with self._lock:
+            recent = self._recent.get(company)
+            if recent is None:
+                recent = self._recent[company] = deque(maxlen=HEDGE_WINDOW)
+            recent.append(False)
+
+    def try_acquire(self, company: str) -> bool:
+        """Bütçe uygunsa hedge hakkı al"""
+        with self._lock:
+            recent = self._recent.get(company) or deque()
+            hedged = sum(1 for h in recent if h)
+            if self._inflight.get(company, 0) >= HEDGE_MAX_INFLIGHT:
+                return False
+            if recent and (hedged + 1) / len(recent) > HEDGE_MAX_RATIO:
+                return False
+            self._inflight[company] = self._inflight.get(company, 0) + 1
+            if recent:
+                # Bu isteğin kaydı hedge'li olarak işaretlenir
+                recent[-1] = True
+            return True
+
+    def release(self, company: str) -> None:
+        with self._lock:
+            self._inflight[company] = max(0, self._inflight.get(company, 0) - 1)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                company: {
+                    "hedges_inflight": self._inflight.get(company, 0),
+                    "hedge_ratio": round(sum(1 for h in recent if h) / len(recent), 4) if recent else 0.0,
+                }
+                for company, recent in self._recent.items()
+            }
+
+
+# Uygulama genelinde tek policy
+hedge_policy = HedgePolicy()
+
+
+async def run_hedged(company: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    attempt() çağrısını çalıştır; süre hedge eşiğini geçerse ikinci bir attempt() başlat
+    İlk başarılı sonuç döner, kalan denemenin task'ı iptal edilir (worker'daki iş durana kadar arka
+    planda sürer, beklenmez). İkisi de başarısızsa asıl denemenin sonucu (ya da exception'ı) döner.
+    """
+    delay = hedge_policy.delay(company)
+    if delay is None:
+        return await attempt()
+    hedge_policy.note_request(company)
+
+    primary = asyncio.ensure_future(attempt())
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not hedge_policy.try_acquire(company):
+            hedge_total.inc(company=company, result="skipped")
+            return await primary
+    except BaseException:
+        primary.cancel()
+        raise
+
+    logger.info(f"⏱️ {company} teklifi {delay:.0f} sn'yi geçti, ikinci deneme başlatılıyor")
+    hedge_total.inc(company=company, result="started")
+    hedge = asyncio.ensure_future(attempt())
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if _succeeded(task)), None)
+            if winner is not None:
+                hedge_total.inc(company=company, result="won" if winner is hedge else "lost")
+                return winner.result()
+        hedge_total.inc(company=company, result="lost")
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        hedge_policy.release(company)
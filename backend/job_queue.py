@@ -0,0 +1,371 @@
+"""
+Veritabanı tabanlı scrape iş kuyruğu - birden fazla makinedeki worker'lar için
+
+API işleri scrape_jobs tablosuna yazar; worker'lar (python -m backend.worker) işleri kiralar
+(lease), süre dolmadan heartbeat ile uzatır ve sonucu yazar. MySQL'de kiralama
+SELECT ... FOR UPDATE SKIP LOCKED ile, SQLite'ta koşullu UPDATE (optimistic lease) ile yapılır.
+Süresi dolan kiralar (ölen worker'lar) tekrar kuyruğa alınır.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.models import (
+    Offer, ScrapeJob, ScrapeJobStatus, WorkerNode,
+    InsuranceBranch as DBInsuranceBranch, InsuranceCompany as DBInsuranceCompany
+)
+from sqlalchemy import and_, func, or_
+
+from backend.error_taxonomy import ErrorCategory, classify_error, is_retryable
+from backend.metrics import registry
+from backend.priorities import PRIORITY_AGING_SECONDS, JobPriority, priority_name, record_queue_wait
+from backend.schemas import StandardOffer
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# SQLite'ta aynı anda denenecek aday iş sayısı (başka worker kaptıysa sıradakine geçilir)
+JOB_LEASE_CANDIDATES = 10
+
+TERMINAL_STATUSES = (ScrapeJobStatus.COMPLETED, ScrapeJobStatus.FAILED)
+
+queued_jobs = registry.gauge(
+    "scraper_jobs_queued",
+    "Veritabanı kuyruğunda bekleyen işler (şirket ve öncelik bazında)",
+    ("company", "priority")
+)
+leased_jobs = registry.gauge(
+    "scraper_jobs_leased",
+    "Worker'ların kiraladığı (çalışan) işler",
+    ("company",)
+)
+
+
+def _is_mysql(db) -> bool:
+    return db.get_bind().dialect.name == "mysql"
+
+
+def enqueue_jobs(session_factory, request_id: str, branch: str, companies: Iterable[str],
+                 data: Dict[str, Any], priority: int = JobPriority.NORMAL) -> List[int]:
+    """Her şirket için bir iş oluştur, iş ID'lerini döndür"""
+    db = session_factory()
+    try:
+        jobs = [
+            ScrapeJob(
+                request_id=request_id,
+                company=DBInsuranceCompany(company),
+                branch=DBInsuranceBranch(branch),
+                payload=data,
+                status=ScrapeJobStatus.QUEUED,
+                attempts=0,
+                priority=int(priority)
+            )
+            for company in companies
+        ]
+        db.add_all(jobs)
+        db.commit()
+        return [job.id for job in jobs]
+    finally:
+        db.close()
+
+
+def _lease_values(worker_id: str, now: datetime) -> Dict[str, Any]:
+    return {
+        ScrapeJob.status: ScrapeJobStatus.LEASED,
+        ScrapeJob.leased_by: worker_id,
+        ScrapeJob.lease_expires_at: now + timedelta(seconds=JOB_LEASE_SECONDS),
+        ScrapeJob.attempts: ScrapeJob.attempts + 1,
+        ScrapeJob.started_at: now,
+    }
+
+
+def _priority_levels(now: datetime):
+    """
+    Yaşlandırılmış önceliğe göre sırayla denenecek filtreler: seviye L'de önceliği <= L olan işler
+    ve L'ye yaşlanmış (p - L sınıf x PRIORITY_AGING_SECONDS'tır bekleyen) düşük öncelikli işler
+    """
+    priority = func.coalesce(ScrapeJob.priority, int(JobPriority.NORMAL))
+    for level in JobPriority:
+        conditions = [priority <= int(level)]
+        if PRIORITY_AGING_SECONDS > 0:
+            conditions += [
+                and_(priority == int(p), ScrapeJob.created_at <= now - timedelta(seconds=(p - level) * PRIORITY_AGING_SECONDS))
+                for p in JobPriority if p > level
+            ]
+        yield or_(*conditions)
+
+
+def _lease_one(db, worker_id: str, companies: List[DBInsuranceCompany]) -> Optional[ScrapeJob]:
+    """En yüksek (yaşlandırılmış) öncelikli, eşitse en eski işi kirala"""
+    now = datetime.now()
+    for level in _priority_levels(now):
+        query = db.query(ScrapeJob).filter(
+            ScrapeJob.status == ScrapeJobStatus.QUEUED,
+            ScrapeJob.company.in_(companies),
+            level
+        ).order_by(ScrapeJob.id)
+        job = _lease_first(db, worker_id, query, now)
+        if job is not None:
+            return job
+    return None
+
+
+def _lease_first(db, worker_id: str, query, now: datetime) -> Optional[ScrapeJob]:
+    if _is_mysql(db):
+        # Kilitli satırları atla: diğer worker'lar beklemeden bir sonraki işe geçer
+        job = query.with_for_update(skip_locked=True).first()
+        if job is None:
+            db.rollback()
+            return None
+        for column, value in _lease_values(worker_id, now).items():
+            setattr(job, column.key, value)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    # SQLite: satır kilidi yok - durum hâlâ QUEUED ise güncelle, değilse başka aday dene
+    candidate_ids = [row[0] for row in query.with_entities(ScrapeJob.id).limit(JOB_LEASE_CANDIDATES).all()]
+    for job_id in candidate_ids:
+        updated = db.query(ScrapeJob).filter(
+            ScrapeJob.id == job_id,
+            ScrapeJob.status == ScrapeJobStatus.QUEUED
+        ).update(_lease_values(worker_id, now), synchronize_session=False)
+        db.commit()
+        if updated:
+            return db.query(ScrapeJob).get(job_id)
+    return None
+
+
+def lease_job(session_factory, worker_id: str, companies: Iterable[str],
+              preferred: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Sıradaki işi kirala; önce oturumu sıcak olan (preferred) şirketlerin işleri denenir
+    İşin dict'ini (payload dahil) ya da None döndürür
+    """
+    company_enums = [DBInsuranceCompany(c) for c in companies]
+    preferred_enums = [DBInsuranceCompany(c) for c in preferred if c in companies]
+    db = session_factory()
+    try:
+        job = None
+        if preferred_enums:
+            job = _lease_one(db, worker_id, preferred_enums)
+        if job is None and company_enums:
+            job = _lease_one(db, worker_id, company_enums)
+        if job is None:
+            return None
+        if job.created_at and job.started_at:
+            record_queue_wait(
+                job.priority if job.priority is not None else JobPriority.NORMAL,
+                max(0.0, (job.started_at - job.created_at).total_seconds())
+            )
+        item = job.to_dict()
+        item["payload"] = job.payload
+        return item
+    finally:
+        db.close()
+
+
+def heartbeat_leases(session_factory, worker_id: str, job_ids: List[int]) -> int:
+    """Worker'ın elindeki işlerin kira süresini uzat, uzatılan iş sayısını döndür"""
+    if not job_ids:
+        return 0
+    db = session_factory()
+    try:
+        updated = db.query(ScrapeJob).filter(
+            ScrapeJob.id.in_(job_ids),
+            ScrapeJob.leased_by == worker_id,
+            ScrapeJob.status == ScrapeJobStatus.LEASED
+        ).update(
+            {ScrapeJob.lease_expires_at: datetime.now() + timedelta(seconds=JOB_LEASE_SECONDS)},
+            synchronize_session=False
+        )
+        db.commit()
+        return updated
+    finally:
+        db.close()
+
+
+def requeue_expired(session_factory) -> int:
+    """
+    Kirası dolmuş işleri (ölen/donan worker) tekrar kuyruğa al
+    Deneme hakkı bitenler başarısız olarak işaretlenir. Tüm worker'lar güvenle çağırabilir.
+    """
+    now = datetime.now()
+    db = session_factory()
+    try:
+        expired = (
+            ScrapeJob.status == ScrapeJobStatus.LEASED,
+            ScrapeJob.lease_expires_at < now
+        )
+        failed = db.query(ScrapeJob).filter(*expired, ScrapeJob.attempts >= JOB_MAX_ATTEMPTS).update(
+            {
+                ScrapeJob.status: ScrapeJobStatus.FAILED,
+                ScrapeJob.error: "Worker yanıt vermedi (kira süresi doldu)",
+                ScrapeJob.error_class: "LeaseExpired",
+                ScrapeJob.finished_at: now,
+            },
+            synchronize_session=False
+        )
+        requeued = db.query(ScrapeJob).filter(*expired).update(
+            {
+                ScrapeJob.status: ScrapeJobStatus.QUEUED,
+                ScrapeJob.leased_by: None,
+                ScrapeJob.lease_expires_at: None,
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        if failed or requeued:
+            logger.warning(f"⚠️ Süresi dolan kiralar: {requeued} iş tekrar kuyrukta, {failed} iş başarısız")
+        return requeued
+    finally:
+        db.close()
+
+
+def complete_job(session_factory, job_id: int, worker_id: str, result: Optional[StandardOffer] = None,
+                 error: Optional[str] = None, error_class: Optional[str] = None) -> bool:
+    """
+    İş sonucunu yaz; başarılı teklif aynı transaction'da offers tablosuna kaydedilir
+    Hata kategorisi tekrar denemeye izin veriyorsa (geçici hatalar JOB_MAX_ATTEMPTS'a kadar) iş
+    tekrar kuyruğa alınır; girdi/portal reddi/sayfa yapısı hataları hemen başarısız olur.
+    Kira bu worker'da değilse (süresi dolup başkasına geçtiyse) sonuç yazılmaz, False döner.
+    """
+    now = datetime.now()
+    db = session_factory()
+    try:
+        query = db.query(ScrapeJob).filter(ScrapeJob.id == job_id)
+        if _is_mysql(db):
+            query = query.with_for_update()
+        job = query.first()
+        if job is None or job.leased_by != worker_id or job.status != ScrapeJobStatus.LEASED:
+            db.rollback()
+            logger.warning(f"⚠️ İş #{job_id} kirası kaybedildi, sonuç yazılmadı")
+            return False
+
+        if error_class == "JobPreempted":
+            # Toplu iş canlı iş için bırakıldı: deneme hakkı yenmez, aynı öncelikle kuyruğa döner
+            job.status = ScrapeJobStatus.QUEUED
+            job.leased_by = None
+            job.lease_expires_at = None
+            job.attempts = max(0, job.attempts - 1)
+            db.commit()
+            return True
+
+        if result is None:
+            category = classify_error(error, error_class) if error_class else None
+        else:
+            category = result.error_category if result.status != "completed" else None
+        retryable = category == ErrorCategory.TRANSIENT or is_retryable(category, job.attempts)
+        if category is not None and retryable and job.attempts < JOB_MAX_ATTEMPTS:
+            job.status = ScrapeJobStatus.QUEUED
+            job.leased_by = None
+            job.lease_expires_at = None
+            job.error = error or (result.error if result is not None else None)
+            job.error_class = error_class or "ScraperFailed"
+            job.error_category = category.value
+            db.commit()
+            return True
+
+        if result is not None and result.status == "completed":
+            offer = Offer.from_standard_offer(
+                result, job.company, job.branch, (job.payload or {}).get('tckn', ''), request_data=job.payload
+            )
+            db.add(offer)
+            db.flush()
+            job.offer_id = offer.id
+            job.status = ScrapeJobStatus.COMPLETED
+        else:
+            job.status = ScrapeJobStatus.FAILED
+            job.error = (result.error if result is not None else None) or error or "Scraper sonuç döndürmedi"
+            job.error_class = error_class or ("ScraperFailed" if result is not None else "NoResult")
+            job.error_category = category.value if category is not None else None
+        job.result = result.dict() if result is not None else None
+        job.finished_at = now
+        job.lease_expires_at = None
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def request_jobs(session_factory, request_id: str) -> List[Dict[str, Any]]:
+    """Bir isteğin işlerini, tamamlananların teklifleriyle birlikte döndür"""
+    db = session_factory()
+    try:
+        jobs = db.query(ScrapeJob).filter(ScrapeJob.request_id == request_id).order_by(ScrapeJob.id).all()
+        items = []
+        for job in jobs:
+            item = job.to_dict()
+            item["offer"] = None
+            if job.offer_id is not None:
+                offer = db.query(Offer).get(job.offer_id)
+                item["offer"] = offer.to_dict(include_raw_data=True) if offer else None
+            items.append(item)
+        return items
+    finally:
+        db.close()
+
+
+def register_worker(session_factory, worker_id: str, hostname: str, capacity: int, active_jobs: int,
+                    companies: List[str], warm_companies: List[str]) -> None:
+    """Worker kaydını oluştur/güncelle (heartbeat)"""
+    db = session_factory()
+    try:
+        db.merge(WorkerNode(
+            worker_id=worker_id,
+            hostname=hostname,
+            capacity=capacity,
+            active_jobs=active_jobs,
+            companies=companies,
+            warm_companies=warm_companies,
+            last_seen=datetime.now()
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def unregister_worker(session_factory, worker_id: str) -> None:
+    db = session_factory()
+    try:
+        db.query(WorkerNode).filter(WorkerNode.worker_id == worker_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def live_workers(session_factory, max_age_seconds: int = JOB_LEASE_SECONDS) -> List[Dict[str, Any]]:
+    """Son heartbeat'i yeterince yeni olan worker'lar"""
+    cutoff = datetime.now() - timedelta(seconds=max_age_seconds)
+    db = session_factory()
+    try:
+        return [w.to_dict() for w in db.query(WorkerNode).filter(WorkerNode.last_seen >= cutoff).all()]
+    finally:
+        db.close()
+
+
+def collect_queue_metrics(session_factory) -> None:
+    """Şirket bazında kuyruk derinliği (/metrics scrape'inde tek GROUP BY sorgusu)"""
+    db = session_factory()
+    try:
+        rows = (db.query(ScrapeJob.company, ScrapeJob.status, ScrapeJob.priority, func.count(ScrapeJob.id))
+                .filter(ScrapeJob.status.in_((ScrapeJobStatus.QUEUED, ScrapeJobStatus.LEASED)))
+                .group_by(ScrapeJob.company, ScrapeJob.status, ScrapeJob.priority)
+                .all())
+    finally:
+        db.close()
+    # Kuyruğu boşalan şirketler eski değerde kalmasın
+    queued = {(c.value, priority_name(p)): 0 for c in DBInsuranceCompany for p in JobPriority}
+    leased = {c.value: 0 for c in DBInsuranceCompany}
+    for company, status, priority, count in rows:
+        if status == ScrapeJobStatus.LEASED:
+            leased[company.value] += count
+        else:
+            key = (company.value, priority_name(priority if priority is not None else JobPriority.NORMAL))
+            queued[key] = queued.get(key, 0) + count
+    for (company, priority), count in queued.items():
+        queued_jobs.set(count, company=company, priority=priority)
+    for company, count in leased.items():
+        leased_jobs.set(count, company=company)
@@ -0,0 +1,284 @@
+"""
+System log retention - aylık bölümleme, arşivleme ve eski kayıtların silinmesi
+
+MySQL: system_logs tablosu TO_DAYS(created_at) üzerinden aylık RANGE partition'lara
+bölünür, eski partition'lar önce sıkıştırılmış NDJSON'a arşivlenir sonra DROP PARTITION
+ile (satır kilidi olmadan) düşürülür.
+SQLite (ve partition'a çevrilmemiş MySQL): eski kayıtlar ay ay, küçük batch'ler halinde
+arşivlenip silinir; her batch ayrı kısa bir transaction olduğu için yazanlar beklemez.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from backend.database import engine
+
+logger = logging.getLogger(__name__)
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "log_archive")
+LOG_MAINTENANCE_ENABLED = os.getenv("LOG_MAINTENANCE_ENABLED", "true").lower() == "true"
+LOG_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", str(6 * 3600)))
+LOG_MAINTENANCE_BATCH_SIZE = int(os.getenv("LOG_MAINTENANCE_BATCH_SIZE", "1000"))
+# Mevcut tabloyu partition'lı yapıya çevirmek tek seferlik tablo kopyası gerektirir,
+# bu yüzden sadece açıkça istendiğinde yapılır
+LOG_PARTITION_CONVERT = os.getenv("LOG_PARTITION_CONVERT", "false").lower() == "true"
+# Önceden oluşturulacak gelecek ay partition sayısı
+LOG_PARTITION_PREMAKE_MONTHS = int(os.getenv("LOG_PARTITION_PREMAKE_MONTHS", "2"))
+
+TABLE = "system_logs"
+COLUMNS = ["id", "level", "message", "user", "action", "log_metadata", "created_at"]
+
+
+def _month_start(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1)
+
+
+def _add_months(d: datetime, months: int) -> datetime:
+    month_index = d.year * 12 + (d.month - 1) + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"p{month.strftime('%Y%m')}"
+
+
+def _archive_path(month: datetime) -> str:
+    return os.path.join(LOG_ARCHIVE_DIR, f"{TABLE}_{month.strftime('%Y%m')}.ndjson.gz")
+
+
+def _serialize_row(row) -> str:
+    """Log satırını NDJSON satırına çevir"""
+    record = {}
+    for key, value in zip(COLUMNS, row):
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif key == "log_metadata" and isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        record[key] = value
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def _append_archive(month: datetime, rows) -> None:
+    """
+    Satırları aylık arşiv dosyasına ekle
+    gzip çoklu member destekler, yarıda kalan bir çalışma sonrası ekleme güvenlidir
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    with gzip.open(_archive_path(month), "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(_serialize_row(row))
+            f.write("\n")
+
+
+def _select_columns() -> str:
+    # "user" bazı veritabanlarında rezerve kelime
+    quote = "`" if engine.dialect.name == "mysql" else '"'
+    return ", ".join(f"{quote}{c}{quote}" for c in COLUMNS)
+
+
+# ============================================
+# BATCH TABANLI RETENTION (SQLite / partition'sız MySQL)
+# ============================================
+
+def _prune_in_batches(cutoff: datetime) -> int:
+    """
+    cutoff'tan eski kayıtları id sırasıyla küçük batch'ler halinde arşivle ve sil
+    Her batch ayrı transaction - yazma işlemleri arada çalışmaya devam eder
+    """
+    removed = 0
+    columns = _select_columns()
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT {columns} FROM {TABLE} "
+                    f"WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+                ),
+                {"cutoff": cutoff, "limit": LOG_MAINTENANCE_BATCH_SIZE}
+            ).fetchall()
+            if not rows:
+                break
+
+            # Aylara göre grupla, önce arşive yaz sonra sil
+            by_month: Dict[datetime, List] = {}
+            for row in rows:
+                created_at = row[COLUMNS.index("created_at")]
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at)
+                by_month.setdefault(_month_start(created_at), []).append(row)
+            for month, month_rows in by_month.items():
+                _append_archive(month, month_rows)
+
+            ids = [row[0] for row in rows]
+            placeholders = ", ".join(f":id{i}" for i in range(len(ids)))
+            conn.execute(
+                text(f"DELETE FROM {TABLE} WHERE id IN ({placeholders})"),
+                {f"id{i}": v for i, v in enumerate(ids)}
+            )
+        removed += len(rows)
+    return removed
+
+
+# ============================================
+# MYSQL PARTITION YÖNETİMİ
+# ============================================
+
+def _mysql_partitions(conn) -> List[Tuple[str, Optional[str]]]:
+    """Mevcut partition adlarını ve üst sınırlarını getir"""
+    rows = conn.execute(
+        text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {"table": TABLE}
+    ).fetchall()
+    return [(r[0], r[1]) for r in rows]
+
+
+def _partition_clause(months: List[datetime]) -> str:
+    parts = [
+        f"PARTITION {_partition_name(m)} VALUES LESS THAN (TO_DAYS('{_add_months(m, 1).strftime('%Y-%m-%d')}'))"
+        for m in months
+    ]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+
+def _mysql_convert_to_partitioned(conn, oldest: datetime, now: datetime) -> None:
+    """
+    Tabloyu aylık partition'lı yapıya çevir (tek seferlik)
+    MySQL partition anahtarının primary key içinde olmasını şart koşar: PK (id, created_at)
+    """
+    months = []
+    month = _month_start(oldest)
+    last = _add_months(_month_start(now), LOG_PARTITION_PREMAKE_MONTHS)
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    logger.warning(f"⚠️ {TABLE} tablosu partition'lı yapıya çevriliyor ({len(months)} ay)...")
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), "
+        f"PARTITION BY RANGE (TO_DAYS(created_at)) ({_partition_clause(months)})"
+    ))
+
+
+def _mysql_rollover(conn, partitions: List[Tuple[str, Optional[str]]], now: datetime) -> None:
+    """Gelecek aylar için partition'ları pmax'ten ayırarak önceden oluştur"""
+    existing = {name for name, _ in partitions}
+    wanted = []
+    for i in range(LOG_PARTITION_PREMAKE_MONTHS + 1):
+        month = _add_months(_month_start(now), i)
+        if _partition_name(month) not in existing:
+            wanted.append(month)
+    if not wanted:
+        return
+    # pmax boş olduğu sürece REORGANIZE anlık bir metadata işlemidir
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO ({_partition_clause(wanted)})"
+    ))
+    logger.info(f"✅ {TABLE} yeni partition'lar: {', '.join(_partition_name(m) for m in wanted)}")
+
+
+def _mysql_drop_expired(cutoff: datetime) -> int:
+    """Tamamen cutoff'tan eski partition'ları arşivle ve DROP PARTITION ile düşür"""
+    removed = 0
+    cutoff_month = _month_start(cutoff)
+    columns = _select_columns()
+    with engine.connect() as conn:
+        partitions = _mysql_partitions(conn)
+    for name, _ in partitions:
+        if name == "pmax" or not name.startswith("p"):
+            continue
+        try:
+            month = datetime.strptime(name[1:], "%Y%m")
+        except ValueError:
+            continue
+        if _add_months(month, 1) > cutoff_month:
+            continue
+
+        # Arşivle: partition'ı id sırasıyla sayfa sayfa oku
+        last_id = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        f"SELECT {columns} FROM {TABLE} PARTITION ({name}) "
+                        f"WHERE id > :last_id ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": LOG_MAINTENANCE_BATCH_SIZE}
+                ).fetchall()
+            if not rows:
+                break
+            _append_archive(month, rows)
+            last_id = rows[-1][0]
+            removed += len(rows)
+
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {name}"))
+        logger.info(f"🗑️ {TABLE} partition {name} arşivlendi ve düşürüldü")
+    return removed
+
+
+def _mysql_is_partitioned() -> bool:
+    with engine.connect() as conn:
+        return len(_mysql_partitions(conn)) > 0
+
+
+# ============================================
+# GİRİŞ NOKTALARI
+# ============================================
+
+def run_log_maintenance(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Retention + rollover bakımını bir kez çalıştır (blocking, thread içinde çağrılmalı)
+    Silinen/arşivlenen kayıt sayısını döndürür
+    """
+    if engine is None:
+        return {"removed": 0}
+
+    now = now or datetime.now()
+    # Retention sınırı ay başına yuvarlanır, böylece MySQL ve SQLite aynı davranır
+    cutoff = _month_start(now - timedelta(days=LOG_RETENTION_DAYS))
+
+    if engine.dialect.name == "mysql":
+        partitioned = _mysql_is_partitioned()
+        if not partitioned and LOG_PARTITION_CONVERT:
+            # Önce retention dışındaki kayıtları sil ki kopyalanacak veri azalsın
+            removed = _prune_in_batches(cutoff)
+            with engine.begin() as conn:
+                _mysql_convert_to_partitioned(conn, cutoff, now)
+            partitioned = True
+        else:
+            removed = 0
+
+        if partitioned:
+            with engine.begin() as conn:
+                _mysql_rollover(conn, _mysql_partitions(conn), now)
+            removed += _mysql_drop_expired(cutoff)
+            return {"removed": removed}
+
+    return {"removed": _prune_in_batches(cutoff)}
+
+
+async def log_maintenance_loop(interval_seconds: int = LOG_MAINTENANCE_INTERVAL_SECONDS) -> None:
+    """Arka plan görevi: bakım işlemini periyodik olarak thread pool'da çalıştır"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            result = await loop.run_in_executor(None, run_log_maintenance)
+            if result.get("removed"):
+                logger.info(f"✅ Log bakımı tamamlandı: {result['removed']} kayıt arşivlendi")
+        except Exception as e:
+            logger.error(f"❌ Log bakımı hatası: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
@@ -1,19 +1,24 @@
 """
 Unified Backend API - Tüm sigorta şirketleri için tek API
 """
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from sqlalchemy.orm import Session, selectinload, undefer
+from typing import List, Optional, Dict, Any, Tuple
 import os
+import functools
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
 import uuid
+import time
 import asyncio
 import sys
-from concurrent.futures import ThreadPoolExecutor
+import io
+import csv
+import json
+import zlib
 
 # Windows için asyncio event loop policy ayarla (Playwright için)
 # ProactorEventLoop subprocess desteği için gerekli
@@ -21,9 +26,24 @@ if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 # Local imports
-from backend.database import get_db, init_db
+from backend.database import get_db, init_db, SessionLocal
+from backend.log_retention import log_maintenance_loop, LOG_MAINTENANCE_ENABLED
+from backend.session_keepalive import session_keepalive_loop, SESSION_KEEPALIVE_ENABLED
+from backend.renewal_prefetch import renewal_prefetch_loop, PREFETCH_ENABLED
+from backend.company_stats import company_stats, company_stats_flush_loop
+from backend.circuit_breaker import circuit_breakers, CircuitOpenError
+from backend.hedging import run_hedged, hedge_policy
+from backend.admission import admission_controller
+from backend.priorities import JobPriority
+from backend.error_taxonomy import (
+    ErrorCategory, ERROR_RETRY_DELAY_SECONDS, classify_exception, is_retryable, negative_cache
+)
+from backend.settings_cache import (
+    company_settings_cache, user_settings_cache, company_status_map, make_etag, etag_matches
+)
 from backend.schemas import (
     ScrapeRequest,
+    MultiBranchScrapeRequest,
     ScrapeResponse,
     OfferResponse,
     OfferListResponse,
@@ -34,8 +54,28 @@ from backend.schemas import (
     KaskoSigortasiRequest,
     StandardOffer
 )
+from backend.scrapers import (
+    SCRAPER_FUNCTIONS,
+    CREDENTIAL_SCRAPERS,
+    open_quote_session,
+    run_sompo_scraper,
+    run_koru_scraper,
+    run_doga_scraper
+)
+from backend.scraper_workers import record_pool_usage, scraper_pool, session_key
+from backend.metrics import registry as metrics_registry, event_loop_lag_loop, METRICS_LOOP_LAG_INTERVAL_SECONDS
+from backend.credential_pool import credential_pool
+from backend.async_browser_pool import async_browser_pool
+from backend.process_supervisor import process_scraper_pool
+from backend.job_queue import enqueue_jobs, request_jobs, live_workers, collect_queue_metrics, TERMINAL_STATUSES
+from backend.async_scrapers import get_async_scraper
+from backend.quote_sessions import QUOTE_SESSIONS
+from backend.batches import (
+    BATCH_CONCURRENCY, BATCH_ROW_SCHEMAS, batch_progress, create_batch, iter_batch_results, parse_batch_rows
+)
+from backend.worker import WORKER_ID, ScraperWorker
 from backend.models import (
-    Offer, OfferStatus, InsuranceCompany as DBInsuranceCompany, InsuranceBranch as DBInsuranceBranch,
+    Offer, InsuranceCompany as DBInsuranceCompany, InsuranceBranch as DBInsuranceBranch,
     CompanySettings, CompanyStatus, SystemLog, LogLevel, UserSettings
 )
 
@@ -74,302 +114,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Thread pool for blocking scraper operations
-thread_pool = ThreadPoolExecutor(max_workers=5)
+# Scraper çalıştırma modu: threads (her worker kendi sync driver'ı) | async (tek async driver)
+# | process (her scraper izole child process'te, takılma/sızıntıda yeniden başlatılır)
+# | fleet (API sadece scrape_jobs'a iş ekler, işleri python -m backend.worker süreçleri çalıştırır)
+SCRAPER_EXECUTION_MODE = os.getenv("SCRAPER_EXECUTION_MODE", "threads").lower()
+FLEET_POLL_SECONDS = float(os.getenv("FLEET_POLL_SECONDS", "1"))
+FLEET_REQUEST_TIMEOUT_SECONDS = float(os.getenv("FLEET_REQUEST_TIMEOUT_SECONDS", "900"))
 
 # Global request tracking (in-memory, production'da Redis kullanılmalı)
 active_requests: Dict[str, Dict[str, Any]] = {}
 
+# Uygulama ömrü boyunca çalışan arka plan görevleri (startup'ta başlatılır)
+background_jobs: List[asyncio.Task] = []
+
 
 # ============================================
-# SCRAPER MANAGERS
+# API ENDPOINTS
 # ============================================
 
-def run_sompo_scraper(branch: str, data: Dict[str, Any], request_id: str) -> Optional[StandardOffer]:
-    """Sompo scraper'ı çalıştır"""
-    import sys
-    import os
-    
-    # Windows için asyncio event loop policy ayarla
-    # ProactorEventLoop subprocess desteği için gerekli
-    if sys.platform == "win32":
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    
-    # Event loop oluşturma - Playwright kendi loop'unu oluşturacak
-    # Sadece policy ayarlıyoruz
-    
+@app.on_event("startup")
+async def startup_event():
+    """Application startup"""
+    logger.info("🚀 Sigorta Otomasyon API başlatılıyor...")
     try:
-        logger.info(f"[Sompo] Scraper başlatılıyor - branch: {branch}")
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scrapers_event'))
-        from sompo_event import (
-            sync_playwright, login_and_save, handle_popups, 
-            open_new_offer_page, process_trafik_sigortasi, process_kasko_sigortasi
-        )
-        
-        logger.info(f"[Sompo] Playwright başlatılıyor...")
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=os.getenv("HEADLESS", "false").lower() == "true")
-            context = browser.new_context()
-            page = context.new_page()
-            
-            # Login
-            if not login_and_save(page):
-                browser.close()
-                return StandardOffer(
-                    company="Sompo",
-                    branch=branch,
-                    tckn=data.get('tckn', ''),
-                    plate=data.get('plaka'),
-                    status="failed",
-                    error="Giriş başarısız"
-                )
-            
-            handle_popups(page)
-            new_page = open_new_offer_page(page)
-            if not new_page:
-                browser.close()
-                return StandardOffer(
-                    company="Sompo",
-                    branch=branch,
-                    tckn=data.get('tckn', ''),
-                    plate=data.get('plaka'),
-                    status="failed",
-                    error="Yeni teklif sayfası açılamadı"
-                )
-            
-            page = new_page
-            
-            # Process insurance
-            if branch == "trafik":
-                result = process_trafik_sigortasi(page, data)
-            elif branch == "kasko":
-                result = process_kasko_sigortasi(page, data)
-            else:
-                browser.close()
-                return StandardOffer(
-                    company="Sompo",
-                    branch=branch,
-                    tckn=data.get('tckn', ''),
-                    plate=data.get('plaka'),
-                    status="failed",
-                    error=f"Desteklenmeyen branş: {branch}"
-                )
-            
-            browser.close()
-            
-            if result and result.get('basarili'):
-                return StandardOffer.from_sompo_result(result, data.get('tckn', ''), data.get('plaka'))
-            else:
-                error_msg = 'Sonuç alınamadı'
-                if result:
-                    error_msg = result.get('hata', 'Teklif alınamadı')
-                    if not error_msg or error_msg.strip() == '':
-                        error_msg = 'Teklif alınamadı'
-                return StandardOffer(
-                    company="Sompo",
-                    branch=branch,
-                    tckn=data.get('tckn', ''),
-                    plate=data.get('plaka'),
-                    status="failed",
-                    error=error_msg
-                )
-            
+        init_db()
+        logger.info("✅ Veritabanı bağlantısı başarılı")
     except Exception as e:
-        logger.error(f"Sompo scraper hatası: {e}", exc_info=True)
-        import traceback
-        error_detail = str(e)
-        if not error_detail or error_detail.strip() == '':
-            error_detail = f"Sompo scraper exception: {type(e).__name__}"
-        return StandardOffer(
-            company="Sompo",
-            branch=branch,
-            tckn=data.get('tckn', ''),
-            plate=data.get('plaka'),
-            status="failed",
-            error=error_detail
-        )
-    # Finally bloğunu kaldırdık - Playwright kendi event loop'unu yönetir
-    # Event loop'u kapatmak Playwright'ı bozuyor
+        logger.error(f"❌ Veritabanı bağlantı hatası: {e}")
 
+    # /metrics: pool doluluğu ve kuyruk derinliği scrape sırasında okunur, event loop gecikmesi ölçülür
+    metrics_registry.collector(_collect_pool_metrics)
+    if SessionLocal is not None:
+        metrics_registry.collector(functools.partial(collect_queue_metrics, SessionLocal))
+    if METRICS_LOOP_LAG_INTERVAL_SECONDS > 0:
+        background_jobs.append(asyncio.create_task(event_loop_lag_loop()))
 
-def run_koru_scraper(branch: str, data: Dict[str, Any], request_id: str) -> Optional[StandardOffer]:
-    """Koru scraper'ı çalıştır"""
-    import sys
-    
-    # Windows için asyncio event loop policy ayarla
-    # ProactorEventLoop subprocess desteği için gerekli
-    if sys.platform == "win32":
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    
-    # Event loop oluşturma - Playwright kendi loop'unu oluşturacak
-    # Sadece policy ayarlıyoruz
-    
-    try:
-        logger.info(f"[Koru] Scraper başlatılıyor - branch: {branch}")
-        from scrapers_event.koru_scraper import KoruScraper
-        from scrapers_event.app.config import settings
-        
-        logger.info(f"[Koru] KoruScraper instance oluşturuluyor...")
-        scraper = KoruScraper()
-        logger.info(f"[Koru] KoruScraper instance oluşturuldu")
-        
-        # Koru için data formatını dönüştür
-        koru_data = {
-            "tc": data.get('tckn', ''),
-            "dogum_tarihi": data.get('dogum_tarihi', '').replace('/', '.'),  # GG/AA/YYYY -> GG.AA.YYYY
-            "plaka_il": data.get('plaka', '')[:2] if data.get('plaka') else '',
-            "plaka_no": data.get('plaka', '')[2:] if data.get('plaka') and len(data.get('plaka', '')) > 2 else '',
-            "tescil_kod": data.get('ruhsat_seri_no', '')[:2] if data.get('ruhsat_seri_no') else '',
-            "tescil_no": data.get('ruhsat_seri_no', '')[2:] if data.get('ruhsat_seri_no') and len(data.get('ruhsat_seri_no', '')) > 2 else ''
-        }
-        
-        # Scraper'ı çalıştır (thread pool içinde)
-        logger.info(f"[Koru] Scraper çalıştırılıyor - branch: {branch}, data: {koru_data}")
-        if branch == "trafik":
-            result = scraper.run_trafik_with_data(koru_data)
-            logger.info(f"[Koru] run_trafik_with_data sonucu: {result}")
-        elif branch == "kasko":
-            result = scraper.run_kasko_with_data(koru_data)
-            logger.info(f"[Koru] run_kasko_with_data sonucu: {result}")
-        else:
-            return StandardOffer(
-                company="Koru",
-                branch=branch,
-                tckn=data.get('tckn', ''),
-                plate=data.get('plaka'),
-                status="failed",
-                error=f"Desteklenmeyen branş: {branch}"
-            )
-        
-        if result and isinstance(result, dict) and result.get('trafik'):
-            return StandardOffer.from_koru_result(result, data.get('tckn', ''), data.get('plaka'))
-        else:
-            error_msg = "Koru teklif alınamadı"
-            if result is False:
-                error_msg = "Koru scraper çalıştırılamadı"
-            elif isinstance(result, dict) and not result.get('trafik'):
-                error_msg = "Koru trafik teklifi alınamadı"
-            return StandardOffer(
-                company="Koru",
-                branch=branch,
-                tckn=data.get('tckn', ''),
-                plate=data.get('plaka'),
-                status="failed",
-                error=error_msg
-            )
-            
-    except Exception as e:
-        logger.error(f"Koru scraper hatası: {e}", exc_info=True)
-        import traceback
-        error_detail = str(e)
-        if not error_detail:
-            error_detail = f"Koru scraper exception: {type(e).__name__}"
-        return StandardOffer(
-            company="Koru",
-            branch=branch,
-            tckn=data.get('tckn', ''),
-            plate=data.get('plaka'),
-            status="failed",
-            error=error_detail
-        )
-    # Finally bloğunu kaldırdık - Playwright kendi event loop'unu yönetir
-    # Event loop'u kapatmak Playwright'ı bozuyor
+    # Playwright worker thread'leri (her biri kendi driver + browser'ı ile)
+    if SCRAPER_EXECUTION_MODE == "fleet":
+        logger.info("✅ Fleet modu: scraper'lar backend.worker süreçlerinde çalışır")
+    elif sys.platform != "win32" and SCRAPER_EXECUTION_MODE == "process":
+        process_scraper_pool.start()
+    elif sys.platform != "win32":
+        scraper_pool.start()
+        # Diskteki portal oturumlarını (storage_state) canlı tut, süresi dolacaklar için uyar
+        if SESSION_KEEPALIVE_ENABLED:
+            background_jobs.append(asyncio.create_task(session_keepalive_loop(scraper_pool)))
+        # Async mod: taşınmış akışlar tek driver + birkaç browser üzerinde çalışır
+        if SCRAPER_EXECUTION_MODE == "async":
+            try:
+                await async_browser_pool.start()
+            except Exception as e:
+                logger.error(f"❌ Async Playwright başlatılamadı, thread worker'ları kullanılacak: {e}")
 
+    # Şirket istatistikleri: kalıcı değerleri yükle, periyodik toplu yazma başlat
+    if SessionLocal is not None:
+        try:
+            company_stats.load(SessionLocal)
+        except Exception as e:
+            logger.warning(f"⚠️ Şirket istatistikleri yüklenemedi: {e}")
+        background_jobs.append(asyncio.create_task(company_stats_flush_loop(SessionLocal)))
 
-def run_doga_scraper(branch: str, data: Dict[str, Any], request_id: str) -> Optional[StandardOffer]:
-    """Doğa scraper'ı çalıştır"""
-    import sys
-    
-    # Windows için asyncio event loop policy ayarla
-    # ProactorEventLoop subprocess desteği için gerekli
-    if sys.platform == "win32":
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    
-    # Event loop oluşturma - Playwright kendi loop'unu oluşturacak
-    # Sadece policy ayarlıyoruz
-    
-    try:
-        logger.info(f"[Doğa] Scraper başlatılıyor - branch: {branch}")
-        from scrapers_event.doga_scraper import DogaScraper
-        
-        logger.info(f"[Doğa] DogaScraper instance oluşturuluyor...")
-        scraper = DogaScraper()
-        logger.info(f"[Doğa] DogaScraper instance oluşturuldu")
-        
-        # Doğa için data formatını dönüştür
-        doga_data = {
-            "tc_no": data.get('tckn', ''),
-            "birth_date": data.get('dogum_tarihi', '').replace('/', '-'),  # YYYY-MM-DD formatına çevir
-            "plate_code": data.get('plaka', '')[:2] if data.get('plaka') else '',
-            "plate_no": data.get('plaka', '')[2:] if data.get('plaka') and len(data.get('plaka', '')) > 2 else '',
-            "tescil_seri_kod": data.get('ruhsat_seri_no', '')[:2] if data.get('ruhsat_seri_no') else '',
-            "tescil_seri_no": data.get('ruhsat_seri_no', '')[2:] if data.get('ruhsat_seri_no') and len(data.get('ruhsat_seri_no', '')) > 2 else ''
-        }
-        
-        # Scraper'ı çalıştır
-        logger.info(f"[Doğa] Scraper çalıştırılıyor - branch: {branch}, data: {doga_data}")
-        result = scraper.run_with_data(branch, doga_data)
-        logger.info(f"[Doğa] run_with_data sonucu: {result}")
-        
-        if result and result.get('premium_data'):
-            return StandardOffer.from_doga_result(result, data.get('tckn', ''), data.get('plaka'))
-        else:
-            error_msg = "Doğa teklif alınamadı"
-            if result is None:
-                error_msg = "Doğa scraper sonuç döndürmedi"
-            elif isinstance(result, dict) and not result.get('premium_data'):
-                error_msg = "Doğa premium verisi alınamadı"
-            return StandardOffer(
-                company="Doğa",
-                branch=branch,
-                tckn=data.get('tckn', ''),
-                plate=data.get('plaka'),
-                status="failed",
-                error=error_msg
-            )
-            
-    except Exception as e:
-        logger.error(f"Doğa scraper hatası: {e}", exc_info=True)
-        import traceback
-        error_detail = str(e)
-        if not error_detail or error_detail.strip() == '':
-            error_detail = f"Doğa scraper exception: {type(e).__name__}"
-        return StandardOffer(
-            company="Doğa",
-            branch=branch,
-            tckn=data.get('tckn', ''),
-            plate=data.get('plaka'),
-            status="failed",
-            error=error_detail
+    # Toplu (batch) işler: fleet modunda worker süreçleri, diğer modlarda API içindeki gömülü worker
+    # çalıştırır. İşler veritabanında olduğu için yeniden başlatmada kalan işlerle devam edilir.
+    if SCRAPER_EXECUTION_MODE != "fleet" and SessionLocal is not None:
+        batch_worker = ScraperWorker(
+            worker_id=f"api-{WORKER_ID}", concurrency=BATCH_CONCURRENCY,
+            runner=functools.partial(run_company_scraper, retry=False), embedded=True
         )
-    # Finally bloğunu kaldırdık - Playwright kendi event loop'unu yönetir
-    # Event loop'u kapatmak Playwright'ı bozuyor
-
+        background_jobs.append(asyncio.create_task(batch_worker.run()))
 
-# Scraper mapping
-SCRAPER_FUNCTIONS = {
-    InsuranceCompany.SOMPO: run_sompo_scraper,
-    # TEST İÇİN SADECE SOMPO AKTİF
-    # InsuranceCompany.KORU: run_koru_scraper,
-    # InsuranceCompany.DOGA: run_doga_scraper,
-    # Diğer şirketler için de eklenebilir
-}
+    # Yenileme ön-çekimi: poliçesi bitmek üzere olan araçlar için gece saatlerinde iş ekle
+    if PREFETCH_ENABLED and SessionLocal is not None:
+        background_jobs.append(asyncio.create_task(renewal_prefetch_loop(SessionLocal)))
 
+    # Log retention bakım görevi (arka planda, thread pool'da çalışır)
+    if LOG_MAINTENANCE_ENABLED and SessionLocal is not None:
+        background_jobs.append(asyncio.create_task(log_maintenance_loop()))
+        logger.info("✅ Log bakım görevi başlatıldı")
+    logger.info("✅ API hazır")
 
-# ============================================
-# API ENDPOINTS
-# ============================================
 
-@app.on_event("startup")
-async def startup_event():
-    """Application startup"""
-    logger.info("🚀 Sigorta Otomasyon API başlatılıyor...")
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Application shutdown"""
+    for task in background_jobs:
+        task.cancel()
+    scraper_pool.stop()
+    process_scraper_pool.stop()
+    await async_browser_pool.stop()
+    # Bekleyen istatistikleri kaybetme
     try:
-        init_db()
-        logger.info("✅ Veritabanı bağlantısı başarılı")
+        company_stats.flush(SessionLocal)
     except Exception as e:
-        logger.error(f"❌ Veritabanı bağlantı hatası: {e}")
-    logger.info("✅ API hazır")
+        logger.warning(f"⚠️ Şirket istatistikleri yazılamadı: {e}")
 
 
 @app.get("/")
@@ -405,6 +242,81 @@ async def health_check(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrikleri (collector'lar DB'ye gidebildiği için thread pool'da üretilir)"""
+    content = await asyncio.get_running_loop().run_in_executor(None, metrics_registry.render)
+    return Response(content=content, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _collect_pool_metrics() -> None:
+    """Çalıştırma moduna göre scraper pool doluluğu (/metrics collector'ı)"""
+    if SCRAPER_EXECUTION_MODE == "fleet":
+        if SessionLocal is not None:
+            workers = live_workers(SessionLocal)
+            record_pool_usage("fleet", sum(w["capacity"] for w in workers),
+                              sum(w["active_jobs"] for w in workers), 0)
+        return
+    if SCRAPER_EXECUTION_MODE == "process":
+        record_pool_usage("process", len(process_scraper_pool.slots), process_scraper_pool.busy_workers(),
+                          process_scraper_pool.queue_depth())
+        return
+    scraper_pool.collect_metrics()
+    if async_browser_pool.started:
+        record_pool_usage("async_browser", async_browser_pool.capacity, async_browser_pool.open_contexts(), 0)
+
+
+async def _scraper_capacity(companies: List[str]) -> Tuple[int, Optional[Dict[str, int]]]:
+    """
+    Eşzamanlı scraper slotu ve şirket -> açık oturumlu (warm) worker sayısı (bilinmiyorsa None)
+    0 sadece hiçbir çalıştırma yolu yoksa (fleet modunda canlı worker yok) döner
+    """
+    if SCRAPER_EXECUTION_MODE == "fleet" and SessionLocal is not None:
+        workers = await asyncio.get_event_loop().run_in_executor(None, live_workers, SessionLocal)
+        warm = {c: sum(1 for w in workers if c in w["warm_companies"]) for c in companies}
+        return sum(w["capacity"] for w in workers), warm
+    if sys.platform == "win32":
+        # Windows'ta pool yok, scraper'lar istek içinde tek tek doğrudan çalışır (_dispatch_scraper)
+        return 1, None
+    if SCRAPER_EXECUTION_MODE == "process":
+        return process_scraper_pool.size, None
+    if SCRAPER_EXECUTION_MODE == "async" and async_browser_pool.started:
+        return async_browser_pool.capacity, None
+    # Thread pool ilk submit'te başlatılır: henüz başlamadıysa yapılandırılan boyut kadar slot vardır
+    workers = list(scraper_pool.workers)
+    warm = {c: sum(1 for w in workers if w.holds_company_session(c)) for c in companies}
+    return len(workers) or scraper_pool.size, warm
+
+
+async def _admit_request(request_id: str, companies: Optional[List[InsuranceCompany]],
+                         branches: int = 1) -> Tuple[Optional[Dict[str, Any]], Optional[JSONResponse]]:
+    """
+    Kabul kontrolü: (tahmin, None) ya da reddedildiyse (None, 429/503 yanıtı)
+    Kabul edilen isteğin şirket işleri bitene kadar kuyruk derinliğine sayılır
+    """
+    names = [c.value for c in (companies or list(InsuranceCompany)) if c in SCRAPER_FUNCTIONS]
+    capacity, warm = await _scraper_capacity(names)
+    decision = admission_controller.estimate(names, capacity, warm)
+    if not decision.accepted:
+        logger.warning(f"🚦 İstek reddedildi ({decision.status_code}): tahmini bekleme "
+                       f"{decision.wait_seconds:.0f} sn, kuyruk {decision.queue_depth}")
+        message = ("Scraper kapasitesi yok, daha sonra tekrar deneyin" if decision.status_code == 503
+                   else "Sistem yoğun, daha sonra tekrar deneyin")
+        return None, JSONResponse(
+            status_code=decision.status_code,
+            content=ApiResponse(
+                success=False,
+                message=message,
+                error="Kuyruk dolu" if decision.status_code == 429 else "Kapasite yok",
+                data=decision.to_dict(),
+                timestamp=datetime.now().isoformat()
+            ).dict(),
+            headers={"Retry-After": str(decision.retry_after)}
+        )
+    admission_controller.admit(request_id, {name: branches for name in names})
+    return decision.to_dict(), None
+
+
 @app.post("/api/v1/scrape/run", response_model=ScrapeResponse)
 async def run_scrape(
     request: ScrapeRequest,
@@ -421,6 +333,11 @@ async def run_scrape(
     """
     request_id = str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
+
+    # Kuyruk çok uzunsa iş eklemeden 429 + Retry-After dön
+    estimate, rejection = await _admit_request(request_id, request.companies)
+    if rejection is not None:
+        return rejection
     
     # Request'i kaydet
     active_requests[request_id] = {
@@ -430,7 +347,9 @@ async def run_scrape(
         "companies": [c.value for c in (request.companies or [])],
         "created_at": timestamp,
         "offers": [],
-        "failed_companies": []
+        "failed_companies": [],
+        "error_categories": {},
+        "estimated_start": estimate["estimated_start"]
     }
     
     # Background task olarak scraper'ları çalıştır
@@ -445,10 +364,360 @@ async def run_scrape(
         success=True,
         message="Teklif alma işlemi başlatıldı",
         request_id=request_id,
-        timestamp=timestamp
+        timestamp=timestamp,
+        data=estimate
+    )
+
+
+@app.post("/api/v1/scrape/multi", response_model=ScrapeResponse)
+async def run_multi_branch_scrape(
+    request: MultiBranchScrapeRequest,
+    background_tasks: BackgroundTasks,
+    db: Optional[Session] = Depends(get_db)
+):
+    """
+    Aynı müşteri için birden fazla branş (örn. trafik + kasko)
+    Şirket başına tek giriş yapılır, branşlar paralel çalışır
+    """
+    request_id = str(uuid.uuid4())
+    timestamp = datetime.now().isoformat()
+
+    estimate, rejection = await _admit_request(request_id, request.companies, len(request.branches))
+    if rejection is not None:
+        return rejection
+
+    active_requests[request_id] = {
+        "request_id": request_id,
+        "status": "running",
+        "branches": [b.value for b in request.branches],
+        "companies": [c.value for c in (request.companies or [])],
+        "created_at": timestamp,
+        "offers": [],
+        "failed_companies": [],
+        "error_categories": {},
+        "estimated_start": estimate["estimated_start"]
+    }
+
+    background_tasks.add_task(
+        process_multi_branch_request,
+        request_id,
+        request,
+        db
+    )
+
+    return ScrapeResponse(
+        success=True,
+        message="Çoklu branş teklif alma işlemi başlatıldı",
+        request_id=request_id,
+        timestamp=timestamp,
+        data=estimate
     )
 
 
+async def _dispatch_scraper(
+    company: InsuranceCompany,
+    branch: str,
+    data: Dict[str, Any],
+    request_id: str,
+    credential=None,
+    priority: int = JobPriority.INTERACTIVE
+) -> Optional[StandardOffer]:
+    """Scraper'ı seçili çalıştırma moduna göre çalıştır (priority: worker kuyruğundaki sıra)"""
+    scraper_func = SCRAPER_FUNCTIONS[company]
+    kwargs = {"credential": credential} if credential is not None else {}
+    async_scraper = None
+    if SCRAPER_EXECUTION_MODE == "async" and async_browser_pool.started:
+        async_scraper = get_async_scraper(company, branch)
+
+    # Windows'ta thread pool yerine doğrudan çalıştır (Playwright event loop sorunu nedeniyle)
+    if sys.platform == "win32":
+        logger.info(f"[{company.value}] Windows'ta doğrudan çalıştırılıyor (thread pool yok)")
+        # Windows'ta doğrudan senkron çalıştır (blocking ama çalışır)
+        return scraper_func(branch, data, request_id, **kwargs)
+    if async_scraper is not None:
+        # Async mod: event loop üzerinde, paylaşılan browser'da yeni context
+        async with async_browser_pool.context(
+            session=session_key(company.value, credential.account if credential else None)
+        ) as context:
+            return await async_scraper(branch, data, request_id, context, **kwargs)
+    if SCRAPER_EXECUTION_MODE == "process":
+        # Çökme/takılma API process'ini etkilemesin diye ayrı child process'te
+        return await process_scraper_pool.submit(scraper_func, branch, data, request_id, priority=priority, **kwargs)
+    # Linux'ta kendi browser'ına sahip uzun ömürlü worker thread'lerinde çalıştır
+    # (aynı şirket/hesap için açık oturumu olan worker tercih edilir)
+    return await scraper_pool.submit(
+        scraper_func, branch, data, request_id,
+        affinity=session_key(company.value, credential.account if credential else None),
+        priority=priority,
+        **kwargs
+    )
+
+
+async def run_company_scraper(
+    company: InsuranceCompany,
+    branch: str,
+    data: Dict[str, Any],
+    request_id: str,
+    retry: bool = True,
+    priority: int = JobPriority.INTERACTIVE
+) -> Optional[StandardOffer]:
+    """
+    Tek şirket için scraper'ı çalıştır
+    Şirketin birden fazla hesabı tanımlıysa en az meşgul hesap kiralanır.
+    Şirketin devresi açıksa portala gidilmeden CircuitOpenError fırlatılır.
+    Hedge'li şirketlerde takılan teklif için başka oturumda ikinci deneme başlatılabilir.
+    Aynı girdiler için yakın zamanda alınmış deterministik hata (geçersiz girdi, portal reddi)
+    önbellekten döner. retry=True ise hata kategorisi izin verdiği kadar tekrar denenir
+    (kuyruk worker'ları kendi deneme sayacını kullandığı için retry=False verir).
+    API istekleri canlı (interactive) önceliktedir; kuyruk işleri kendi önceliklerini verir.
+    """
+    async def attempt():
+        # Her deneme kendi hesabını kiralar: hedge denemesi farklı hesap/oturumda çalışır
+        if company in CREDENTIAL_SCRAPERS and credential_pool.has_accounts(company.value):
+            with credential_pool.lease(company.value) as credential:
+                return await _dispatch_scraper(company, branch, data, request_id, credential, priority)
+        return await _dispatch_scraper(company, branch, data, request_id, priority=priority)
+
+    cached = negative_cache.get(company.value, branch, data)
+    if cached is not None:
+        logger.info(f"⏭️ {company.value} ({branch}) aynı girdiler için önbellekteki hata döndü: {cached.error}")
+        return cached
+
+    attempts = 0
+    while True:
+        circuit_breakers.before_call(company.value)
+        attempts += 1
+        try:
+            result = await run_hedged(company.value, attempt)
+        except asyncio.CancelledError:
+            circuit_breakers.release(company.value)
+            raise
+        except Exception as e:
+            category = classify_exception(e)
+            circuit_breakers.record(company.value, False, getattr(e, "error_class", type(e).__name__), category)
+            if retry and is_retryable(category, attempts) and circuit_breakers.available(company.value):
+                logger.warning(f"🔁 {company.value} ({branch}) tekrar deneniyor ({category.value}): {e}")
+                await asyncio.sleep(ERROR_RETRY_DELAY_SECONDS)
+                continue
+            raise
+        success = bool(result and result.status == "completed")
+        category = None if success else (result.error_category if result else ErrorCategory.TRANSIENT)
+        circuit_breakers.record(
+            company.value, success, None if success else ("ScraperFailed" if result else "NoResult"), category
+        )
+        if not success and retry and is_retryable(category, attempts) and circuit_breakers.available(company.value):
+            logger.warning(f"🔁 {company.value} ({branch}) tekrar deneniyor ({category.value}): "
+                           f"{result.error if result else 'sonuç yok'}")
+            await asyncio.sleep(ERROR_RETRY_DELAY_SECONDS)
+            continue
+        negative_cache.put(company.value, branch, data, result)
+        return result
+
+
+async def run_company_multi_branch(
+    company: InsuranceCompany,
+    branch_data: Dict[str, Dict[str, Any]],
+    request_id: str
+) -> Dict[str, Any]:
+    """
+    Tek şirket için birden fazla branşı paralel çalıştır: branş -> (StandardOffer / None / Exception, süre)
+    Süre her branşın kendi çalışma süresidir (önbellekten dönenlerde 0).
+    Quote session'ı olan şirketlerde önce tek bir worker'da giriş yapılır; oturum storage_state'i
+    diğer worker'lara aktarıldığı için paralel branşlar tekrar giriş yapmaz
+    """
+    async def run_branch(branch, data, credential):
+        started_at = time.monotonic()
+        try:
+            result = await _dispatch_scraper(company, branch, data, request_id, credential)
+        except Exception as e:
+            return e, time.monotonic() - started_at
+        return result, time.monotonic() - started_at
+
+    async def run_branches(credential=None):
+        if (len(branch_data) > 1 and company.value in QUOTE_SESSIONS and sys.platform != "win32"
+                and SCRAPER_EXECUTION_MODE in ("threads", "async")):
+            await scraper_pool.submit(
+                open_quote_session, company.value,
+                affinity=session_key(company.value, credential.account if credential else None),
+                credential=credential
+            )
+        results = await asyncio.gather(*(
+            run_branch(branch, data, credential) for branch, data in pending.items()
+        ))
+        return dict(zip(pending, results))
+
+    # Deterministik hatası önbellekte olan branşlar portala gönderilmez
+    cached = {}
+    for branch, data in branch_data.items():
+        offer = negative_cache.get(company.value, branch, data)
+        if offer is not None:
+            cached[branch] = offer
+    pending = {branch: data for branch, data in branch_data.items() if branch not in cached}
+    if not pending:
+        return {branch: (offer, 0.0) for branch, offer in cached.items()}
+
+    circuit_breakers.before_call(company.value)
+    try:
+        if company in CREDENTIAL_SCRAPERS and credential_pool.has_accounts(company.value):
+            with credential_pool.lease(company.value) as credential:
+                results = await run_branches(credential)
+        else:
+            results = await run_branches()
+    except asyncio.CancelledError:
+        circuit_breakers.release(company.value)
+        raise
+    except Exception as e:
+        circuit_breakers.record(company.value, False, getattr(e, "error_class", type(e).__name__), classify_exception(e))
+        raise
+    for branch, (result, _) in results.items():
+        if isinstance(result, Exception):
+            circuit_breakers.record(
+                company.value, False, getattr(result, "error_class", type(result).__name__), classify_exception(result)
+            )
+        else:
+            success = bool(result and result.status == "completed")
+            circuit_breakers.record(
+                company.value, success, None if success else ("ScraperFailed" if result else "NoResult"),
+                None if success or not result else result.error_category
+            )
+            negative_cache.put(company.value, branch, pending[branch], result)
+    results.update({branch: (offer, 0.0) for branch, offer in cached.items()})
+    return {branch: results[branch] for branch in branch_data}
+
+
+def _error_category(outcome: Any) -> str:
+    """Başarısız sonucun (StandardOffer / None / Exception) hata kategorisi"""
+    if isinstance(outcome, BaseException):
+        return classify_exception(outcome).value
+    if outcome is not None and outcome.error_category is not None:
+        return outcome.error_category.value
+    return ErrorCategory.TRANSIENT.value
+
+
+def _from_negative_cache(result: Optional[StandardOffer]) -> bool:
+    """Sonuç portala gidilmeden negatif önbellekten mi döndü (istatistiğe sayılmaz)"""
+    return bool(result is not None and result.raw_data and "negative_cache" in result.raw_data)
+
+
+def _save_offer(db: Optional[Session], company: InsuranceCompany, branch: InsuranceBranch,
+                data: Dict[str, Any], result: StandardOffer):
+    """Başarılı teklifi veritabanına kaydet (database yoksa ya da hata olursa in-memory döndür)"""
+    try:
+        if db is None:
+            return result
+        offer = Offer.from_standard_offer(
+            result, DBInsuranceCompany[company.name], DBInsuranceBranch[branch.name],
+            data.get('tckn', ''), request_data=data
+        )
+        db.add(offer)
+        db.commit()
+        return offer
+    except Exception as db_error:
+        logger.warning(f"⚠️ Database kayıt hatası (in-memory devam ediyor): {db_error}")
+        return result
+
+
+def _offer_dict(offer) -> Dict[str, Any]:
+    """Kaydedilmiş (Offer) ya da in-memory (StandardOffer) teklifi dict'e çevir"""
+    if isinstance(offer, StandardOffer):
+        return offer.dict()
+    return offer.to_dict(include_raw_data=True)
+
+
+class _ScrapeOutcomes:
+    """Bir scrape request'inin şirket/branş sonuçlarını toplar (tek ve çoklu branş ortak)"""
+
+    def __init__(self, db: Optional[Session], request_id: str):
+        self.db = db
+        self.request_id = request_id
+        self.offers = []
+        self.failed_companies: List[str] = []
+        # Başarısız şirket/branş -> hata kategorisi (transient, input_invalid, ...)
+        self.error_categories: Dict[str, str] = {}
+
+    def skipped(self, company: InsuranceCompany, company_status: Optional[str] = None) -> None:
+        """Scraper'ı olmayan ya da aktif olmayan şirket"""
+        if company_status is None:
+            logger.warning(f"⚠️ {company.value} için scraper fonksiyonu bulunamadı")
+            self.failed_companies.append(company.value)
+        else:
+            logger.info(f"⏸️ {company.value} atlandı (durum: {company_status})")
+            self.failed_companies.append(f"{company.value}: Şirket aktif değil ({company_status})")
+
+    def add(self, company: InsuranceCompany, branch: Optional[InsuranceBranch], data: Dict[str, Any],
+            outcome: Any, elapsed: float, label: Optional[str] = None) -> None:
+        """
+        Tek sonucu (StandardOffer / None / Exception) işle: istatistik, kayıt, hata listesi
+        branch None ise hata şirketin tüm branşlarına aittir (örn. ortak giriş başarısız)
+        """
+        label = label or company.value
+        branch_value = branch.value if branch is not None else None
+        if isinstance(outcome, CircuitOpenError):
+            # Portal hata veriyor: worker meşgul edilmeden hemen başarısız
+            logger.info(f"🔌 {label} atlandı: {outcome}")
+            self.failed_companies.append(f"{label}: {outcome}")
+            self.error_categories[label] = _error_category(outcome)
+            return
+        if isinstance(outcome, Exception):
+            self._add_exception(company, branch_value, outcome, elapsed, label)
+            return
+
+        success = bool(outcome and outcome.status == "completed")
+        if not _from_negative_cache(outcome):
+            company_stats.record(
+                company.value, success, elapsed,
+                None if success else ("ScraperFailed" if outcome else "NoResult"), branch=branch_value
+            )
+        if success:
+            self.offers.append(_save_offer(self.db, company, branch, data, outcome))
+            logger.info(f"✅ {label} teklifi başarılı: {outcome.price} {outcome.currency}")
+            return
+
+        if outcome:
+            error_msg = outcome.error if outcome.error and outcome.error.strip() else "Teklif alınamadı"
+        else:
+            error_msg = "Scraper sonuç döndürmedi"
+        self.failed_companies.append(f"{label}: {error_msg}")
+        self.error_categories[label] = _error_category(outcome)
+        logger.error(f"❌ {label} teklifi başarısız: {error_msg}")
+
+    def _add_exception(self, company: InsuranceCompany, branch: Optional[str], error: Exception,
+                       elapsed: float, label: str) -> None:
+        logger.error(f"❌ {label} scraper hatası: {error}", exc_info=error)
+        company_stats.record(company.value, False, elapsed,
+                             getattr(error, "error_class", type(error).__name__), branch=branch)
+        error_msg = str(error)
+        if not error_msg or error_msg.strip() == '':
+            error_msg = f"{company.value} scraper exception: {type(error).__name__}"
+        self.failed_companies.append(f"{label}: {error_msg}")
+        self.error_categories[label] = _error_category(error)
+
+        # Log kaydı (eğer database mevcut ise)
+        try:
+            if self.db is not None:
+                log = SystemLog(
+                    level=LogLevel.ERROR,
+                    message=f"{company.value} scraper error: {str(error)}",
+                    user="system",
+                    action="SCRAPER_ERROR",
+                    log_metadata={"company": company.value, "branch": branch, "error": str(error),
+                                  "request_id": self.request_id}
+                )
+                self.db.add(log)
+                self.db.commit()
+        except Exception:
+            pass  # Database yoksa log kaydını atla
+
+    def completed_status(self) -> Dict[str, Any]:
+        return {
+            "status": "completed",
+            "offers": [_offer_dict(o) for o in self.offers],
+            "failed_companies": self.failed_companies,
+            "error_categories": self.error_categories,
+            "completed_at": datetime.now().isoformat()
+        }
+
+
 async def process_scrape_request(
     request_id: str,
     request: ScrapeRequest,
@@ -468,125 +737,48 @@ async def process_scrape_request(
         else:
             data = request.data or {}
         
+        if SCRAPER_EXECUTION_MODE == "fleet" and SessionLocal is not None:
+            await process_fleet_request(request_id, {request.branch.value: data}, companies_to_scrape)
+            return
+
         # Her şirket için scraper çalıştır
-        offers = []
-        failed_companies = []
+        outcomes = _ScrapeOutcomes(db, request_id)
         
-        # Event loop'u al (Linux'ta thread pool için gerekli)
-        loop = None
-        if sys.platform != "win32":
-            loop = asyncio.get_event_loop()
+        # Şirket durumları (önbellekten) - pasif/bakımdaki şirketler çalıştırılmaz
+        company_statuses = company_status_map(SessionLocal) if SessionLocal is not None else {}
         
         for company in companies_to_scrape:
             if company not in SCRAPER_FUNCTIONS:
-                logger.warning(f"⚠️ {company.value} için scraper fonksiyonu bulunamadı")
-                failed_companies.append(company.value)
+                outcomes.skipped(company)
+                continue
+
+            company_status = company_statuses.get(company.value, CompanyStatus.ACTIVE.value)
+            if company_status != CompanyStatus.ACTIVE.value:
+                outcomes.skipped(company, company_status)
                 continue
             
+            started_at = time.monotonic()
             try:
-                scraper_func = SCRAPER_FUNCTIONS[company]
-                
-                # Windows'ta thread pool yerine doğrudan çalıştır (Playwright event loop sorunu nedeniyle)
-                # Linux'ta thread pool kullan
-                if sys.platform == "win32":
-                    logger.info(f"[{company.value}] Windows'ta doğrudan çalıştırılıyor (thread pool yok)")
-                    # Windows'ta doğrudan senkron çalıştır (blocking ama çalışır)
-                    result = scraper_func(
-                        request.branch.value,
-                        data,
-                        request_id
-                    )
-                else:
-                    # Linux'ta thread pool kullan
-                    if loop is None:
-                        loop = asyncio.get_event_loop()
-                    result = await loop.run_in_executor(
-                        thread_pool,
-                        scraper_func,
-                        request.branch.value,
-                        data,
-                        request_id
-                    )
-                
-                if result and result.status == "completed":
-                    # Veritabanına kaydet (eğer database mevcut ise)
-                    try:
-                        if db is not None:
-                            offer = Offer(
-                                company=DBInsuranceCompany[company.name],
-                                branch=DBInsuranceBranch[request.branch.name],
-                                tckn=data.get('tckn', ''),
-                                plate=result.plate,
-                                price=result.price,
-                                currency=result.currency,
-                                policy_no=result.policy_no,
-                                status=OfferStatus.COMPLETED,
-                                raw_data=result.raw_data
-                            )
-                            db.add(offer)
-                            db.commit()
-                            offers.append(offer)
-                        else:
-                            # Database yoksa, sadece in-memory olarak ekle
-                            offers.append(result)
-                    except Exception as db_error:
-                        logger.warning(f"⚠️ Database kayıt hatası (in-memory devam ediyor): {db_error}")
-                        offers.append(result)
-                    
-                    logger.info(f"✅ {company.value} teklifi başarılı: {result.price} {result.currency}")
-                else:
-                    # Hata kaydı
-                    error_msg = "Bilinmeyen hata"
-                    if result:
-                        error_msg = result.error if result.error and result.error.strip() else "Teklif alınamadı"
-                    else:
-                        error_msg = "Scraper sonuç döndürmedi"
-                    
-                    if not error_msg or error_msg.strip() == '':
-                        error_msg = f"{company.value} teklif alınamadı"
-                    
-                    failed_companies.append(f"{company.value}: {error_msg}")
-                    logger.error(f"❌ {company.value} teklifi başarısız: {error_msg}")
-                    
+                result = await run_company_scraper(company, request.branch.value, data, request_id)
             except Exception as e:
-                logger.error(f"❌ {company.value} scraper hatası: {e}", exc_info=True)
-                error_msg = str(e)
-                if not error_msg or error_msg.strip() == '':
-                    error_msg = f"{company.value} scraper exception: {type(e).__name__}"
-                failed_companies.append(f"{company.value}: {error_msg}")
-                
-                # Log kaydı (eğer database mevcut ise)
-                try:
-                    if db is not None:
-                        log = SystemLog(
-                            level=LogLevel.ERROR,
-                            message=f"{company.value} scraper error: {str(e)}",
-                            user="system",
-                            action="SCRAPER_ERROR",
-                            log_metadata={"company": company.value, "branch": request.branch.value, "error": str(e), "request_id": request_id}
-                        )
-                        db.add(log)
-                        db.commit()
-                except Exception:
-                    pass  # Database yoksa log kaydını atla
+                result = e
+            finally:
+                # Şirketin işi bitti: kabul kontrolündeki kuyruk derinliğinden düş
+                admission_controller.release(request_id, company.value)
+            outcomes.add(company, request.branch, data, result, time.monotonic() - started_at)
         
         # Request durumunu güncelle
-        active_requests[request_id].update({
-            "status": "completed",
-            "offers": [o.to_dict() for o in offers],
-            "failed_companies": failed_companies,
-            "completed_at": datetime.now().isoformat()
-        })
+        active_requests[request_id].update(outcomes.completed_status())
         
         # Başarı logu (eğer database mevcut ise)
         try:
             if db is not None:
                 log = SystemLog(
                     level=LogLevel.SUCCESS,
-                    message=f"Scrape request completed: {len(offers)} offers, {len(failed_companies)} failed",
+                    message=f"Scrape request completed: {len(outcomes.offers)} offers, {len(outcomes.failed_companies)} failed",
                     user="system",
                     action="SCRAPE_COMPLETED",
-                    log_metadata={"request_id": request_id, "offers_count": len(offers), "failed_count": len(failed_companies)}
+                    log_metadata={"request_id": request_id, "offers_count": len(outcomes.offers), "failed_count": len(outcomes.failed_companies)}
                 )
                 db.add(log)
                 db.commit()
@@ -615,6 +807,134 @@ async def process_scrape_request(
                 db.commit()
         except Exception:
             pass  # Database yoksa log kaydını atla
+    finally:
+        admission_controller.finish(request_id)
+
+
+async def process_multi_branch_request(
+    request_id: str,
+    request: MultiBranchScrapeRequest,
+    db: Session
+):
+    """Background task: her şirket için branşları paralel çalıştır ve sonuçları kaydet"""
+    try:
+        companies_to_scrape = request.companies or list(InsuranceCompany)
+        branch_data = request.branch_data()
+
+        if SCRAPER_EXECUTION_MODE == "fleet" and SessionLocal is not None:
+            await process_fleet_request(request_id, branch_data, companies_to_scrape)
+            return
+
+        outcomes = _ScrapeOutcomes(db, request_id)
+        company_statuses = company_status_map(SessionLocal) if SessionLocal is not None else {}
+
+        for company in companies_to_scrape:
+            if company not in SCRAPER_FUNCTIONS:
+                outcomes.skipped(company)
+                continue
+
+            company_status = company_statuses.get(company.value, CompanyStatus.ACTIVE.value)
+            if company_status != CompanyStatus.ACTIVE.value:
+                outcomes.skipped(company, company_status)
+                continue
+
+            started_at = time.monotonic()
+            try:
+                results = await run_company_multi_branch(company, branch_data, request_id)
+            except Exception as e:
+                # Devre açık ya da ortak giriş başarısız: şirketin tüm branşları başarısız
+                outcomes.add(company, None, {}, e, time.monotonic() - started_at)
+                continue
+            finally:
+                admission_controller.release(request_id, company.value)
+
+            for branch, (result, elapsed) in results.items():
+                outcomes.add(company, InsuranceBranch(branch), branch_data[branch], result, elapsed,
+                             label=f"{company.value} ({branch})")
+
+        active_requests[request_id].update(outcomes.completed_status())
+
+    except Exception as e:
+        logger.error(f"❌ Çoklu branş request işleme hatası: {e}", exc_info=True)
+        active_requests[request_id].update({
+            "status": "failed",
+            "error": str(e),
+            "completed_at": datetime.now().isoformat()
+        })
+    finally:
+        admission_controller.finish(request_id)
+
+
+async def process_fleet_request(
+    request_id: str,
+    branch_data: Dict[str, Dict[str, Any]],
+    companies_to_scrape: List[InsuranceCompany]
+):
+    """Fleet modu: işleri (şirket x branş) kuyruğa ekle, worker'lar bitirene kadar sonuçları oku"""
+    loop = asyncio.get_event_loop()
+    failed_companies = []
+    error_categories: Dict[str, str] = {}
+    company_statuses = company_status_map(SessionLocal)
+    companies = []
+    for company in companies_to_scrape:
+        if company not in SCRAPER_FUNCTIONS:
+            failed_companies.append(company.value)
+            continue
+        company_status = company_statuses.get(company.value, CompanyStatus.ACTIVE.value)
+        if company_status != CompanyStatus.ACTIVE.value:
+            failed_companies.append(f"{company.value}: Şirket aktif değil ({company_status})")
+            continue
+        companies.append(company.value)
+
+    for branch, data in branch_data.items():
+        await loop.run_in_executor(
+            None, enqueue_jobs, SessionLocal, request_id, branch, companies, data, JobPriority.INTERACTIVE
+        )
+    active_requests[request_id]["jobs"] = len(companies) * len(branch_data)
+
+    deadline = time.monotonic() + FLEET_REQUEST_TIMEOUT_SECONDS
+    terminal = {status.value for status in TERMINAL_STATUSES}
+    jobs = []
+    while True:
+        jobs = await loop.run_in_executor(None, request_jobs, SessionLocal, request_id)
+        if all(job["status"] in terminal for job in jobs) or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(FLEET_POLL_SECONDS)
+
+    offers = []
+    for job in jobs:
+        label = job["company"] if len(branch_data) == 1 else f"{job['company']} ({job['branch']})"
+        if job["status"] == "completed" and job["offer"]:
+            offers.append(job["offer"])
+        elif job["status"] in terminal:
+            failed_companies.append(f"{label}: {job['error'] or 'Teklif alınamadı'}")
+            error_categories[label] = job.get("error_category") or ErrorCategory.TRANSIENT.value
+        else:
+            failed_companies.append(f"{label}: Zaman aşımı (iş durumu: {job['status']})")
+            error_categories[label] = ErrorCategory.TRANSIENT.value
+
+    active_requests[request_id].update({
+        "status": "completed",
+        "offers": offers,
+        "failed_companies": failed_companies,
+        "error_categories": error_categories,
+        "completed_at": datetime.now().isoformat()
+    })
+
+
+@app.get("/api/v1/credentials")
+async def get_credentials():
+    """Hesap havuzu durumu (şifre/secret içermez)"""
+    return {"credentials": credential_pool.snapshot()}
+
+
+@app.get("/api/v1/workers")
+async def get_workers():
+    """Canlı scraper worker'ları (fleet modu)"""
+    if SessionLocal is None:
+        return {"workers": []}
+    loop = asyncio.get_event_loop()
+    return {"workers": await loop.run_in_executor(None, live_workers, SessionLocal)}
 
 
 @app.get("/api/v1/offers", response_model=OfferListResponse)
@@ -624,10 +944,20 @@ async def get_offers(
     company: Optional[str] = None,
     branch: Optional[str] = None,
     tckn: Optional[str] = None,
+    include: Optional[str] = Query(None, description="Ek alanlar (virgülle ayrılmış), örn: raw_data"),
     db: Session = Depends(get_db)
 ):
-    """Teklif listesini getir"""
+    """
+    Teklif listesini getir
+    Varsayılan olarak yalın liste döner; ham veri için ?include=raw_data
+    """
+    include_fields = {f.strip() for f in include.split(",")} if include else set()
+    include_raw_data = "raw_data" in include_fields
+
     query = db.query(Offer)
+    if include_raw_data:
+        # Ham veriyi tek ek sorguda toplu yükle (N+1 yerine)
+        query = query.options(selectinload(Offer.raw_payload), undefer(Offer.raw_data))
     
     # Filtreleme
     if company:
@@ -645,7 +975,198 @@ async def get_offers(
         total=total,
         page=page,
         page_size=page_size,
-        offers=[OfferResponse(**offer.to_dict()) for offer in offers]
+        offers=[OfferResponse(**offer.to_dict(include_raw_data=include_raw_data)) for offer in offers]
+    )
+
+
+EXPORT_COLUMNS = [
+    "id", "company", "branch", "tckn", "plate", "price", "currency", "policy_no",
+    "valid_from", "valid_to", "status", "error_message", "created_at", "updated_at"
+]
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+
+
+def _export_value(value):
+    """Export için tek bir kolon değerini serileştir"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    return value
+
+
+def _iter_offer_export(
+    export_format: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    company: Optional[DBInsuranceCompany],
+    branch: Optional[DBInsuranceBranch],
+    use_gzip: bool
+):
+    """
+    Teklifleri server-side cursor ile satır satır okuyup CSV/NDJSON parçaları üret
+    Bellek kullanımı eşleşen satır sayısından bağımsızdır (yield_per)
+    """
+    # Dependency session'ı response stream edilirken kapanmış olabilir, kendi session'ımızı açıyoruz
+    db = SessionLocal()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if use_gzip else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    try:
+        query = db.query(*[getattr(Offer, c) for c in EXPORT_COLUMNS])
+        if date_from:
+            query = query.filter(Offer.created_at >= date_from)
+        if date_to:
+            query = query.filter(Offer.created_at < date_to)
+        if company:
+            query = query.filter(Offer.company == company)
+        if branch:
+            query = query.filter(Offer.branch == branch)
+        query = query.order_by(Offer.id).execution_options(stream_results=True).yield_per(EXPORT_YIELD_PER)
+
+        buffer = io.StringIO()
+        writer = None
+        if export_format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+
+        rows_in_buffer = 0
+        for row in query:
+            values = [_export_value(v) for v in row]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+                buffer.write("\n")
+            rows_in_buffer += 1
+            if rows_in_buffer >= EXPORT_YIELD_PER:
+                chunk = emit(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate(0)
+                rows_in_buffer = 0
+                if chunk:
+                    yield chunk
+
+        chunk = emit(buffer.getvalue())
+        if chunk:
+            yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
+
+
+@app.get("/api/v1/offers/export")
+async def export_offers(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    company: Optional[str] = None,
+    branch: Optional[str] = None,
+    gzip: Optional[bool] = Query(None, description="Boşsa Accept-Encoding başlığına göre belirlenir")
+):
+    """
+    Teklifleri CSV veya NDJSON olarak stream et (aylık raporlar için)
+    Sayfalama yok, tüm eşleşen satırlar tek istekte ve sabit bellekle döner
+    """
+    if SessionLocal is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    try:
+        company_enum = DBInsuranceCompany[company.upper()] if company else None
+        branch_enum = DBInsuranceBranch[branch.upper()] if branch else None
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid company or branch")
+
+    if gzip is None:
+        gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"offers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        _iter_offer_export(format, date_from, date_to, company_enum, branch_enum, gzip),
+        media_type=media_type,
+        headers=headers
+    )
+
+
+@app.post("/api/v1/scrape/batch")
+async def create_scrape_batch(
+    file: UploadFile = File(..., description="CSV (başlık satırlı) ya da NDJSON; her satır bir araç"),
+    branch: InsuranceBranch = Query(InsuranceBranch.TRAFIK),
+    companies: Optional[List[InsuranceCompany]] = Query(None),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Boşsa dosya adından belirlenir")
+):
+    """
+    Yenileme dönemi için toplu teklif: dosyadaki her satır x şirket bir iş olarak kuyruğa eklenir
+    Batch id ile ilerleme (/api/v1/scrape/batch/{id}) ve sonuç dosyası (/results) alınır
+    """
+    if SessionLocal is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if branch not in BATCH_ROW_SCHEMAS:
+        raise HTTPException(status_code=400, detail=f"Toplu teklif desteklenmeyen branş: {branch.value}")
+
+    file_format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    content = await file.read()
+    try:
+        rows, rejected = parse_batch_rows(content, file_format, branch)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    company_names = [c.value for c in (companies or list(InsuranceCompany)) if c in SCRAPER_FUNCTIONS]
+    if not company_names:
+        raise HTTPException(status_code=400, detail="Geçerli şirket yok")
+
+    batch_id = str(uuid.uuid4())
+    loop = asyncio.get_event_loop()
+    batch = await loop.run_in_executor(
+        None, create_batch, SessionLocal, batch_id, branch, company_names, rows, rejected, file.filename
+    )
+    logger.info(f"📦 Batch {batch_id}: {len(rows)} satır x {len(company_names)} şirket, {len(rejected)} satır reddedildi")
+    return {
+        "success": True,
+        "message": "Toplu teklif işlemi başlatıldı",
+        "batch_id": batch_id,
+        "total_jobs": len(rows) * len(company_names),
+        **batch
+    }
+
+
+@app.get("/api/v1/scrape/batch/{batch_id}")
+async def get_scrape_batch(batch_id: str):
+    """Batch ilerlemesi: şirket bazında iş sayaçları ve saatlik teklif hızı"""
+    if SessionLocal is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    progress = await asyncio.get_event_loop().run_in_executor(None, batch_progress, SessionLocal, batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch bulunamadı")
+    return progress
+
+
+@app.get("/api/v1/scrape/batch/{batch_id}/results")
+async def export_scrape_batch(
+    batch_id: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$")
+):
+    """Batch sonuçlarını (satır x şirket) CSV veya NDJSON olarak stream et; bitmemiş işler durumlarıyla döner"""
+    if SessionLocal is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="batch_{batch_id}.{format}"'}
+    return StreamingResponse(
+        iter_batch_results(SessionLocal, batch_id, format),
+        media_type=media_type,
+        headers=headers
     )
 
 
@@ -671,10 +1192,19 @@ async def get_companies():
 # COMPANY SETTINGS ENDPOINTS
 # ============================================
 
+def _cached_json_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """ETag ile JSON yanıt; If-None-Match eşleşirse 304 döner"""
+    etag = make_etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
+
 @app.get("/api/v1/companies/settings")
-async def get_company_settings(db: Session = Depends(get_db)):
-    """Tüm şirket ayarlarını getir"""
-    settings = db.query(CompanySettings).all()
+async def get_company_settings(request: Request, db: Session = Depends(get_db)):
+    """Tüm şirket ayarlarını getir (önbellekten, ETag destekli)"""
+    settings = company_settings_cache.get("all", db=db)
     
     # Eğer hiç ayar yoksa, varsayılan ayarları oluştur
     # TEST İÇİN SADECE SOMPO
@@ -686,13 +1216,27 @@ async def get_company_settings(db: Session = Depends(get_db)):
                 status=CompanyStatus.ACTIVE
             )
             db.add(setting)
+        company_settings_cache.invalidate(db)
         db.commit()
-        settings = db.query(CompanySettings).all()
+        settings = company_settings_cache.get("all", db=db)
+
+    # İstatistikler bellekteki güncel snapshot'tan (DB'deki değerler flush aralığı kadar geride olabilir)
+    stats = company_stats.snapshot()
+    circuits = circuit_breakers.snapshot()
+    hedges = hedge_policy.snapshot()
+    companies = []
+    for s in settings:
+        item = dict(s)
+        # Bellekte henüz değeri olmayan alanlar (None) kalıcı değerleri ezmez
+        item.update({k: v for k, v in stats.get(item["company"], {}).items() if v is not None})
+        item.update(circuits.get(item["company"], {}))
+        item.update(hedges.get(item["company"], {}))
+        companies.append(item)
     
-    return {
+    return _cached_json_response(request, {
         "success": True,
-        "companies": [s.to_dict() for s in settings]
-    }
+        "companies": companies
+    })
 
 
 @app.post("/api/v1/companies/settings")
@@ -721,6 +1265,7 @@ async def update_company_settings(
     else:
         setting.status = status_enum
     
+    company_settings_cache.invalidate(db)
     db.commit()
     db.refresh(setting)
     
@@ -771,6 +1316,7 @@ async def update_company_settings_bulk(
         
         updated.append(setting)
     
+    company_settings_cache.invalidate(db)
     db.commit()
     
     # Log kaydı
@@ -871,24 +1417,18 @@ async def create_log(
 
 @app.get("/api/v1/settings")
 async def get_settings(
+    request: Request,
     user_id: Optional[int] = None,
     setting_key: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Kullanıcı ayarlarını getir"""
-    query = db.query(UserSettings)
+    """Kullanıcı ayarlarını getir (önbellekten, ETag destekli)"""
+    settings = user_settings_cache.get((user_id, setting_key), db=db)
     
-    if user_id is not None:
-        query = query.filter(UserSettings.user_id == user_id)
-    if setting_key:
-        query = query.filter(UserSettings.setting_key == setting_key)
-    
-    settings = query.all()
-    
-    return {
+    return _cached_json_response(request, {
         "success": True,
-        "settings": [s.to_dict() for s in settings]
-    }
+        "settings": settings
+    })
 
 
 @app.post("/api/v1/settings")
@@ -918,6 +1458,7 @@ async def save_settings(
         )
         db.add(setting)
     
+    user_settings_cache.invalidate(db)
     db.commit()
     db.refresh(setting)
     
@@ -0,0 +1,200 @@
+"""
+Process içi metrik kayıtları (Prometheus text formatında dışa aktarılır)
+
+Harici bağımlılık yok: sayaçlar, göstergeler ve histogramlar thread-safe olarak bellekte tutulur,
+/metrics endpoint'i render() çıktısını döndürür. Hot path'te sadece sayaç/kova artırılır; pool
+doluluğu, kuyruk derinliği gibi anlık değerler scrape sırasında collector'larla okunur.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Teklif süreleri için varsayılan kovalar (saniye)
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+# Event loop gecikmesi ölçüm aralığı (0: ölçülmez)
+METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LOOP_LAG_INTERVAL_SECONDS", "1"))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            label_text = ",".join(f'{label}="{_escape(v)}"' for label, v in zip(self.labels, key))
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """Sadece artan sayaç"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Anlık değer"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Kovalı dağılım; observe() tek kova artırır, kümülatif değerler render'da hesaplanır"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # Etiketler -> kova sayıları (son eleman +Inf), toplam
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def value(self, **labels) -> float:
+        """Gözlem sayısı"""
+        with self._lock:
+            return float(sum(self._counts.get(self._key(labels), ())))
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            series = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        samples = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                samples.append((f"{self.name}_bucket", key + (le,), cumulative))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            names = self.labels + ("le",) if name.endswith("_bucket") else self.labels
+            label_text = ",".join(f'{label}="{_escape(v)}"' for label, v in zip(names, key))
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Her render() öncesi çağrılan fonksiyon (anlık göstergeleri günceller)"""
+        with self._lock:
+            if fn not in self._collectors:
+                self._collectors.append(fn)
+        return fn
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"⚠️ Metrik toplanamadı ({getattr(collect, '__name__', collect)}): {e}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Uygulama genelinde tek registry
+registry = MetricsRegistry()
+
+event_loop_lag = registry.gauge(
+    "event_loop_lag_seconds",
+    "Event loop'un son ölçümdeki gecikmesi (sleep'in planlanandan ne kadar geç döndüğü)"
+)
+event_loop_lag_histogram = registry.histogram(
+    "event_loop_lag_distribution_seconds",
+    "Event loop gecikmesi dağılımı",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+async def event_loop_lag_loop(interval_seconds: float = METRICS_LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """Arka plan görevi: event loop'u bloklayan senkron işleri görünür kılmak için gecikmeyi ölç"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval_seconds)
+        lag = max(0.0, loop.time() - started - interval_seconds)
+        event_loop_lag.set(round(lag, 6))
+        event_loop_lag_histogram.observe(lag)
@@ -1,11 +1,20 @@
 """
 SQLAlchemy Database Models
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, LargeBinary, ForeignKey, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 Base = declarative_base()
 
@@ -39,6 +48,25 @@ class InsuranceCompany(str, enum.Enum):
     ATLAS = "Atlas"
 
 
+def parse_offer_date(value):
+    """Scraper tarih metnini (ISO, GG.AA.YYYY ya da GG/AA/YYYY) datetime'a çevir, çözülemezse None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(text[:10], fmt)
+        except ValueError:
+            continue
+    return None
+
+
 class Offer(Base):
     """
     Teklif kayıtları için standart model
@@ -66,15 +94,69 @@ class Offer(Base):
     
     # Durum ve metadata
     status = Column(SQLEnum(OfferStatus), default=OfferStatus.PENDING, index=True)
-    raw_data = Column(JSON, nullable=True)  # Scraper'dan gelen ham veri
+    # Eski kayıtlardaki ham veri - yeni kayıtlar offer_raw_data tablosuna yazılır
+    raw_data = deferred(Column(JSON, nullable=True))
+    # Teklifi üreten form verisi (yenileme dönemi ön-çekiminde aynı araç için tekrar kullanılır)
+    request_data = deferred(Column(JSON, nullable=True))
     error_message = Column(Text, nullable=True)  # Hata mesajı (varsa)
     
     # Timestamps
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
-    
-    def to_dict(self):
-        """Model'i dictionary'ye çevir"""
+
+    # Scraper'dan gelen ham veri (sıkıştırılmış, yan tabloda, lazy yüklenir)
+    raw_payload = relationship(
+        "OfferRawData",
+        uselist=False,
+        lazy="select",
+        cascade="all, delete-orphan",
+        back_populates="offer"
+    )
+
+    @classmethod
+    def from_standard_offer(cls, result, company: "InsuranceCompany", branch: "InsuranceBranch",
+                            tckn: str, request_data=None) -> "Offer":
+        """Başarılı StandardOffer'dan kayıt oluştur (ham veri yan tabloya yazılır)"""
+        offer = cls(
+            company=company,
+            branch=branch,
+            tckn=tckn,
+            plate=result.plate,
+            price=result.price,
+            currency=result.currency,
+            policy_no=result.policy_no,
+            valid_from=parse_offer_date(result.valid_from),
+            valid_to=parse_offer_date(result.valid_to),
+            request_data=request_data,
+            status=OfferStatus.COMPLETED
+        )
+        offer.set_raw_data(result.raw_data)
+        return offer
+
+    def set_raw_data(self, data):
+        """Ham veriyi sıkıştırıp yan tabloya yaz"""
+        self._raw_data_cache = data
+        if data is None:
+            self.raw_payload = None
+            return
+        if self.raw_payload is None:
+            self.raw_payload = OfferRawData()
+        self.raw_payload.set_data(data)
+
+    def get_raw_data(self):
+        """Ham veriyi getir (yan tablo, yoksa eski JSON kolonu)"""
+        cached = getattr(self, "_raw_data_cache", None)
+        if cached is not None:
+            return cached
+        if self.raw_payload is not None:
+            return self.raw_payload.get_data()
+        return self.raw_data
+
+    def to_dict(self, include_raw_data: bool = False):
+        """
+        Model'i dictionary'ye çevir
+        include_raw_data=False iken ham veri yüklenmez (liste sorguları için yalın çıktı)
+        """
         return {
             "id": self.id,
             "company": self.company.value if self.company else None,
@@ -87,13 +169,66 @@ class Offer(Base):
             "valid_from": self.valid_from.isoformat() if self.valid_from else None,
             "valid_to": self.valid_to.isoformat() if self.valid_to else None,
             "status": self.status.value if self.status else None,
-            "raw_data": self.raw_data,
+            "raw_data": self.get_raw_data() if include_raw_data else None,
             "error_message": self.error_message,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
 
+# Ham veri sıkıştırma algoritması: zlib (varsayılan), zstd (zstandard kuruluysa) veya none
+RAW_DATA_COMPRESSION = os.getenv("RAW_DATA_COMPRESSION", "zlib").lower()
+
+
+def compress_payload(data):
+    """Dict'i JSON'a çevirip sıkıştır, (encoding, bytes, ham boyut) döndür"""
+    raw = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+    if RAW_DATA_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(raw), len(raw)
+    if RAW_DATA_COMPRESSION == "none":
+        return "none", raw, len(raw)
+    return "zlib", zlib.compress(raw, 6), len(raw)
+
+
+def decompress_payload(encoding, payload):
+    """compress_payload çıktısını tekrar dict'e çevir"""
+    if payload is None:
+        return None
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd ile sıkıştırılmış veri için 'zstandard' paketi gerekli")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    elif encoding == "zlib":
+        raw = zlib.decompress(payload)
+    else:
+        raw = payload
+    return json.loads(raw.decode("utf-8"))
+
+
+class OfferRawData(Base):
+    """
+    Teklif ham verileri (scraper çıktısının tamamı)
+    Liste sorgularını hafif tutmak için offers tablosundan ayrı tutulur
+    """
+    __tablename__ = "offer_raw_data"
+
+    offer_id = Column(Integer, ForeignKey("offers.id", ondelete="CASCADE"), primary_key=True)
+    encoding = Column(String(10), nullable=False, default="zlib")
+    payload = Column(LargeBinary().with_variant(LargeBinary(length=2 ** 24 - 1), "mysql"), nullable=False)
+    raw_size = Column(Integer, nullable=True)  # Sıkıştırılmamış boyut (byte)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    offer = relationship("Offer", back_populates="raw_payload")
+
+    def set_data(self, data):
+        """Veriyi sıkıştırarak kaydet"""
+        self.encoding, self.payload, self.raw_size = compress_payload(data)
+
+    def get_data(self):
+        """Sıkıştırılmış veriyi aç"""
+        return decompress_payload(self.encoding, self.payload)
+
+
 class User(Base):
     """
     Kullanıcı modeli (admin panel için)
@@ -145,6 +280,12 @@ class CompanySettings(Base):
     last_query = Column(DateTime, nullable=True)
     success_rate = Column(Float, default=0.0)
     total_queries = Column(Integer, default=0)
+    p50_duration = Column(Float, nullable=True)  # Saniye cinsinden medyan süre
+    p95_duration = Column(Float, nullable=True)  # Saniye cinsinden p95 süre
+    last_error_class = Column(String(50), nullable=True)
+    last_error_at = Column(DateTime, nullable=True)
+    circuit_state = Column(String(20), nullable=True)  # closed / open / half_open (son geçiş)
+    circuit_changed_at = Column(DateTime, nullable=True)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -158,6 +299,12 @@ class CompanySettings(Base):
             "last_query": self.last_query.isoformat() if self.last_query else None,
             "success_rate": self.success_rate,
             "total_queries": self.total_queries,
+            "p50_duration": self.p50_duration,
+            "p95_duration": self.p95_duration,
+            "last_error_class": self.last_error_class,
+            "last_error_at": self.last_error_at.isoformat() if self.last_error_at else None,
+            "circuit_state": self.circuit_state,
+            "circuit_changed_at": self.circuit_changed_at.isoformat() if self.circuit_changed_at else None,
             "notes": self.notes,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
@@ -223,3 +370,138 @@ class UserSettings(Base):
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
+
+
+class CacheVersion(Base):
+    """
+    Önbellek versiyon damgaları
+    Bir ayar yazıldığında ilgili versiyon artırılır, diğer worker'lar bunu görüp önbelleğini temizler
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ScrapeJobStatus(str, enum.Enum):
+    """Scrape işi durumu"""
+    QUEUED = "queued"
+    LEASED = "leased"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class ScrapeJob(Base):
+    """
+    Worker'ların veritabanından kiraladığı (lease) scrape işi - her kayıt tek şirket + branş
+    """
+    __tablename__ = "scrape_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(String(100), nullable=False, index=True)
+    company = Column(SQLEnum(InsuranceCompany), nullable=False, index=True)
+    branch = Column(SQLEnum(InsuranceBranch), nullable=False)
+    payload = Column(JSON, nullable=False)  # Scraper'a giden form verisi
+    status = Column(SQLEnum(ScrapeJobStatus), default=ScrapeJobStatus.QUEUED, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    leased_by = Column(String(100), nullable=True, index=True)  # Worker ID
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    result = Column(JSON, nullable=True)  # StandardOffer dict'i
+    offer_id = Column(Integer, ForeignKey("offers.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    error_class = Column(String(50), nullable=True)
+    error_category = Column(String(30), nullable=True)
+    # JobPriority: 0 canlı, 1 normal, 2 toplu (NULL normal sayılır)
+    priority = Column(Integer, default=1, nullable=True)
+    row_index = Column(Integer, nullable=True)  # Toplu (batch) işlerde girdi dosyasındaki satır
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        """Model'i dictionary'ye çevir"""
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "row_index": self.row_index,
+            "company": self.company.value if self.company else None,
+            "branch": self.branch.value if self.branch else None,
+            "status": self.status.value if self.status else None,
+            "attempts": self.attempts,
+            "priority": self.priority,
+            "leased_by": self.leased_by,
+            "offer_id": self.offer_id,
+            "error": self.error,
+            "error_class": self.error_class,
+            "error_category": self.error_category,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class WorkerNode(Base):
+    """
+    Scraper worker kayıtları (python -m backend.worker) - heartbeat ve sıcak oturum bilgisi
+    """
+    __tablename__ = "worker_nodes"
+
+    worker_id = Column(String(100), primary_key=True)
+    hostname = Column(String(255), nullable=True)
+    capacity = Column(Integer, default=1, nullable=False)
+    active_jobs = Column(Integer, default=0, nullable=False)
+    companies = Column(JSON, nullable=True)  # Çalıştırabildiği şirketler
+    warm_companies = Column(JSON, nullable=True)  # Oturumu açık (sıcak) olan şirketler
+    started_at = Column(DateTime, server_default=func.now(), nullable=False)
+    last_seen = Column(DateTime, nullable=True, index=True)
+
+    def to_dict(self):
+        """Model'i dictionary'ye çevir"""
+        return {
+            "worker_id": self.worker_id,
+            "hostname": self.hostname,
+            "capacity": self.capacity,
+            "active_jobs": self.active_jobs,
+            "companies": self.companies or [],
+            "warm_companies": self.warm_companies or [],
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+        }
+
+
+class ScrapeBatchStatus(str, enum.Enum):
+    """Toplu teklif işi durumu"""
+    RUNNING = "running"
+    COMPLETED = "completed"
+
+
+class ScrapeBatch(Base):
+    """
+    Toplu (yenileme dönemi) teklif isteği - işleri scrape_jobs'ta request_id = batch id ile tutulur
+    """
+    __tablename__ = "scrape_batches"
+
+    id = Column(String(100), primary_key=True)
+    branch = Column(SQLEnum(InsuranceBranch), nullable=False)
+    companies = Column(JSON, nullable=False)
+    status = Column(SQLEnum(ScrapeBatchStatus), default=ScrapeBatchStatus.RUNNING, nullable=False, index=True)
+    source_name = Column(String(255), nullable=True)  # Yüklenen dosya adı
+    total_rows = Column(Integer, default=0, nullable=False)
+    rejected_rows = Column(JSON, nullable=True)  # Doğrulamadan geçmeyen satırlar: [{row, error}]
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        """Model'i dictionary'ye çevir"""
+        return {
+            "id": self.id,
+            "branch": self.branch.value if self.branch else None,
+            "companies": self.companies or [],
+            "status": self.status.value if self.status else None,
+            "source_name": self.source_name,
+            "total_rows": self.total_rows,
+            "rejected_rows": self.rejected_rows or [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
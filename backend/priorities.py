@@ -0,0 +1,161 @@
+"""
+İş öncelikleri: canlı (interactive), normal ve toplu (batch) teklifler
+
+Telefondaki müşteri için alınan teklif ile gece çalışan yenileme işleri aynı Playwright worker'ları
+için yarışıyordu. İşler öncelik sınıfıyla kuyruğa girer; worker her seferinde en yüksek öncelikli işi
+alır. Açlığı önlemek için bekleyen iş her PRIORITY_AGING_SECONDS'ta bir sınıf yükselir. Toplu işler
+adım sınırlarında kesilebilir: worker'da canlı iş beklerken toplu teklif bir sonraki adımdan önce
+JobPreempted ile bırakılır ve tekrar kuyruğa alınır (deneme hakkı yenmez).
+"""
+import os
+import queue
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable, List, Optional, Tuple
+
+from backend.metrics import registry
+
+
+class JobPriority(IntEnum):
+    """Küçük değer önce çalışır"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BATCH = 2
+
+
+# Bekleyen iş her bu kadar saniyede bir öncelik sınıfı yükselir (0: yaşlanma yok)
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "600"))
+# Toplu işler canlı iş beklerken adım sınırında bırakılsın mı
+PRIORITY_PREEMPT_BATCH = os.getenv("PRIORITY_PREEMPT_BATCH", "true").lower() == "true"
+
+queue_wait_seconds_total = registry.counter(
+    "scraper_queue_wait_seconds_total",
+    "İşlerin kuyrukta bekleme süresi toplamı",
+    ("priority",)
+)
+queue_jobs_total = registry.counter(
+    "scraper_queue_jobs_total",
+    "Kuyruktan alınan işler",
+    ("priority",)
+)
+preempted_total = registry.counter(
+    "scraper_preempted_total",
+    "Canlı iş için adım sınırında bırakılan toplu işler",
+    ("company",)
+)
+
+
+class JobPreempted(Exception):
+    """Toplu iş canlı iş için bırakıldı - hata sayılmaz, iş tekrar kuyruğa alınır"""
+    error_class = "JobPreempted"
+
+
+def priority_name(priority: int) -> str:
+    try:
+        return JobPriority(priority).name.lower()
+    except ValueError:
+        return str(priority)
+
+
+def effective_priority(priority: int, waited_seconds: float) -> int:
+    """Bekleme süresine göre yaşlandırılmış öncelik"""
+    if PRIORITY_AGING_SECONDS <= 0:
+        return priority
+    return max(int(JobPriority.INTERACTIVE), priority - int(waited_seconds // PRIORITY_AGING_SECONDS))
+
+
+def record_queue_wait(priority: int, waited_seconds: float) -> None:
+    name = priority_name(priority)
+    queue_wait_seconds_total.inc(waited_seconds, priority=name)
+    queue_jobs_total.inc(priority=name)
+
+
+class PriorityJobQueue:
+    """
+    queue.Queue yerine kullanılan öncelikli kuyruk (thread-safe)
+    get() yaşlandırılmış önceliği en küçük, eşitse en eski işi döndürür. None (durdurma işareti)
+    her zaman en sona girer.
+    """
+
+    def __init__(self):
+        self._items: List[Tuple[int, float, int, Any]] = []
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def put(self, item: Any, priority: int = JobPriority.NORMAL) -> None:
+        with self._cond:
+            self._seq += 1
+            rank = priority if item is not None else float("inf")
+            self._items.append((rank, time.monotonic(), self._seq, item))
+            self._cond.notify()
+
+    def _pop_best(self) -> Any:
+        now = time.monotonic()
+
+        def key(entry):
+            rank, enqueued_at, seq, item = entry
+            if item is None:
+                return (float("inf"), seq)
+            return (effective_priority(rank, now - enqueued_at), seq)
+
+        best = min(self._items, key=key)
+        self._items.remove(best)
+        rank, enqueued_at, _, item = best
+        if item is not None:
+            record_queue_wait(rank, now - enqueued_at)
+        return item
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """En öncelikli işi al; timeout dolarsa queue.Empty"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            return self._pop_best()
+
+    def has_waiting(self, priority: int) -> bool:
+        """Bu (yaşlandırılmamış) öncelikte ya da daha yüksek öncelikte bekleyen iş var mı"""
+        with self._cond:
+            return any(item is not None and rank <= priority for rank, _, _, item in self._items)
+
+    def count_ahead(self, priority: int) -> int:
+        """Bu öncelikte yeni gelen bir işin önünde sırada olacak iş sayısı"""
+        now = time.monotonic()
+        with self._cond:
+            return sum(1 for rank, at, _, item in self._items
+                       if item is not None and effective_priority(rank, now - at) <= priority)
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+
+# Çalışan işin kesilme kontrolü (worker thread'i başına): quote akışları adım sınırında sorar
+_local = threading.local()
+
+
+def set_preemption_check(check: Optional[Callable[[], bool]],
+                         on_register: Optional[Callable[[], None]] = None) -> None:
+    """
+    Worker, çalıştıracağı işe kesilme kontrolünü sunar
+    on_register iş kontrolü gerçekten aldığında (adımlı akış başladığında) çağrılır; sadece o
+    andan sonra iş kesilebilir sayılır
+    """
+    _local.check = check
+    _local.on_register = on_register
+
+
+def preemption_check() -> Optional[Callable[[], bool]]:
+    """Bu thread'de çalışan iş kesilebiliyorsa kontrol fonksiyonu, değilse None"""
+    check = getattr(_local, "check", None)
+    on_register = getattr(_local, "on_register", None)
+    if check is not None and on_register is not None:
+        on_register()
+    return check
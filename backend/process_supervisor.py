@@ -0,0 +1,410 @@
+"""
+Process tabanlı scraper supervisor'ı
+
+Her scraper ayrı bir child process'te, o process'in kendi Playwright driver'ı ve browser'ı
+ile çalışır. Bir Chromium takılması, driver deadlock'u ya da bellek sızıntısı API process'ini
+etkilemez: supervisor takılan child'ı öldürüp yenisini başlatır. İşler ve sonuçlar pipe
+üzerinden (StandardOffer dict'leri olarak) taşınır.
+
+Heartbeat canlılık değil ilerlemedir: child, işin yaptığı ağ istekleri/yanıtları, açılan sayfalar ve
+teklif akışının adım sınırlarında zaman damgasını günceller. Playwright çağrısında kilitlenen iş bu
+olayları üretemediği için SCRAPER_PROGRESS_TIMEOUT_SECONDS içinde yakalanır.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.priorities import JobPriority, PriorityJobQueue
+from backend.schemas import StandardOffer
+
+logger = logging.getLogger(__name__)
+
+SCRAPER_PROCESSES = int(os.getenv("SCRAPER_PROCESSES", os.getenv("MAX_WORKERS", "5")))
+# Child bu kadar işten sonra kendini emekliye ayırır (yerine yenisi başlatılır)
+SCRAPER_PROCESS_MAX_JOBS = int(os.getenv("SCRAPER_PROCESS_MAX_JOBS", "50"))
+# Child + browser process'lerinin toplam RSS tavanı (MB), aşılırsa iş bitince yenilenir
+SCRAPER_PROCESS_MAX_RSS_MB = int(os.getenv("SCRAPER_PROCESS_MAX_RSS_MB", "1500"))
+SCRAPER_JOB_TIMEOUT_SECONDS = float(os.getenv("SCRAPER_JOB_TIMEOUT_SECONDS", "300"))
+# İş bu kadar süre ilerleme (ağ trafiği, sayfa, akış adımı) göstermezse takılmış sayılır
+SCRAPER_PROGRESS_TIMEOUT_SECONDS = float(os.getenv(
+    "SCRAPER_PROGRESS_TIMEOUT_SECONDS", os.getenv("SCRAPER_HEARTBEAT_TIMEOUT_SECONDS", "60")
+))
+HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+
+# spawn: child'lar API process'inin thread/driver durumunu miras almaz
+_mp = multiprocessing.get_context("spawn")
+
+
+class ScraperProcessError(Exception):
+    """Child process'teki scraper exception'ı (orijinal sınıf adı error_class'ta)"""
+
+    def __init__(self, error_class: str, message: str):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+class ScraperTimeout(Exception):
+    """İş süresi aşıldı ya da child ilerleme kaydetmeyi bıraktı"""
+
+
+class ScraperCrashed(Exception):
+    """Child process iş sırasında beklenmedik şekilde sonlandı"""
+
+
+class ScraperCancelled(Exception):
+    """İşi bekleyen taraf vazgeçti (örn. hedge denemesini kaybetti)"""
+
+
+# ============================================
+# CHILD PROCESS
+# ============================================
+
+def _watch_context(context, beat: Callable[..., None]):
+    """Context'teki ağ trafiği ve yeni sayfalar ilerleme sayılır (olaylar işin thread'inde işlenir)"""
+    for event in ("request", "response", "page"):
+        context.on(event, beat)
+
+
+class _ProgressBrowser:
+    """Browser vekili: scraper'ın açtığı context/sayfalar ilerleme için izlenir"""
+
+    def __init__(self, browser, beat: Callable[..., None]):
+        self._browser = browser
+        self._beat = beat
+
+    def new_context(self, **kwargs):
+        context = self._browser.new_context(**kwargs)
+        _watch_context(context, self._beat)
+        return context
+
+    def new_page(self, **kwargs):
+        page = self._browser.new_page(**kwargs)
+        _watch_context(page.context, self._beat)
+        return page
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+class _ChildWorker:
+    """Child process içinde scraper fonksiyonlarına worker=... olarak verilen nesne"""
+
+    def __init__(self, heartbeat=None):
+        self.playwright = None
+        self.browser = None
+        self.heartbeat = heartbeat
+
+    def progress(self, *_):
+        """İş ilerledi: supervisor'ın izlediği zaman damgasını güncelle"""
+        if self.heartbeat is not None:
+            self.heartbeat.value = time.time()
+
+    def ensure_browser(self):
+        if self.playwright is None:
+            from playwright.sync_api import sync_playwright
+            self.playwright = sync_playwright().start()
+        if self.browser is not None and not self.browser.is_connected():
+            self.close()
+            return self.ensure_browser()
+        if self.browser is None:
+            self.browser = _ProgressBrowser(self.playwright.chromium.launch(headless=HEADLESS), self.progress)
+            self.progress()
+
+    def close(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+
+
+def _install_step_progress(worker: _ChildWorker):
+    """Teklif akışlarının adım sınırları da ilerleme sayılır"""
+    scrapers_event_dir = os.path.join(os.path.dirname(__file__), '..', 'scrapers_event')
+    if scrapers_event_dir not in sys.path:
+        sys.path.append(scrapers_event_dir)
+    from quote_steps import set_progress_hook
+    set_progress_hook(worker.progress)
+
+
+def _child_main(conn, heartbeat, max_jobs: int):
+    """Child process giriş noktası: pipe'tan iş al, çalıştır, sonucu geri gönder"""
+    worker = _ChildWorker(heartbeat)
+    _install_step_progress(worker)
+    jobs_done = 0
+    try:
+        while jobs_done < max_jobs:
+            job = conn.recv()
+            if job is None:
+                break
+            fn, args, kwargs = job
+            worker.progress()
+            try:
+                worker.ensure_browser()
+                result = fn(*args, worker=worker, **kwargs)
+                if isinstance(result, StandardOffer):
+                    result = result.dict()
+                conn.send(("ok", result))
+            except Exception as e:
+                conn.send(("error", type(e).__name__, str(e)))
+            jobs_done += 1
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        worker.close()
+        if worker.playwright is not None:
+            try:
+                worker.playwright.stop()
+            except Exception:
+                pass
+
+
+# ============================================
+# SUPERVISOR (API PROCESS)
+# ============================================
+
+def _tree_rss_mb(pid: int) -> float:
+    """Process ve tüm alt process'lerinin (browser dahil) toplam RSS'i - sadece Linux /proc"""
+    if not os.path.isdir("/proc"):
+        return 0.0
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm parantez içinde boşluk içerebilir, son ')' sonrasından ayrıştır
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            rss_pages[int(entry)] = int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_pages.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _Job:
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict,
+                 loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.loop = loop
+        self.future = future
+        # Slot işi aldı mı / iş bitti mi (bekleyen iptal edilse bile)
+        self.started = False
+        self.finished = asyncio.Event()
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _ChildSlot(threading.Thread):
+    """
+    Tek bir child process'i yöneten supervisor thread'i
+    Kuyruktan iş alır, child'a gönderir, sonucu/heartbeat'i izler; gerekirse child'ı yeniden başlatır
+    """
+
+    def __init__(self, index: int, jobs: PriorityJobQueue):
+        super().__init__(name=f"scraper-supervisor-{index}", daemon=True)
+        self.index = index
+        self.jobs = jobs
+        self.process = None
+        self.conn = None
+        self.heartbeat = None
+        self.jobs_on_child = 0
+        self.busy = False
+        self.restarts = 0
+
+    def _spawn(self):
+        parent_conn, child_conn = _mp.Pipe()
+        self.heartbeat = _mp.Value("d", time.time())
+        self.process = _mp.Process(
+            target=_child_main,
+            args=(child_conn, self.heartbeat, SCRAPER_PROCESS_MAX_JOBS),
+            name=f"scraper-child-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs_on_child = 0
+        logger.info(f"[{self.name}] Child process başlatıldı (pid={self.process.pid})")
+
+    def _kill(self, reason: str):
+        if self.process is None:
+            return
+        logger.warning(f"⚠️ [{self.name}] Child process sonlandırılıyor (pid={self.process.pid}): {reason}")
+        # Önce nazikçe, sonra zorla; browser process'leri child ile birlikte ölür
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.process = None
+        self.conn = None
+        self.restarts += 1
+
+    def _retire_if_needed(self):
+        """Max-jobs ya da RSS tavanı aşıldıysa child'ı yenile"""
+        if self.process is None:
+            return
+        if self.jobs_on_child >= SCRAPER_PROCESS_MAX_JOBS:
+            # Child max-jobs'a ulaşınca kendisi çıkar, bir sonraki işte yenisi başlatılır
+            self.process.join(10)
+            if self.process.is_alive():
+                self._kill("max jobs")
+            else:
+                self.conn.close()
+                self.process = None
+                self.conn = None
+            return
+        rss = _tree_rss_mb(self.process.pid)
+        if rss > SCRAPER_PROCESS_MAX_RSS_MB:
+            self._kill(f"RSS {rss:.0f}MB > {SCRAPER_PROCESS_MAX_RSS_MB}MB")
+
+    def _wait_result(self, job: _Job):
+        """Sonucu bekle; süre aşımı, ilerleme kaybı, çökme ya da iptal durumunda exception"""
+        deadline = time.monotonic() + SCRAPER_JOB_TIMEOUT_SECONDS
+        while True:
+            if self.conn.poll(1.0):
+                return self.conn.recv()
+            if job.future.cancelled():
+                raise ScraperCancelled("İş iptal edildi")
+            if not self.process.is_alive():
+                raise ScraperCrashed(f"Scraper process çöktü (exit code {self.process.exitcode})")
+            if time.time() - self.heartbeat.value > SCRAPER_PROGRESS_TIMEOUT_SECONDS:
+                raise ScraperTimeout(
+                    f"Scraper {SCRAPER_PROGRESS_TIMEOUT_SECONDS:.0f} saniyedir ilerleme kaydetmiyor (takıldı)"
+                )
+            if time.monotonic() > deadline:
+                raise ScraperTimeout(f"Scraper {SCRAPER_JOB_TIMEOUT_SECONDS:.0f} saniyede tamamlanmadı")
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            job.started = True
+            if job.future.cancelled():
+                job.loop.call_soon_threadsafe(job.finished.set)
+                continue
+            self.busy = True
+            try:
+                if self.process is None:
+                    self._spawn()
+                self.conn.send((job.fn, job.args, job.kwargs))
+                self.jobs_on_child += 1
+                message = self._wait_result(job)
+                if message[0] == "ok":
+                    result = message[1]
+                    if isinstance(result, dict):
+                        result = StandardOffer(**result)
+                    job.loop.call_soon_threadsafe(_resolve, job.future, result, None)
+                else:
+                    job.loop.call_soon_threadsafe(
+                        _resolve, job.future, None, ScraperProcessError(message[1], message[2])
+                    )
+            except (ScraperTimeout, ScraperCrashed, ScraperCancelled, EOFError, OSError) as e:
+                if isinstance(e, (EOFError, OSError)):
+                    # Pipe koptu: child iş sırasında çıktı (os._exit, segfault, OOM kill...)
+                    e = ScraperCrashed("Scraper process beklenmedik şekilde sonlandı")
+                self._kill(str(e))
+                job.loop.call_soon_threadsafe(_resolve, job.future, None, e)
+            except BaseException as e:
+                job.loop.call_soon_threadsafe(_resolve, job.future, None, e)
+            finally:
+                self.busy = False
+                job.loop.call_soon_threadsafe(job.finished.set)
+            self._retire_if_needed()
+
+        if self.process is not None:
+            try:
+                self.conn.send(None)
+                self.process.join(10)
+            except Exception:
+                pass
+            if self.process.is_alive():
+                self._kill("shutdown")
+        logger.info(f"[{self.name}] Durduruldu")
+
+
+class ProcessScraperPool:
+    """Sabit sayıda child process ve ortak iş kuyruğu (ScraperWorkerPool ile aynı arayüz)"""
+
+    def __init__(self, size: int = SCRAPER_PROCESSES):
+        self.size = size
+        # Ortak öncelikli kuyruk: canlı teklifler toplu işlerden önce alınır
+        self.jobs = PriorityJobQueue()
+        self.slots: List[_ChildSlot] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.slots:
+                return
+            for i in range(self.size):
+                slot = _ChildSlot(i, self.jobs)
+                slot.start()
+                self.slots.append(slot)
+            logger.info(f"✅ {self.size} scraper process slotu başlatıldı")
+
+    def stop(self):
+        with self._lock:
+            for _ in self.slots:
+                self.jobs.put(None)
+            self.slots = []
+
+    def queue_depth(self) -> int:
+        return self.jobs.qsize()
+
+    def busy_workers(self) -> int:
+        return sum(1 for s in self.slots if s.busy)
+
+    def restarts(self) -> int:
+        return sum(s.restarts for s in self.slots)
+
+    async def submit(self, fn: Callable, *args, priority: int = JobPriority.NORMAL, **kwargs) -> Any:
+        """
+        fn(*args, worker=<child worker>, **kwargs) çağrısını bir child process'te çalıştır
+        fn modül seviyesinde tanımlı olmalı (pickle ile referans olarak gönderilir)
+        """
+        if not self.slots:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(fn, args, kwargs, loop, future)
+        self.jobs.put(job, priority)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # İptal edilen işin child'ı öldürülür; o ana kadar çağıranın hesap kirası bırakılmaz
+            if job.started:
+                await job.finished.wait()
+            raise
+
+
+# Uygulama genelinde tek pool (SCRAPER_EXECUTION_MODE=process iken startup'ta başlatılır)
+process_scraper_pool = ProcessScraperPool()
@@ -0,0 +1,300 @@
+"""
+Quote session'ları - giriş yapılmış sayfada art arda teklif alma
+
+Teklif sonrası browser'ı kapatmak yerine QuoteSession sayfayı temiz bir "yeni teklif"
+durumuna döndürür (formu yeniden açar). Worker'daki her açık oturum context'i için bir
+QuoteSession tutulur; login, pop-up kapatma ve menü gezintisi sadece ilk teklifte ödenir.
+"""
+import logging
+import os
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+from backend.error_taxonomy import ErrorCategory
+from backend.metrics import registry
+from backend.priorities import JobPreempted, preempted_total, preemption_check
+from backend.schemas import StandardOffer
+from backend.scrapers import ScraperLoginError, _sompo_session_alive
+
+logger = logging.getLogger(__name__)
+
+# Aynı sekmede bu kadar tekliften sonra form sıfırlanmak yerine baştan açılır (sayfa belleği büyür)
+QUOTE_SESSION_MAX_QUOTES = int(os.getenv("QUOTE_SESSION_MAX_QUOTES", "50"))
+
+_SCRAPERS_EVENT_DIR = os.path.join(os.path.dirname(__file__), '..', 'scrapers_event')
+
+session_logins_total = registry.counter(
+    "scraper_session_logins_total",
+    "Quote session açılışları: yeni giriş (login), açık oturumun kullanılması (reused), başarısız giriş (failed)",
+    ("company", "result")
+)
+quote_step_duration_seconds = registry.histogram(
+    "scraper_quote_step_duration_seconds",
+    "Adımlı teklif akışlarında adım süreleri",
+    ("company", "branch", "step", "result"),
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+
+class QuoteSessionError(Exception):
+    """Teklif formu açılamadı (oturum geçerli olabilir)"""
+
+
+class QuoteSession:
+    """
+    Bir şirket portalında giriş yapılmış teklif oturumu
+    Alt sınıflar open() (login + teklif formu), reset() (formu temiz duruma getir, başarısızsa
+    False) ve _quote() (formu doldur, StandardOffer döndür) metodlarını uygular
+    """
+    company = ""
+    branches: Tuple[str, ...] = ()
+
+    def __init__(self, context, warm: bool = False, credential=None):
+        self.context = context
+        self.warm = warm
+        self.credential = credential
+        self.ready = False
+        self.dirty = False
+        self.quotes_served = 0
+        self.quotes_on_page = 0
+        # Son teklifin adım checkpoint'i (adımlı akışlarda)
+        self.last_checkpoint = None
+
+    def open(self):
+        raise NotImplementedError
+
+    def reset(self) -> bool:
+        raise NotImplementedError
+
+    def _quote(self, branch: str, data: Dict[str, Any]) -> StandardOffer:
+        raise NotImplementedError
+
+    def failed(self, branch: str, data: Dict[str, Any], error: str,
+               error_category: Optional[ErrorCategory] = None) -> StandardOffer:
+        """Başarısız teklif; kategori verilmezse hata mesajından sınıflandırılır"""
+        return StandardOffer(
+            company=self.company,
+            branch=branch,
+            tckn=data.get('tckn', ''),
+            plate=data.get('plaka'),
+            status="failed",
+            error=error,
+            error_category=error_category
+        )
+
+    def _run_flow(self, branch: str, run, checkpoint_cls, preempted_cls):
+        """
+        Adımlı akışı checkpoint ile çalıştır: run(checkpoint) -> akış sonucu
+        checkpoint_cls/preempted_cls akış modülünün import ettiği quote_steps sınıflarıdır
+        (modül scrapers_event yolundan ya da paket olarak yüklenmiş olabilir)
+        """
+        # Adım checkpoint'i: geçici hatada akış aynı sayfada başarısız adımdan devam eder
+        checkpoint = checkpoint_cls(f"{self.company.lower()}_{branch}")
+        # Toplu işlerde worker'da canlı iş beklerken ya da bekleyen vazgeçtiyse (hedge'i kaybeden deneme)
+        # akış adım sınırında bırakılır
+        checkpoint.preempt = preemption_check()
+        try:
+            result = run(checkpoint)
+        except preempted_cls as e:
+            preempted_total.inc(company=self.company)
+            raise JobPreempted(f"{self.company} {branch} teklifi bırakıldı: {e}") from e
+        finally:
+            self.last_checkpoint = checkpoint
+            for step, seconds, ok in checkpoint.timings:
+                quote_step_duration_seconds.observe(
+                    seconds, company=self.company, branch=branch, step=step, result="success" if ok else "failure"
+                )
+        if checkpoint.resumes:
+            logger.info(f"[{self.company}] {branch} teklifi {checkpoint.resumes} kez kaldığı adımdan devam etti")
+        return result, checkpoint
+
+    def _flow_failed(self, branch: str, data: Dict[str, Any], error_msg: str, checkpoint) -> StandardOffer:
+        """Başarısız akış: hata mesajına adım eklenir, girdi hatası (StepInputError) tekrar denenmez"""
+        if checkpoint.failed_step:
+            error_msg = f"{error_msg} (adım: {checkpoint.failed_step})"
+        return self.failed(branch, data, error_msg, None if checkpoint.retryable else ErrorCategory.INPUT_INVALID)
+
+    def prepare(self):
+        """Sayfayı teklife hazırla: ilk seferde open(), sonrasında reset(); reset olmazsa baştan aç"""
+        if self.ready and not self.dirty:
+            return
+        if self.ready and self.quotes_on_page < QUOTE_SESSION_MAX_QUOTES:
+            try:
+                if self.reset():
+                    self.dirty = False
+                    return
+                logger.info(f"[{self.company}] Teklif formu sıfırlanamadı, yeniden açılıyor")
+            except Exception as e:
+                logger.warning(f"[{self.company}] Teklif formu sıfırlama hatası: {e}")
+        self.close()
+        self.open()
+        # Bundan sonraki open() çağrıları (örn. sekme kapandıysa) önce açık oturumu dener
+        self.warm = True
+        self.ready = True
+        self.dirty = False
+        self.quotes_on_page = 0
+
+    def quote(self, branch: str, data: Dict[str, Any]) -> StandardOffer:
+        """Hazır formda teklif al; form kirli işaretlenir, sonraki prepare() onu sıfırlar"""
+        if branch not in self.branches:
+            return self.failed(branch, data, f"Desteklenmeyen branş: {branch}", ErrorCategory.INPUT_INVALID)
+        self.prepare()
+        self.dirty = True
+        self.quotes_served += 1
+        self.quotes_on_page += 1
+        return self._quote(branch, data)
+
+    def close(self):
+        """Oturumun açtığı sekmeleri kapat (context ve login açık kalır)"""
+        self.ready = False
+        for page in list(self.context.pages):
+            try:
+                page.close()
+            except Exception:
+                pass
+
+
+class SompoQuoteSession(QuoteSession):
+    """Dashboard sekmesi + 'TEKLİF AL' ile açılan form sekmesi; form kendi adresinden yeniden yüklenir"""
+    company = "Sompo"
+    branches = ("trafik", "kasko")
+
+    def __init__(self, context, warm: bool = False, credential=None):
+        super().__init__(context, warm, credential)
+        self.home = None
+        self.offer_page = None
+        self.offer_url: Optional[str] = None
+
+    def open(self):
+        if _SCRAPERS_EVENT_DIR not in sys.path:
+            sys.path.append(_SCRAPERS_EVENT_DIR)
+        from sompo_event import login_and_save, handle_popups, open_new_offer_page
+
+        page = self.context.new_page()
+        # Login (açık oturum geçerliyse atla)
+        if self.warm and _sompo_session_alive(page):
+            session_logins_total.inc(company=self.company, result="reused")
+        else:
+            try:
+                logged_in = login_and_save(
+                    page,
+                    username=self.credential.username if self.credential else None,
+                    password=self.credential.password if self.credential else None,
+                    secret_key=self.credential.totp_secret if self.credential else None
+                )
+            except Exception as e:
+                session_logins_total.inc(company=self.company, result="failed")
+                raise ScraperLoginError(f"Giriş başarısız: {e}") from e
+            if not logged_in:
+                session_logins_total.inc(company=self.company, result="failed")
+                raise ScraperLoginError("Giriş başarısız")
+            session_logins_total.inc(company=self.company, result="login")
+
+        handle_popups(page)
+        offer_page = open_new_offer_page(page)
+        if not offer_page:
+            raise QuoteSessionError("Yeni teklif sayfası açılamadı")
+        self.home = page
+        self.offer_page = offer_page
+        self.offer_url = offer_page.url
+
+    def reset(self) -> bool:
+        from sompo_event import LOGIN_URL
+
+        # Teklif sırasında açılan ek sekmeleri kapat
+        for page in list(self.context.pages):
+            if page is not self.home and page is not self.offer_page:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+        if self.offer_page is None or self.offer_page.is_closed():
+            return False
+        self.offer_page.goto(self.offer_url, wait_until="domcontentloaded")
+        if LOGIN_URL in self.offer_page.url:
+            return False
+        self.offer_page.wait_for_selector("#txtIdentityOrTaxNo", state="visible", timeout=15000)
+        return True
+
+    def _quote(self, branch: str, data: Dict[str, Any]) -> StandardOffer:
+        from sompo_event import process_trafik_sigortasi, process_kasko_sigortasi
+        from quote_steps import StepCheckpoint, StepPreempted
+
+        process = process_trafik_sigortasi if branch == "trafik" else process_kasko_sigortasi
+        result, checkpoint = self._run_flow(
+            branch, lambda checkpoint: process(self.offer_page, data, checkpoint=checkpoint),
+            StepCheckpoint, StepPreempted
+        )
+
+        if result and result.get('basarili'):
+            return StandardOffer.from_sompo_result(result, data.get('tckn', ''), data.get('plaka'))
+        error_msg = 'Sonuç alınamadı'
+        if result:
+            error_msg = result.get('hata', 'Teklif alınamadı')
+            if not error_msg or error_msg.strip() == '':
+                error_msg = 'Teklif alınamadı'
+        return self._flow_failed(branch, data, error_msg, checkpoint)
+
+
+class KoruQuoteSession(QuoteSession):
+    """Login sonrası ana sayfa tutulur; her teklif 'Hızlı Trafik/Kasko' ikonundan yeniden başlar"""
+    company = "Koru"
+    branches = ("trafik", "kasko")
+
+    def __init__(self, context, warm: bool = False, credential=None):
+        super().__init__(context, warm, credential)
+        self.scraper = None
+        self.page = None
+        self.home_url: Optional[str] = None
+
+    def open(self):
+        from scrapers_event.koru_scraper import KoruScraper
+
+        scraper = KoruScraper()
+        if self.credential is not None:
+            scraper.username = self.credential.username
+            scraper.password = self.credential.password
+            scraper.totp_secret = self.credential.totp_secret
+        page = self.context.new_page()
+        try:
+            logged_in = scraper.login(page, warm=self.warm)
+        except Exception as e:
+            session_logins_total.inc(company=self.company, result="failed")
+            raise ScraperLoginError(f"Giriş başarısız: {e}") from e
+        session_logins_total.inc(company=self.company, result="login" if logged_in else "reused")
+        self.scraper = scraper
+        self.page = page
+        self.home_url = page.url
+
+    def reset(self) -> bool:
+        if self.page is None or self.page.is_closed():
+            return False
+        self.page.goto(self.home_url, wait_until="domcontentloaded", timeout=self.scraper.timeout_ms)
+        if self.page.locator(self.scraper.sel_username).count():
+            return False
+        self.scraper._close_popups(self.page)
+        self.page.locator("img#img_police_hizli_trafik_sepet").wait_for(state="visible", timeout=15000)
+        return True
+
+    def _quote(self, branch: str, data: Dict[str, Any]) -> StandardOffer:
+        from backend.scrapers import koru_form_data
+        from scrapers_event.koru_scraper import StepCheckpoint, StepPreempted
+
+        create = self.scraper.create_trafik_sigortasi if branch == "trafik" else self.scraper.create_kasko_sigortasi
+        teklif, checkpoint = self._run_flow(
+            branch, lambda checkpoint: create(self.page, koru_form_data(data), checkpoint=checkpoint),
+            StepCheckpoint, StepPreempted
+        )
+        if teklif:
+            return StandardOffer.from_koru_result(
+                {branch: teklif}, data.get('tckn', ''), data.get('plaka'), branch=branch
+            )
+        error_msg = checkpoint.error or f"Koru {branch} teklifi alınamadı"
+        return self._flow_failed(branch, data, error_msg, checkpoint)
+
+
+# Şirket adı -> QuoteSession sınıfı
+QUOTE_SESSIONS = {
+    SompoQuoteSession.company: SompoQuoteSession,
+    KoruQuoteSession.company: KoruQuoteSession,
+}
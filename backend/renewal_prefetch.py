@@ -0,0 +1,184 @@
+"""
+Yenileme ön-çekimi - poliçe bitişi yaklaşan araçlar için portal sakin saatlerinde teklif alma
+
+offers.valid_to önümüzdeki PREFETCH_WINDOW_DAYS gün içinde olan araçlar bulunur ve
+PREFETCH_HOURS aralığında, şirket başına gecelik bütçe ve dakikalık hız sınırıyla scrape_jobs'a
+iş eklenir. Son PREFETCH_FRESH_DAYS gün içinde teklifi olan plakalar atlanır. İşleri fleet
+worker'ları ya da API'deki gömülü worker çalıştırır; acente müşteri dosyasını açtığında güncel
+teklif offers tablosunda hazırdır.
+"""
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+
+from backend.models import (
+    CompanyStatus, Offer, OfferStatus, ScrapeJob, ScrapeJobStatus, InsuranceCompany as DBInsuranceCompany
+)
+from backend.priorities import JobPriority
+from backend.session_keepalive import in_hour_window
+from backend.settings_cache import company_status_map
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+# Bitişine bu kadar gün kalan poliçeler için teklif alınır
+PREFETCH_WINDOW_DAYS = int(os.getenv("PREFETCH_WINDOW_DAYS", "30"))
+# Portalların sakin olduğu saatler (yerel saat, başlangıç-bitiş)
+PREFETCH_HOURS = os.getenv("PREFETCH_HOURS", "01-06")
+# Şirket başına bir gecede eklenecek en fazla iş
+PREFETCH_NIGHTLY_BUDGET = int(os.getenv("PREFETCH_NIGHTLY_BUDGET", "200"))
+# Şirket başına dakikada eklenecek en fazla iş (portal yükü için hız sınırı)
+PREFETCH_RATE_PER_MINUTE = float(os.getenv("PREFETCH_RATE_PER_MINUTE", "2"))
+# Bu kadar gün içinde alınmış teklifi olan plaka/şirket atlanır
+PREFETCH_FRESH_DAYS = int(os.getenv("PREFETCH_FRESH_DAYS", "7"))
+PREFETCH_INTERVAL_SECONDS = int(os.getenv("PREFETCH_INTERVAL_SECONDS", "300"))
+# Boşsa scraper'ı olan tüm şirketler
+PREFETCH_COMPANIES = [c.strip() for c in os.getenv("PREFETCH_COMPANIES", "").split(",") if c.strip()]
+
+PREFETCH_REQUEST_PREFIX = "prefetch:"
+_PLATE_CHUNK = 500
+
+
+def prefetch_request_id(branch: str, plate: str) -> str:
+    """Ön-çekim işlerinin request_id'si: aynı araç için tekrar iş eklenmesini engellemek için sabit"""
+    return f"{PREFETCH_REQUEST_PREFIX}{branch}:{plate}"
+
+
+def _window_start(now: datetime) -> datetime:
+    """İçinde bulunulan (ya da son) ön-çekim penceresinin başlangıcı - gecelik bütçe buradan sayılır"""
+    try:
+        start_hour = int(PREFETCH_HOURS.split("-", 1)[0])
+    except ValueError:
+        start_hour = 0
+    start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    return start if now >= start else start - timedelta(days=1)
+
+
+def _prefetch_companies(session_factory) -> List[str]:
+    from backend.scrapers import SCRAPER_FUNCTIONS
+
+    companies = PREFETCH_COMPANIES or [company.value for company in SCRAPER_FUNCTIONS]
+    statuses = company_status_map(session_factory)
+    return [c for c in companies if statuses.get(c, CompanyStatus.ACTIVE.value) == CompanyStatus.ACTIVE.value]
+
+
+def _expiring_vehicles(db, now: datetime) -> List[Tuple[str, Any, Dict[str, Any]]]:
+    """Poliçesi pencere içinde biten araçlar: (plaka, branş, form verisi), en yakın bitiş önce"""
+    rows = (
+        db.query(Offer.plate, Offer.branch, Offer.request_data)
+        .filter(
+            Offer.status == OfferStatus.COMPLETED,
+            Offer.valid_to >= now,
+            Offer.valid_to < now + timedelta(days=PREFETCH_WINDOW_DAYS),
+            Offer.plate.isnot(None),
+            Offer.request_data.isnot(None)
+        )
+        .order_by(Offer.valid_to, Offer.id.desc())
+        .all()
+    )
+    seen: Set[Tuple[str, Any]] = set()
+    vehicles = []
+    for plate, branch, request_data in rows:
+        if (plate, branch) in seen or not request_data:
+            continue
+        seen.add((plate, branch))
+        vehicles.append((plate, branch, request_data))
+    return vehicles
+
+
+def _fresh_offers(db, plates: List[str], since: datetime) -> Set[Tuple[Any, str, Any]]:
+    """Son teklifleri yeterince yeni olan (şirket, plaka, branş) üçlüleri"""
+    fresh = set()
+    for i in range(0, len(plates), _PLATE_CHUNK):
+        chunk = plates[i:i + _PLATE_CHUNK]
+        fresh.update(
+            db.query(Offer.company, Offer.plate, Offer.branch)
+            .filter(
+                Offer.status == OfferStatus.COMPLETED,
+                Offer.created_at >= since,
+                Offer.plate.in_(chunk)
+            )
+            .distinct()
+            .all()
+        )
+    return fresh
+
+
+def run_renewal_prefetch(session_factory, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Tek ön-çekim turu: şirket başına bu tur için izin verilen kadar iş ekle
+    Tur kotası = min(kalan gecelik bütçe, hız sınırı x tur aralığı). Eklenen iş sayılarını döndürür.
+    """
+    now = now or datetime.now()
+    window_start = _window_start(now)
+    per_cycle = max(1, math.ceil(PREFETCH_RATE_PER_MINUTE * PREFETCH_INTERVAL_SECONDS / 60))
+    companies = _prefetch_companies(session_factory)
+    added: Dict[str, int] = {}
+    if not companies:
+        return added
+
+    db = session_factory()
+    try:
+        prefetch_jobs = db.query(ScrapeJob.request_id, ScrapeJob.company, ScrapeJob.status, ScrapeJob.created_at).filter(
+            ScrapeJob.request_id.like(f"{PREFETCH_REQUEST_PREFIX}%"),
+            or_(
+                ScrapeJob.status.in_([ScrapeJobStatus.QUEUED, ScrapeJobStatus.LEASED]),
+                ScrapeJob.created_at >= window_start
+            )
+        ).all()
+        # Bu gece eklenmiş ya da hâlâ bekleyen işler tekrar eklenmez
+        existing = {(request_id, company) for request_id, company, _, _ in prefetch_jobs}
+        used_tonight: Dict[Any, int] = {}
+        for _, company, _, created_at in prefetch_jobs:
+            if created_at and created_at >= window_start:
+                used_tonight[company] = used_tonight.get(company, 0) + 1
+
+        vehicles = _expiring_vehicles(db, now)
+        fresh = _fresh_offers(db, [plate for plate, _, _ in vehicles], now - timedelta(days=PREFETCH_FRESH_DAYS))
+
+        jobs = []
+        for company_name in companies:
+            company = DBInsuranceCompany(company_name)
+            quota = min(per_cycle, PREFETCH_NIGHTLY_BUDGET - used_tonight.get(company, 0))
+            for plate, branch, request_data in vehicles:
+                if quota <= 0:
+                    break
+                request_id = prefetch_request_id(branch.value, plate)
+                if (company, plate, branch) in fresh or (request_id, company) in existing:
+                    continue
+                jobs.append(ScrapeJob(
+                    request_id=request_id,
+                    company=company,
+                    branch=branch,
+                    payload=request_data,
+                    status=ScrapeJobStatus.QUEUED,
+                    attempts=0,
+                    priority=int(JobPriority.BATCH)
+                ))
+                quota -= 1
+                added[company_name] = added.get(company_name, 0) + 1
+        if jobs:
+            db.add_all(jobs)
+            db.commit()
+        return added
+    finally:
+        db.close()
+
+
+async def renewal_prefetch_loop(session_factory, interval_seconds: int = PREFETCH_INTERVAL_SECONDS) -> None:
+    """Arka plan görevi: ön-çekim saatlerinde periyodik olarak iş ekle"""
+    loop = asyncio.get_event_loop()
+    while True:
+        if in_hour_window(PREFETCH_HOURS, default=False):
+            try:
+                added = await loop.run_in_executor(None, run_renewal_prefetch, session_factory)
+                if added:
+                    logger.info(f"🌙 Yenileme ön-çekimi: {added} iş eklendi")
+            except Exception as e:
+                logger.error(f"❌ Yenileme ön-çekimi hatası: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
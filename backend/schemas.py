@@ -1,11 +1,16 @@
 """
 Pydantic v2 Schemas for request/response validation
 """
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime, date
 from enum import Enum
 
+from backend.error_taxonomy import ErrorCategory, classify_error
+from backend.validation import (
+    normalize_birth_date, normalize_request_data, parse_plate, parse_ruhsat, split_vehicle_fields, validate_tckn
+)
+
 
 class InsuranceBranch(str, Enum):
     """Sigorta branşı"""
@@ -50,37 +55,54 @@ class BaseInsuranceRequest(BaseModel):
     @field_validator('tckn')
     @classmethod
     def validate_tckn(cls, v: str) -> str:
-        """TCKN validasyonu"""
-        if not v.isdigit():
-            raise ValueError("TCKN sadece rakamlardan oluşmalıdır")
-        if len(v) != 11:
-            raise ValueError("TCKN 11 haneli olmalıdır")
-        return v
+        """TCKN validasyonu (kontrol basamakları dahil)"""
+        return validate_tckn(v)
 
+    @field_validator('dogum_tarihi')
+    @classmethod
+    def validate_dogum_tarihi(cls, v: Optional[str]) -> Optional[str]:
+        """Doğum tarihi GG/AA/YYYY biçimine çevrilir"""
+        return normalize_birth_date(v)
 
-class TrafikSigortasiRequest(BaseInsuranceRequest):
-    """Trafik sigortası teklif isteği"""
+
+class VehicleInsuranceRequest(BaseInsuranceRequest):
+    """Araç branşları (trafik/kasko) için ortak alanlar ve doğrulama"""
     plaka: str = Field(..., description="Araç plakası (örn: 34ABC123)")
     ruhsat_seri_no: str = Field(..., description="Ruhsat seri numarası (örn: FC993016)")
     arac_marka: str = Field(..., description="Araç markası")
     arac_modeli: Optional[str] = Field(None, description="Araç modeli")
+    # Doğrulamadan sonra doldurulur; scraper'lar plakayı/ruhsatı tekrar parçalamaz
+    plaka_il: Optional[str] = Field(None, description="Plaka il kodu (otomatik)")
+    plaka_harf: Optional[str] = Field(None, description="Plaka harfleri (otomatik)")
+    plaka_numara: Optional[str] = Field(None, description="Plaka numarası (otomatik)")
+    ruhsat_seri: Optional[str] = Field(None, description="Ruhsat belge serisi (otomatik)")
+    ruhsat_no: Optional[str] = Field(None, description="Ruhsat belge numarası (otomatik)")
 
     @field_validator('plaka')
     @classmethod
     def validate_plaka(cls, v: str) -> str:
-        """Plaka validasyonu"""
-        v = v.upper().strip()
-        if len(v) < 5:
-            raise ValueError("Geçersiz plaka formatı")
-        return v
+        """Plaka validasyonu: il kodu 01-81, 1-3 harf, harf sayısına uygun numara"""
+        return parse_plate(v).compact
+
+    @field_validator('ruhsat_seri_no')
+    @classmethod
+    def validate_ruhsat_seri_no(cls, v: str) -> str:
+        """Ruhsat seri no validasyonu: 2 harf + 6 rakam"""
+        return "".join(parse_ruhsat(v))
+
+    @model_validator(mode="after")
+    def _split_vehicle_fields(self):
+        for key, value in split_vehicle_fields(self.plaka, self.ruhsat_seri_no).items():
+            setattr(self, key, value)
+        return self
+
+
+class TrafikSigortasiRequest(VehicleInsuranceRequest):
+    """Trafik sigortası teklif isteği"""
 
 
-class KaskoSigortasiRequest(BaseInsuranceRequest):
+class KaskoSigortasiRequest(VehicleInsuranceRequest):
     """Kasko sigortası teklif isteği"""
-    plaka: str = Field(..., description="Araç plakası")
-    ruhsat_seri_no: str = Field(..., description="Ruhsat seri numarası")
-    arac_marka: str = Field(..., description="Araç markası")
-    arac_modeli: Optional[str] = Field(None, description="Araç modeli")
     meslek: Optional[str] = Field(None, description="Meslek bilgisi")
 
 
@@ -105,6 +127,62 @@ class ScrapeRequest(BaseModel):
             raise ValueError("Şirket listesi boş olamaz")
         return v
 
+    @field_validator('data')
+    @classmethod
+    def validate_data(cls, v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Genel veri: mevcut TCKN/plaka/ruhsat/doğum tarihi alanları doğrulanır"""
+        return normalize_request_data(v) if v is not None else v
+
+
+class MultiBranchScrapeRequest(BaseModel):
+    """Aynı müşteri için birden fazla branş - şirket başına tek giriş, branşlar paralel sekmelerde"""
+    branches: List[InsuranceBranch] = Field(..., description="Teklif alınacak branşlar")
+    companies: Optional[List[InsuranceCompany]] = Field(
+        None,
+        description="Hangi şirketlerden teklif alınacak (boşsa tümü)"
+    )
+    trafik_data: Optional[TrafikSigortasiRequest] = None
+    kasko_data: Optional[KaskoSigortasiRequest] = None
+    # Diğer branşlar için branş -> data
+    data: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @field_validator('branches')
+    @classmethod
+    def validate_branches(cls, v: List[InsuranceBranch]) -> List[InsuranceBranch]:
+        """Branş listesi validasyonu (tekrarlar atılır)"""
+        if not v:
+            raise ValueError("Branş listesi boş olamaz")
+        return list(dict.fromkeys(v))
+
+    @field_validator('data')
+    @classmethod
+    def validate_data(cls, v: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Branş verileri: mevcut TCKN/plaka/ruhsat/doğum tarihi alanları doğrulanır"""
+        if v is None:
+            return v
+        return {branch: normalize_request_data(data or {}) for branch, data in v.items()}
+
+    @field_validator('companies')
+    @classmethod
+    def validate_companies(cls, v: Optional[List[InsuranceCompany]]) -> Optional[List[InsuranceCompany]]:
+        """Şirket listesi validasyonu"""
+        if v is not None and len(v) == 0:
+            raise ValueError("Şirket listesi boş olamaz")
+        return v
+
+    def branch_data(self) -> Dict[str, Dict[str, Any]]:
+        """Branş -> scraper verisi (aynı müşteri/araç: trafik ve kasko birbirinin verisini kullanabilir)"""
+        vehicle = self.trafik_data or self.kasko_data
+        result = {}
+        for branch in self.branches:
+            if branch == InsuranceBranch.TRAFIK and vehicle:
+                result[branch.value] = (self.trafik_data or vehicle).dict()
+            elif branch == InsuranceBranch.KASKO and vehicle:
+                result[branch.value] = (self.kasko_data or vehicle).dict()
+            else:
+                result[branch.value] = (self.data or {}).get(branch.value, {})
+        return result
+
 
 # ============================================
 # RESPONSE SCHEMAS
@@ -176,6 +254,14 @@ class StandardOffer(BaseModel):
     raw_data: Optional[Dict[str, Any]] = None
     status: str = "completed"
     error: Optional[str] = None
+    # Başarısız sonuçlarda hata kategorisi; verilmezse hata mesajından çıkarılır
+    error_category: Optional[ErrorCategory] = None
+
+    @model_validator(mode="after")
+    def _classify_error(self):
+        if self.status == "failed" and self.error_category is None:
+            self.error_category = classify_error(self.error)
+        return self
 
     @classmethod
     def from_sompo_result(cls, result: Dict[str, Any], tckn: str, plate: Optional[str] = None) -> "StandardOffer":
@@ -213,13 +299,14 @@ class StandardOffer(BaseModel):
         )
 
     @classmethod
-    def from_koru_result(cls, result: Dict[str, Any], tckn: str, plate: Optional[str] = None) -> "StandardOffer":
+    def from_koru_result(cls, result: Dict[str, Any], tckn: str, plate: Optional[str] = None,
+                         branch: str = "trafik") -> "StandardOffer":
         """Koru scraper çıktısını standart formata çevir"""
-        trafik_data = result.get('trafik') or result
+        trafik_data = result.get(branch) or result
         if not trafik_data:
             return cls(
                 company="Koru",
-                branch="trafik",
+                branch=branch,
                 tckn=tckn,
                 plate=plate,
                 status="failed",
@@ -237,7 +324,7 @@ class StandardOffer(BaseModel):
         
         return cls(
             company="Koru",
-            branch="trafik",
+            branch=branch,
             tckn=tckn,
             plate=plate,
             price=price,
@@ -0,0 +1,455 @@
+"""
+Thread-affine Playwright worker'ları
+
+Playwright sync API thread-safe değildir: bir driver/browser sadece onu başlatan thread'den
+kullanılabilir. Her PlaywrightWorker uzun ömürlü bir thread'dir, kendi sync_playwright
+driver'ını ve browser'ını bir kez başlatır ve kendi kuyruğundan iş çeker. Sonuçlar asyncio
+future'ları üzerinden event loop'a geri verilir.
+
+Session affinity: worker'lar şirket/hesap bazında giriş yapılmış context'leri açık tutar.
+Yeni iş önce o oturumu tutan worker'a yönlendirilir; o worker doluysa en az yüklü worker'a gider.
+Worker kuyrukları önceliklidir (backend.priorities): canlı teklifler toplu işlerin önüne geçer.
+Her oturumda bir QuoteSession tutulur: teklif formu her işten sonra sıfırlanır ve sıradaki teklif
+login/menü gezintisi olmadan aynı sayfada alınır. Boştaki worker açık oturumları keep-alive ile canlı tutar ve storage_state'lerini diske yazar;
+yeni başlayan worker o dosyadan girişli context açabilir.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.metrics import registry
+from backend.priorities import (
+    PRIORITY_PREEMPT_BATCH, JobPriority, PriorityJobQueue, set_preemption_check
+)
+from backend.session_keepalive import (
+    SESSION_KEEPALIVE_ENABLED, SESSION_KEEPALIVE_SECONDS, company_of, session_keepalive_total,
+    session_state_path, touch_session
+)
+
+logger = logging.getLogger(__name__)
+
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", os.getenv("MAX_WORKERS", "5")))
+# Bellek sızıntılarını sınırlamak için browser bu kadar işten sonra yeniden başlatılır
+BROWSER_MAX_JOBS = int(os.getenv("BROWSER_MAX_JOBS", "50"))
+HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+# Kullanılmayan oturum context'i bu süreden sonra kapatılır (portal tarafı keep-alive ile canlı tutulur)
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+# Oturumu tutan worker'da bu kadar iş (çalışan + bekleyen) varsa doygun sayılır
+SESSION_AFFINITY_MAX_QUEUE = int(os.getenv("SESSION_AFFINITY_MAX_QUEUE", "1"))
+
+session_routing_total = registry.counter(
+    "scraper_session_routing_total",
+    "İşin oturum tutan worker'a yönlendirilme sonucu (hit, miss, saturated)",
+    ("session", "result")
+)
+session_reuse_total = registry.counter(
+    "scraper_session_reuse_total",
+    "Worker'daki açık oturumun yeniden kullanımı (hit), diskteki durumdan açılması (restored) ya da yeni giriş (miss)",
+    ("session", "result")
+)
+pool_capacity = registry.gauge(
+    "scraper_pool_capacity",
+    "Eşzamanlı scraper slotu (thread worker, child process, browser context ya da fleet kapasitesi)",
+    ("pool",)
+)
+pool_busy = registry.gauge("scraper_pool_busy", "Meşgul scraper slotu", ("pool",))
+pool_utilization = registry.gauge("scraper_pool_utilization", "Meşgul slot oranı (0-1)", ("pool",))
+pool_queue_depth = registry.gauge("scraper_pool_queue_depth", "Slot bekleyen işler", ("pool",))
+pool_open_sessions = registry.gauge(
+    "scraper_pool_open_sessions", "Worker'larda açık tutulan giriş yapılmış oturumlar", ("pool",)
+)
+
+
+def record_pool_usage(pool: str, capacity: int, busy: int, queue_depth: int) -> None:
+    """Pool doluluk göstergelerini güncelle (/metrics collector'larından çağrılır)"""
+    pool_capacity.set(capacity, pool=pool)
+    pool_busy.set(busy, pool=pool)
+    pool_utilization.set(round(busy / capacity, 4) if capacity else 0.0, pool=pool)
+    pool_queue_depth.set(queue_depth, pool=pool)
+
+
+def session_key(company: str, account: Optional[str] = None) -> str:
+    """Oturum anahtarı: şirket (ve varsa hesap)"""
+    return f"{company}:{account}" if account else company
+
+
+class _Job:
+    """Kuyruktaki tek bir iş"""
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict,
+                 loop: asyncio.AbstractEventLoop, future: asyncio.Future, priority: int = JobPriority.NORMAL):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.loop = loop
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        # Worker işi aldı mı / iş worker'da bitti mi (bekleyen iptal edilse bile)
+        self.started = False
+        self.finished = asyncio.Event()
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+    """Event loop thread'inde future'ı tamamla (iptal edilmişse dokunma)"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class PlaywrightWorker(threading.Thread):
+    """
+    Kendi Playwright driver'ı ve browser'ı olan worker thread
+    Scraper fonksiyonlarına worker=self olarak verilir; fonksiyonlar self.browser'ı ya da
+    self.session_context(...) ile açık oturum context'ini kullanır
+    """
+
+    def __init__(self, index: int):
+        super().__init__(name=f"playwright-worker-{index}", daemon=True)
+        self.index = index
+        self.jobs = PriorityJobQueue()
+        self.playwright = None
+        self.browser = None
+        self.jobs_on_browser = 0
+        self.busy = False
+        # Çalışan işin önceliği (boştayken None)
+        self.current_priority: Optional[int] = None
+        # Çalışan iş kesilme kontrolünü aldı mı (adımlı akışta); almayan toplu iş sonuna kadar sürer
+        self.preemption_registered = False
+        self.jobs_done = 0
+        # Oturum anahtarı -> (context, son kullanım zamanı); sadece bu thread'den erişilir
+        self.sessions: Dict[str, Tuple[Any, float]] = {}
+        # Yönlendirme için diğer thread'lerden okunur (sadece anahtarlar)
+        self.warm_sessions: Dict[str, float] = {}
+        # Oturum anahtarı -> son keep-alive zamanı
+        self.touched_at: Dict[str, float] = {}
+        # Oturum anahtarı -> QuoteSession (giriş yapılmış, teklif formu açık sayfalar)
+        self.quote_sessions: Dict[str, Any] = {}
+
+    def load(self, priority: Optional[int] = None) -> int:
+        """
+        Çalışan + bekleyen iş sayısı
+        priority verilirse o öncelikteki yeni işin önünde kalacak işler (kesilme kontrolünü almış
+        toplu iş sayılmaz)
+        """
+        if priority is None:
+            return self.jobs.qsize() + (1 if self.busy else 0)
+        running = 1 if self.busy and not self._preemptible_by(priority) else 0
+        return self.jobs.count_ahead(priority) + running
+
+    def _preemptible_by(self, priority: int) -> bool:
+        return priority == JobPriority.INTERACTIVE and self.preemption_registered
+
+    def _register_preemption(self) -> None:
+        self.preemption_registered = True
+
+    def should_yield(self) -> bool:
+        """Çalışan toplu iş, bekleyen canlı iş için adım sınırında bırakılmalı mı"""
+        return self.jobs.has_waiting(JobPriority.INTERACTIVE)
+
+    def _yield_check(self, job: _Job, preemptible: bool) -> Callable[[], bool]:
+        """
+        Adım sınırında bırakma kontrolü: bekleyen vazgeçtiyse (örn. hedge'i kaybeden deneme) ya da
+        kesilebilir toplu iş bekleyen canlı işe yol vermeliyse True
+        """
+        return lambda: job.future.cancelled() or (preemptible and self.should_yield())
+
+    def holds_session(self, key: str) -> bool:
+        last_used = self.warm_sessions.get(key)
+        return last_used is not None and time.monotonic() - last_used < SESSION_IDLE_SECONDS
+
+    def holds_company_session(self, company: str) -> bool:
+        """Şirketin herhangi bir hesabıyla açık oturum var mı (anahtarlar şirket:hesap)"""
+        return any(self.holds_session(key) for key in list(self.warm_sessions) if company_of(key) == company)
+
+    def session_context(self, key: str):
+        """
+        Oturum context'ini döndür: (context, warm)
+        warm=True ise context daha önce giriş yapmıştır; scraper girişi atlayabilir
+        """
+        entry = self.sessions.get(key)
+        if entry is not None:
+            session_reuse_total.inc(session=key, result="hit")
+            return entry[0], True
+        state_path = session_state_path(key)
+        if os.path.exists(state_path) and time.time() - os.path.getmtime(state_path) < SESSION_IDLE_SECONDS:
+            # Başka bir worker'ın (ya da önceki çalışmanın) kaydettiği oturum; scraper geçerliliğini doğrular
+            session_reuse_total.inc(session=key, result="restored")
+            context = self.browser.new_context(storage_state=state_path)
+            warm = True
+        else:
+            session_reuse_total.inc(session=key, result="miss")
+            context = self.browser.new_context()
+            warm = False
+        now = time.monotonic()
+        self.sessions[key] = (context, now)
+        self.touched_at[key] = now
+        return context, warm
+
+    def quote_session(self, key: str, factory: Callable[[Any, bool], Any]):
+        """
+        Oturumun QuoteSession'ını döndür; yoksa factory(context, warm) ile oluştur
+        Context değiştiyse (oturum kapanıp yeniden açıldıysa) yeni QuoteSession oluşturulur
+        """
+        context, warm = self.session_context(key)
+        quote_session = self.quote_sessions.get(key)
+        if quote_session is None or quote_session.context is not context:
+            quote_session = factory(context, warm)
+            self.quote_sessions[key] = quote_session
+        return quote_session
+
+    def _reset_quote_sessions(self):
+        """Sonuç verildikten sonra kirli teklif formlarını sıradaki iş için hazırla"""
+        for key, quote_session in list(self.quote_sessions.items()):
+            if not quote_session.dirty or key not in self.sessions:
+                continue
+            try:
+                quote_session.prepare()
+            except Exception as e:
+                # Sıradaki iş oturumu baştan açar
+                logger.warning(f"[{self.name}] Teklif formu hazırlanamadı ({key}): {e}")
+                quote_session.close()
+
+    def release_session(self, key: str, valid: bool = True):
+        """İş bitince çağrılır; oturum geçersizse context kapatılır"""
+        entry = self.sessions.get(key)
+        if entry is None:
+            return
+        if valid:
+            now = time.monotonic()
+            self.sessions[key] = (entry[0], now)
+            self.warm_sessions[key] = now
+            self.touched_at[key] = now
+            self._save_session_state(key, entry[0])
+        else:
+            self._drop_session(key)
+            self._remove_session_state(key)
+
+    def _save_session_state(self, key: str, context):
+        path = session_state_path(key)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            context.storage_state(path=path)
+        except Exception as e:
+            logger.debug(f"[{self.name}] Oturum durumu kaydedilemedi ({key}): {e}")
+
+    def _remove_session_state(self, key: str):
+        try:
+            os.remove(session_state_path(key))
+        except OSError:
+            pass
+
+    def _drop_session(self, key: str):
+        entry = self.sessions.pop(key, None)
+        self.warm_sessions.pop(key, None)
+        self.touched_at.pop(key, None)
+        self.quote_sessions.pop(key, None)
+        if entry is not None:
+            try:
+                entry[0].close()
+            except Exception:
+                pass
+
+    def _expire_sessions(self):
+        now = time.monotonic()
+        for key, (_, last_used) in list(self.sessions.items()):
+            if now - last_used >= SESSION_IDLE_SECONDS:
+                self._drop_session(key)
+
+    def _keepalive_sessions(self):
+        """Boşta çağrılır: son keep-alive'dan bu yana SESSION_KEEPALIVE_SECONDS geçen oturumları yokla"""
+        if not SESSION_KEEPALIVE_ENABLED:
+            return
+        now = time.monotonic()
+        for key in list(self.sessions):
+            if now - self.touched_at.get(key, 0) < SESSION_KEEPALIVE_SECONDS:
+                continue
+            context = self.sessions[key][0]
+            try:
+                alive = touch_session(context, company_of(key), state_path=session_state_path(key))
+            except Exception as e:
+                session_keepalive_total.inc(session=key, result="error")
+                logger.warning(f"[{self.name}] Keep-alive hatası ({key}): {e}")
+                self._drop_session(key)
+                continue
+            if alive is None:
+                continue
+            if alive:
+                session_keepalive_total.inc(session=key, result="ok")
+                self.touched_at[key] = time.monotonic()
+            else:
+                session_keepalive_total.inc(session=key, result="expired")
+                logger.info(f"[{self.name}] Oturum düşmüş, kapatılıyor: {key}")
+                self._drop_session(key)
+                self._remove_session_state(key)
+
+    def _ensure_browser(self):
+        """Browser yoksa, kopmuşsa ya da iş limiti dolduysa yeniden başlat"""
+        if self.browser is not None and (not self.browser.is_connected() or self.jobs_on_browser >= BROWSER_MAX_JOBS):
+            self._close_browser()
+        if self.browser is None:
+            self.browser = self.playwright.chromium.launch(headless=HEADLESS)
+            self.jobs_on_browser = 0
+            logger.info(f"[{self.name}] Browser başlatıldı")
+
+    def _close_browser(self):
+        for key in list(self.sessions):
+            self._drop_session(key)
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+
+    def run(self):
+        start_error = None
+        try:
+            from playwright.sync_api import sync_playwright
+            self.playwright = sync_playwright().start()
+            logger.info(f"[{self.name}] Playwright driver başlatıldı")
+        except Exception as e:
+            # Driver başlatılamazsa işleri askıda bırakma, hatayla tamamla
+            logger.error(f"[{self.name}] Playwright başlatılamadı: {e}")
+            start_error = e
+        try:
+            while True:
+                try:
+                    job = self.jobs.get(timeout=min(60.0, SESSION_KEEPALIVE_SECONDS))
+                except queue.Empty:
+                    self._expire_sessions()
+                    self._keepalive_sessions()
+                    continue
+                if job is None:
+                    break
+                # Önce başladı işaretlenir: iptal eden taraf ya bunu görüp bitişi bekler ya da iş burada atlanır
+                job.started = True
+                if job.future.cancelled():
+                    job.loop.call_soon_threadsafe(job.finished.set)
+                    continue
+                self.busy = True
+                self.current_priority = job.priority
+                # Toplu işler quote akışında adım sınırlarında bekleyen canlı işe yol verebilir; bekleyeni
+                # vazgeçen iş (hedge'i kaybeden deneme) de sıradaki adım sınırında durur
+                preemptible = PRIORITY_PREEMPT_BATCH and job.priority == JobPriority.BATCH
+                set_preemption_check(self._yield_check(job, preemptible),
+                                     self._register_preemption if preemptible else None)
+                result, error = None, None
+                try:
+                    if start_error is not None:
+                        raise start_error
+                    self._expire_sessions()
+                    self._ensure_browser()
+                    result = job.fn(*job.args, worker=self, **job.kwargs)
+                except BaseException as e:
+                    error = e
+                finally:
+                    set_preemption_check(None)
+                # Sonuç verilmeden önce boşa çık ki sıradaki iş bu worker'a yönlendirilebilsin
+                self.busy = False
+                self.current_priority = None
+                self.preemption_registered = False
+                self.jobs_on_browser += 1
+                self.jobs_done += 1
+                job.loop.call_soon_threadsafe(_resolve, job.future, result, error)
+                job.loop.call_soon_threadsafe(job.finished.set)
+                if start_error is None and self.jobs.empty():
+                    self._reset_quote_sessions()
+        finally:
+            self._close_browser()
+            if self.playwright is not None:
+                try:
+                    self.playwright.stop()
+                except Exception:
+                    pass
+            logger.info(f"[{self.name}] Durduruldu")
+
+
+class ScraperWorkerPool:
+    """Sabit sayıda PlaywrightWorker; işler oturum affinity'sine göre worker kuyruklarına dağıtılır"""
+
+    def __init__(self, size: int = SCRAPER_WORKERS):
+        self.size = size
+        self.workers: List[PlaywrightWorker] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.workers:
+                return
+            for i in range(self.size):
+                worker = PlaywrightWorker(i)
+                worker.start()
+                self.workers.append(worker)
+            logger.info(f"✅ {self.size} Playwright worker başlatıldı")
+
+    def stop(self):
+        with self._lock:
+            for worker in self.workers:
+                worker.jobs.put(None)
+            self.workers = []
+
+    def queue_depth(self) -> int:
+        return sum(w.jobs.qsize() for w in self.workers)
+
+    def busy_workers(self) -> int:
+        return sum(1 for w in self.workers if w.busy)
+
+    def collect_metrics(self) -> None:
+        workers = list(self.workers)
+        record_pool_usage("threads", len(workers), sum(1 for w in workers if w.busy),
+                          sum(w.jobs.qsize() for w in workers))
+        pool_open_sessions.set(sum(len(w.warm_sessions) for w in workers), pool="threads")
+
+    def _route(self, affinity: Optional[str], priority: int = JobPriority.NORMAL) -> PlaywrightWorker:
+        """
+        Oturumu tutan worker doygun değilse onu, değilse en az yüklü worker'ı seç
+        Yük, işin önceliğine göre önünde kalacak işlerle ölçülür
+        """
+        least_loaded = min(self.workers, key=lambda w: (w.load(priority), w.load()))
+        if affinity is None:
+            return least_loaded
+        holders = [w for w in self.workers if w.holds_session(affinity)]
+        if not holders:
+            session_routing_total.inc(session=affinity, result="miss")
+            return least_loaded
+        holder = min(holders, key=lambda w: (w.load(priority), w.load()))
+        if holder.load(priority) < SESSION_AFFINITY_MAX_QUEUE:
+            session_routing_total.inc(session=affinity, result="hit")
+            return holder
+        session_routing_total.inc(session=affinity, result="saturated")
+        return least_loaded
+
+    async def submit(self, fn: Callable, *args, affinity: Optional[str] = None,
+                     priority: int = JobPriority.NORMAL, **kwargs) -> Any:
+        """
+        fn(*args, worker=<PlaywrightWorker>, **kwargs) çağrısını bir worker thread'inde çalıştır
+        ve sonucunu bekle. affinity verilirse (session_key) o oturumu tutan worker tercih edilir.
+        priority (JobPriority) worker kuyruğundaki sırayı belirler.
+        """
+        if not self.workers:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(fn, args, kwargs, loop, future, priority)
+        with self._lock:
+            worker = self._route(affinity, priority)
+            worker.jobs.put(job, priority)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # İş adım sınırında durur; bitene kadar beklenir ki çağıranın hesap kirası iş sürerken bırakılmasın
+            if job.started:
+                await job.finished.wait()
+            raise
+
+
+# Uygulama genelinde tek pool (ilk kullanımda ya da startup'ta başlatılır)
+scraper_pool = ScraperWorkerPool()
@@ -0,0 +1,337 @@
+"""
+Scraper runner'ları - her sigorta şirketi için scraper'ı çalıştırıp StandardOffer döndürür
+
+API uygulamasından bağımsızdır; thread worker'ları ve ayrı process'ler tarafından da import edilir.
+"""
+import asyncio
+import logging
+import os
+import sys
+from typing import Any, Dict, Optional
+
+from backend.schemas import InsuranceCompany, StandardOffer
+from backend.scraper_workers import session_key
+from backend.priorities import JobPreempted
+from backend.validation import vehicle_fields
+
+logger = logging.getLogger(__name__)
+
+
+class ScraperLoginError(Exception):
+    """
+    Portala giriş yapılamadı - açık oturum geçersiz sayılır, hesabın giriş hatası sayacı artar
+    Runner'lar bu hatayı StandardOffer'a çevirmeden yukarı iletir
+    """
+
+
+def _sompo_failed(branch: str, data: Dict[str, Any], error: str) -> StandardOffer:
+    return StandardOffer(
+        company="Sompo",
+        branch=branch,
+        tckn=data.get('tckn', ''),
+        plate=data.get('plaka'),
+        status="failed",
+        error=error
+    )
+
+
+def _sompo_session_alive(page) -> bool:
+    """Açık oturumda dashboard'a git; login'e yönlendirilirse oturum düşmüştür"""
+    from sompo_event import DASHBOARD_URL
+    try:
+        page.goto(DASHBOARD_URL, wait_until="domcontentloaded")
+        return "login" not in page.url.lower()
+    except Exception:
+        return False
+
+
+def _run_sompo_flow(context, branch: str, data: Dict[str, Any], warm: bool = False,
+                    credential=None) -> StandardOffer:
+    """
+    Verilen browser context'i içinde tek seferlik Sompo login + teklif akışını çalıştır
+    warm=True ise context daha önce giriş yapmıştır; oturum hâlâ geçerliyse login atlanır
+    credential verilmezse .env'deki varsayılan hesap kullanılır
+    """
+    from backend.quote_sessions import SompoQuoteSession
+    return SompoQuoteSession(context, warm=warm, credential=credential).quote(branch, data)
+
+
+def _worker_quote_session(worker, company: str, credential=None):
+    """Worker'daki şirket/hesap oturumunun (anahtar, QuoteSession) ikilisi"""
+    from backend.quote_sessions import QUOTE_SESSIONS
+
+    key = session_key(company, credential.account if credential else None)
+    session_cls = QUOTE_SESSIONS[company]
+    return key, worker.quote_session(
+        key, lambda context, warm: session_cls(context, warm=warm, credential=credential)
+    )
+
+
+def _run_quote_session(worker, company: str, branch: str, data: Dict[str, Any],
+                       credential=None) -> StandardOffer:
+    """Worker'ın şirket/hesap oturumundaki QuoteSession ile teklif al; hata olursa oturum kapatılır"""
+    key, quote_session = _worker_quote_session(worker, company, credential)
+    valid = False
+    try:
+        result = quote_session.quote(branch, data)
+        valid = True
+        return result
+    except JobPreempted:
+        # Oturum sağlam: form kirli işaretli, sıradaki iş sıfırlayıp kullanır
+        valid = True
+        raise
+    finally:
+        worker.release_session(key, valid=valid)
+
+
+def open_quote_session(company: str, worker=None, credential=None) -> bool:
+    """
+    Worker'da şirket/hesap oturumunu aç (login + teklif formu), teklif almadan bırak
+    Oturumun storage_state'i diske yazılır; aynı anda başka worker'lara düşen işler tekrar giriş yapmaz
+    """
+    key, quote_session = _worker_quote_session(worker, company, credential)
+    valid = False
+    try:
+        quote_session.prepare()
+        valid = True
+        return True
+    finally:
+        worker.release_session(key, valid=valid)
+
+
+def koru_form_data(data: Dict[str, Any]) -> Dict[str, str]:
+    """Standart istek verisini Koru form alanlarına çevir"""
+    vehicle = vehicle_fields(data)
+    return {
+        "tc": data.get('tckn', ''),
+        "dogum_tarihi": (data.get('dogum_tarihi') or '').replace('/', '.'),  # GG/AA/YYYY -> GG.AA.YYYY
+        "plaka_il": vehicle['plaka_il'],
+        "plaka_no": vehicle['plaka_harf'] + vehicle['plaka_numara'],
+        "tescil_kod": vehicle['ruhsat_seri'],
+        "tescil_no": vehicle['ruhsat_no']
+    }
+
+
+def run_sompo_scraper(branch: str, data: Dict[str, Any], request_id: str, worker=None,
+                      credential=None) -> Optional[StandardOffer]:
+    """
+    Sompo scraper'ı çalıştır
+    worker verilirse (PlaywrightWorker) onun browser'ı kullanılır, sadece yeni context açılır
+    credential verilirse (credential_pool) o hesapla giriş yapılır, oturum hesap başına tutulur
+    """
+    # Windows için asyncio event loop policy ayarla
+    # ProactorEventLoop subprocess desteği için gerekli
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    
+    try:
+        logger.info(f"[Sompo] Scraper başlatılıyor - branch: {branch}")
+        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scrapers_event'))
+        from sompo_event import sync_playwright
+
+        if worker is not None and hasattr(worker, "quote_session"):
+            # Worker'daki açık Sompo oturumunda art arda teklif; form bir sonraki teklif için sıfırlanır
+            return _run_quote_session(worker, InsuranceCompany.SOMPO.value, branch, data, credential)
+
+        if worker is not None:
+            context = worker.browser.new_context()
+            try:
+                return _run_sompo_flow(context, branch, data, credential=credential)
+            finally:
+                context.close()
+        
+        logger.info(f"[Sompo] Playwright başlatılıyor...")
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=os.getenv("HEADLESS", "false").lower() == "true")
+            try:
+                return _run_sompo_flow(browser.new_context(), branch, data, credential=credential)
+            finally:
+                browser.close()
+            
+    except (ScraperLoginError, JobPreempted):
+        raise
+    except Exception as e:
+        logger.error(f"Sompo scraper hatası: {e}", exc_info=True)
+        error_detail = str(e)
+        if not error_detail or error_detail.strip() == '':
+            error_detail = f"Sompo scraper exception: {type(e).__name__}"
+        return _sompo_failed(branch, data, error_detail)
+
+
+def run_koru_scraper(branch: str, data: Dict[str, Any], request_id: str, worker=None,
+                     credential=None) -> Optional[StandardOffer]:
+    """Koru scraper'ı çalıştır (worker verilirse onun browser'ı, credential verilirse o hesap kullanılır)"""
+    import sys
+    
+    # Windows için asyncio event loop policy ayarla
+    # ProactorEventLoop subprocess desteği için gerekli
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    
+    # Event loop oluşturma - Playwright kendi loop'unu oluşturacak
+    # Sadece policy ayarlıyoruz
+    
+    try:
+        logger.info(f"[Koru] Scraper başlatılıyor - branch: {branch}")
+        if worker is not None and hasattr(worker, "quote_session"):
+            # Worker'daki açık Koru oturumunda art arda teklif
+            return _run_quote_session(worker, InsuranceCompany.KORU.value, branch, data, credential)
+
+        from scrapers_event.koru_scraper import KoruScraper, KoruLoginError
+        from scrapers_event.app.config import settings
+        
+        logger.info(f"[Koru] KoruScraper instance oluşturuluyor...")
+        scraper = KoruScraper()
+        if credential is not None:
+            scraper.username = credential.username
+            scraper.password = credential.password
+            scraper.totp_secret = credential.totp_secret
+        logger.info(f"[Koru] KoruScraper instance oluşturuldu")
+        
+        # Koru için data formatını dönüştür
+        koru_data = koru_form_data(data)
+        
+        # Scraper'ı çalıştır (thread pool içinde)
+        logger.info(f"[Koru] Scraper çalıştırılıyor - branch: {branch}, data: {koru_data}")
+        if branch not in ("trafik", "kasko"):
+            return StandardOffer(
+                company="Koru",
+                branch=branch,
+                tckn=data.get('tckn', ''),
+                plate=data.get('plaka'),
+                status="failed",
+                error=f"Desteklenmeyen branş: {branch}"
+            )
+        try:
+            if branch == "trafik":
+                result = scraper.run_trafik_with_data(koru_data, browser=worker.browser if worker else None)
+                logger.info(f"[Koru] run_trafik_with_data sonucu: {result}")
+            else:
+                result = scraper.run_kasko_with_data(koru_data, browser=worker.browser if worker else None)
+                logger.info(f"[Koru] run_kasko_with_data sonucu: {result}")
+        except KoruLoginError as e:
+            # Giriş hatası StandardOffer'a çevrilmez: credential_pool hesabı karantinaya alabilsin
+            raise ScraperLoginError(f"Giriş başarısız: {e}") from e
+        
+        if result and isinstance(result, dict) and result.get('trafik'):
+            return StandardOffer.from_koru_result(result, data.get('tckn', ''), data.get('plaka'))
+        else:
+            error_msg = "Koru teklif alınamadı"
+            if result is False:
+                error_msg = "Koru scraper çalıştırılamadı"
+            elif isinstance(result, dict) and not result.get('trafik'):
+                error_msg = "Koru trafik teklifi alınamadı"
+            return StandardOffer(
+                company="Koru",
+                branch=branch,
+                tckn=data.get('tckn', ''),
+                plate=data.get('plaka'),
+                status="failed",
+                error=error_msg
+            )
+            
+    except ScraperLoginError:
+        raise
+    except Exception as e:
+        logger.error(f"Koru scraper hatası: {e}", exc_info=True)
+        import traceback
+        error_detail = str(e)
+        if not error_detail:
+            error_detail = f"Koru scraper exception: {type(e).__name__}"
+        return StandardOffer(
+            company="Koru",
+            branch=branch,
+            tckn=data.get('tckn', ''),
+            plate=data.get('plaka'),
+            status="failed",
+            error=error_detail
+        )
+    # Finally bloğunu kaldırdık - Playwright kendi event loop'unu yönetir
+    # Event loop'u kapatmak Playwright'ı bozuyor
+
+
+def run_doga_scraper(branch: str, data: Dict[str, Any], request_id: str, worker=None) -> Optional[StandardOffer]:
+    """Doğa scraper'ı çalıştır (worker verilirse onun browser'ı kullanılır)"""
+    import sys
+    
+    # Windows için asyncio event loop policy ayarla
+    # ProactorEventLoop subprocess desteği için gerekli
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    
+    # Event loop oluşturma - Playwright kendi loop'unu oluşturacak
+    # Sadece policy ayarlıyoruz
+    
+    try:
+        logger.info(f"[Doğa] Scraper başlatılıyor - branch: {branch}")
+        from scrapers_event.doga_scraper import DogaScraper
+        
+        logger.info(f"[Doğa] DogaScraper instance oluşturuluyor...")
+        scraper = DogaScraper()
+        logger.info(f"[Doğa] DogaScraper instance oluşturuldu")
+        
+        # Doğa için data formatını dönüştür
+        vehicle = vehicle_fields(data)
+        doga_data = {
+            "tc_no": data.get('tckn', ''),
+            "birth_date": (data.get('dogum_tarihi') or '').replace('/', '-'),  # YYYY-MM-DD formatına çevir
+            "plate_code": vehicle['plaka_il'],
+            "plate_no": vehicle['plaka_harf'] + vehicle['plaka_numara'],
+            "tescil_seri_kod": vehicle['ruhsat_seri'],
+            "tescil_seri_no": vehicle['ruhsat_no']
+        }
+        
+        # Scraper'ı çalıştır
+        logger.info(f"[Doğa] Scraper çalıştırılıyor - branch: {branch}, data: {doga_data}")
+        result = scraper.run_with_data(branch, doga_data, browser=worker.browser if worker else None)
+        logger.info(f"[Doğa] run_with_data sonucu: {result}")
+        
+        if result and result.get('premium_data'):
+            return StandardOffer.from_doga_result(result, data.get('tckn', ''), data.get('plaka'))
+        else:
+            error_msg = "Doğa teklif alınamadı"
+            if result is None:
+                error_msg = "Doğa scraper sonuç döndürmedi"
+            elif isinstance(result, dict) and not result.get('premium_data'):
+                error_msg = "Doğa premium verisi alınamadı"
+            return StandardOffer(
+                company="Doğa",
+                branch=branch,
+                tckn=data.get('tckn', ''),
+                plate=data.get('plaka'),
+                status="failed",
+                error=error_msg
+            )
+            
+    except Exception as e:
+        logger.error(f"Doğa scraper hatası: {e}", exc_info=True)
+        import traceback
+        error_detail = str(e)
+        if not error_detail or error_detail.strip() == '':
+            error_detail = f"Doğa scraper exception: {type(e).__name__}"
+        return StandardOffer(
+            company="Doğa",
+            branch=branch,
+            tckn=data.get('tckn', ''),
+            plate=data.get('plaka'),
+            status="failed",
+            error=error_detail
+        )
+    # Finally bloğunu kaldırdık - Playwright kendi event loop'unu yönetir
+    # Event loop'u kapatmak Playwright'ı bozuyor
+
+
+# Scraper mapping
+SCRAPER_FUNCTIONS = {
+    InsuranceCompany.SOMPO: run_sompo_scraper,
+    # TEST İÇİN SADECE SOMPO AKTİF
+    # InsuranceCompany.KORU: run_koru_scraper,
+    # InsuranceCompany.DOGA: run_doga_scraper,
+    # Diğer şirketler için de eklenebilir
+}
+
+# credential=... parametresi alan runner'lar (credential_pool'dan hesap kiralanır)
+CREDENTIAL_SCRAPERS = {
+    InsuranceCompany.SOMPO,
+    InsuranceCompany.KORU,
+}
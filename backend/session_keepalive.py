@@ -0,0 +1,262 @@
+"""
+Portal oturumlarını canlı tutma (keep-alive)
+
+- Worker'lardaki açık oturum context'leri boşta kaldıklarında periyodik olarak ucuz bir
+  yetkili sayfaya gider (touch_session); oturum düşmüşse context kapatılır.
+- Diske kaydedilmiş oturum dosyaları arka plan görevinde yenilenir, süresi dolmak üzereyse
+  uyarı verilir. Dosya, scraper'ın okuduğu formatta geri yazılır: Playwright storage_state
+  (sompo_storage_state.json) ya da scraper'ın kendi formatı (anadolu_session.json: cookies,
+  localStorage, sessionStorage, url, timestamp). İnsan doğrulaması gereken oturumlar
+  (Anadolu mail doğrulaması) müşteri isteği sırasında değil mesai dışında yenilenmelidir;
+  yenilenemezlerse mesai dışında operatör için uyarı kaydı düşülür.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEEPALIVE_ENABLED = os.getenv("SESSION_KEEPALIVE_ENABLED", "true").lower() == "true"
+SESSION_KEEPALIVE_SECONDS = float(os.getenv("SESSION_KEEPALIVE_SECONDS", "240"))
+# Süresine bu kadar kalan kayıtlı oturum için uyarı verilir
+SESSION_EXPIRY_WARN_SECONDS = float(os.getenv("SESSION_EXPIRY_WARN_SECONDS", "3600"))
+# Worker oturumlarının storage_state kopyalarının tutulduğu dizin
+SESSION_STATE_DIR = os.getenv("SESSION_STATE_DIR", "state/sessions")
+# Mesai saatleri (yerel saat, başlangıç-bitiş): insan doğrulamalı oturumlar bu aralık dışında yenilenir
+BUSINESS_HOURS = os.getenv("BUSINESS_HOURS", "08-20")
+
+# Şirket -> oturumun geçerli olduğunu gösteren ucuz yetkili sayfa ve login yönlendirme işaretleri
+KEEPALIVE_TARGETS: Dict[str, Dict[str, Any]] = {
+    "Sompo": {
+        "url": os.getenv("SOMPO_KEEPALIVE_URL", "https://ejento.somposigorta.com.tr/dashboard"),
+        "login_markers": ["login"],
+    },
+    "Koru": {
+        "url": os.getenv("KORU_KEEPALIVE_URL", os.getenv("KORU_HOME_URL", "")),
+        "login_markers": ["login", "giris"],
+    },
+    # Login sayfası oturum geçerliyken de "login" içerdiğinden yedek olarak kullanılamaz;
+    # tanımlı değilse Anadolu oturumu yoklanmaz
+    "Anadolu": {
+        "url": os.getenv("ANADOLU_KEEPALIVE_URL", ""),
+        "login_markers": ["login", "giris"],
+    },
+}
+
+# Diskte saklanan oturumlar
+STORED_SESSIONS: List[Dict[str, Any]] = [
+    {
+        "name": "sompo",
+        "company": "Sompo",
+        "path": os.getenv("SOMPO_SESSION_FILE", os.path.join("cookies", "sompo_storage_state.json")),
+        "max_age_seconds": float(os.getenv("SOMPO_SESSION_MAX_AGE_HOURS", "12")) * 3600,
+        "requires_human": False,
+        "format": "storage_state",
+    },
+    {
+        "name": "anadolu",
+        "company": "Anadolu",
+        "path": os.getenv("ANADOLU_SESSION_FILE", "anadolu_session.json"),
+        "max_age_seconds": float(os.getenv("ANADOLU_SESSION_MAX_AGE_HOURS", "24")) * 3600,
+        "requires_human": True,
+        "format": "web_storage",
+    },
+]
+
+session_keepalive_total = registry.counter(
+    "scraper_session_keepalive_total",
+    "Oturum canlı tutma denemeleri (ok, expired, error)",
+    ("session", "result")
+)
+session_expires_in_seconds = registry.gauge(
+    "scraper_stored_session_expires_in_seconds",
+    "Kayıtlı oturumun tahmini süre dolumuna kalan saniye",
+    ("session",)
+)
+
+
+def session_state_path(key: str) -> str:
+    """Worker oturumunun storage_state dosyası"""
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+    return os.path.join(SESSION_STATE_DIR, f"{safe}.json")
+
+
+def company_of(key: str) -> str:
+    """Oturum anahtarından şirket adı (session_key: şirket[:hesap])"""
+    return key.split(":", 1)[0]
+
+
+def in_hour_window(spec: str, now: Optional[datetime] = None, default: bool = True) -> bool:
+    """Saat aralığı ("08-20", gece yarısını aşabilir: "22-06") şu anki saati içeriyor mu"""
+    now = now or datetime.now()
+    try:
+        start, end = (int(part) for part in spec.split("-", 1))
+    except ValueError:
+        return default
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+def in_business_hours(now: Optional[datetime] = None) -> bool:
+    return in_hour_window(BUSINESS_HOURS, now)
+
+
+_READ_WEB_STORAGE_JS = "() => Object.assign({}, window.%s)"
+
+
+def _restore_web_storage(page, stored: Dict[str, Any]) -> None:
+    """Scraper formatındaki localStorage/sessionStorage kayıtlarını açık sayfanın origin'ine yükle"""
+    for storage in ("localStorage", "sessionStorage"):
+        for key, value in (stored.get(storage) or {}).items():
+            page.evaluate(f"() => window.{storage}.setItem({json.dumps(key)}, {json.dumps(value)})")
+
+
+def _write_web_storage_state(page, context, path: str) -> None:
+    """Oturumu scraper'ın kendi formatında yaz (AnadoluScraper._save_session_data ile aynı alanlar)"""
+    state = {
+        "cookies": context.cookies(),
+        "localStorage": page.evaluate(_READ_WEB_STORAGE_JS % "localStorage"),
+        "sessionStorage": page.evaluate(_READ_WEB_STORAGE_JS % "sessionStorage"),
+        "url": page.url,
+        "timestamp": time.time(),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def touch_session(context, company: str, state_path: Optional[str] = None,
+                  state_format: str = "storage_state",
+                  stored: Optional[Dict[str, Any]] = None) -> Optional[bool]:
+    """
+    Context'te yetkili sayfaya git (sync API, context'in sahibi olan thread'de çağrılmalı)
+    True: oturum geçerli (state_path verilmişse dosya state_format'ta güncellenir)
+    False: login'e yönlendirildi. None: şirket için hedef tanımlı değil
+    state_format="web_storage" ise stored'daki localStorage/sessionStorage sayfaya yüklenip yenilenir
+    """
+    target = KEEPALIVE_TARGETS.get(company)
+    if not target or not target["url"]:
+        return None
+    page = context.new_page()
+    try:
+        page.goto(target["url"], wait_until="domcontentloaded", timeout=30000)
+        if state_format == "web_storage" and stored:
+            _restore_web_storage(page, stored)
+            page.reload(wait_until="domcontentloaded", timeout=30000)
+        url = page.url.lower()
+        alive = not any(marker in url for marker in target["login_markers"])
+        if alive and state_path:
+            os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+            if state_format == "web_storage":
+                _write_web_storage_state(page, context, state_path)
+            else:
+                context.storage_state(path=state_path)
+        return alive
+    finally:
+        try:
+            page.close()
+        except Exception:
+            pass
+
+
+def refresh_stored_session(spec: Dict[str, Any], worker=None) -> Optional[bool]:
+    """
+    Kayıtlı oturumla yeni context aç, oturumu yokla ve dosyayı aynı formatta güncelle
+    scraper_pool.submit ile bir Playwright worker thread'inde çalıştırılır
+    """
+    with open(spec["path"], "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    state_format = spec.get("format", "storage_state")
+    context = worker.browser.new_context(storage_state={
+        "cookies": stored.get("cookies", []),
+        # web_storage formatında localStorage/sessionStorage sayfa açıldıktan sonra yüklenir
+        "origins": stored.get("origins", []) if state_format == "storage_state" else [],
+    })
+    try:
+        return touch_session(context, spec["company"], state_path=spec["path"],
+                             state_format=state_format, stored=stored)
+    finally:
+        context.close()
+
+
+def _record_refresh_required(spec: Dict[str, Any], message: str) -> None:
+    """Operatör için kalıcı uyarı kaydı (system_logs)"""
+    try:
+        from backend.database import SessionLocal
+        from backend.models import LogLevel, SystemLog
+        if SessionLocal is None:
+            return
+        db = SessionLocal()
+        try:
+            db.add(SystemLog(
+                level=LogLevel.WARNING,
+                message=message,
+                user="system",
+                action="SESSION_REFRESH_REQUIRED",
+                log_metadata={"session": spec["name"], "path": spec["path"]}
+            ))
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Oturum uyarısı kaydedilemedi: {e}")
+
+
+async def _check_stored_session(spec: Dict[str, Any], pool) -> None:
+    name = spec["name"]
+    if not os.path.exists(spec["path"]):
+        return
+    age = time.time() - os.path.getmtime(spec["path"])
+    expires_in = spec["max_age_seconds"] - age
+    session_expires_in_seconds.set(round(expires_in), session=name)
+
+    if spec["requires_human"] and in_business_hours():
+        # Mesai içinde sadece uyar; yenileme (gerekirse insan doğrulaması) mesai dışında yapılır
+        if expires_in < SESSION_EXPIRY_WARN_SECONDS:
+            logger.warning(f"⚠️ {name} oturumunun süresi {max(0, expires_in) / 60:.0f} dk içinde doluyor")
+        return
+
+    try:
+        alive = await pool.submit(refresh_stored_session, spec)
+    except Exception as e:
+        session_keepalive_total.inc(session=name, result="error")
+        logger.warning(f"⚠️ {name} oturumu yoklanamadı: {e}")
+        return
+    if alive is None:
+        return
+    if alive:
+        session_keepalive_total.inc(session=name, result="ok")
+        session_expires_in_seconds.set(spec["max_age_seconds"], session=name)
+        return
+
+    session_keepalive_total.inc(session=name, result="expired")
+    if spec["requires_human"]:
+        message = f"{name} oturumu düştü, mesai dışında manuel doğrulama ile yenilenmeli"
+        logger.error(f"❌ {message}")
+        _record_refresh_required(spec, message)
+    else:
+        # Bir sonraki işte normal giriş yapılır
+        logger.warning(f"⚠️ {name} kayıtlı oturumu geçersiz, siliniyor")
+        try:
+            os.remove(spec["path"])
+        except OSError:
+            pass
+
+
+async def session_keepalive_loop(pool, interval_seconds: float = SESSION_KEEPALIVE_SECONDS) -> None:
+    """Arka plan görevi: kayıtlı oturumları periyodik olarak yokla ve yenile"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        for spec in STORED_SESSIONS:
+            try:
+                await _check_stored_session(spec, pool)
+            except Exception as e:
+                logger.error(f"❌ Oturum keep-alive hatası ({spec['name']}): {e}")
@@ -0,0 +1,165 @@
+"""
+In-process read-through cache - CompanySettings ve UserSettings için
+
+Her worker kendi belleğinde tutar. Yazma işlemleri cache_versions tablosundaki versiyonu
+artırır; worker'lar versiyonu en fazla CACHE_VERSION_CHECK_SECONDS aralıkla kontrol edip
+değiştiyse önbelleğini boşaltır (birden fazla uvicorn worker'ı arasında invalidation).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.models import CacheVersion
+
+CACHE_TTL_SECONDS = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "300"))
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv("SETTINGS_CACHE_VERSION_CHECK_SECONDS", "2"))
+
+
+def make_etag(payload: Any) -> str:
+    """Yanıt içeriğinden weak ETag üret"""
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match başlığı verilen ETag ile eşleşiyor mu"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ReadThroughCache:
+    """
+    Anahtar -> değer önbelleği; kayıp durumunda loader(db, key) ile doldurulur
+    Değerler session'dan bağımsız (dict/list) olmalı
+    """
+
+    def __init__(self, name: str, loader: Callable[[Session, Hashable], Any], ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.version: Optional[int] = None
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._version_checked_at = 0.0
+        # Önbellek her boşaltıldığında artar; boşaltmadan önce başlamış yükleme sonucunu yazmaz
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _read_version(self, db: Session) -> int:
+        row = db.query(CacheVersion.version).filter(CacheVersion.name == self.name).first()
+        return row[0] if row else 0
+
+    def _sync_version(self, db: Session) -> None:
+        """Versiyonu belirli aralıklarla kontrol et, değiştiyse önbelleği boşalt"""
+        now = time.monotonic()
+        if now - self._version_checked_at < CACHE_VERSION_CHECK_SECONDS:
+            return
+        version = self._read_version(db)
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._generation += 1
+                self.version = version
+            self._version_checked_at = now
+
+    def _reset(self, version: int) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.version = version
+            self._version_checked_at = time.monotonic()
+
+    def get(self, key: Hashable, db: Optional[Session] = None, session_factory=None) -> Any:
+        """
+        Değeri önbellekten getir, yoksa yükle
+        db verilmezse session_factory ile kısa ömürlü bir session açılır (sadece gerekirse)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh_version = now - self._version_checked_at < CACHE_VERSION_CHECK_SECONDS
+            if entry is not None and fresh_version and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+
+        own_session = db is None
+        if own_session:
+            if session_factory is None:
+                return None
+            db = session_factory()
+        try:
+            self._sync_version(db)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] < self.ttl:
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+                generation = self._generation
+            value = self.loader(db, key)
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic(), value)
+            return value
+        finally:
+            if own_session:
+                db.close()
+
+    def invalidate(self, db: Session) -> int:
+        """
+        Versiyonu artır; yerel önbellek transaction commit edilince boşaltılır
+        Çağıran transaction'ın parçası olarak çalışır - commit çağıranın sorumluluğunda. Commit'ten
+        önce boşaltılsaydı aradaki bir okuma eski satırları TTL boyunca önbellekte tutabilirdi.
+        """
+        row = db.query(CacheVersion).filter(CacheVersion.name == self.name).with_for_update().first()
+        if row is None:
+            row = CacheVersion(name=self.name, version=1)
+            db.add(row)
+        else:
+            row.version = (row.version or 0) + 1
+        db.flush()
+        version = row.version
+        event.listen(db, "after_commit", lambda session: self._reset(version), once=True)
+        return version
+
+
+# ============================================
+# LOADER'LAR
+# ============================================
+
+def _load_company_settings(db: Session, key: Hashable):
+    from backend.models import CompanySettings
+    return [s.to_dict() for s in db.query(CompanySettings).all()]
+
+
+def _load_user_settings(db: Session, key: Hashable):
+    from backend.models import UserSettings
+    user_id, setting_key = key
+    query = db.query(UserSettings)
+    if user_id is not None:
+        query = query.filter(UserSettings.user_id == user_id)
+    if setting_key:
+        query = query.filter(UserSettings.setting_key == setting_key)
+    return [s.to_dict() for s in query.all()]
+
+
+company_settings_cache = ReadThroughCache("company_settings", _load_company_settings)
+user_settings_cache = ReadThroughCache("user_settings", _load_user_settings)
+
+
+def company_status_map(session_factory) -> Dict[str, str]:
+    """Şirket -> durum eşlemesi (scrape hot path'i için, önbellekten)"""
+    try:
+        settings = company_settings_cache.get("all", session_factory=session_factory) or []
+    except Exception:
+        return {}
+    return {s["company"]: s["status"] for s in settings}
@@ -0,0 +1,16 @@
+"""Ortak fixture'lar: her test için bellekte boş SQLite veritabanı"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models import Base
+
+
+@pytest.fixture
+def session_factory():
+    # StaticPool: tüm session'lar aynı bellek içi bağlantıyı paylaşır
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
@@ -0,0 +1,80 @@
+"""Kabul kontrolü: bekleme tahmini, 429/503 kararları ve kuyruk derinliği"""
+import pytest
+
+from backend import admission
+from backend.admission import AdmissionController
+
+P50 = {"Sompo": 40.0, "Koru": 20.0}
+
+
+@pytest.fixture(autouse=True)
+def latencies(monkeypatch):
+    # Süre istatistiği olmayan şirkette varsayılan p50 kullanılır
+    monkeypatch.setattr(admission.company_stats, "duration_percentile", lambda company, q: P50.get(company))
+    monkeypatch.setattr(admission, "ADMISSION_DEFAULT_LATENCY_SECONDS", 60.0)
+    monkeypatch.setattr(admission, "ADMISSION_COLD_START_SECONDS", 20.0)
+    monkeypatch.setattr(admission, "ADMISSION_NO_CAPACITY_RETRY_SECONDS", 30)
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(enabled=True, max_wait_seconds=100)
+
+
+def test_empty_queue_is_accepted_immediately(controller):
+    decision = controller.estimate(["Sompo"], capacity=2)
+    assert decision.accepted
+    assert decision.status_code == 200
+    assert decision.wait_seconds == 0
+    assert decision.retry_after is None
+
+
+def test_wait_is_backlog_over_capacity(controller):
+    controller.admit("r1", {"Sompo": 2, "Koru": 1})
+    controller.admit("r2", {"Anadolu": 1})
+    # (2 * 40 + 1 * 20 + 1 * 60) / 4
+    decision = controller.estimate(["Sompo"], capacity=4)
+    assert decision.wait_seconds == pytest.approx(40.0)
+    assert decision.queue_depth == 4
+    assert decision.to_dict()["estimated_wait_seconds"] == 40.0
+
+
+def test_cold_start_added_when_no_warm_worker(controller):
+    controller.admit("r1", {"Sompo": 1})
+    assert controller.estimate(["Sompo"], 1, warm={"Sompo": 1}).wait_seconds == pytest.approx(40.0)
+    assert controller.estimate(["Sompo", "Koru"], 1, warm={"Sompo": 1}).wait_seconds == pytest.approx(60.0)
+
+
+def test_rejects_with_retry_after_over_max_wait(controller):
+    controller.admit("r1", {"Sompo": 3})
+    decision = controller.estimate(["Sompo"], capacity=1)
+    assert not decision.accepted
+    assert decision.status_code == 429
+    assert decision.retry_after == 20
+
+
+def test_no_capacity_is_unavailable(controller):
+    decision = controller.estimate(["Sompo"], capacity=0)
+    assert decision.status_code == 503
+    assert decision.retry_after == 30
+
+
+def test_disabled_controller_accepts_everything():
+    controller = AdmissionController(enabled=False, max_wait_seconds=1)
+    controller.admit("r1", {"Sompo": 10})
+    assert controller.estimate(["Sompo"], capacity=1).accepted
+    assert controller.estimate(["Sompo"], capacity=0).accepted
+
+
+def test_release_and_finish_shrink_queue(controller):
+    controller.admit("r1", {"Sompo": 2, "Koru": 1})
+    controller.release("r1", "Sompo")
+    assert controller.queue_depth("Sompo") == 0
+    assert controller.queue_depth() == 1
+    # Aynı şirketin ikinci kez bırakılması sayacı düşürmez
+    controller.release("r1", "Sompo")
+    assert controller.queue_depth() == 1
+
+    controller.finish("r1")
+    assert controller.queue_depth() == 0
+    assert controller.estimate(["Sompo"], capacity=1).wait_seconds == 0
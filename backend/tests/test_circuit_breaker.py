@@ -0,0 +1,126 @@
+"""Devre kesici durum geçişleri (kapalı -> açık -> deneme -> kapalı/açık)"""
+import pytest
+
+from backend import circuit_breaker as cb
+from backend.error_taxonomy import ErrorCategory
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cb.time, "monotonic", clock)
+    # Geçişler veritabanına yazılmaz
+    monkeypatch.setattr(cb, "_persist_transition", lambda *args: None)
+    return clock
+
+
+@pytest.fixture
+def breakers(clock):
+    return cb.CircuitBreakerRegistry(enabled=True)
+
+
+def _state(breakers, company="Sompo"):
+    return breakers.snapshot()[company]["circuit_state"]
+
+
+def _fail(breakers, times, company="Sompo"):
+    for _ in range(times):
+        breakers.before_call(company)
+        breakers.record(company, False, "TimeoutError", ErrorCategory.TRANSIENT)
+
+
+def test_consecutive_failures_open_circuit(breakers):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD - 1)
+    assert _state(breakers) == cb.CLOSED
+
+    _fail(breakers, 1)
+    assert _state(breakers) == cb.OPEN
+    assert not breakers.available("Sompo")
+    with pytest.raises(cb.CircuitOpenError) as excinfo:
+        breakers.before_call("Sompo")
+    assert excinfo.value.retry_in == pytest.approx(cb.CIRCUIT_OPEN_SECONDS)
+
+
+def test_success_resets_consecutive_failures(breakers):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD - 1)
+    breakers.before_call("Sompo")
+    breakers.record("Sompo", True)
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD - 1)
+    assert _state(breakers) == cb.CLOSED
+
+
+def test_deterministic_errors_do_not_open_circuit(breakers):
+    for _ in range(cb.CIRCUIT_FAILURE_THRESHOLD * 2):
+        breakers.before_call("Sompo")
+        breakers.record("Sompo", False, "ScraperFailed", ErrorCategory.INPUT_INVALID)
+    assert _state(breakers) == cb.CLOSED
+
+
+def test_ignored_errors_do_not_count(breakers):
+    for _ in range(cb.CIRCUIT_FAILURE_THRESHOLD * 2):
+        breakers.before_call("Sompo")
+        breakers.record("Sompo", False, "NoCredentialAvailable")
+    assert _state(breakers) == cb.CLOSED
+
+
+def test_half_open_allows_single_probe_and_closes_on_success(breakers, clock):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD)
+    clock.now += cb.CIRCUIT_OPEN_SECONDS
+    assert breakers.available("Sompo")
+
+    breakers.before_call("Sompo")
+    assert _state(breakers) == cb.HALF_OPEN
+    # Deneme işi sürerken ikinci istek reddedilir
+    assert not breakers.available("Sompo")
+    with pytest.raises(cb.CircuitOpenError):
+        breakers.before_call("Sompo")
+
+    breakers.record("Sompo", True)
+    assert _state(breakers) == cb.CLOSED
+    assert breakers.snapshot()["Sompo"]["consecutive_failures"] == 0
+
+
+def test_failed_probe_reopens_with_doubled_wait(breakers, clock):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD)
+    clock.now += cb.CIRCUIT_OPEN_SECONDS
+    breakers.before_call("Sompo")
+    breakers.record("Sompo", False, "TimeoutError", ErrorCategory.TRANSIENT)
+
+    assert _state(breakers) == cb.OPEN
+    assert breakers.snapshot()["Sompo"]["circuit_retry_in"] == pytest.approx(
+        min(cb.CIRCUIT_OPEN_SECONDS * 2, cb.CIRCUIT_OPEN_MAX_SECONDS)
+    )
+
+
+def test_release_returns_probe_slot(breakers, clock):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD)
+    clock.now += cb.CIRCUIT_OPEN_SECONDS
+    breakers.before_call("Sompo")
+    breakers.release("Sompo")
+
+    assert _state(breakers) == cb.HALF_OPEN
+    assert breakers.available("Sompo")
+
+
+def test_late_results_while_open_are_ignored(breakers, clock):
+    _fail(breakers, cb.CIRCUIT_FAILURE_THRESHOLD)
+    retry_in = breakers.snapshot()["Sompo"]["circuit_retry_in"]
+    breakers.record("Sompo", False, "TimeoutError", ErrorCategory.TRANSIENT)
+    assert breakers.snapshot()["Sompo"]["circuit_retry_in"] == retry_in
+
+
+def test_disabled_registry_never_rejects(clock):
+    breakers = cb.CircuitBreakerRegistry(enabled=False)
+    for _ in range(cb.CIRCUIT_FAILURE_THRESHOLD * 2):
+        breakers.before_call("Sompo")
+        breakers.record("Sompo", False, "TimeoutError", ErrorCategory.TRANSIENT)
+    assert breakers.available("Sompo")
+    assert breakers.snapshot() == {}
@@ -0,0 +1,71 @@
+"""Şirket istatistikleri: kalıcı değerlerin yüklenmesi ve toplu yazma"""
+import pytest
+
+from backend import company_stats as cs
+from backend.company_stats import CompanyStatsTracker
+from backend.models import CompanySettings, CompanyStatus, InsuranceCompany
+
+
+@pytest.fixture
+def stored(session_factory, monkeypatch):
+    monkeypatch.setattr(cs, "COMPANY_STATS_MIN_PERCENTILE_SAMPLES", 3)
+    db = session_factory()
+    try:
+        db.add(CompanySettings(company=InsuranceCompany.SOMPO, status=CompanyStatus.ACTIVE, success_rate=0.8,
+                               total_queries=50, p50_duration=12.0, p95_duration=40.0))
+        db.commit()
+    finally:
+        db.close()
+    return session_factory
+
+
+def _setting(session_factory):
+    db = session_factory()
+    try:
+        return db.query(CompanySettings).filter(CompanySettings.company == InsuranceCompany.SOMPO).one()
+    finally:
+        db.close()
+
+
+def test_load_restores_persisted_percentiles(stored):
+    tracker = CompanyStatsTracker()
+    tracker.load(stored)
+    snapshot = tracker.snapshot()["Sompo"]
+    assert (snapshot["success_rate"], snapshot["total_queries"]) == (0.8, 50)
+    assert (snapshot["p50_duration"], snapshot["p95_duration"]) == (12.0, 40.0)
+
+
+def test_few_new_samples_do_not_overwrite_persisted_percentiles(stored):
+    tracker = CompanyStatsTracker()
+    tracker.load(stored)
+    for duration in (1.0, 2.0):
+        tracker.record("Sompo", True, duration)
+    assert tracker.flush(stored) == 2
+
+    setting = _setting(stored)
+    assert setting.total_queries == 52
+    assert (setting.p50_duration, setting.p95_duration) == (12.0, 40.0)
+    assert tracker.snapshot()["Sompo"]["p50_duration"] == 12.0
+
+    # Pencere yeterince dolunca yeni süreler kullanılır
+    tracker.record("Sompo", True, 3.0)
+    tracker.flush(stored)
+    setting = _setting(stored)
+    assert (setting.p50_duration, setting.p95_duration) == (2.0, 3.0)
+    assert tracker.snapshot()["Sompo"]["p95_duration"] == 3.0
+
+
+def test_company_without_history_uses_window(session_factory):
+    tracker = CompanyStatsTracker()
+    tracker.load(session_factory)
+    tracker.record("Koru", False, 5.0, "TimeoutError")
+    snapshot = tracker.snapshot()["Koru"]
+    assert (snapshot["p50_duration"], snapshot["last_error_class"]) == (5.0, "TimeoutError")
+
+    tracker.flush(session_factory)
+    db = session_factory()
+    try:
+        setting = db.query(CompanySettings).filter(CompanySettings.company == InsuranceCompany.KORU).one()
+        assert (setting.total_queries, setting.success_rate, setting.p50_duration) == (1, 0.0, 5.0)
+    finally:
+        db.close()
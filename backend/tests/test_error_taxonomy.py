@@ -0,0 +1,101 @@
+"""Hata mesajı sınıflandırması ve negatif önbellek (TTL, LRU)"""
+import pytest
+
+from backend import error_taxonomy as et
+from backend.error_taxonomy import ErrorCategory, NegativeCache, classify_error
+from backend.schemas import StandardOffer
+
+
+@pytest.mark.parametrize("message, category", [
+    # Gidilen URL'deki "login" giriş hatası sayılmaz
+    ("Page.goto: net::ERR_CONNECTION_RESET at https://x/login", ErrorCategory.TRANSIENT),
+    # Zaman aşımı mesajındaki selector sayfa değişikliği sayılmaz
+    ('Timeout 30000ms exceeded. waiting for selector "#x"', ErrorCategory.TRANSIENT),
+    ("GİRİŞ BAŞARISIZ", ErrorCategory.AUTH),
+    ("Giriş başarısız: TOTP kodu reddedildi", ErrorCategory.AUTH),
+    ("Login butonu tıklanamadı", ErrorCategory.AUTH),
+    ("GEÇERSİZ PLAKA FORMATI", ErrorCategory.INPUT_INVALID),
+    ("Geçersiz plaka formatı: 34", ErrorCategory.INPUT_INVALID),
+    ("ARAÇ BULUNAMADI", ErrorCategory.PORTAL_REJECTED),
+    ("Bu araç için teklif verilemez", ErrorCategory.PORTAL_REJECTED),
+    ("Teklif Al butonu bulunamadı", ErrorCategory.LAYOUT_CHANGED),
+    ("strict mode violation: locator resolved to 2 elements", ErrorCategory.LAYOUT_CHANGED),
+    ("", ErrorCategory.TRANSIENT),
+    (None, ErrorCategory.TRANSIENT),
+    ("tanımsız bir şey oldu", ErrorCategory.TRANSIENT),
+])
+def test_classify_error_messages(message, category):
+    assert classify_error(message) == category
+
+
+def test_exception_class_wins_over_message():
+    assert classify_error("Timeout 30000ms exceeded", "ScraperLoginError") == ErrorCategory.AUTH
+    assert classify_error("login", "StepInputError") == ErrorCategory.INPUT_INVALID
+
+
+def test_normalize_message_folds_turkish_case():
+    assert et.normalize_message("GİRİŞ BAŞARISIZ") == et.normalize_message("giriş başarısız")
+    assert et.normalize_message("IĞDIR") == "iğdir"
+    assert "login" not in et.normalize_message("at https://portal.example/login?next=/")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(et.time, "monotonic", clock)
+    return clock
+
+
+def _rejected(error="Araç bulunamadı", category=ErrorCategory.PORTAL_REJECTED):
+    return StandardOffer(company="Sompo", branch="trafik", tckn="10000000146", status="failed",
+                         error=error, error_category=category)
+
+
+def _data(plate):
+    return {"tckn": "10000000146", "plaka": plate}
+
+
+def test_negative_cache_ttl(clock):
+    cache = NegativeCache(ttl=60, max_entries=10, enabled=True)
+    assert cache.put("Sompo", "trafik", _data("34ABC123"), _rejected())
+
+    clock.now += 59
+    cached = cache.get("Sompo", "trafik", _data(" 34abc123 "))
+    assert cached is not None
+    assert cached.error == "Araç bulunamadı"
+    assert cached.raw_data["negative_cache"]["expires_in"] == 1
+
+    clock.now += 1
+    assert cache.get("Sompo", "trafik", _data("34ABC123")) is None
+    assert len(cache) == 0
+
+
+def test_negative_cache_evicts_least_recently_used(clock):
+    cache = NegativeCache(ttl=60, max_entries=2, enabled=True)
+    cache.put("Sompo", "trafik", _data("34A1"), _rejected())
+    cache.put("Sompo", "trafik", _data("34A2"), _rejected())
+    # Okunan kayıt en son kullanılan olur
+    assert cache.get("Sompo", "trafik", _data("34A1")) is not None
+
+    cache.put("Sompo", "trafik", _data("34A3"), _rejected())
+    assert len(cache) == 2
+    assert cache.get("Sompo", "trafik", _data("34A2")) is None
+    assert cache.get("Sompo", "trafik", _data("34A1")) is not None
+    assert cache.get("Sompo", "trafik", _data("34A3")) is not None
+
+
+def test_negative_cache_stores_only_deterministic_failures(clock):
+    cache = NegativeCache(ttl=60, max_entries=10, enabled=True)
+    assert not cache.put("Sompo", "trafik", _data("34A1"), _rejected("Timeout", ErrorCategory.TRANSIENT))
+    completed = StandardOffer(company="Sompo", branch="trafik", tckn="10000000146", status="completed")
+    assert not cache.put("Sompo", "trafik", _data("34A1"), completed)
+    assert not cache.put("Sompo", "trafik", _data("34A1"), None)
+    assert len(cache) == 0
@@ -0,0 +1,84 @@
+"""Hedge bütçesi (eşzamanlı hedge ve son isteklere oran sınırı) ve hedge gecikmesi"""
+import pytest
+
+from backend import hedging
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_MAX_INFLIGHT", 2)
+    monkeypatch.setattr(hedging, "HEDGE_MAX_RATIO", 0.1)
+    monkeypatch.setattr(hedging, "HEDGE_WINDOW", 100)
+    return hedging.HedgePolicy()
+
+
+def _requests(policy, count, company="Şeker"):
+    for _ in range(count):
+        policy.note_request(company)
+
+
+def test_ratio_limits_hedges_in_window(policy):
+    _requests(policy, 10)
+    assert policy.try_acquire("Şeker")
+    policy.release("Şeker")
+
+    # 11 istekte 2 hedge oranı aşar (%18 > %10)
+    _requests(policy, 1)
+    assert not policy.try_acquire("Şeker")
+
+    _requests(policy, 9)
+    assert policy.try_acquire("Şeker")
+    assert policy.snapshot()["Şeker"]["hedge_ratio"] == pytest.approx(2 / 20)
+
+
+def test_inflight_limit_and_release(policy, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_MAX_RATIO", 1.0)
+    _requests(policy, 3)
+    assert policy.try_acquire("Şeker")
+    _requests(policy, 1)
+    assert policy.try_acquire("Şeker")
+    _requests(policy, 1)
+    assert not policy.try_acquire("Şeker")
+    assert policy.snapshot()["Şeker"]["hedges_inflight"] == 2
+
+    policy.release("Şeker")
+    assert policy.try_acquire("Şeker")
+
+
+def test_window_forgets_old_hedges(policy, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_WINDOW", 10)
+    policy = hedging.HedgePolicy()
+    _requests(policy, 10)
+    assert policy.try_acquire("Şeker")
+    policy.release("Şeker")
+    _requests(policy, 1)
+    assert not policy.try_acquire("Şeker")
+
+    # Hedge'li istek pencereden çıkınca bütçe geri gelir
+    _requests(policy, 9)
+    assert policy.try_acquire("Şeker")
+
+
+def test_budget_is_per_company(policy):
+    _requests(policy, 10, "Şeker")
+    _requests(policy, 10, "Atlas")
+    assert policy.try_acquire("Şeker")
+    assert policy.try_acquire("Atlas")
+
+
+def test_delay_requires_hedged_company_and_samples(policy, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_COMPANIES", {"Şeker"})
+    monkeypatch.setattr(hedging, "HEDGE_MIN_SAMPLES", 20)
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 30.0)
+    samples = {"count": 5}
+    monkeypatch.setattr(hedging.company_stats, "duration_samples", lambda company: samples["count"])
+    monkeypatch.setattr(hedging.company_stats, "duration_percentile", lambda company, q: 12.0)
+
+    assert policy.delay("Atlas") is None
+    assert policy.delay("Şeker") is None
+
+    samples["count"] = 20
+    # Percentile en az bekleme süresinden kısaysa en az süre kullanılır
+    assert policy.delay("Şeker") == 30.0
+    monkeypatch.setattr(hedging.company_stats, "duration_percentile", lambda company, q: 95.0)
+    assert policy.delay("Şeker") == 95.0
@@ -0,0 +1,169 @@
+"""Veritabanı iş kuyruğu: kiralama, sonuç yazma, tekrar deneme, kesilme ve süresi dolan kiralar"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import job_queue
+from backend.error_taxonomy import ErrorCategory
+from backend.job_queue import complete_job, enqueue_jobs, lease_job, requeue_expired
+from backend.models import Offer, ScrapeJob, ScrapeJobStatus
+from backend.priorities import JobPriority
+from backend.schemas import StandardOffer
+
+DATA = {"tckn": "10000000146", "plaka": "34ABC123"}
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    # Yaşlandırma created_at'e (veritabanı saati) bakar; testlerde sadece öncelik sırası denenir
+    monkeypatch.setattr(job_queue, "PRIORITY_AGING_SECONDS", 0.0)
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+
+
+def _job(session_factory, job_id):
+    db = session_factory()
+    try:
+        return db.get(ScrapeJob, job_id)
+    finally:
+        db.close()
+
+
+def _offer(status="completed", error=None, category=None, raw_data=None):
+    return StandardOffer(company="Sompo", branch="trafik", tckn=DATA["tckn"],
+                         price=1234.5 if status == "completed" else None, status=status, error=error,
+                         error_category=category, raw_data=raw_data)
+
+
+def test_lease_takes_highest_priority_then_oldest(session_factory):
+    batch, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA, JobPriority.BATCH)
+    first, second = enqueue_jobs(session_factory, "r2", "trafik", ["Sompo", "Koru"], DATA)
+    live, = enqueue_jobs(session_factory, "r3", "trafik", ["Koru"], DATA, JobPriority.INTERACTIVE)
+
+    leased = [lease_job(session_factory, "w1", ["Sompo", "Koru"])["id"] for _ in range(4)]
+    assert leased == [live, first, second, batch]
+    assert lease_job(session_factory, "w1", ["Sompo", "Koru"]) is None
+
+
+def test_lease_marks_job_and_prefers_warm_companies(session_factory):
+    sompo, koru = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo", "Koru"], DATA)
+
+    job = lease_job(session_factory, "w1", ["Sompo", "Koru"], preferred=["Koru", "Doğa"])
+    assert job["id"] == koru
+    assert job["payload"] == DATA
+    assert (job["status"], job["leased_by"], job["attempts"]) == ("leased", "w1", 1)
+    assert _job(session_factory, koru).lease_expires_at > datetime.now()
+    # Şirket listesi dışındaki işler kiralanmaz
+    assert lease_job(session_factory, "w2", ["Koru"]) is None
+    assert lease_job(session_factory, "w2", ["Sompo"])["id"] == sompo
+
+
+def test_complete_success_writes_offer(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA)
+    lease_job(session_factory, "w1", ["Sompo"])
+
+    assert complete_job(session_factory, job_id, "w1", _offer())
+    job = _job(session_factory, job_id)
+    assert job.status == ScrapeJobStatus.COMPLETED
+    assert job.result["price"] == 1234.5
+    assert job.finished_at is not None and job.lease_expires_at is None
+    db = session_factory()
+    try:
+        offer = db.get(Offer, job.offer_id)
+        assert (offer.price, offer.tckn) == (1234.5, DATA["tckn"])
+    finally:
+        db.close()
+
+
+def test_transient_error_requeues_until_attempts_run_out(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA)
+
+    lease_job(session_factory, "w1", ["Sompo"])
+    assert complete_job(session_factory, job_id, "w1", None, "Timeout 30000ms exceeded", "TimeoutError")
+    job = _job(session_factory, job_id)
+    assert (job.status, job.leased_by, job.attempts) == (ScrapeJobStatus.QUEUED, None, 1)
+    assert (job.error_class, job.error_category) == ("TimeoutError", ErrorCategory.TRANSIENT.value)
+
+    lease_job(session_factory, "w2", ["Sompo"])
+    assert complete_job(session_factory, job_id, "w2", None, "Timeout 30000ms exceeded", "TimeoutError")
+    job = _job(session_factory, job_id)
+    assert (job.status, job.attempts) == (ScrapeJobStatus.FAILED, 2)
+    assert job.error == "Timeout 30000ms exceeded"
+    assert job.result is None
+
+
+def test_deterministic_failure_fails_at_once(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA)
+    lease_job(session_factory, "w1", ["Sompo"])
+
+    result = _offer("failed", "Geçersiz plaka formatı", ErrorCategory.INPUT_INVALID)
+    assert complete_job(session_factory, job_id, "w1", result)
+    job = _job(session_factory, job_id)
+    assert (job.status, job.attempts) == (ScrapeJobStatus.FAILED, 1)
+    assert (job.error, job.error_class, job.error_category) == (
+        "Geçersiz plaka formatı", "ScraperFailed", ErrorCategory.INPUT_INVALID.value
+    )
+    assert job.result["error"] == "Geçersiz plaka formatı"
+    assert job.offer_id is None
+
+
+def test_negative_cache_hit_keeps_cached_reason(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA)
+    lease_job(session_factory, "w1", ["Sompo"])
+
+    cached = _offer("failed", "Araç bulunamadı", ErrorCategory.PORTAL_REJECTED,
+                    raw_data={"negative_cache": {"expires_in": 60}})
+    assert complete_job(session_factory, job_id, "w1", cached)
+    job = _job(session_factory, job_id)
+    assert (job.status, job.error, job.error_category) == (
+        ScrapeJobStatus.FAILED, "Araç bulunamadı", ErrorCategory.PORTAL_REJECTED.value
+    )
+    assert job.result["raw_data"]["negative_cache"] == {"expires_in": 60}
+
+
+def test_preempted_job_returns_to_queue_without_using_an_attempt(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA, JobPriority.BATCH)
+    lease_job(session_factory, "w1", ["Sompo"])
+
+    assert complete_job(session_factory, job_id, "w1", None, "bırakıldı", "JobPreempted")
+    job = _job(session_factory, job_id)
+    assert (job.status, job.leased_by, job.attempts, job.priority) == (
+        ScrapeJobStatus.QUEUED, None, 0, int(JobPriority.BATCH)
+    )
+    assert lease_job(session_factory, "w2", ["Sompo"])["attempts"] == 1
+
+
+def test_result_from_lost_lease_is_dropped(session_factory):
+    job_id, = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo"], DATA)
+    lease_job(session_factory, "w1", ["Sompo"])
+
+    assert not complete_job(session_factory, job_id, "w2", _offer())
+    assert _job(session_factory, job_id).status == ScrapeJobStatus.LEASED
+
+
+def _expire(session_factory, job_id):
+    db = session_factory()
+    try:
+        db.get(ScrapeJob, job_id).lease_expires_at = datetime.now() - timedelta(seconds=1)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_expired_lease_is_requeued_then_failed(session_factory):
+    job_id, other = enqueue_jobs(session_factory, "r1", "trafik", ["Sompo", "Koru"], DATA)
+    lease_job(session_factory, "w1", ["Sompo"])
+    lease_job(session_factory, "w1", ["Koru"])
+
+    _expire(session_factory, job_id)
+    assert requeue_expired(session_factory) == 1
+    job = _job(session_factory, job_id)
+    assert (job.status, job.leased_by, job.lease_expires_at) == (ScrapeJobStatus.QUEUED, None, None)
+    # Kirası süren iş yerinde kalır
+    assert _job(session_factory, other).status == ScrapeJobStatus.LEASED
+
+    lease_job(session_factory, "w2", ["Sompo"])
+    _expire(session_factory, job_id)
+    assert requeue_expired(session_factory) == 0
+    job = _job(session_factory, job_id)
+    assert (job.status, job.error_class, job.attempts) == (ScrapeJobStatus.FAILED, "LeaseExpired", 2)
+    assert job.finished_at is not None
@@ -0,0 +1,71 @@
+"""Prometheus text çıktısı: histogram kovaları, etiketler ve registry"""
+from backend.metrics import Counter, Histogram, MetricsRegistry
+
+
+def _lines(metric):
+    return metric.render()[2:]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("quote_seconds", "Teklif süresi", buckets=(5, 1, 2.5))
+    for value in (0.5, 1, 3, 7):
+        histogram.observe(value)
+
+    assert histogram.render()[:2] == ["# HELP quote_seconds Teklif süresi", "# TYPE quote_seconds histogram"]
+    # Kovalar sıralanır; sınıra eşit değer o kovaya girer (le = küçük eşit)
+    assert _lines(histogram) == [
+        'quote_seconds_bucket{le="1"} 2',
+        'quote_seconds_bucket{le="2.5"} 2',
+        'quote_seconds_bucket{le="5"} 3',
+        'quote_seconds_bucket{le="+Inf"} 4',
+        "quote_seconds_sum 11.5",
+        "quote_seconds_count 4",
+    ]
+    assert histogram.value() == 4
+
+
+def test_histogram_labels_come_before_le():
+    histogram = Histogram("step_seconds", "Adım süresi", ("company", "step"), buckets=(1,))
+    histogram.observe(0.2, company="Sompo", step="tckn")
+    histogram.observe(4, company='Ko"ru', step="teklif")
+
+    assert _lines(histogram) == [
+        'step_seconds_bucket{company="Sompo",step="tckn",le="1"} 1',
+        'step_seconds_bucket{company="Sompo",step="tckn",le="+Inf"} 1',
+        'step_seconds_sum{company="Sompo",step="tckn"} 0.2',
+        'step_seconds_count{company="Sompo",step="tckn"} 1',
+        'step_seconds_bucket{company="Ko\\"ru",step="teklif",le="1"} 0',
+        'step_seconds_bucket{company="Ko\\"ru",step="teklif",le="+Inf"} 1',
+        'step_seconds_sum{company="Ko\\"ru",step="teklif"} 4.0',
+        'step_seconds_count{company="Ko\\"ru",step="teklif"} 1',
+    ]
+    assert histogram.value(company="Sompo", step="tckn") == 1
+    assert histogram.value(company="Atlas", step="tckn") == 0
+
+
+def test_empty_histogram_renders_only_header():
+    assert _lines(Histogram("idle_seconds", "Boş")) == []
+
+
+def test_registry_reuses_metrics_and_runs_collectors():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "İşler", ("result",))
+    assert registry.counter("jobs_total", "İşler", ("result",)) is counter
+    assert isinstance(counter, Counter)
+    counter.inc(result="ok")
+
+    depth = registry.gauge("depth", "Derinlik")
+
+    @registry.collector
+    def collect():
+        depth.set(3)
+
+    @registry.collector
+    def broken():
+        raise RuntimeError("okunamadı")
+
+    output = registry.render()
+    assert output.endswith("\n")
+    assert 'jobs_total{result="ok"} 1.0' in output
+    # Hatalı collector render'ı bozmaz
+    assert "depth 3" in output.splitlines()
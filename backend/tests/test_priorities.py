@@ -0,0 +1,108 @@
+"""Öncelikli kuyruk, yaşlandırma ve kesilebilir toplu işlerin yönlendirmedeki yeri"""
+import queue
+
+import pytest
+
+from backend import priorities
+from backend.priorities import JobPriority, PriorityJobQueue, effective_priority
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(priorities.time, "monotonic", clock)
+    monkeypatch.setattr(priorities, "PRIORITY_AGING_SECONDS", 600.0)
+    return clock
+
+
+@pytest.mark.parametrize("priority, waited, expected", [
+    (JobPriority.BATCH, 0, JobPriority.BATCH),
+    (JobPriority.BATCH, 599, JobPriority.BATCH),
+    (JobPriority.BATCH, 600, JobPriority.NORMAL),
+    (JobPriority.BATCH, 1200, JobPriority.INTERACTIVE),
+    (JobPriority.BATCH, 10_000, JobPriority.INTERACTIVE),
+    (JobPriority.INTERACTIVE, 10_000, JobPriority.INTERACTIVE),
+])
+def test_effective_priority(clock, priority, waited, expected):
+    assert effective_priority(priority, waited) == expected
+
+
+def test_aging_disabled(clock, monkeypatch):
+    monkeypatch.setattr(priorities, "PRIORITY_AGING_SECONDS", 0.0)
+    assert effective_priority(JobPriority.BATCH, 10_000) == JobPriority.BATCH
+
+
+def test_queue_orders_by_priority_then_age(clock):
+    jobs = PriorityJobQueue()
+    jobs.put("batch", JobPriority.BATCH)
+    jobs.put("normal-1", JobPriority.NORMAL)
+    jobs.put(None)
+    jobs.put("interactive", JobPriority.INTERACTIVE)
+    jobs.put("normal-2", JobPriority.NORMAL)
+
+    assert [jobs.get(timeout=0) for _ in range(5)] == ["interactive", "normal-1", "normal-2", "batch", None]
+    with pytest.raises(queue.Empty):
+        jobs.get(timeout=0)
+
+
+def test_aged_batch_job_overtakes_new_jobs(clock):
+    jobs = PriorityJobQueue()
+    jobs.put("batch", JobPriority.BATCH)
+    clock.now += 600
+    jobs.put("normal", JobPriority.NORMAL)
+    # Yaşlanan toplu iş normal önceliğe çıktı; eşit öncelikte eski iş önce
+    assert jobs.count_ahead(JobPriority.NORMAL) == 2
+    assert jobs.get(timeout=0) == "batch"
+
+    jobs.put("batch-2", JobPriority.BATCH)
+    clock.now += 1200
+    jobs.put("interactive", JobPriority.INTERACTIVE)
+    assert jobs.get(timeout=0) == "normal"
+    assert jobs.get(timeout=0) == "batch-2"
+    assert jobs.get(timeout=0) == "interactive"
+
+
+def test_has_waiting_ignores_aging(clock):
+    jobs = PriorityJobQueue()
+    jobs.put("batch", JobPriority.BATCH)
+    clock.now += 1200
+    assert not jobs.has_waiting(JobPriority.INTERACTIVE)
+    jobs.put("interactive", JobPriority.INTERACTIVE)
+    assert jobs.has_waiting(JobPriority.INTERACTIVE)
+
+
+def test_preemption_check_registers_only_when_offered():
+    registered = []
+    priorities.set_preemption_check(None, lambda: registered.append(True))
+    try:
+        assert priorities.preemption_check() is None
+        assert registered == []
+
+        priorities.set_preemption_check(lambda: False, lambda: registered.append(True))
+        assert priorities.preemption_check() is not None
+        assert registered == [True]
+    finally:
+        priorities.set_preemption_check(None)
+
+
+def test_running_batch_job_counts_until_it_registers_preemption(clock):
+    from backend.scraper_workers import PlaywrightWorker
+
+    worker = PlaywrightWorker(0)
+    worker.busy = True
+    worker.current_priority = JobPriority.BATCH
+    # Adımlı akış kullanmayan toplu iş kesilemez: canlı işin önünde sayılır
+    assert worker.load(JobPriority.INTERACTIVE) == 1
+
+    worker._register_preemption()
+    assert worker.load(JobPriority.INTERACTIVE) == 0
+    assert worker.load(JobPriority.NORMAL) == 1
+    assert worker.load() == 1
@@ -0,0 +1,68 @@
+"""Ayar önbelleği: invalidation commit'ten sonra, yükleme sırasında boşaltılan önbelleğe yazılmaz"""
+from backend.models import CompanySettings, CompanyStatus, InsuranceCompany
+from backend.settings_cache import ReadThroughCache
+
+
+def _statuses(db, key):
+    return [s.status.value for s in db.query(CompanySettings).all()]
+
+
+def _add_settings(session_factory):
+    db = session_factory()
+    try:
+        db.add(CompanySettings(company=InsuranceCompany.SOMPO, status=CompanyStatus.ACTIVE))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_invalidate_takes_effect_on_commit(session_factory):
+    _add_settings(session_factory)
+    cache = ReadThroughCache("company_settings", _statuses)
+    assert cache.get("all", session_factory=session_factory) == ["active"]
+
+    writer = session_factory()
+    try:
+        writer.query(CompanySettings).one().status = CompanyStatus.INACTIVE
+        version = cache.invalidate(writer)
+        # Commit'ten önceki okuma eski satırları görür; önbellek henüz boşaltılmaz
+        assert cache.get("all", session_factory=session_factory) == ["active"]
+        assert cache.version != version
+
+        writer.commit()
+    finally:
+        writer.close()
+    assert cache.version == version
+    assert cache.get("all", session_factory=session_factory) == ["inactive"]
+
+
+def test_rolled_back_invalidate_keeps_cache(session_factory):
+    _add_settings(session_factory)
+    cache = ReadThroughCache("company_settings", _statuses)
+    cache.get("all", session_factory=session_factory)
+
+    writer = session_factory()
+    try:
+        cache.invalidate(writer)
+        writer.rollback()
+    finally:
+        writer.close()
+    assert cache.get("all", session_factory=session_factory) == ["active"]
+    assert cache.hits == 1
+
+
+def test_load_overlapping_reset_is_not_cached(session_factory):
+    _add_settings(session_factory)
+    calls = []
+
+    def loader(db, key):
+        calls.append(key)
+        if len(calls) == 1:
+            # Yükleme sürerken başka bir istek yazıp commit etti
+            cache._reset(cache.version + 1)
+        return _statuses(db, key)
+
+    cache = ReadThroughCache("company_settings", loader)
+    cache.get("all", session_factory=session_factory)
+    cache.get("all", session_factory=session_factory)
+    assert len(calls) == 2
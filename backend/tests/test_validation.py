@@ -0,0 +1,107 @@
+"""İstek verisi doğrulama: TCKN kontrol basamakları, plaka, ruhsat, doğum tarihi"""
+from datetime import date
+
+import pytest
+
+from backend.validation import (
+    ParsedPlate, normalize_birth_date, normalize_request_data, parse_plate, parse_ruhsat,
+    validate_tckn, vehicle_fields,
+)
+
+VALID_TCKN = "10000000146"
+
+
+@pytest.mark.parametrize("value", [VALID_TCKN, " 10000000146 ", "11111111110"])
+def test_validate_tckn_accepts_checksum_valid(value):
+    assert validate_tckn(value) == value.strip()
+
+
+@pytest.mark.parametrize("value, message", [
+    ("12345678901", "kontrol basamakları"),
+    ("10000000147", "kontrol basamakları"),
+    ("01234567890", "ilk hane 0"),
+    ("1000000014", "11 haneli"),
+    ("1000000014a", "sadece rakam"),
+    ("", "sadece rakam"),
+    (None, "sadece rakam"),
+])
+def test_validate_tckn_rejects(value, message):
+    with pytest.raises(ValueError, match=message):
+        validate_tckn(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("34ABC123", ParsedPlate("34", "ABC", "123")),
+    ("34 abc 123", ParsedPlate("34", "ABC", "123")),
+    ("06-a-1234", ParsedPlate("06", "A", "1234")),
+    ("81.ab.999", ParsedPlate("81", "AB", "999")),
+    ("35 ABC 12", ParsedPlate("35", "ABC", "12")),
+])
+def test_parse_plate(value, expected):
+    assert parse_plate(value) == expected
+    assert parse_plate(value).compact == "".join(expected)
+
+
+@pytest.mark.parametrize("value", [
+    "00ABC123",   # il kodu 01-81
+    "82ABC123",
+    "34ABCD12",   # en fazla 3 harf
+    "34A123",     # tek harfte 4-5 rakam
+    "34AB12",     # iki harfte 3-4 rakam
+    "34ABC1234",  # üç harfte 2-3 rakam
+    "ABC123",
+    "",
+])
+def test_parse_plate_rejects(value):
+    with pytest.raises(ValueError):
+        parse_plate(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("FC993016", ("FC", "993016")),
+    ("fc 993016", ("FC", "993016")),
+    ("Fİ-993016", ("FI", "993016")),
+])
+def test_parse_ruhsat(value, expected):
+    assert parse_ruhsat(value) == expected
+
+
+@pytest.mark.parametrize("value", ["F993016", "FC99301", "FC9930167", "993016FC", ""])
+def test_parse_ruhsat_rejects(value):
+    with pytest.raises(ValueError, match="ruhsat"):
+        parse_ruhsat(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("01/02/1990", "01/02/1990"),
+    ("01.02.1990", "01/02/1990"),
+    ("01-02-1990", "01/02/1990"),
+    ("1990-02-01", "01/02/1990"),
+    (None, None),
+    ("  ", None),
+])
+def test_normalize_birth_date(value, expected):
+    assert normalize_birth_date(value, today=date(2026, 1, 1)) == expected
+
+
+@pytest.mark.parametrize("value", ["31/02/1990", "1990/02/01", "01/01/1899", "02/01/2026", "dün"])
+def test_normalize_birth_date_rejects(value):
+    with pytest.raises(ValueError, match="doğum tarihi"):
+        normalize_birth_date(value, today=date(2026, 1, 1))
+
+
+def test_normalize_request_data_splits_vehicle_fields():
+    data = normalize_request_data({
+        "tckn": VALID_TCKN, "plaka": "34 abc 123", "ruhsat_seri_no": "fc 993016", "dogum_tarihi": "1990-02-01",
+    })
+    assert data["plaka"] == "34ABC123"
+    assert data["ruhsat_seri_no"] == "FC993016"
+    assert data["dogum_tarihi"] == "01/02/1990"
+    assert (data["plaka_il"], data["plaka_harf"], data["plaka_numara"]) == ("34", "ABC", "123")
+    assert (data["ruhsat_seri"], data["ruhsat_no"]) == ("FC", "993016")
+
+
+def test_vehicle_fields_tolerates_unparseable_input():
+    assert vehicle_fields({"plaka": "bozuk", "ruhsat_seri_no": "FC993016"}) == {
+        "plaka_il": "", "plaka_harf": "", "plaka_numara": "", "ruhsat_seri": "FC", "ruhsat_no": "993016",
+    }
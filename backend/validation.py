@@ -0,0 +1,144 @@
+"""
+İstek verisi doğrulama ve normalizasyon
+
+Geçersiz TCKN, olmayan il kodu ya da bozuk ruhsat seri no ancak her şirkette giriş ve form
+doldurma bittikten sonra portal hatası olarak ortaya çıkıyordu. Buradaki fonksiyonlar tarayıcıya
+dokunmadan girdiyi doğrular (ValueError) ve scraper'lara parçalanmış alanları (plaka il/harf/numara,
+ruhsat seri/no) hazır verir.
+"""
+import re
+from datetime import date, datetime
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+# Harf sayısı -> izin verilen rakam sayıları (99 X 9999, 99 XX 999, 99 XXX 99 ...)
+_PLATE_DIGITS = {1: (4, 5), 2: (3, 4), 3: (2, 3)}
+_PLATE_RE = re.compile(r"^(\d{2})([A-Z]{1,3})(\d{2,5})$")
+_RUHSAT_RE = re.compile(r"^([A-Z]{2})(\d{6})$")
+_SEPARATORS_RE = re.compile(r"[\s\-_.]+")
+_BIRTH_DATE_FORMATS = ("%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d")
+
+# Scraper'lara hazır verilen parçalanmış alanlar
+VEHICLE_SPLIT_FIELDS = ("plaka_il", "plaka_harf", "plaka_numara", "ruhsat_seri", "ruhsat_no")
+
+
+class ParsedPlate(NamedTuple):
+    """Plaka parçaları: il kodu, harfler, numara"""
+    il_kodu: str
+    harfler: str
+    numara: str
+
+    @property
+    def compact(self) -> str:
+        return f"{self.il_kodu}{self.harfler}{self.numara}"
+
+
+def _compact_upper(value: str) -> str:
+    """Boşluk/ayraçları at, büyük harfe çevir (Türkçe İ/ı -> I)"""
+    return _SEPARATORS_RE.sub("", value.upper().replace("İ", "I"))
+
+
+def validate_tckn(value: str) -> str:
+    """TCKN: 11 hane, ilk hane 0 değil, 10. ve 11. hane kontrol basamakları tutmalı"""
+    value = (value or "").strip()
+    if not value.isdigit():
+        raise ValueError("TCKN sadece rakamlardan oluşmalıdır")
+    if len(value) != 11:
+        raise ValueError("TCKN 11 haneli olmalıdır")
+    digits = [int(c) for c in value]
+    if digits[0] == 0:
+        raise ValueError("Geçersiz TCKN: ilk hane 0 olamaz")
+    odd, even = sum(digits[0:9:2]), sum(digits[1:8:2])
+    if (odd * 7 - even) % 10 != digits[9] or sum(digits[:10]) % 10 != digits[10]:
+        raise ValueError("Geçersiz TCKN: kontrol basamakları tutmuyor")
+    return value
+
+
+def parse_plate(value: str) -> ParsedPlate:
+    """'34 ABC 123', '34-abc-123' -> ParsedPlate('34', 'ABC', '123')"""
+    plate = _compact_upper(value or "")
+    match = _PLATE_RE.match(plate)
+    if not match:
+        raise ValueError(f"Geçersiz plaka formatı: {value}")
+    il_kodu, harfler, numara = match.groups()
+    if not 1 <= int(il_kodu) <= 81:
+        raise ValueError(f"Geçersiz plaka il kodu: {il_kodu}")
+    if len(numara) not in _PLATE_DIGITS[len(harfler)]:
+        raise ValueError(f"Geçersiz plaka formatı: {value}")
+    return ParsedPlate(il_kodu, harfler, numara)
+
+
+def parse_ruhsat(value: str) -> Tuple[str, str]:
+    """Ruhsat belge seri no: 'FC 993016' -> ('FC', '993016')"""
+    ruhsat = _compact_upper(value or "")
+    match = _RUHSAT_RE.match(ruhsat)
+    if not match:
+        raise ValueError(f"Geçersiz ruhsat seri no formatı: {value} (2 harf + 6 rakam olmalı)")
+    return match.group(1), match.group(2)
+
+
+def normalize_birth_date(value: Optional[str], today: Optional[date] = None) -> Optional[str]:
+    """Doğum tarihini GG/AA/YYYY biçimine çevir; boşsa None"""
+    if value is None or not str(value).strip():
+        return None
+    text = str(value).strip()
+    for fmt in _BIRTH_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt).date()
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"Geçersiz doğum tarihi: {value} (GG/AA/YYYY veya YYYY-MM-DD)")
+    if parsed.year < 1900 or parsed > (today or date.today()):
+        raise ValueError(f"Geçersiz doğum tarihi: {value}")
+    return parsed.strftime("%d/%m/%Y")
+
+
+def split_vehicle_fields(plaka: Optional[str], ruhsat_seri_no: Optional[str]) -> Dict[str, Optional[str]]:
+    """Plaka ve ruhsattan parçalanmış alanlar (doğrulanmış girdi beklenir)"""
+    fields: Dict[str, Optional[str]] = dict.fromkeys(VEHICLE_SPLIT_FIELDS)
+    if plaka:
+        plate = parse_plate(plaka)
+        fields.update(plaka_il=plate.il_kodu, plaka_harf=plate.harfler, plaka_numara=plate.numara)
+    if ruhsat_seri_no:
+        fields["ruhsat_seri"], fields["ruhsat_no"] = parse_ruhsat(ruhsat_seri_no)
+    return fields
+
+
+def vehicle_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Scraper'lar için parçalanmış alanlar: istek şemasının hazırladıkları kullanılır, yoksa
+    (eski kayıtlar, elle eklenmiş işler) plaka/ruhsat burada parçalanır; parçalanamazsa boş
+    """
+    if all(data.get(key) for key in VEHICLE_SPLIT_FIELDS):
+        return {key: data[key] for key in VEHICLE_SPLIT_FIELDS}
+    fields = {key: "" for key in VEHICLE_SPLIT_FIELDS}
+    try:
+        plate = parse_plate(data.get("plaka") or "")
+        fields.update(plaka_il=plate.il_kodu, plaka_harf=plate.harfler, plaka_numara=plate.numara)
+    except ValueError:
+        pass
+    try:
+        fields["ruhsat_seri"], fields["ruhsat_no"] = parse_ruhsat(data.get("ruhsat_seri_no") or "")
+    except ValueError:
+        pass
+    return fields
+
+
+def normalize_request_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serbest biçimli istek verisini (ScrapeRequest.data) doğrula ve normalize et
+    Sadece mevcut alanlara bakılır; plaka/ruhsat varsa parçalanmış alanlar eklenir
+    """
+    data = dict(data)
+    if data.get("tckn") not in (None, ""):
+        data["tckn"] = validate_tckn(str(data["tckn"]))
+    if "dogum_tarihi" in data:
+        data["dogum_tarihi"] = normalize_birth_date(data["dogum_tarihi"])
+    if data.get("plaka"):
+        data["plaka"] = parse_plate(str(data["plaka"])).compact
+    if data.get("ruhsat_seri_no"):
+        data["ruhsat_seri_no"] = "".join(parse_ruhsat(str(data["ruhsat_seri_no"])))
+    if data.get("plaka") or data.get("ruhsat_seri_no"):
+        data.update(split_vehicle_fields(data.get("plaka"), data.get("ruhsat_seri_no")))
+    return data
@@ -0,0 +1,233 @@
+"""
+Scraper worker - veritabanındaki scrape işlerini kiralayıp çalıştırır
+
+Kullanım:
+    python -m backend.worker
+
+Birden fazla makinede aynı veritabanına bağlanarak çalıştırılabilir. Her worker kendi
+Playwright thread'lerini (scraper_workers) kullanır; API sadece iş ekler ve sonuç okur.
+Fleet modu dışında API de gömülü bir ScraperWorker ile toplu (batch) işleri çalıştırır.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.circuit_breaker import circuit_breakers
+from backend.company_stats import company_stats, company_stats_flush_loop
+from backend.credential_pool import credential_pool
+from backend.database import SessionLocal, init_db
+from backend.error_taxonomy import classify_error, negative_cache
+from backend.job_queue import (
+    complete_job, heartbeat_leases, lease_job, register_worker, requeue_expired, unregister_worker
+)
+from backend.priorities import JobPreempted, JobPriority
+from backend.schemas import InsuranceCompany
+from backend.scraper_workers import SCRAPER_WORKERS, scraper_pool, session_key
+from backend.scrapers import CREDENTIAL_SCRAPERS, SCRAPER_FUNCTIONS
+
+logger = logging.getLogger("backend.worker")
+
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(SCRAPER_WORKERS)))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "30"))
+
+
+class ScraperWorker:
+    """Kiralama döngüsü, heartbeat ve iş çalıştırma"""
+
+    def __init__(self, worker_id: str = WORKER_ID, concurrency: int = WORKER_CONCURRENCY,
+                 runner: Optional[Callable[..., Awaitable[Any]]] = None, embedded: bool = False):
+        """
+        runner(company, branch, data, request_id, priority=...) verilirse işler onunla çalıştırılır
+        embedded=True: API içinde çalışır; scraper pool ve istatistikler API'ye aittir
+        """
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.runner = runner
+        self.embedded = embedded
+        self.hostname = socket.gethostname()
+        self.companies = [company.value for company in SCRAPER_FUNCTIONS]
+        self.active: Dict[int, asyncio.Task] = {}
+        self.stopping = asyncio.Event()
+
+    def warm_companies(self):
+        """Playwright worker'larından birinde açık oturumu olan şirketler"""
+        return [
+            company for company in self.companies
+            if any(w.holds_company_session(company) for w in scraper_pool.workers)
+        ]
+
+    def _register(self):
+        register_worker(
+            SessionLocal, self.worker_id, self.hostname, self.concurrency,
+            len(self.active), self.companies, self.warm_companies()
+        )
+
+    async def _heartbeat_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            try:
+                await loop.run_in_executor(None, heartbeat_leases, SessionLocal, self.worker_id, list(self.active))
+                await loop.run_in_executor(None, self._register)
+                await loop.run_in_executor(None, requeue_expired, SessionLocal)
+            except Exception as e:
+                logger.error(f"❌ Heartbeat hatası: {e}")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), WORKER_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        company = InsuranceCompany(job["company"])
+        started_at = time.monotonic()
+        result, error, error_class = None, None, None
+        priority = job["priority"] if job.get("priority") is not None else JobPriority.NORMAL
+        # Runner (run_company_scraper) negatif önbelleğe kendisi bakar
+        cached = negative_cache.get(company.value, job["branch"], job["payload"]) if self.runner is None else None
+        try:
+            if self.runner is not None:
+                # Runner (run_company_scraper) devre kesiciyi kendisi uygular
+                result = await self.runner(
+                    company, job["branch"], job["payload"], job["request_id"], priority=priority
+                )
+                if result is not None and "negative_cache" in (result.raw_data or {}):
+                    cached = result
+            elif cached is not None:
+                # Aynı girdiler için deterministik hata önbellekte: portala gidilmez
+                result = cached
+            else:
+                circuit_breakers.before_call(company.value)
+                if company in CREDENTIAL_SCRAPERS and credential_pool.has_accounts(company.value):
+                    with credential_pool.lease(company.value) as credential:
+                        result = await scraper_pool.submit(
+                            SCRAPER_FUNCTIONS[company], job["branch"], job["payload"], job["request_id"],
+                            affinity=session_key(company.value, credential.account), priority=priority,
+                            credential=credential
+                        )
+                else:
+                    result = await scraper_pool.submit(
+                        SCRAPER_FUNCTIONS[company], job["branch"], job["payload"], job["request_id"],
+                        affinity=session_key(company.value), priority=priority
+                    )
+        except asyncio.CancelledError:
+            if self.runner is None:
+                circuit_breakers.release(company.value)
+            raise
+        except JobPreempted as e:
+            logger.info(f"⏸️ İş #{job['id']} ({company.value}) canlı teklif için bırakıldı, tekrar kuyruğa alınacak")
+            error, error_class = str(e), e.error_class
+        except Exception as e:
+            logger.error(f"❌ İş #{job['id']} ({company.value}) hatası: {e}", exc_info=True)
+            error, error_class = str(e) or type(e).__name__, getattr(e, "error_class", type(e).__name__)
+
+        success = bool(result and result.status == "completed")
+        if self.runner is None and cached is None:
+            category = None
+            if not success:
+                category = result.error_category if result else classify_error(error, error_class)
+            circuit_breakers.record(
+                company.value, success, None if success else (error_class or ("ScraperFailed" if result else "NoResult")),
+                category
+            )
+            negative_cache.put(company.value, job["branch"], job["payload"], result)
+        if error_class in ("CircuitOpenError", "JobPreempted") or cached is not None:
+            # Reddedilen/bırakılan iş sonuç vermedi, deneme hakkı varsa kuyruğa döner; önbellekten dönen
+            # iş önbellekteki hatayla (kategori dahil) biter. İkisi de istatistiğe sayılmaz
+            try:
+                await loop.run_in_executor(
+                    None, complete_job, SessionLocal, job["id"], self.worker_id, cached, error, error_class
+                )
+            finally:
+                self.active.pop(job["id"], None)
+            return
+        company_stats.record(
+            company.value, success, time.monotonic() - started_at,
+            None if success else (error_class or ("ScraperFailed" if result else "NoResult")),
+            branch=job["branch"]
+        )
+        try:
+            await loop.run_in_executor(
+                None, complete_job, SessionLocal, job["id"], self.worker_id, result, error, error_class
+            )
+            logger.info(f"{'✅' if success else '❌'} İş #{job['id']} ({company.value}) tamamlandı")
+        except Exception as e:
+            logger.error(f"❌ İş #{job['id']} sonucu yazılamadı: {e}", exc_info=True)
+        finally:
+            self.active.pop(job["id"], None)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        background = [asyncio.create_task(self._heartbeat_loop())]
+        if not self.embedded:
+            scraper_pool.start()
+            company_stats.load(SessionLocal)
+            background.append(asyncio.create_task(company_stats_flush_loop(SessionLocal)))
+        logger.info(f"🚀 Worker {self.worker_id} başlatıldı ({self.concurrency} eşzamanlı iş, {', '.join(self.companies)})")
+
+        while not self.stopping.is_set():
+            job = None
+            if len(self.active) < self.concurrency:
+                try:
+                    # Devresi açık şirketlerin işleri kuyrukta bekler (deneme zamanı gelince kiralanır)
+                    companies = [c for c in self.companies if circuit_breakers.available(c)]
+                    job = await loop.run_in_executor(
+                        None, lease_job, SessionLocal, self.worker_id, companies, self.warm_companies()
+                    ) if companies else None
+                except Exception as e:
+                    logger.error(f"❌ İş kiralanamadı: {e}")
+            if job is not None:
+                self.active[job["id"]] = asyncio.create_task(self._run_job(job))
+                continue
+            try:
+                await asyncio.wait_for(self.stopping.wait(), WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+        # Eldeki işleri bitir, sonra kapat
+        if self.active:
+            logger.info(f"⏳ {len(self.active)} iş bitmesi bekleniyor...")
+            await asyncio.gather(*self.active.values(), return_exceptions=True)
+        for task in background:
+            task.cancel()
+        if not self.embedded:
+            scraper_pool.stop()
+            company_stats.flush(SessionLocal)
+        unregister_worker(SessionLocal, self.worker_id)
+        logger.info(f"👋 Worker {self.worker_id} durduruldu")
+
+
+async def _main():
+    worker = ScraperWorker()
+    loop = asyncio.get_running_loop()
+    if sys.platform != "win32":
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stopping.set)
+    await worker.run()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    init_db()
+    if SessionLocal is None:
+        logger.error("❌ Veritabanı bağlantısı yok, worker başlatılamaz")
+        sys.exit(1)
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
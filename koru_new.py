@@ -216,9 +216,8 @@ class TOTPHelper:
     def generate_totp(secret: str) -> str:
         """TOTP kodu üret (basit implementasyon)"""
         try:
-            import pyotp
-            totp = pyotp.TOTP(secret)
-            return totp.now()
+            from scrapers_event.totp_service import totp_code
+            return totp_code(secret)
         except ImportError:
             logger.warning("pyotp bulunamadı, demo TOTP kullanılıyor")
             return "123456"
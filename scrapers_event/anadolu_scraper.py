@@ -6,6 +6,10 @@ from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 import time
 import random
+try:
+    from totp_service import totp_code
+except ImportError:
+    from scrapers_event.totp_service import totp_code
 
 # Windows için asyncio event loop policy ayarla (Playwright için)
 # ProactorEventLoop subprocess desteği için gerekli
@@ -28,7 +32,8 @@ class AnadoluScraper:
         self.totp_secret = os.getenv("ANADOLU_TOTP_SECRET", "LNPTT4LB6AI7TCKBQSFF2PPQ5U22JYB3").strip()  # Google Authenticator secret
         self.headless  = os.getenv("HEADLESS", "false").lower() == "true"
         self.timeout   = int(os.getenv("ANADOLU_TIMEOUT_MS", "45000"))
-        self.session_file = "anadolu_session.json"  # Tüm oturum verileri
+        # Tüm oturum verileri (backend keep-alive görevi de aynı dosyayı yeniler)
+        self.session_file = os.getenv("ANADOLU_SESSION_FILE", "anadolu_session.json")
 
         if not self.login_url:
             raise RuntimeError("ANADOLU_LOGIN_URL .env içinde tanımlı değil.")
@@ -114,8 +119,6 @@ class AnadoluScraper:
     def _verify_totp(self, page):
         """TOTP/Google Authenticator doğrulaması yap"""
         try:
-            import pyotp
-            
             print("[INFO] TOTP/Google Authenticator doğrulaması yapılıyor...")
             time.sleep(2)  # TOTP ekranının yüklenmesi için bekle
             
@@ -144,8 +147,7 @@ class AnadoluScraper:
                 return True
             
             # TOTP kodu oluştur
-            totp = pyotp.TOTP(self.totp_secret)
-            code = totp.now()
+            code = totp_code(self.totp_secret)
             print(f"[INFO] TOTP kodu oluşturuldu: {code}")
             
             # TOTP kodunu gir
@@ -177,9 +179,6 @@ class AnadoluScraper:
             print("[SUCCESS] TOTP doğrulaması tamamlandı!")
             return True
             
-        except ImportError:
-            print("[ERROR] pyotp kütüphanesi yüklü değil. 'pip install pyotp' yapın.")
-            return False
         except Exception as e:
             print(f"[WARNING] TOTP doğrulaması sırasında hata: {e}")
             # TOTP hatası kritik değil, devam et
@@ -6,8 +6,11 @@ from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 import time
 import random
-import pyotp # 'run_bireysel_kasko' fonksiyonundan import'u buraya taşıdım
 import traceback # Hata ayıklama için
+try:
+    from totp_service import totp_code
+except ImportError:
+    from scrapers_event.totp_service import totp_code
 
 # Windows için asyncio event loop policy ayarla (Playwright için)
 # ProactorEventLoop subprocess desteği için gerekli
@@ -303,8 +306,7 @@ class AtlasScraper:
                 print("[INFO] TOTP doğrulaması yapılıyor...")
                 time.sleep(random.uniform(1, 2))
                 
-                totp = pyotp.TOTP(self.totp_secret)
-                code = totp.now()
+                code = totp_code(self.totp_secret)
                 print(f"[INFO] TOTP kodu oluşturuldu: {code}")
                 
                 totp_selectors = [
@@ -809,8 +811,7 @@ class AtlasScraper:
                 print("[INFO] TOTP doğrulaması yapılıyor...")
                 time.sleep(random.uniform(1, 2))
                 
-                totp = pyotp.TOTP(self.totp_secret)
-                code = totp.now()
+                code = totp_code(self.totp_secret)
                 print(f"[INFO] TOTP kodu oluşturuldu: {code}")
                 
                 totp_selectors = [
@@ -1167,8 +1168,7 @@ class AtlasScraper:
                 print("[INFO] TOTP doğrulaması yapılıyor...")
                 time.sleep(random.uniform(1, 2))
                 
-                totp = pyotp.TOTP(self.totp_secret)
-                code = totp.now()
+                code = totp_code(self.totp_secret)
                 print(f"[INFO] TOTP kodu oluşturuldu: {code}")
                 
                 totp_selectors = [
@@ -5,6 +5,10 @@ from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 import time
 import random
+try:
+    from totp_service import totp_code
+except ImportError:
+    from scrapers_event.totp_service import totp_code
 
 # Windows için asyncio event loop policy ayarla (Playwright için)
 # ProactorEventLoop subprocess desteği için gerekli
@@ -799,13 +803,10 @@ class DogaScraper:
     def _verify_totp(self, page):
         """TOTP 2FA doğrulaması yap"""
         try:
-            import pyotp
-            
             print("[INFO] TOTP doğrulaması yapılıyor...")
             
             # TOTP kodu oluştur
-            totp = pyotp.TOTP(self.totp_secret)
-            code = totp.now()
+            code = totp_code(self.totp_secret)
             print(f"[INFO] TOTP kodu oluşturuldu: {code}")
             
             # TOTP input alanını bul
@@ -843,9 +844,6 @@ class DogaScraper:
             page.wait_for_load_state("networkidle", timeout=self.timeout)
             print("[SUCCESS] TOTP doğrulaması başarılı!")
             
-        except ImportError:
-            print("[ERROR] pyotp kütüphanesi yüklü değil. Lütfen 'pip install pyotp' yapın.")
-            raise
         except Exception as e:
             print(f"[ERROR] TOTP doğrulaması sırasında hata: {e}")
             raise
@@ -890,7 +888,7 @@ class DogaScraper:
         except Exception as e:
             print(f"[ERROR] Ekran görüntüsü alınamadı: {e}")
     
-    def run_with_data(self, scraper_type: str, data: dict):
+    def run_with_data(self, scraper_type: str, data: dict, browser=None):
         """
         API için scraper çalıştırma metodu
         scraper_type: "kasko" veya "trafik"
@@ -902,9 +900,11 @@ class DogaScraper:
             "tescil_seri_kod": "ER",
             "tescil_seri_no": "993016"
         }
+        browser: verilirse (uzun ömürlü worker browser'ı) sadece yeni context açılır,
+        browser kapatılmaz
         """
         # Windows için event loop policy ayarla (her run'da)
-        if sys.platform == "win32":
+        if sys.platform == "win32" and browser is None:
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
             # Mevcut event loop'u kapat ve yeni bir tane oluştur
             try:
@@ -919,36 +919,38 @@ class DogaScraper:
             # Yeni event loop oluştur
             asyncio.set_event_loop(asyncio.new_event_loop())
         
-        browser = None
+        owns_browser = browser is None
+        p = None
         context = None
         page = None
         
         try:
             from playwright.sync_api import sync_playwright
             
-            with sync_playwright() as p:
+            if owns_browser:
+                p = sync_playwright().start()
                 browser = p.chromium.launch(headless=self.headless)
-                context = browser.new_context()
-                page = context.new_page()
-                page.set_default_timeout(self.timeout)
-                
-                # Login
-                page.goto(self.login_url, wait_until="networkidle")
-                self._login(page)
-                self._verify_totp(page)
-                
-                # Scraper tipine göre işlem yap
-                if scraper_type == "kasko":
-                    premium_data = self.get_kasko_quote(page, data)
-                elif scraper_type == "trafik":
-                    premium_data = self.get_trafik_quote(page, data)
-                else:
-                    raise ValueError(f"Geçersiz scraper tipi: {scraper_type}")
-                
-                # Premium verilerini çek
-                premium_data = self._extract_premium_values(page)
-                
-                return {"premium_data": premium_data}
+            context = browser.new_context()
+            page = context.new_page()
+            page.set_default_timeout(self.timeout)
+            
+            # Login
+            page.goto(self.login_url, wait_until="networkidle")
+            self._login(page)
+            self._verify_totp(page)
+            
+            # Scraper tipine göre işlem yap
+            if scraper_type == "kasko":
+                premium_data = self.get_kasko_quote(page, data)
+            elif scraper_type == "trafik":
+                premium_data = self.get_trafik_quote(page, data)
+            else:
+                raise ValueError(f"Geçersiz scraper tipi: {scraper_type}")
+            
+            # Premium verilerini çek
+            premium_data = self._extract_premium_values(page)
+            
+            return {"premium_data": premium_data}
                 
         except Exception as e:
             print(f"[ERROR] Scraper çalıştırılırken hata: {e}")
@@ -964,11 +966,16 @@ class DogaScraper:
                     context.close()
                 except Exception:
                     pass
-            if browser:
+            if browser and owns_browser:
                 try:
                     browser.close()
                 except Exception:
                     pass
+            if p:
+                try:
+                    p.stop()
+                except Exception:
+                    pass
 
 
 # Kullanım örneği
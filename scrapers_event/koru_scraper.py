@@ -7,9 +7,16 @@ import sys
 import logging
 import asyncio
 from dotenv import load_dotenv
-import pyotp
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 import time
+try:
+    from totp_service import totp_code
+    from quote_steps import QuoteStep, StepCheckpoint, StepInputError, StepPreempted, run_quote_flow, step_failed
+except ImportError:
+    from scrapers_event.totp_service import totp_code
+    from scrapers_event.quote_steps import (
+        QuoteStep, StepCheckpoint, StepInputError, StepPreempted, run_quote_flow, step_failed
+    )
 
 # Windows için asyncio event loop policy ayarla (Playwright için)
 # ProactorEventLoop subprocess desteği için gerekli
@@ -23,6 +30,152 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- TEKLİF ADIMLARI (Trafik / Kasko) ---
+# Her adım run(page, data, inputs) imzasıyla çalışır; quote_steps.run_quote_flow başarısız adımı,
+# sayfa hâlâ o adımın ekranını gösteriyorsa login tekrarlanmadan yeniden dener. Form alanları
+# doluysa tekrar doldurulmaz, bu yüzden devam eden adım önceki girdileri bozmaz.
+TRAFFIC_ICON = "table#police_hizli_trafik_sepet img#img_police_hizli_trafik_sepet"
+CASCO_ICON = "table#police_hizli_kasko_sepet img#img_police_hizli_kasko_sepet"
+TCKN_INPUT = "#kimlikNoInput"
+BIRTH_DATE_INPUT = "#dogumTarihiInput input"
+PLATE_CITY_INPUT = "#plakaIlCodeuInput"
+PLATE_INPUT = "#plakaCodeuInput"
+REGISTRATION_CODE_INPUT = "#tescilCodeInput"
+REGISTRATION_NO_INPUT = "#tescilNoInput"
+OCCUPATION_SELECT = "#sigortaliMeslek"
+OCCUPATION_OTHER = "3"  # Diğer
+QUOTE_BUTTON = 'input[type="button"][value="Teklif Al"]'
+OFFER_TABLE = "#tblCaprazSatisTeklifTablosu"
+OFFER_ROWS = "#tblCaprazSatisTeklifTablosu tbody tr"
+
+
+def _fill_if_empty(page, selector, value, label, inputs):
+    field = page.locator(selector)
+    if field.input_value().strip():
+        logger.info(f"{label} zaten dolu, atlandı")
+        return
+    field.fill(value)
+    inputs[label] = value
+    logger.info(f"{label} girildi")
+    page.wait_for_timeout(3000)
+
+
+def _open_product_step(icon_selector):
+    def step(page, data, inputs):
+        icon = page.locator(icon_selector)
+        icon.wait_for(state="visible", timeout=10000)
+        icon.click()
+        logger.info("Ürün ikonuna tıklandı, sayfa yükleniyor...")
+        page.wait_for_timeout(10000)
+        return True
+    return step
+
+
+def _step_customer(page, data, inputs):
+    if not data.get("tc"):
+        raise StepInputError("TC kimlik no boş")
+    kimlik_input = page.locator(TCKN_INPUT)
+    kimlik_input.wait_for(state="visible", timeout=15000)
+    kimlik_input.fill(data["tc"])
+    inputs["tc"] = data["tc"]
+    logger.info("TC kimlik no girildi")
+    page.wait_for_timeout(3000)
+    _fill_if_empty(page, BIRTH_DATE_INPUT, data["dogum_tarihi"], "Doğum tarihi", inputs)
+    return True
+
+
+def _vehicle_step(registration_fields):
+    """Plaka ve tescil alanları; tescil alanlarının sırası branşın formuna göre verilir"""
+    def step(page, data, inputs):
+        if not data.get("plaka_il") or not data.get("plaka_no"):
+            raise StepInputError(f"Geçersiz plaka: {data.get('plaka_il', '')}{data.get('plaka_no', '')}")
+        _fill_if_empty(page, PLATE_CITY_INPUT, data["plaka_il"], "Plaka il kodu", inputs)
+        _fill_if_empty(page, PLATE_INPUT, data["plaka_no"], "Plaka numarası", inputs)
+        for selector, key, label in registration_fields:
+            _fill_if_empty(page, selector, data[key], label, inputs)
+        return True
+    return step
+
+
+def _step_occupation(page, data, inputs):
+    page.locator(OCCUPATION_SELECT).select_option(value=OCCUPATION_OTHER)
+    inputs["meslek"] = OCCUPATION_OTHER
+    page.wait_for_timeout(3000)
+    return True
+
+
+def _read_offer_rows(page, matches, timeout=5000):
+    """Teklif tablosunda ürün adı matches(ürün_adı) olan satırlar"""
+    satirlar = page.locator(OFFER_ROWS)
+    satir_sayisi = satirlar.count()
+    logger.info(f"Toplam {satir_sayisi} quote rows found")
+    teklifler = []
+    for i in range(satir_sayisi):
+        satir = satirlar.nth(i)
+        try:
+            urun_adi = satir.locator('td:nth-child(3)').inner_text(timeout=timeout).strip()
+            logger.info(f"Satır {i+1} - Ürün Adı: '{urun_adi}'")
+            if not matches(urun_adi.upper()):
+                continue
+            teklifler.append({
+                "sigortali_ad": satir.locator('td:nth-child(1)').inner_text(timeout=timeout).strip(),
+                "teklif_no": satir.locator('td:nth-child(2) a').inner_text(timeout=timeout).strip(),
+                "urun_adi": urun_adi,
+                "prim": satir.locator('td:nth-child(5)').inner_text(timeout=timeout).strip(),
+            })
+        except Exception as satir_hata:
+            logger.warning(f"Satır {i+1} okunamadı: {satir_hata}")
+    return teklifler
+
+
+def _quote_step(product, matches, row_timeout):
+    """Teklif Al'a bas, tabloyu bekle ve ürünün ilk teklifini döndür"""
+    def step(page, data, inputs):
+        teklif_buton = page.locator(QUOTE_BUTTON)
+        teklif_buton.wait_for(state="visible", timeout=10000)
+        teklif_buton.click()
+        logger.info("Teklif Al butonuna tıklandı, sonuç bekleniyor...")
+
+        page.wait_for_selector(OFFER_TABLE, timeout=60000)
+        page.wait_for_selector(OFFER_ROWS, timeout=60000)
+        logger.info("Teklif tablosu yüklendi")
+
+        teklifler = _read_offer_rows(page, matches, row_timeout)
+        if not teklifler:
+            logger.warning(f"{product} teklifi bulunamadı!")
+            return {'basarili': False, 'hata': f"{product} teklifi tabloda yok"}
+        logger.info(f"{product} teklifi bulundu: {teklifler[0]}")
+        return teklifler[0]
+    return step
+
+
+# Adım adı, fonksiyon ve adımın çalışabileceği ekranın selector'ı (kaldığı yerden devam için)
+TRAFIK_STEPS = [
+    QuoteStep("urun", _open_product_step(TRAFFIC_ICON), TRAFFIC_ICON),
+    QuoteStep("musteri", _step_customer, TCKN_INPUT),
+    QuoteStep("arac", _vehicle_step([
+        (REGISTRATION_NO_INPUT, "tescil_no", "Tescil numarası"),
+        (REGISTRATION_CODE_INPUT, "tescil_kod", "Tescil kodu"),
+    ]), PLATE_INPUT),
+    QuoteStep("teklif", _quote_step("TRAFIK", lambda urun: urun == "TRAFIK", 5000), QUOTE_BUTTON),
+]
+
+KASKO_STEPS = [
+    QuoteStep("urun", _open_product_step(CASCO_ICON), CASCO_ICON),
+    QuoteStep("musteri", _step_customer, TCKN_INPUT),
+    QuoteStep("arac", _vehicle_step([
+        (REGISTRATION_CODE_INPUT, "tescil_kod", "Tescil kodu"),
+        (REGISTRATION_NO_INPUT, "tescil_no", "Tescil numarası"),
+    ]), PLATE_INPUT),
+    QuoteStep("meslek", _step_occupation, OCCUPATION_SELECT),
+    QuoteStep("teklif", _quote_step("Kasko", lambda urun: "KASKO" in urun, 2000), QUOTE_BUTTON),
+]
+
+
+class KoruLoginError(RuntimeError):
+    """Login/TOTP başarısız - run() bunu False'a çevirmeden yukarı iletir (hesap giriş hatası sayılır)"""
+
+
 class KoruScraper:
     def __init__(self):
         # Load environment variables with UTF-8 encoding
@@ -157,8 +310,7 @@ class KoruScraper:
             totp_input.wait_for(state="visible", timeout=15000)
             logger.info("TOTP ekranı yüklendi")
 
-            totp = pyotp.TOTP(self.totp_secret)
-            code = totp.now()
+            code = totp_code(self.totp_secret)
 
             totp_input.fill(code, timeout=self.timeout_ms)
             logger.info(f"TOTP code entered: {code}")
@@ -176,168 +328,49 @@ class KoruScraper:
             logger.error(f"TOTP doğrulaması başarısız: {e}")
             return False
 
-    def create_trafik_sigortasi(self, page, teklif_data):
+    def login(self, page, warm=False):
         """
-        Trafik sigortası teklif formunu doldurur ve teklifi alır.
+        Login + TOTP + pop-up kapatma; başarısızsa RuntimeError
+        warm=True ise (oturum çerezleri yüklü context) login formu görünmüyorsa giriş atlanır
+        Giriş yapıldıysa True, açık oturum kullanıldıysa False döner
         """
-        try:
-            logger.info("Trafik sigortası form being filled...")
-
-            # 🔹 1. Hızlı Trafik (Sepet) ikonuna tıklama
-            trafik_icon = page.locator("table#police_hizli_trafik_sepet img#img_police_hizli_trafik_sepet")
-            trafik_icon.wait_for(state="visible", timeout=10000)
-            trafik_icon.click()
-            logger.info("Trafik ikonuna tıklandı, sayfa yükleniyor...")
-            page.wait_for_timeout(10000)
-
-            # 🔹 2. Kimlik No doldur
-            kimlik_input = page.locator("#kimlikNoInput")
-            kimlik_input.wait_for(state="visible", timeout=15000)
-            kimlik_input.fill(teklif_data["tc"])
-            logger.info("TC kimlik no girildi")
-            page.wait_for_timeout(3000)
-
-            # 🔹 3. Doğum tarihi alanı boşsa doldur
-            dogum_input = page.locator('#dogumTarihiInput input')
-            dogum_degeri = dogum_input.input_value()
-            if not dogum_degeri.strip():
-                dogum_input.fill(teklif_data["dogum_tarihi"])
-                logger.info("Doğum tarihi girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Doğum tarihi zaten dolu, atlandı")
-
-            # 🔹 4. Plaka İl ve Plaka No alanlarını kontrol et ve boşsa doldur
-            plaka_il_input = page.locator("#plakaIlCodeuInput")
-            plaka_no_input = page.locator("#plakaCodeuInput")
-
-            plaka_il_value = plaka_il_input.input_value().strip()
-            plaka_no_value = plaka_no_input.input_value().strip()
-
-            if not plaka_il_value:
-                plaka_il_input.fill(teklif_data["plaka_il"])
-                logger.info("Plaka il kodu girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Plaka il kodu zaten dolu, atlandı")
-
-            if not plaka_no_value:
-                plaka_no_input.fill(teklif_data["plaka_no"])
-                logger.info("Plaka numarası girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Plaka numarası zaten dolu, atlandı")
-
-            # 🔹 6. Tescil no boşsa doldur
-            tescil_no_input = page.locator("#tescilNoInput")
-            if not tescil_no_input.input_value().strip():
-                tescil_no_input.fill(teklif_data["tescil_no"])
-                logger.info("Tescil numarası girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Tescil numarası zaten dolu, atlandı")
-
-            tescil_kod_input = page.locator("#tescilCodeInput")
-            if not tescil_kod_input.input_value().strip():
-                tescil_kod_input.fill(teklif_data["tescil_kod"])
-                logger.info("Tescil kodu girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Tescil kodu zaten dolu, atlandı")
-
-            # 🔹 7. Teklif Al butonuna tıklama
-            teklif_buton = page.locator('input[type="button"][value="Teklif Al"]')
-            teklif_buton.wait_for(state="visible", timeout=10000)
-            teklif_buton.click()
-            logger.info("Teklif Al butonuna tıklandı, sonuç bekleniyor...")
-
-            # 🔹 8. Tablo yüklenmesini beklemek için farklı stratejiler
-            try:
-                # Önce loading/processing göstergelerini kontrol et
-                logger.info("Sayfa yüklenmesi bekleniyor...")
-
-                # Alternatif 1: Tablonun görünür olmasını bekle
-                page.wait_for_selector('#tblCaprazSatisTeklifTablosu', timeout=60000)
-                logger.info("Teklif tablosu görünür oldu")
+        page.goto(self.login_url, wait_until="domcontentloaded", timeout=self.timeout_ms)
+        logger.info(f"Login sayfası açıldı: {self.login_url}")
 
-                # Alternatif 2: Tablo satırlarını bekle (daha uzun timeout)
-                page.wait_for_selector('#tblCaprazSatisTeklifTablosu tbody tr', timeout=60000)
-                logger.info("Tablo satırları yüklendi")
-
-                # Alternatif 3: "TRAFIK" yazısının görünmesini bekle
-                try:
-                    page.wait_for_selector('td:has-text("TRAFIK")', timeout=30000)
-                    logger.info("TRAFIK ürünü tabloda görüldü")
-                except:
-                    logger.warning("TRAFIK ürünü doğrudan bulunamadı, tabloyu tarıyoruz...")
+        if not self._validate_selectors(page):
+            if warm:
+                logger.info(f"Login formu yok, açık oturum kullanılıyor. URL: {page.url}")
+                self._close_popups(page)
+                return False
+            logger.warning("Selector doğrulaması başarısız, continuing...")
 
-                # Tabloyu al
-                satirlar = page.locator('#tblCaprazSatisTeklifTablosu tbody tr')
-                satir_sayisi = satirlar.count()
-                logger.info(f"Toplam {satir_sayisi} quote rows found")
+        if not self._fill_credentials(page):
+            raise RuntimeError("Kimlik bilgileri girilemedi")
 
-                trafik_teklifi = None
+        if not self._click_login_button(page):
+            raise RuntimeError("Login butonu tıklanamadı")
 
-                for i in range(satir_sayisi):
-                    try:
-                        # Ürün adını al (3. sütun)
-                        urun_adi = satirlar.nth(i).locator('td:nth-child(3)').inner_text(timeout=5000).strip()
-                        logger.info(f"Satır {i+1} - Ürün Adı: '{urun_adi}'")
-
-                        if urun_adi.upper() == "TRAFIK":
-                            sigortali_ad = satirlar.nth(i).locator('td:nth-child(1)').inner_text(timeout=5000).strip()
-                            teklif_no = satirlar.nth(i).locator('td:nth-child(2) a').inner_text(timeout=5000).strip()
-                            prim = satirlar.nth(i).locator('td:nth-child(5)').inner_text(timeout=5000).strip()
-
-                            trafik_teklifi = {
-                                "sigortali_ad": sigortali_ad,
-                                "teklif_no": teklif_no,
-                                "urun_adi": urun_adi,
-                                "prim": prim
-                            }
-                            logger.info(f"TRAFIK teklifi bulundu: {trafik_teklifi}")
-                            break
-                    except Exception as satir_hata:
-                        logger.warning(f"Satır {i+1} okunamadı: {satir_hata}")
-                        continue
-
-                if not trafik_teklifi:
-                    logger.warning("TRAFIK teklifi bulunamadı!")
-                    # Hata ayıklama için tüm satırları logla
-                    logger.info("Mevcut teklifler:")
-                    for i in range(satir_sayisi):
-                        try:
-                            urun_adi = satirlar.nth(i).locator('td:nth-child(3)').inner_text(timeout=3000).strip()
-                            prim = satirlar.nth(i).locator('td:nth-child(5)').inner_text(timeout=3000).strip()
-                            logger.info(f"  - {urun_adi}: {prim}")
-                        except:
-                            logger.info(f"  - Satır {i+1}: Okunamadı")
-                    return None
-
-                return trafik_teklifi
+        if not self._handle_totp(page):
+            raise RuntimeError("TOTP doğrulaması başarısız")
 
-            except Exception as e:
-                logger.error(f"TRAFIK teklifini alırken hata oluştu: {e}")
-
-                # Sayfa kaynağını hata ayıklama için kaydet
-                try:
-                    page_content = page.content()
-                    with open("debug_page.html", "w", encoding="utf-8") as f:
-                        f.write(page_content)
-                    logger.info("Hata ayıklama için sayfa kaynağı 'debug_page.html' saved to file")
-                except:
-                    pass
+        page.wait_for_load_state("domcontentloaded", timeout=self.timeout_ms)
+        logger.info(f"Login işlemi tamamlandı. URL: {page.url}")
+        time.sleep(5)
 
-                return None
+        self._close_popups(page)
+        return True
 
-        except Exception as e:
-            logger.error(f"[HATA] Trafik sigortası teklifi oluşturulamadı: {e}")
-            return False
-        
+    def create_trafik_sigortasi(self, page, teklif_data, checkpoint=None):
+        """
+        Trafik sigortası teklif formunu doldurur ve teklifi alır (teklif dict'i, alınamazsa None)
+        Geçici bir hatada akış, sayfa uygunsa aynı oturumda başarısız adımdan devam eder
+        """
+        logger.info("Trafik sigortası form being filled...")
+        return self._run_flow(page, TRAFIK_STEPS, teklif_data, "koru_trafik", checkpoint)
 
-    def create_kasko_sigortasi(self, page, teklif_data):
+    def create_kasko_sigortasi(self, page, teklif_data, checkpoint=None):
         """
-        Kasko sigortası teklif formunu doldurur ve teklifi alır.
+        Kasko sigortası teklif formunu doldurur ve ilk kasko teklifini alır (alınamazsa None)
         teklif_data örneği:
         {
             "tc": "12345678901",
@@ -348,157 +381,26 @@ class KoruScraper:
             "tescil_no": "123456"
         }
         """
-        try:
-            logger.info("Kasko sigortası form being filled...")
-
-            # 🔹 1. Hızlı Kasko (Sepet) ikonuna tıklama
-            kasko_icon = page.locator("table#police_hizli_kasko_sepet img#img_police_hizli_kasko_sepet")
-            kasko_icon.wait_for(state="visible", timeout=10000)
-            kasko_icon.click()
-            logger.info("Kasko ikonuna tıklandı, sayfa yükleniyor...")
-            page.wait_for_timeout(10000)
-
-            # 🔹 2. Kimlik No doldur
-            kimlik_input = page.locator("#kimlikNoInput")
-            kimlik_input.wait_for(state="visible", timeout=15000)
-            kimlik_input.fill(teklif_data["tc"])
-            logger.info("TC kimlik no girildi")
-            page.wait_for_timeout(3000)
-
-            # 🔹 3. Doğum tarihi alanı boşsa doldur
-            dogum_input = page.locator('#dogumTarihiInput input')
-            dogum_degeri = dogum_input.input_value()
-            if not dogum_degeri.strip():
-                dogum_input.fill(teklif_data["dogum_tarihi"])
-                logger.info("Doğum tarihi girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Doğum tarihi zaten dolu, atlandı")
-
-            # 🔹 4. Plaka İl ve Plaka No alanlarını kontrol et ve boşsa doldur
-            plaka_il_input = page.locator("#plakaIlCodeuInput")
-            plaka_no_input = page.locator("#plakaCodeuInput")
-
-            plaka_il_value = plaka_il_input.input_value().strip()
-            plaka_no_value = plaka_no_input.input_value().strip()
-
-            if not plaka_il_value:
-                plaka_il_input.fill(teklif_data["plaka_il"])
-                logger.info("Plaka il kodu girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Plaka il kodu zaten dolu, atlandı")
-
-            if not plaka_no_value:
-                plaka_no_input.fill(teklif_data["plaka_no"])
-                logger.info("Plaka numarası girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Plaka numarası zaten dolu, atlandı")
-
-            # 🔹 5. Tescil kodu boşsa doldur
-            tescil_kod_input = page.locator("#tescilCodeInput")
-            if not tescil_kod_input.input_value().strip():
-                tescil_kod_input.fill(teklif_data["tescil_kod"])
-                logger.info("Tescil kodu girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Tescil kodu zaten dolu, atlandı")
-
-            # 🔹 6. Tescil no boşsa doldur
-            tescil_no_input = page.locator("#tescilNoInput")
-            if not tescil_no_input.input_value().strip():
-                tescil_no_input.fill(teklif_data["tescil_no"])
-                logger.info("Tescil numarası girildi")
-                page.wait_for_timeout(3000)
-            else:
-                logger.info("Tescil numarası zaten dolu, atlandı")
-
-            # 🔹 7. Meslek seçimi - Otomatik "Diğer" seç
-            meslek_select = page.locator("#sigortaliMeslek")
-            meslek_select.select_option(value="3")  # 3 = Diğer
-            page.wait_for_timeout(3000)
-
-            # 🔹 8. Teklif Al butonuna tıklama
-            teklif_buton = page.locator('input[type="button"][value="Teklif Al"]')
-            teklif_buton.wait_for(state="visible", timeout=10000)
-            teklif_buton.click()
-            logger.info("Teklif Al butonuna tıklandı, sonuç bekleniyor...")
-
-            # 🔹 9. Tablo yüklenmesini beklemek için farklı stratejiler
-            try:
-                logger.info("Sayfa yüklenmesi bekleniyor...")
-
-                # Tablonun görünür olmasını bekle
-                page.wait_for_selector('#tblCaprazSatisTeklifTablosu', timeout=60000)
-                logger.info("Teklif tablosu görünür oldu")
-
-                # Tablo satırlarını bekle
-                page.wait_for_selector('#tblCaprazSatisTeklifTablosu tbody tr', timeout=60000)
-                logger.info("Tablo satırları yüklendi")
-
-                # Tabloyu al
-                satirlar = page.locator('#tblCaprazSatisTeklifTablosu tbody tr')
-                satir_sayisi = satirlar.count()
-                logger.info(f"Toplam {satir_sayisi} quote rows found")
-
-                kasko_teklifleri = []
-
-                for i in range(satir_sayisi):
-                    try:
-                        # Ürün adını al (3. sütun)
-                        urun_adi = satirlar.nth(i).locator('td:nth-child(3)').inner_text(timeout=2000).strip()
-                        logger.info(f"Satır {i+1} - Ürün Adı: '{urun_adi}'")
-
-                        # Kasko ürünlerini filtrele
-                        if "KASKO" in urun_adi.upper():
-                            sigortali_ad = satirlar.nth(i).locator('td:nth-child(1)').inner_text(timeout=2000).strip()
-                            teklif_no = satirlar.nth(i).locator('td:nth-child(2) a').inner_text(timeout=2000).strip()
-                            prim = satirlar.nth(i).locator('td:nth-child(5)').inner_text(timeout=2000).strip()
-
-                            kasko_teklifi = {
-                                "sigortali_ad": sigortali_ad,
-                                "teklif_no": teklif_no,
-                                "urun_adi": urun_adi,
-                                "prim": prim
-                            }
-                            kasko_teklifleri.append(kasko_teklifi)
-                            logger.info(f"Kasko teklifi bulundu: {kasko_teklifi}")
-
-                    except Exception as satir_hata:
-                        logger.debug(f"Satır {i+1} okunamadı: {satir_hata}")
-                        continue
-
-                if not kasko_teklifleri:
-                    logger.warning("Kasko teklifi bulunamadı!")
-                    # Hata ayıklama için tüm satırları logla
-                    logger.info("Mevcut teklifler:")
-                    for i in range(satir_sayisi):
-                        try:
-                            urun_adi = satirlar.nth(i).locator('td:nth-child(3)').inner_text(timeout=2000).strip()
-                            prim = satirlar.nth(i).locator('td:nth-child(5)').inner_text(timeout=2000).strip()
-                            logger.info(f"  - {urun_adi}: {prim}")
-                        except:
-                            logger.info(f"  - Satır {i+1}: Okunamadı")
-                    return None
-
-                # İlk kasko teklifini döndür
-                return kasko_teklifleri[0] if kasko_teklifleri else None
-
-            except Exception as e:
-                logger.error(f"Kasko teklifini alırken hata oluştu: {e}")
-
-
-                return None
-
-        except Exception as e:
-            logger.error(f"[HATA] Kasko sigortası teklifi oluşturulamadı: {e}")
-            return False
-
-    def run(self, trafik_data=None, kasko_data=None):
-        """Ana çalıştırma fonksiyonu"""
+        logger.info("Kasko sigortası form being filled...")
+        return self._run_flow(page, KASKO_STEPS, teklif_data, "koru_kasko", checkpoint)
+
+    def _run_flow(self, page, steps, teklif_data, flow, checkpoint):
+        result = run_quote_flow(page, steps, teklif_data, flow, login_url=self.login_url, checkpoint=checkpoint)
+        if step_failed(result):
+            hata = result.get('hata') if isinstance(result, dict) else None
+            adim = result.get('adim') if isinstance(result, dict) else None
+            logger.error(f"[HATA] {flow} teklifi alınamadı (adım: {adim}): {hata}")
+            return None
+        return result
+
+    def run(self, trafik_data=None, kasko_data=None, browser=None):
+        """
+        Ana çalıştırma fonksiyonu
+        browser verilirse (uzun ömürlü worker browser'ı) yeni Playwright başlatılmaz,
+        sadece yeni bir context açılıp iş sonunda kapatılır
+        """
         # Windows için event loop policy ayarla (her run'da)
-        if sys.platform == "win32":
+        if sys.platform == "win32" and browser is None:
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
             # Mevcut event loop'u kapat ve yeni bir tane oluştur
             try:
@@ -513,65 +415,63 @@ class KoruScraper:
             # Yeni event loop oluştur
             asyncio.set_event_loop(asyncio.new_event_loop())
         
-        browser = None
         try:
+            if browser is not None:
+                return self._run_in_browser(browser, trafik_data, kasko_data, interactive=False)
             with sync_playwright() as pw:
                 browser = pw.chromium.launch(headless=self.headless)
-                context = browser.new_context(viewport={"width": 1366, "height": 900})
-                page = context.new_page()
-
-                page.goto(self.login_url, wait_until="domcontentloaded", timeout=self.timeout_ms)
-                logger.info(f"Login sayfası açıldı: {self.login_url}")
-
-                if not self._validate_selectors(page):
-                    logger.warning("Selector doğrulaması başarısız, continuing...")
-
-                if not self._fill_credentials(page):
-                    raise RuntimeError("Kimlik bilgileri girilemedi")
-
-                if not self._click_login_button(page):
-                    raise RuntimeError("Login butonu tıklanamadı")
-
-                if not self._handle_totp(page):
-                    raise RuntimeError("TOTP doğrulaması başarısız")
-
-                page.wait_for_load_state("domcontentloaded", timeout=self.timeout_ms)
-                logger.info(f"Login işlemi tamamlandı. URL: {page.url}")
-                time.sleep(5)
-
-                self._close_popups(page)
-
-                result = {}
-                
-                # Trafik sigortası teklif işlemi
-                if trafik_data:
-                    trafik_teklifi = self.create_trafik_sigortasi(page, trafik_data)
-                    logger.info(f"Trafik teklifi sonucu: {trafik_teklifi}")
-                    result["trafik"] = trafik_teklifi
-    
-                # Kasko sigortası teklif işlemi
-                if kasko_data:
-                    kasko_teklifi = self.create_kasko_sigortasi(page, kasko_data)
-                    logger.info(f"Kasko teklifi sonucu: {kasko_teklifi}")
-                    result["kasko"] = kasko_teklifi
-    
-                if not self.headless:
-                    input("\nTarayıcı açık. Kapatmak için Enter'a basın...")
-    
-                return result if result else False
+                return self._run_in_browser(browser, trafik_data, kasko_data, interactive=not self.headless)
     
+        except KoruLoginError:
+            raise
         except Exception as e:
             logger.error(f"Ölümcül hata: {e}")
             return False
         # Finally bloğunu kaldırdık - sync_playwright() context manager browser'ı otomatik kapatır
+
+    def _run_in_browser(self, browser, trafik_data, kasko_data, interactive):
+        """Login + teklif akışını verilen browser'da yeni bir context içinde çalıştır"""
+        context = browser.new_context(viewport={"width": 1366, "height": 900})
+        try:
+            page = context.new_page()
+            try:
+                self.login(page)
+            except Exception as e:
+                logger.error(f"Login başarısız: {e}")
+                raise KoruLoginError(str(e) or type(e).__name__) from e
+
+            result = {}
+            
+            # Trafik sigortası teklif işlemi
+            if trafik_data:
+                trafik_teklifi = self.create_trafik_sigortasi(page, trafik_data)
+                logger.info(f"Trafik teklifi sonucu: {trafik_teklifi}")
+                result["trafik"] = trafik_teklifi
+
+            # Kasko sigortası teklif işlemi
+            if kasko_data:
+                kasko_teklifi = self.create_kasko_sigortasi(page, kasko_data)
+                logger.info(f"Kasko teklifi sonucu: {kasko_teklifi}")
+                result["kasko"] = kasko_teklifi
+
+            # Sadece komut satırından çalıştırıldığında kullanıcıyı bekle
+            if interactive:
+                input("\nTarayıcı açık. Kapatmak için Enter'a basın...")
+
+            return result if result else False
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
     
-    def run_trafik_with_data(self, teklif_data):
+    def run_trafik_with_data(self, teklif_data, browser=None):
         """Trafik sigortası için scraper çalıştır"""
-        return self.run(trafik_data=teklif_data)
+        return self.run(trafik_data=teklif_data, browser=browser)
     
-    def run_kasko_with_data(self, teklif_data):
+    def run_kasko_with_data(self, teklif_data, browser=None):
         """Kasko sigortası için scraper çalıştır"""
-        return self.run(kasko_data=teklif_data)
+        return self.run(kasko_data=teklif_data, browser=browser)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Adım adım, kaldığı yerden devam edebilen teklif akışları
+
+Teklif akışı isimli adımlardan (QuoteStep) oluşur. Her başarılı adımdan sonra StepCheckpoint
+güncellenir: tamamlanan adımlar, girilen değerler ve sayfa adresi. Bir adım geçici olarak
+başarısız olursa ve portal hâlâ o adımın beklediği ekranı gösteriyorsa (expect selector'ı
+görünür, login sayfasına atılmamış) akış login/form doldurmayı tekrarlamadan aynı oturumda o
+adımdan devam eder. Girdi hataları (StepInputError) tekrar denenmez. checkpoint.preempt verilmişse
+her adım sınırında sorulur; True dönerse akış StepPreempted ile bırakılır (öncelikli işe yol verme).
+Her adımın süresi checkpoint.timings'e yazılır (metrikler için). run_quote_flow_async aynı akışı
+playwright.async_api sayfalarında async adım fonksiyonlarıyla çalıştırır.
+"""
+import asyncio
+import os
+import sys
+import time
+import traceback
+
+# Başarısız adım aynı oturumda en fazla bu kadar kez tekrar denenir
+QUOTE_STEP_RETRIES = int(os.getenv("QUOTE_STEP_RETRIES", "1"))
+QUOTE_STEP_RETRY_DELAY_SECONDS = float(os.getenv("QUOTE_STEP_RETRY_DELAY_SECONDS", "2"))
+
+# Adım başlangıç/bitişinde çağrılır (process supervisor'ı bunu ilerleme heartbeat'i olarak kullanır)
+_progress_hook = None
+
+
+def set_progress_hook(hook):
+    global _progress_hook
+    _progress_hook = hook
+
+
+def _progress():
+    if _progress_hook is not None:
+        _progress_hook()
+
+
+class StepInputError(Exception):
+    """Girdi verisi portala uygun değil (geçersiz plaka, bulunamayan marka...) - tekrar denenmez"""
+
+
+class StepPreempted(Exception):
+    """Akış daha öncelikli iş için adım sınırında bırakıldı - hata değil"""
+
+
+class QuoteStep:
+    """
+    Tek bir akış adımı
+    run(page, data, inputs): başarılıysa truthy (son adım teklif dict'i) döndürür; False ya da
+    {'basarili': False, ...} başarısızlıktır. inputs adımların girdiği değerleri tutar.
+    expect: adımın çalışabileceği ekranı gösteren selector (None: her ekranda denenebilir)
+    options: adımın ayarları (örn. wait_seconds); aynı adım planından async adım üretirken kullanılır
+    """
+
+    def __init__(self, name, run, expect=None, **options):
+        self.name = name
+        self.run = run
+        self.expect = expect
+        self.options = options
+
+    def __repr__(self):
+        return f"QuoteStep({self.name!r})"
+
+
+class StepCheckpoint:
+    """Akışın son iyi durumu: tamamlanan adımlar, girilen değerler, sayfa adresi"""
+
+    def __init__(self, flow):
+        self.flow = flow
+        self.completed = []
+        self.inputs = {}
+        self.url = None
+        self.failed_step = None
+        self.error = None
+        self.retryable = True
+        self.resumes = 0
+        # Adım sınırında sorulan kesilme kontrolü (None: kesilmez)
+        self.preempt = None
+        # Çalışan her adım için (adım, süre, başarılı mı); tekrar denenen adım iki kez yer alır
+        self.timings = []
+
+    @property
+    def next_index(self):
+        return len(self.completed)
+
+    def to_dict(self):
+        return {
+            "flow": self.flow,
+            "completed": list(self.completed),
+            "failed_step": self.failed_step,
+            "error": self.error,
+            "resumes": self.resumes,
+        }
+
+
+def step_failed(result):
+    return not result or (isinstance(result, dict) and not result.get('basarili', True))
+
+
+def _should_preempt(step, checkpoint):
+    if checkpoint.completed and checkpoint.preempt is not None and checkpoint.preempt():
+        print(f"[BİLGİ] Akış '{step.name}' adımından önce öncelikli iş için bırakıldı")
+        return True
+    _progress()
+    return False
+
+
+def _record_step(step, checkpoint, result, started_at):
+    """Adım sonucunu checkpoint'e yaz; başarısızsa False"""
+    _progress()
+    checkpoint.timings.append((step.name, time.monotonic() - started_at, not step_failed(result)))
+    if step_failed(result):
+        checkpoint.failed_step = step.name
+        if isinstance(result, dict):
+            checkpoint.error = result.get('hata')
+        return False
+    checkpoint.completed.append(step.name)
+    return True
+
+
+def _step_exception_result(step, checkpoint, e):
+    if isinstance(e, StepInputError):
+        print(f"[HATA] {step.name}: {e}", file=sys.stderr)
+        checkpoint.retryable = False
+        return {'basarili': False, 'hata': str(e)}
+    print(f"[HATA] '{step.name}' adımında hata oluştu: {e}", file=sys.stderr)
+    traceback.print_exc()
+    return {'basarili': False, 'hata': str(e) or type(e).__name__}
+
+
+def _failed_flow_result(result, checkpoint):
+    if step_failed(result) and checkpoint.failed_step:
+        if isinstance(result, dict):
+            result.setdefault('adim', checkpoint.failed_step)
+        else:
+            result = {'basarili': False, 'hata': f"'{checkpoint.failed_step}' adımı başarısız", 'adim': checkpoint.failed_step}
+    return result
+
+
+def run_steps(page, steps, data, checkpoint):
+    """
+    checkpoint.next_index'ten başlayarak adımları çalıştır
+    Son adımın sonucunu ya da başarısız adımın sonucunu döndürür; exception'lar
+    {'basarili': False, 'hata': ...} olarak döner ve checkpoint'e yazılır
+    """
+    result = False
+    for step in steps[checkpoint.next_index:]:
+        if _should_preempt(step, checkpoint):
+            raise StepPreempted(f"'{step.name}' adımından önce bırakıldı")
+        checkpoint.failed_step = None
+        checkpoint.error = None
+        started_at = time.monotonic()
+        try:
+            result = step.run(page, data, checkpoint.inputs)
+        except Exception as e:
+            result = _step_exception_result(step, checkpoint, e)
+        if not _record_step(step, checkpoint, result, started_at):
+            return result
+        try:
+            checkpoint.url = page.url
+        except Exception:
+            pass
+    return result
+
+
+def can_resume(page, steps, checkpoint, login_url=None):
+    """Portal hâlâ başarısız adımın beklediği ekranı mı gösteriyor"""
+    if not checkpoint.retryable or checkpoint.failed_step is None:
+        return False
+    try:
+        if page.is_closed():
+            return False
+        if login_url and login_url in page.url:
+            return False
+        step = steps[checkpoint.next_index]
+        if step.expect is None:
+            return True
+        return page.locator(step.expect).first.is_visible()
+    except Exception:
+        return False
+
+
+def run_quote_flow(page, steps, data, flow, login_url=None, retries=None, checkpoint=None):
+    """
+    Akışı çalıştır; başarısız adım, ekran uygunsa aynı oturumda kaldığı yerden tekrar denenir
+    Dönüş: son adımın sonucu (teklif dict'i) ya da başarısızlık sonucu
+    """
+    checkpoint = checkpoint or StepCheckpoint(flow)
+    retries = QUOTE_STEP_RETRIES if retries is None else retries
+    result = run_steps(page, steps, data, checkpoint)
+    while step_failed(result) and checkpoint.resumes < retries and can_resume(page, steps, checkpoint, login_url):
+        checkpoint.resumes += 1
+        print(f"[BİLGİ] '{checkpoint.failed_step}' adımından devam ediliyor "
+              f"({len(checkpoint.completed)} adım atlandı, deneme {checkpoint.resumes}/{retries})")
+        time.sleep(QUOTE_STEP_RETRY_DELAY_SECONDS)
+        result = run_steps(page, steps, data, checkpoint)
+    return _failed_flow_result(result, checkpoint)
+
+
+async def run_steps_async(page, steps, data, checkpoint):
+    """run_steps'in async karşılığı: adım fonksiyonları coroutine'dir"""
+    result = False
+    for step in steps[checkpoint.next_index:]:
+        if _should_preempt(step, checkpoint):
+            raise StepPreempted(f"'{step.name}' adımından önce bırakıldı")
+        checkpoint.failed_step = None
+        checkpoint.error = None
+        started_at = time.monotonic()
+        try:
+            result = await step.run(page, data, checkpoint.inputs)
+        except Exception as e:
+            result = _step_exception_result(step, checkpoint, e)
+        if not _record_step(step, checkpoint, result, started_at):
+            return result
+        checkpoint.url = page.url
+    return result
+
+
+async def can_resume_async(page, steps, checkpoint, login_url=None):
+    """can_resume'un async karşılığı"""
+    if not checkpoint.retryable or checkpoint.failed_step is None:
+        return False
+    try:
+        if page.is_closed():
+            return False
+        if login_url and login_url in page.url:
+            return False
+        step = steps[checkpoint.next_index]
+        if step.expect is None:
+            return True
+        return await page.locator(step.expect).first.is_visible()
+    except Exception:
+        return False
+
+
+async def run_quote_flow_async(page, steps, data, flow, login_url=None, retries=None, checkpoint=None):
+    """run_quote_flow'un async karşılığı; bekleme event loop'u bloklamaz"""
+    checkpoint = checkpoint or StepCheckpoint(flow)
+    retries = QUOTE_STEP_RETRIES if retries is None else retries
+    result = await run_steps_async(page, steps, data, checkpoint)
+    while (step_failed(result) and checkpoint.resumes < retries
+           and await can_resume_async(page, steps, checkpoint, login_url)):
+        checkpoint.resumes += 1
+        print(f"[BİLGİ] '{checkpoint.failed_step}' adımından devam ediliyor "
+              f"({len(checkpoint.completed)} adım atlandı, deneme {checkpoint.resumes}/{retries})")
+        await asyncio.sleep(QUOTE_STEP_RETRY_DELAY_SECONDS)
+        result = await run_steps_async(page, steps, data, checkpoint)
+    return _failed_flow_result(result, checkpoint)
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-import pyotp
+try:
+    from totp_service import totp_code
+except ImportError:
+    from scrapers_event.totp_service import totp_code
 import time
 import sys
 import json 
@@ -47,8 +50,8 @@ STEALTH_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.
 def generate_totp_code(secret_key):
     """Generate current TOTP code with given secret key."""
     try:
-        totp = pyotp.TOTP(secret_key)
-        current_code = totp.now()
+        # Pencerede yeterli süre kalmadıysa bir sonrakini bekler, aynı kodu iki kez vermez
+        current_code = totp_code(secret_key)
         print(f"[INFO] Generated TOTP Code: {current_code}")
         return current_code
     except Exception as e:
@@ -70,6 +73,10 @@ def save_storage_state(context):
     except Exception as e:
         print(f"\n[ERROR] Failed to save session state: {e}", file=sys.stderr)
 
+# Not: Referans akışları henüz quote_steps'e taşınmadı. Bu dosya backend'e bağlı değil
+# (SCRAPER_FUNCTIONS'ta Referans yok), menüden çalışan bağımsız bir script. Hata olunca sayfa
+# yenilenip akış baştan başarısız sayılır. Backend'e bağlanırken adımlar Sompo/Koru'daki gibi
+# QuoteStep listesine bölünmeli.
 def hata_handler(page, hata_mesaji, fonksiyon_adi):
     """Reload page and take screenshot on error."""
     print(f"\n[ERROR] {fonksiyon_adi} - {hata_mesaji}", file=sys.stderr)
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+Sompo teklif akışının playwright.async_api sürümü
+
+Selector'lar, ayarlar, giriş bilgileri, girdi parçalama ve adım planı (TRAFIK_STEPS/KASKO_STEPS:
+adım adları, ekran selector'ları, bekleme süreleri) sompo_event.py'den alınır; burada sadece adım
+fonksiyonlarının async karşılıkları vardır. Akış quote_steps.run_quote_flow_async ile çalışır, yani
+sync akıştaki gibi başarısız adımdan devam edebilir. Tek bir event loop üzerinde çok sayıda
+context/sayfa eşzamanlı çalışabilir (her teklif için ayrı thread + Playwright driver gerekmez).
+"""
+import asyncio
+import os
+import sys
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from quote_steps import QuoteStep, StepInputError, run_quote_flow_async
+from sompo_event import (
+    COOKIE_DIR, STORAGE_STATE_FILE_PATH, YOUR_USERNAME, YOUR_PASSWORD, SECRET_KEY,
+    LOGIN_BUTTON_SELECTOR, TOTP_CONTAINER_SELECTOR, LOGIN_URL, DASHBOARD_URL,
+    NEW_OFFER_BUTTON_SELECTOR, POPUP_NOTIF_HAYIR, POPUP_SHEPHERD_CLOSE, GET_OFFER_BUTTON_SELECTOR,
+    TCKN_INPUT_SELECTORS, CASCO_CHECKBOX, TRAFFIC_CHECKBOX, PLATE_CITY_INPUT, PLATE_INPUT,
+    EGM_CODE_INPUT, EGM_NUMBER_INPUT, EGM_SEARCH_BUTTON, VEHICLE_BRAND_DROPDOWN, VEHICLE_MODEL_INPUT,
+    AUTOCOMPLETE_ITEMS, JOB_CODE_INPUT, CONTACT_EMAIL_RADIO, EMAIL_INPUT, PROPOSAL_CREATE_BUTTON,
+    MATURITY_GAP_POPUP_TITLE, MATURITY_GAP_FIRST_DECLARATION, MATURITY_GAP_OK_BUTTON,
+    TRAFFIC_PREMIUM, TRAFFIC_PROPOSAL_NO, TRAFFIC_PREMIUM_ALT, TRAFFIC_PROPOSAL_NO_ALT,
+    TRAFFIC_PREMIUM_VISIBLE_JS, CASCO_STANDARD_NO, CASCO_STANDARD_PREMIUM, CASCO_BUDGET_NO,
+    CASCO_BUDGET_PREMIUM, TRAFIK_STEPS, KASKO_STEPS, split_plate, split_registration, casco_offer_result
+)
+from totp_service import totp_code_async
+
+
+async def save_storage_state(page):
+    """Oturum durumunu JSON dosyasına kaydeder."""
+    try:
+        if not os.path.exists(COOKIE_DIR):
+            os.makedirs(COOKIE_DIR)
+        await page.context.storage_state(path=STORAGE_STATE_FILE_PATH)
+        print(f"\n[BİLGİ] Session state successfully '{STORAGE_STATE_FILE_PATH}' saved to file.")
+    except Exception as e:
+        print(f"\n[HATA] Failed to save session state: {e}", file=sys.stderr)
+
+
+async def login_and_save(page, username=None, password=None, secret_key=None, save_state=True):
+    """
+    Kullanıcı adı/şifre ve TOTP ile giriş yapar ve oturumu kaydeder.
+    Hesap bilgileri verilmezse .env'deki varsayılan hesap kullanılır.
+    save_state=False ise ortak storage_state dosyasına yazılmaz (oturumu çağıran saklar).
+    """
+    username = username or YOUR_USERNAME
+    password = password or YOUR_PASSWORD
+    secret_key = secret_key or SECRET_KEY
+    await page.goto(LOGIN_URL, wait_until="domcontentloaded")
+    print("Sayfa açıldı:", await page.title())
+    username_selector = 'form input:nth-of-type(1)'
+    password_selector = 'input[type="password"]'
+    await page.fill(username_selector, username)
+    await page.fill(password_selector, password)
+    print("Username and password entered.")
+    await page.click(LOGIN_BUTTON_SELECTOR)
+    print("Giriş butonu tıklandı, TOTP ekranı bekleniyor...")
+    # Kod, TOTP ekranı açıldıktan sonra üretilir; pencere sonu bekleme event loop'u bloklamaz
+    await page.wait_for_selector(TOTP_CONTAINER_SELECTOR, timeout=15000)
+    totp_code = await totp_code_async(secret_key)
+    if not totp_code or len(totp_code) != 6:
+        print("[HATA] Geçersiz TOTP kodu uzunluğu.", file=sys.stderr)
+        return False
+    totp_container = page.locator(TOTP_CONTAINER_SELECTOR)
+    input_fields = totp_container.locator('input[type="text"]')
+    for i in range(6):
+        await input_fields.nth(i).fill(totp_code[i])
+    print(f"TOTP Code ({totp_code}) hanelere ayrılarak girildi.")
+    await asyncio.sleep(0.5)
+    print("TOTP code entered. Otomatik doğrulama ve Dashboard bekleniyor...")
+    await page.wait_for_url(lambda url: url != LOGIN_URL, timeout=15000)
+    print("Giriş başarılı! Dashboard sayfasına geçildi.")
+    if save_state:
+        await save_storage_state(page)
+    return True
+
+
+async def session_alive(page):
+    """Dashboard'a gider; login'e yönlendirilirse oturum düşmüştür."""
+    try:
+        await page.goto(DASHBOARD_URL, wait_until="domcontentloaded")
+        return "login" not in page.url.lower()
+    except Exception:
+        return False
+
+
+async def handle_popups(page):
+    """Tanıtım ve Bildirim pop-up'larını kapatır (Varsa)."""
+    print("\n[İŞLEM] Pop-up kontrol ediliyor...")
+    await asyncio.sleep(2)
+
+    popup_buttons = [
+        (POPUP_NOTIF_HAYIR, "'HAYIR' Bildirim pop-up'ı"),
+        (POPUP_SHEPHERD_CLOSE, "Shepherd Turu Kapatma (X)"),
+    ]
+
+    for selector, name in popup_buttons:
+        try:
+            button = page.locator(selector)
+            if await button.is_visible(timeout=2000):
+                await button.click()
+                print(f"[BİLGİ] {name} tıklandı ve kapatıldı.")
+                await asyncio.sleep(0.5)
+        except PlaywrightTimeoutError:
+            continue
+        except Exception as e:
+            print(f"[HATA] {name} kapatılırken beklenmedik hata: {e}", file=sys.stderr)
+
+    print("[BİLGİ] Pop-up kontrol adımı tamamlandı.")
+
+
+async def fill_tckn_field(page, tckn_value):
+    """TCKN alanını bulur ve doldurur. Başarı durumunu döndürür."""
+    print(f"\n[İŞLEM] TCKN girişi yapılıyor: {tckn_value}")
+
+    for selector in TCKN_INPUT_SELECTORS:
+        try:
+            await page.wait_for_selector(selector, state="visible", timeout=5000)
+            input_box = page.locator(selector).first
+            await input_box.wait_for(state="visible", timeout=5000)
+
+            await input_box.click()
+            await asyncio.sleep(0.3)
+            await page.keyboard.press("Control+A")
+            await page.keyboard.press("Backspace")
+            await asyncio.sleep(0.2)
+            await input_box.fill(tckn_value)
+            await asyncio.sleep(0.5)
+
+            current_value = await input_box.input_value()
+            if current_value == tckn_value:
+                print(f"[BAŞARILI] TCKN '{tckn_value}' başarıyla written.")
+                await page.keyboard.press("Tab")
+                await asyncio.sleep(0.5)
+                return True
+            print(f"[UYARI] TCKN written ama doğrulanamadı. Beklenen: {tckn_value}, Bulunan: {current_value}")
+
+        except PlaywrightTimeoutError:
+            continue
+        except Exception as e:
+            print(f"[HATA] {selector} ile hata: {e}")
+            continue
+
+    print("[HATA] TCKN alanı hiçbir selector ile bulunamadı!", file=sys.stderr)
+    return False
+
+
+async def open_new_offer_page(page):
+    """Yeni İş Teklifi sayfasını açar ve yeni sekmeyi döndürür."""
+    print("\n[İŞLEM] 'YENİ İŞ TEKLİFİ' butonuna tıklanıyor...")
+
+    await page.wait_for_url(lambda url: "login" not in url.lower(), timeout=15000)
+    await page.wait_for_selector(NEW_OFFER_BUTTON_SELECTOR, timeout=10000)
+    await page.click(NEW_OFFER_BUTTON_SELECTOR)
+    print("[BAŞARILI] 'YENİ İŞ TEKLİFİ' butonuna tıklandı.")
+
+    await asyncio.sleep(3)
+
+    print("[İŞLEM] 'TEKLİF AL' butonuna tıklanıyor ve yeni sekme bekleniyor...")
+    try:
+        await page.wait_for_selector(GET_OFFER_BUTTON_SELECTOR, timeout=10000)
+
+        async with page.context.expect_page() as new_page_info:
+            await page.click(GET_OFFER_BUTTON_SELECTOR)
+
+        new_page = await new_page_info.value
+        print("[BAŞARILI] Yeni sekme yakalandı!")
+
+        await new_page.wait_for_load_state("domcontentloaded")
+        print(f"[BİLGİ] Yeni sekme URL: {new_page.url}")
+
+        await asyncio.sleep(5)  # Form yüklenmesini bekle
+        return new_page
+
+    except PlaywrightTimeoutError:
+        print("[UYARI] 'TEKLİF AL' butonu bulunamadı veya yeni sekme açılmadı.", file=sys.stderr)
+        return None
+
+
+# ==================== TEKLİF ADIMLARI (sompo_event'teki adımların async karşılıkları) ====================
+
+async def _set_checked(page, selector, checked):
+    checkbox = page.locator(selector)
+    if await checkbox.is_checked() != checked:
+        await (checkbox.check() if checked else checkbox.uncheck())
+
+
+async def _fill(page, selector, value):
+    field = page.locator(selector)
+    await field.click()
+    await field.fill(value)
+    await asyncio.sleep(0.3)
+
+
+async def _type_with_autocomplete(page, field, value):
+    """Alanı temizleyip yavaşça yaz (autocomplete listesinin açılması için)"""
+    await field.click()
+    await asyncio.sleep(0.5)
+    await page.keyboard.press("Control+A")
+    await page.keyboard.press("Backspace")
+    await asyncio.sleep(0.2)
+    await field.type(value, delay=100)
+    await asyncio.sleep(2)
+
+
+async def _step_tckn(page, data, inputs):
+    if not await fill_tckn_field(page, data['tckn']):
+        return False
+    inputs['tckn'] = data['tckn']
+    await asyncio.sleep(1)
+    return True
+
+
+async def _step_select_traffic(page, data, inputs):
+    await _set_checked(page, CASCO_CHECKBOX, False)
+    await asyncio.sleep(0.3)
+    await _set_checked(page, TRAFFIC_CHECKBOX, True)
+    await asyncio.sleep(0.5)
+    return True
+
+
+async def _step_select_casco(page, data, inputs):
+    await _set_checked(page, CASCO_CHECKBOX, True)
+    await asyncio.sleep(0.3)
+    await _set_checked(page, TRAFFIC_CHECKBOX, False)
+    await asyncio.sleep(0.5)
+    return True
+
+
+async def _step_plate(page, data, inputs):
+    il_kodu, kalan_plaka = split_plate(data)
+    await _fill(page, PLATE_CITY_INPUT, il_kodu)
+    await _fill(page, PLATE_INPUT, kalan_plaka)
+    inputs['plaka'] = (il_kodu, kalan_plaka)
+    return True
+
+
+async def _step_registration(page, data, inputs):
+    ruhsat_code, ruhsat_number = split_registration(data)
+    await _fill(page, EGM_CODE_INPUT, ruhsat_code)
+    await _fill(page, EGM_NUMBER_INPUT, ruhsat_number)
+    inputs['ruhsat_seri_no'] = (ruhsat_code, ruhsat_number)
+    return True
+
+
+def _egm_query_step(wait_seconds):
+    async def _step_egm_query(page, data, inputs):
+        print("\n[İŞLEM] EGM sorgusu yapılıyor...")
+        await page.locator(EGM_SEARCH_BUTTON).click()
+        await asyncio.sleep(wait_seconds)
+        return True
+    return _step_egm_query
+
+
+async def _step_vehicle_brand(page, data, inputs):
+    """Araç markası dropdown'ında tam, yoksa kısmi eşleşen seçeneği seç"""
+    brand = data['arac_marka']
+    print(f"\n[İŞLEM] Araç markası seçiliyor: {brand}")
+    try:
+        dropdown = page.locator(VEHICLE_BRAND_DROPDOWN)
+        await dropdown.wait_for(state="visible", timeout=5000)
+    except PlaywrightTimeoutError:
+        print("[HATA] Araç markası dropdown'ı bulunamadı!")
+        return False
+
+    options = dropdown.locator("option")
+    count = await options.count()
+    texts = [((await options.nth(i).text_content()) or "").strip() for i in range(count)]
+    for exact in (True, False):
+        for i, option_text in enumerate(texts):
+            matched = option_text.upper() == brand.upper() if exact else brand.upper() in option_text.upper()
+            if matched:
+                await dropdown.select_option(value=await options.nth(i).get_attribute("value"))
+                print(f"[BAŞARILI] Araç markası seçildi: {option_text}")
+                inputs['arac_marka'] = option_text
+                await asyncio.sleep(4)
+                return True
+    raise StepInputError(f"Araç markası seçilemedi: {brand}")
+
+
+async def _step_vehicle_model(page, data, inputs):
+    # Zorunlu değil - alan bulunamazsa adım atlanır
+    if not data.get('arac_modeli'):
+        return True
+    vehicle_model_input = page.locator(VEHICLE_MODEL_INPUT)
+    try:
+        await vehicle_model_input.wait_for(state="visible", timeout=3000)
+        await _type_with_autocomplete(page, vehicle_model_input, data['arac_modeli'])
+        try:
+            autocomplete_item = page.locator(AUTOCOMPLETE_ITEMS).first
+            if await autocomplete_item.is_visible(timeout=3000):
+                await autocomplete_item.click()
+            else:
+                await page.keyboard.press("Enter")
+        except Exception:
+            await page.keyboard.press("Enter")
+        inputs['arac_modeli'] = data['arac_modeli']
+    except PlaywrightTimeoutError:
+        print("[UYARI] Araç modeli giriş alanı bulunamadı veya zorunlu değil. Adım atlanıyor.")
+    except Exception as e:
+        print(f"[HATA] Araç modeli girişinde beklenmedik hata: {e}", file=sys.stderr)
+    await asyncio.sleep(1)
+    return True
+
+
+async def _step_occupation(page, data, inputs):
+    # Sadece veri varsa; tam eşleşen meslek yoksa listedeki ilk meslek seçilir
+    if not data.get('meslek'):
+        return True
+    try:
+        job_input = page.locator(JOB_CODE_INPUT)
+        await job_input.wait_for(state="visible", timeout=5000)
+        await _type_with_autocomplete(page, job_input, data['meslek'])
+        try:
+            items = page.locator(AUTOCOMPLETE_ITEMS)
+            count = await items.count()
+            if count > 0:
+                for i in range(count):
+                    item_text = ((await items.nth(i).text_content()) or "").strip()
+                    if item_text.upper() == data['meslek'].upper():
+                        await items.nth(i).click()
+                        break
+                else:
+                    await items.first.click()
+            else:
+                await page.keyboard.press("Enter")
+        except Exception as e:
+            print(f"[HATA] Meslek autocomplete seçiminde hata: {e}")
+            await page.keyboard.press("Enter")
+        inputs['meslek'] = data['meslek']
+    except PlaywrightTimeoutError:
+        print("[HATA] Meslek input alanı bulunamadı!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Meslek alanı bulunamadı'}
+    await asyncio.sleep(1)
+    return True
+
+
+async def _step_contact(page, data, inputs):
+    await page.locator(CONTACT_EMAIL_RADIO).check()
+    await asyncio.sleep(0.5)
+    email_input = page.locator(EMAIL_INPUT)
+    await email_input.wait_for(state="visible", timeout=5000)
+    await email_input.click()
+    await email_input.fill(data['email'])
+    inputs['email'] = data['email']
+    await asyncio.sleep(0.5)
+    return True
+
+
+def _create_proposal_step(wait_seconds):
+    async def _step_create_proposal(page, data, inputs):
+        proposal_button = page.locator(PROPOSAL_CREATE_BUTTON)
+        await proposal_button.wait_for(state="visible", timeout=5000)
+        await proposal_button.click()
+        print("[BAŞARILI] 'Teklif Oluştur' butonuna tıklandı.")
+        await asyncio.sleep(wait_seconds)
+        return True
+    return _step_create_proposal
+
+
+async def _step_maturity_gap_popup(page, data, inputs):
+    try:
+        await page.wait_for_selector(MATURITY_GAP_POPUP_TITLE, timeout=5000, state='visible')
+    except PlaywrightTimeoutError:
+        return True
+    print("[UYARI] Vade boşluğu beyan pop-up'ı yakalandı!")
+    await page.locator(MATURITY_GAP_FIRST_DECLARATION).check()
+    await asyncio.sleep(0.5)
+    ok_buttons = page.locator(MATURITY_GAP_OK_BUTTON)
+    count = await ok_buttons.count()
+    if count == 0:
+        return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu bulunamadı'}
+    for i in range(count):
+        if await ok_buttons.nth(i).is_visible():
+            await ok_buttons.nth(i).click()
+            break
+    else:
+        return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu görünür değil'}
+    await asyncio.sleep(5)
+    return True
+
+
+async def _text(page, selector, default="Bulunamadı"):
+    try:
+        return ((await page.locator(selector).text_content()) or "").strip()
+    except Exception:
+        return default
+
+
+async def _step_traffic_premium(page, data, inputs):
+    try:
+        await page.evaluate("window.scrollBy(0, 500)")
+        await asyncio.sleep(2)
+        await page.evaluate("window.scrollBy(0, 500)")
+        await asyncio.sleep(2)
+
+        teklif_tipi = brut_prim = teklif_no = None
+        try:
+            if await page.locator(TRAFFIC_PREMIUM).count() > 0 and await page.evaluate(TRAFFIC_PREMIUM_VISIBLE_JS):
+                brut_prim = await _text(page, TRAFFIC_PREMIUM, None)
+                teklif_no = await _text(page, TRAFFIC_PROPOSAL_NO)
+                teklif_tipi = "STANDART"
+        except Exception as e:
+            print(f"[BİLGİ] Standart teklif bulunamadı: {e}")
+
+        if not brut_prim:
+            try:
+                await page.evaluate("window.scrollBy(0, 300)")
+                await asyncio.sleep(1)
+                await page.locator(TRAFFIC_PREMIUM_ALT).wait_for(state="visible", timeout=15000)
+                brut_prim = await _text(page, TRAFFIC_PREMIUM_ALT, None)
+                teklif_no = await _text(page, TRAFFIC_PROPOSAL_NO_ALT)
+                teklif_tipi = "EK_TEMİNATLI"
+            except Exception as e:
+                print(f"[BİLGİ] Ek Teminatlı teklif bulunamadı: {e}")
+
+        if not brut_prim:
+            print("[HATA] Hiçbir teklif bulunamadı!", file=sys.stderr)
+            return {'basarili': False, 'hata': 'Teklif bilgileri bulunamadı'}
+
+        print(f"✅ TRAFİK SİGORTASI TEKLİFİ: {teklif_tipi} / {teklif_no} / {brut_prim}")
+        return {'basarili': True, 'teklif_tipi': teklif_tipi, 'teklif_no': teklif_no, 'brut_prim': brut_prim}
+    except PlaywrightTimeoutError:
+        print("[HATA] Teklif bilgileri yüklenemedi (timeout)!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
+
+
+async def _visible_text(page, selector):
+    element = page.locator(selector)
+    if await element.count() > 0 and await element.is_visible():
+        return ((await element.text_content()) or "").strip()
+    return "Bulunamadı"
+
+
+async def _step_casco_premium(page, data, inputs):
+    try:
+        await page.evaluate("window.scrollBy(0, 700)")
+        await asyncio.sleep(2)
+
+        teklif_bilgileri = {}
+        for prefix, no_selector, premium_selector in (
+            ("standart", CASCO_STANDARD_NO, CASCO_STANDARD_PREMIUM),
+            ("butce_dostu", CASCO_BUDGET_NO, CASCO_BUDGET_PREMIUM),
+        ):
+            try:
+                teklif_bilgileri[f"{prefix}_teklif_no"] = await _visible_text(page, no_selector)
+                teklif_bilgileri[f"{prefix}_brut_prim"] = await _visible_text(page, premium_selector)
+            except Exception as e:
+                print(f"[HATA] {prefix} kasko teklifi bilgileri alınırken hata: {e}")
+                teklif_bilgileri[f"{prefix}_teklif_no"] = "Hata"
+                teklif_bilgileri[f"{prefix}_brut_prim"] = "Hata"
+
+        result = casco_offer_result(teklif_bilgileri)
+        print(f"✅ KASKO SİGORTASI TEKLİFİ: {result['en_uygun_teklif']} / "
+              f"{result['en_uygun_teklif_no']} / {result['en_uygun_prim']}")
+        return result
+    except PlaywrightTimeoutError:
+        print("[HATA] Kasko teklif sonuçları yüklenemedi (timeout)!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
+
+
+# Adım adı -> async adım fonksiyonu üreticisi (adımın options'ı ile çağrılır)
+_ASYNC_STEP_FACTORIES = {
+    "tckn": lambda: _step_tckn,
+    "plaka": lambda: _step_plate,
+    "ruhsat": lambda: _step_registration,
+    "egm_sorgu": lambda wait_seconds: _egm_query_step(wait_seconds),
+    "arac_marka": lambda: _step_vehicle_brand,
+    "arac_modeli": lambda: _step_vehicle_model,
+    "meslek": lambda: _step_occupation,
+    "iletisim": lambda: _step_contact,
+    "teklif_olustur": lambda wait_seconds: _create_proposal_step(wait_seconds),
+    "vade_boslugu": lambda: _step_maturity_gap_popup,
+}
+
+
+def _async_steps(plan, overrides):
+    """sompo_event'teki adım planından async adımlar (aynı ad, ekran selector'ı ve ayarlar)"""
+    steps = []
+    for step in plan:
+        run = overrides.get(step.name) or _ASYNC_STEP_FACTORIES[step.name](**step.options)
+        steps.append(QuoteStep(step.name, run, step.expect, **step.options))
+    return steps
+
+
+TRAFIK_STEPS_ASYNC = _async_steps(TRAFIK_STEPS, {
+    "sigorta_turu": _step_select_traffic, "prim": _step_traffic_premium,
+})
+KASKO_STEPS_ASYNC = _async_steps(KASKO_STEPS, {
+    "sigorta_turu": _step_select_casco, "prim": _step_casco_premium,
+})
+
+
+async def process_trafik_sigortasi(page, data, checkpoint=None):
+    """Trafik Sigortası için teklif sürecini tamamlar (başarısız adımdan devam edebilir)."""
+    print("\n" + "="*60)
+    print("TRAFİK SİGORTASI İŞLEMİ BAŞLATILIYOR (async)")
+    print("="*60)
+    return await run_quote_flow_async(
+        page, TRAFIK_STEPS_ASYNC, data, "sompo_trafik", login_url=LOGIN_URL, checkpoint=checkpoint
+    )
+
+
+async def process_kasko_sigortasi(page, data, checkpoint=None):
+    """Kasko Sigortası için teklif sürecini tamamlar (başarısız adımdan devam edebilir)."""
+    print("\n" + "="*60)
+    print("KASKO SİGORTASI İŞLEMİ BAŞLATILIYOR (async)")
+    print("="*60)
+    return await run_quote_flow_async(
+        page, KASKO_STEPS_ASYNC, data, "sompo_kasko", login_url=LOGIN_URL, checkpoint=checkpoint
+    )
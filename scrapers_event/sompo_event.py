@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-import pyotp
+try:
+    from totp_service import totp_code
+    from quote_steps import QuoteStep, StepInputError, run_quote_flow
+except ImportError:
+    from scrapers_event.totp_service import totp_code
+    from scrapers_event.quote_steps import QuoteStep, StepInputError, run_quote_flow
 import time
 import sys
 import json
@@ -50,6 +55,52 @@ POPUP_NOTIF_HAYIR = '#ppialog-popover-cancel-button:has-text("HAYIR")'
 POPUP_SHEPHERD_CLOSE = 'button.shepherd-cancel-icon'
 GET_OFFER_BUTTON_SELECTOR = 'button:has-text("TEKLİF AL")'
 
+# --- TEKLİF FORMU SELECTOR'LARI (sync akış ve sompo_async ortak kullanır) ---
+TCKN_INPUT = "#txtIdentityOrTaxNo"
+TCKN_INPUT_SELECTORS = [
+    TCKN_INPUT,
+    "input[id='txtIdentityOrTaxNo']",
+    "input[name*='Identity']",
+    "input[name*='TaxNo']",
+    "input[placeholder*='TC']",
+    "input[placeholder*='Kimlik']",
+]
+CASCO_CHECKBOX = "#chkCasco"
+TRAFFIC_CHECKBOX = "#chkTraffic"
+PLATE_CITY_INPUT = "#txtPlateNoCityNo"
+PLATE_INPUT = "#txtPlateNo"
+EGM_CODE_INPUT = "#txtEGMNoCode"
+EGM_NUMBER_INPUT = "#txtEGMNoNumber"
+EGM_SEARCH_BUTTON = "#btnSearchEgm"
+VEHICLE_BRAND_DROPDOWN = "#ddlVehicleBrandNewCasco"
+VEHICLE_MODEL_INPUT = "#txtVehicleModels"
+AUTOCOMPLETE_ITEMS = "ul.ui-autocomplete li.ui-menu-item"
+JOB_CODE_INPUT = "#txtCascoNewEntranceJobCode"
+CONTACT_EMAIL_RADIO = "#rblInsuredContactType_1"
+EMAIL_INPUT = "#txtInsuredEmailAddress"
+PROPOSAL_CREATE_BUTTON = "#btnProposalCreate"
+MATURITY_GAP_POPUP_TITLE = 'h3:has-text("Teklifte vade boşluğu bulunmaktadır.")'
+MATURITY_GAP_FIRST_DECLARATION = '#rbVehicleDamaged_1'
+MATURITY_GAP_OK_BUTTON = 'button:has-text("Tamam")'
+TRAFFIC_PREMIUM = "#lblTrafficProposalGrossPremium"
+TRAFFIC_PROPOSAL_NO = "#lblTrafficProposalStartEndDateOrProposalNo"
+TRAFFIC_PREMIUM_ALT = "#lblTrafficProposalGrossPremiumAlternative"
+TRAFFIC_PROPOSAL_NO_ALT = "#lblTrafficProposalStartEndDateOrProposalNoAlternative"
+# Standart trafik primi DOM'da gizli de olabilir: görünür ve dolu mu
+TRAFFIC_PREMIUM_VISIBLE_JS = """
+    () => {
+        const element = document.querySelector('#lblTrafficProposalGrossPremium');
+        if (!element) return false;
+        const style = window.getComputedStyle(element);
+        const text = element.textContent.trim();
+        return style.display !== 'none' && text.length > 0;
+    }
+"""
+CASCO_STANDARD_NO = "#lblCascoProposal2TransactionNo"
+CASCO_STANDARD_PREMIUM = "#lblCascoProposal2GrossPremium"
+CASCO_BUDGET_NO = "#lblReasonablePriceCascoProposalTransactionNo"
+CASCO_BUDGET_PREMIUM = "#lblReasonablePriceCascoProposalGrossPremium"
+
 # --- SİGORTA TÜRLERİ ---
 INSURANCE_TYPES = {
     "TRAFIK": "Trafik Sigortası",
@@ -62,8 +113,8 @@ INSURANCE_TYPES = {
 def generate_totp_code(secret_key):
     """Verilen secret key ile güncel TOTP kodunu üretir."""
     try:
-        totp = pyotp.TOTP(secret_key)
-        current_code = totp.now()
+        # Pencerede yeterli süre kalmadıysa bir sonrakini bekler, aynı kodu iki kez vermez
+        current_code = totp_code(secret_key)
         print(f"[BİLGİ] Generated TOTP Code: {current_code}")
         return current_code
     except Exception as e:
@@ -80,22 +131,29 @@ def save_storage_state(page):
     except Exception as e:
         print(f"\n[HATA] Failed to save session state: {e}", file=sys.stderr)
 
-def login_and_save(page):
-    """Kullanıcı adı/şifre ve TOTP ile giriş yapar ve oturumu kaydeder."""
+def login_and_save(page, username=None, password=None, secret_key=None):
+    """
+    Kullanıcı adı/şifre ve TOTP ile giriş yapar ve oturumu kaydeder.
+    Hesap bilgileri verilmezse .env'deki varsayılan hesap kullanılır.
+    """
+    username = username or YOUR_USERNAME
+    password = password or YOUR_PASSWORD
+    secret_key = secret_key or SECRET_KEY
     page.goto(LOGIN_URL, wait_until="domcontentloaded")
     print("Sayfa açıldı:", page.title())
     username_selector = 'form input:nth-of-type(1)'
     password_selector = 'input[type="password"]'
-    page.fill(username_selector, YOUR_USERNAME)
-    page.fill(password_selector, YOUR_PASSWORD)
+    page.fill(username_selector, username)
+    page.fill(password_selector, password)
     print("Username and password entered.")
     page.click(LOGIN_BUTTON_SELECTOR)
     print("Giriş butonu tıklandı, TOTP ekranı bekleniyor...")
-    totp_code = generate_totp_code(SECRET_KEY)
+    # Kod, TOTP ekranı açıldıktan sonra üretilir ki pencerenin tamamı giriş için kalsın
+    page.wait_for_selector(TOTP_CONTAINER_SELECTOR, timeout=15000)
+    totp_code = generate_totp_code(secret_key)
     if not totp_code or len(totp_code) != 6:
         print("[HATA] Geçersiz TOTP kodu uzunluğu.", file=sys.stderr)
         return False
-    page.wait_for_selector(TOTP_CONTAINER_SELECTOR, timeout=15000)
     totp_container = page.locator(TOTP_CONTAINER_SELECTOR)
     input_fields = totp_container.locator('input[type="text"]')
     for i in range(6):
@@ -141,16 +199,7 @@ def fill_tckn_field(page, tckn_value):
     print(f"\n[İŞLEM] TCKN girişi yapılıyor: {tckn_value}")
 
     # Alternatif selector'lar
-    tckn_selectors = [
-        "#txtIdentityOrTaxNo",
-        "input[id='txtIdentityOrTaxNo']",
-        "input[name*='Identity']",
-        "input[name*='TaxNo']",
-        "input[placeholder*='TC']",
-        "input[placeholder*='Kimlik']",
-    ]
-
-    for selector in tckn_selectors:
+    for selector in TCKN_INPUT_SELECTORS:
         try:
             print(f"[BİLGİ] TCKN alanı deneniyor: {selector}")
 
@@ -222,763 +271,664 @@ def open_new_offer_page(page):
 
 # ==================== SİGORTA TÜRÜ FONKSİYONLARI ====================
 
-def process_trafik_sigortasi(page, data):
-    """
-    Trafik Sigortası için teklif sürecini tamamlar.
-    """
-    print("\n" + "="*60)
-    print("TRAFİK SİGORTASI İŞLEMİ BAŞLATILIYOR")
-    print("="*60)
-    
-    try:
-        # 1️⃣ TCKN girişi
-        if not fill_tckn_field(page, data['tckn']):
-            return False
-        
-        time.sleep(1)
-        
-        # 2️⃣ Kasko checkbox'ını kaldır, Trafik checkbox'ını işaretle
-        print("\n[İŞLEM] Sigorta türü seçiliyor (Trafik)...")
-        
-        # Kasko checkbox'ının işaretini kaldır
-        casco_checkbox = page.locator("#chkCasco")
-        if casco_checkbox.is_checked():
-            casco_checkbox.uncheck()
-            print("[BİLGİ] Kasko seçimi kaldırıldı.")
-        
-        time.sleep(0.3)
-        
-        # Trafik checkbox'ını işaretle
-        traffic_checkbox = page.locator("#chkTraffic")
-        if not traffic_checkbox.is_checked():
-            traffic_checkbox.check()
-            print("[BİLGİ] Trafik sigortası seçildi.")
-        
-        time.sleep(0.5)
-        
-        # 3️⃣ Plaka girişi
-        print(f"\n[İŞLEM] Plaka bilgisi giriliyor: {data['plaka']}")
-        
-        # Plakayı parçala: "34ABC123" -> "34" ve "ABC123"
+# --- TEKLİF ADIMLARI (Trafik / Kasko) ---
+# Her adım run(page, data, inputs) imzasıyla çalışır; quote_steps.run_quote_flow başarısız adımı,
+# sayfa hâlâ o adımın ekranını gösteriyorsa login ve form doldurma tekrarlanmadan yeniden dener.
+
+def split_plate(data):
+    """Plakayı il kodu ve kalan kısım olarak ver: "34ABC123" -> ("34", "ABC123")"""
+    # Backend doğruladıysa parçalar hazır gelir
+    il_kodu = data.get('plaka_il') or ""
+    kalan_plaka = (data.get('plaka_harf') or "") + (data.get('plaka_numara') or "")
+    if not il_kodu or not kalan_plaka:
         plaka = data['plaka'].upper().strip()
-        
-        il_kodu = ""
-        kalan_plaka = ""
-        
+        il_kodu, kalan_plaka = "", ""
         for i, char in enumerate(plaka):
             if char.isdigit():
                 il_kodu += char
             else:
                 kalan_plaka = plaka[i:]
                 break
-        
-        if not il_kodu or not kalan_plaka:
-            print(f"[HATA] Geçersiz plaka formatı: {data['plaka']}", file=sys.stderr)
-            return False
-        
-        print(f"[BİLGİ] Plaka parçalandı -> İl: {il_kodu}, Kalan: {kalan_plaka}")
-        
-        # İl kodunu gir
-        plate_city_input = page.locator("#txtPlateNoCityNo")
-        plate_city_input.click()
-        plate_city_input.fill(il_kodu)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] İl kodu girildi: {il_kodu}")
-        
-        # Kalan plakayı gir
-        plate_input = page.locator("#txtPlateNo")
-        plate_input.click()
-        plate_input.fill(kalan_plaka)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Plate entered: {kalan_plaka}")
-        
-        # 4️⃣ Ruhsat Seri No girişi
-        print(f"\n[İŞLEM] Ruhsat seri no giriliyor: {data['ruhsat_seri_no']}")
-        
+    if not il_kodu or not kalan_plaka:
+        raise StepInputError(f"Geçersiz plaka formatı: {data['plaka']}")
+    return il_kodu, kalan_plaka
+
+
+def split_registration(data):
+    """Ruhsat seri no'yu seri kodu ve numara olarak ver: "FC993016" -> ("FC", "993016")"""
+    ruhsat_code = data.get('ruhsat_seri') or ""
+    ruhsat_number = data.get('ruhsat_no') or ""
+    if not ruhsat_code or not ruhsat_number:
         ruhsat = data['ruhsat_seri_no'].upper().strip()
-        
-        ruhsat_code = ""
-        ruhsat_number = ""
-        
+        ruhsat_code, ruhsat_number = "", ""
         for i, char in enumerate(ruhsat):
             if char.isalpha():
                 ruhsat_code += char
             else:
                 ruhsat_number = ruhsat[i:]
                 break
-        
-        if not ruhsat_code or not ruhsat_number:
-            print(f"[HATA] Geçersiz ruhsat seri no formatı: {data['ruhsat_seri_no']}", file=sys.stderr)
-            return False
-        
-        print(f"[BİLGİ] Ruhsat parçalandı -> Seri: {ruhsat_code}, No: {ruhsat_number}")
-        
-        # Ruhsat seri kodunu gir
-        egm_code_input = page.locator("#txtEGMNoCode")
-        egm_code_input.click()
-        egm_code_input.fill(ruhsat_code)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Ruhsat seri kodu girildi: {ruhsat_code}")
-        
-        # Ruhsat numarasını gir
-        egm_number_input = page.locator("#txtEGMNoNumber")
-        egm_number_input.click()
-        egm_number_input.fill(ruhsat_number)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Ruhsat numarası girildi: {ruhsat_number}")
-        
+    if not ruhsat_code or not ruhsat_number:
+        raise StepInputError(f"Geçersiz ruhsat seri no formatı: {data['ruhsat_seri_no']}")
+    return ruhsat_code, ruhsat_number
+
+
+def parse_premium_amount(prim_str):
+    """'1.234,56 TL' -> 1234.56; okunamayan prim karşılaştırmada en sona kalır (inf)"""
+    if prim_str in (None, "Bulunamadı", "Hata"):
+        return float('inf')
+    try:
+        return float(prim_str.replace('TL', '').replace('.', '').replace(',', '.').strip())
+    except (ValueError, AttributeError):
+        return float('inf')
+
+
+def casco_offer_result(teklif_bilgileri):
+    """Standart ve bütçe dostu kasko tekliflerinden en uygununu seçip akış sonucunu oluştur"""
+    standart_prim = parse_premium_amount(teklif_bilgileri.get('standart_brut_prim', 'Bulunamadı'))
+    butce_prim = parse_premium_amount(teklif_bilgileri.get('butce_dostu_brut_prim', 'Bulunamadı'))
+
+    if standart_prim <= butce_prim and standart_prim != float('inf'):
+        en_uygun_teklif = "STANDART_KASKO"
+        en_uygun_prim = teklif_bilgileri['standart_brut_prim']
+        en_uygun_teklif_no = teklif_bilgileri['standart_teklif_no']
+    elif butce_prim != float('inf'):
+        en_uygun_teklif = "BÜTÇE_DOSTU_KASKO"
+        en_uygun_prim = teklif_bilgileri['butce_dostu_brut_prim']
+        en_uygun_teklif_no = teklif_bilgileri['butce_dostu_teklif_no']
+    else:
+        en_uygun_teklif = "TEKLİF_BULUNAMADI"
+        en_uygun_prim = "Bulunamadı"
+        en_uygun_teklif_no = "Bulunamadı"
+
+    teklif_bilgileri['en_uygun_teklif'] = en_uygun_teklif
+    teklif_bilgileri['en_uygun_prim'] = en_uygun_prim
+    teklif_bilgileri['en_uygun_teklif_no'] = en_uygun_teklif_no
+    return {
+        'basarili': True,
+        'teklif_bilgileri': teklif_bilgileri,
+        'standart_teklif_no': teklif_bilgileri.get('standart_teklif_no'),
+        'standart_brut_prim': teklif_bilgileri.get('standart_brut_prim'),
+        'butce_dostu_teklif_no': teklif_bilgileri.get('butce_dostu_teklif_no'),
+        'butce_dostu_brut_prim': teklif_bilgileri.get('butce_dostu_brut_prim'),
+        'en_uygun_teklif': en_uygun_teklif,
+        'en_uygun_prim': en_uygun_prim,
+        'en_uygun_teklif_no': en_uygun_teklif_no
+    }
+
+
+def _step_tckn(page, data, inputs):
+    # 1️⃣ TCKN girişi
+    if not fill_tckn_field(page, data['tckn']):
+        return False
+    inputs['tckn'] = data['tckn']
+    time.sleep(1)
+    return True
+
+
+def _step_select_traffic(page, data, inputs):
+    # 2️⃣ Kasko checkbox'ını kaldır, Trafik checkbox'ını işaretle
+    print("\n[İŞLEM] Sigorta türü seçiliyor (Trafik)...")
+    
+    # Kasko checkbox'ının işaretini kaldır
+    casco_checkbox = page.locator(CASCO_CHECKBOX)
+    if casco_checkbox.is_checked():
+        casco_checkbox.uncheck()
+        print("[BİLGİ] Kasko seçimi kaldırıldı.")
+    
+    time.sleep(0.3)
+    
+    # Trafik checkbox'ını işaretle
+    traffic_checkbox = page.locator(TRAFFIC_CHECKBOX)
+    if not traffic_checkbox.is_checked():
+        traffic_checkbox.check()
+        print("[BİLGİ] Trafik sigortası seçildi.")
+    
+    time.sleep(0.5)
+    return True
+
+
+def _step_select_casco(page, data, inputs):
+    # 2️⃣ Kasko checkbox'ını işaretle, Trafik checkbox'ını kaldır
+    print("\n[İŞLEM] Sigorta türü seçiliyor (Kasko)...")
+    
+    casco_checkbox = page.locator(CASCO_CHECKBOX)
+    if not casco_checkbox.is_checked():
+        casco_checkbox.check()
+        print("[BİLGİ] Kasko sigortası seçildi.")
+    
+    time.sleep(0.3)
+    
+    traffic_checkbox = page.locator(TRAFFIC_CHECKBOX)
+    if traffic_checkbox.is_checked():
+        traffic_checkbox.uncheck()
+        print("[BİLGİ] Trafik sigortası seçimi kaldırıldı.")
+    
+    time.sleep(0.5)
+    return True
+
+
+def _step_plate(page, data, inputs):
+    # 3️⃣ Plaka girişi
+    print(f"\n[İŞLEM] Plaka bilgisi giriliyor: {data['plaka']}")
+    
+    # Plakayı parçala: "34ABC123" -> "34" ve "ABC123"
+    il_kodu, kalan_plaka = split_plate(data)
+    print(f"[BİLGİ] Plaka parçalandı -> İl: {il_kodu}, Kalan: {kalan_plaka}")
+    
+    # İl kodunu gir
+    plate_city_input = page.locator(PLATE_CITY_INPUT)
+    plate_city_input.click()
+    plate_city_input.fill(il_kodu)
+    time.sleep(0.3)
+    print(f"[BAŞARILI] İl kodu girildi: {il_kodu}")
+    
+    # Kalan plakayı gir
+    plate_input = page.locator(PLATE_INPUT)
+    plate_input.click()
+    plate_input.fill(kalan_plaka)
+    time.sleep(0.3)
+    print(f"[BAŞARILI] Plate entered: {kalan_plaka}")
+    inputs['plaka'] = (il_kodu, kalan_plaka)
+    return True
+
+
+def _step_registration(page, data, inputs):
+    # 4️⃣ Ruhsat Seri No girişi
+    print(f"\n[İŞLEM] Ruhsat seri no giriliyor: {data['ruhsat_seri_no']}")
+    
+    ruhsat_code, ruhsat_number = split_registration(data)
+    print(f"[BİLGİ] Ruhsat parçalandı -> Seri: {ruhsat_code}, No: {ruhsat_number}")
+    
+    # Ruhsat seri kodunu gir
+    egm_code_input = page.locator(EGM_CODE_INPUT)
+    egm_code_input.click()
+    egm_code_input.fill(ruhsat_code)
+    time.sleep(0.3)
+    print(f"[BAŞARILI] Ruhsat seri kodu girildi: {ruhsat_code}")
+    
+    # Ruhsat numarasını gir
+    egm_number_input = page.locator(EGM_NUMBER_INPUT)
+    egm_number_input.click()
+    egm_number_input.fill(ruhsat_number)
+    time.sleep(0.3)
+    print(f"[BAŞARILI] Ruhsat numarası girildi: {ruhsat_number}")
+    inputs['ruhsat_seri_no'] = (ruhsat_code, ruhsat_number)
+    return True
+
+
+def _egm_query_step(wait_seconds):
+    def _step_egm_query(page, data, inputs):
         # 5️⃣ EGM Sorgula butonuna tıkla
         print("\n[İŞLEM] EGM sorgusu yapılıyor...")
-        egm_search_button = page.locator("#btnSearchEgm")
+        egm_search_button = page.locator(EGM_SEARCH_BUTTON)
         egm_search_button.click()
         print("[BAŞARILI] EGM Query button clicked.")
         
-        print("[BİLGİ] EGM sorgu sonucu bekleniyor (5 saniye)...")
-        time.sleep(10)
+        print(f"[BİLGİ] EGM sorgu sonucu bekleniyor ({wait_seconds} saniye)...")
+        time.sleep(wait_seconds)
+        return True
+    return _step_egm_query
 
-        """
-        arac_marka = "Volkswagen" # DÜZENLENECEK ARAÇ MARKA
-        data['arac_marka'] = arac_marka if arac_marka else "Bilinmiyor"
-        """
 
-        print(f"\n[İŞLEM] Araç markası seçiliyor: {data['arac_marka']}")
+def _step_vehicle_brand(page, data, inputs):
+    print(f"\n[İŞLEM] Araç markası seçiliyor: {data['arac_marka']}")
+    
+    try:
+        vehicle_brand_dropdown = page.locator(VEHICLE_BRAND_DROPDOWN)
+        vehicle_brand_dropdown.wait_for(state="visible", timeout=5000)
+        
+        print(f"[BİLGİ] Marka dropdown'ı bulundu. Seçim yapılıyor: {data['arac_marka']}")
+        
+        # Dropdown'dan markaları listele ve eşleş
+        options = vehicle_brand_dropdown.locator("option")
+        option_found = None
+        
+        for i in range(options.count()):
+            option_text = options.nth(i).text_content().strip()
+            if option_text.upper() == data['arac_marka'].upper():
+                option_value = options.nth(i).get_attribute("value")
+                vehicle_brand_dropdown.select_option(value=option_value)
+                print(f"[BAŞARILI] Araç markası seçildi: {option_text}")
+                option_found = option_text
+                break
         
-        try:
-            vehicle_brand_dropdown = page.locator("#ddlVehicleBrandNewCasco")
-            vehicle_brand_dropdown.wait_for(state="visible", timeout=5000)
-            
-            print(f"[BİLGİ] Marka dropdown'ı bulundu. Seçim yapılıyor: {data['arac_marka']}")
-            
-            # Dropdown'dan markaları listele ve eşleş
-            options = vehicle_brand_dropdown.locator("option")
-            option_found = False
-            
+        if not option_found:
+            print(f"[UYARI] Marka bulunamadı: {data['arac_marka']}, listedeki seçenekler aranıyor...")
+            # Tam eşleşme yoksa, kısmi eşleşme ara
             for i in range(options.count()):
                 option_text = options.nth(i).text_content().strip()
-                if option_text.upper() == data['arac_marka'].upper():
+                if data['arac_marka'].upper() in option_text.upper():
                     option_value = options.nth(i).get_attribute("value")
                     vehicle_brand_dropdown.select_option(value=option_value)
-                    print(f"[BAŞARILI] Araç markası seçildi: {option_text}")
-                    option_found = True
+                    print(f"[BAŞARILI] Benzer marka seçildi: {option_text}")
+                    option_found = option_text
                     break
-            
-            if not option_found:
-                print(f"[UYARI] Marka bulunamadı: {data['arac_marka']}, listedeki seçenekler aranıyor...")
-                # Tam eşleşme yoksa, kısmi eşleşme ara
-                for i in range(options.count()):
-                    option_text = options.nth(i).text_content().strip()
-                    if data['arac_marka'].upper() in option_text.upper():
-                        option_value = options.nth(i).get_attribute("value")
-                        vehicle_brand_dropdown.select_option(value=option_value)
-                        print(f"[BAŞARILI] Benzer marka seçildi: {option_text}")
-                        option_found = True
-                        break
-            
-            if not option_found:
-                print(f"[HATA] Araç markası seçilenemedi: {data['arac_marka']}")
-                return False
-            
-            time.sleep(1)
-            
-        except PlaywrightTimeoutError:
-            print("[HATA] Araç markası dropdown'ı bulunamadı!")
-            return False
-        except Exception as e:
-            print(f"[HATA] Araç markası seçiminde hata: {e}", file=sys.stderr)
-            return False
-        time.sleep(3)
-        # 6️⃣ Araç Modeli girişi
-        print(f"\n[İŞLEM] Araç modeli alanı kontrol ediliyor...")
-        
-        vehicle_model_input = page.locator("#txtVehicleModels")
-        
-        try:
-            vehicle_model_input.wait_for(state="visible", timeout=3000)
-            
-            print(f"[BİLGİ] Araç modeli alanı bulundu. Dolduruluyor: {data['arac_modeli']}")
-            
-            vehicle_model_input.click()
-            time.sleep(0.5)
-            
-            page.keyboard.press("Control+A")
-            page.keyboard.press("Backspace")
-            time.sleep(0.2)
-            
-            vehicle_model_input.type(data['arac_modeli'], delay=100)
-            print(f"[BAŞARILI] Araç modeli written: {data['arac_modeli']}")
-            
-            time.sleep(2)
-            print("[BİLGİ] Autocomplete listesi bekleniyor...")
-            
-            try:
-                autocomplete_item = page.locator("ul.ui-autocomplete li.ui-menu-item").first
-                if autocomplete_item.is_visible(timeout=3000):
-                    autocomplete_item.click()
-                    print("[BAŞARILI] Autocomplete listesinden ilk seçenek seçildi.")
-                else:
-                    page.keyboard.press("Enter")
-                    print("[BİLGİ] Enter tuşuna basıldı.")
-            except:
-                page.keyboard.press("Enter")
-                print("[BİLGİ] Enter tuşuna basıldı (autocomplete bulunamadı).")
         
-        except PlaywrightTimeoutError:
-            print("[UYARI] Araç modeli giriş alanı bulunamadı veya zorunlu değil. Adım atlanıyor.")
-            pass
-        except Exception as e:
-            print(f"[HATA] Araç modeli girişinde beklenmedik hata: {e}", file=sys.stderr)
-            pass
+        if not option_found:
+            raise StepInputError(f"Araç markası seçilemedi: {data['arac_marka']}")
+        inputs['arac_marka'] = option_found
         
         time.sleep(1)
         
-        # 7️⃣ E-posta iletişim türünü seç
-        print("\n[İŞLEM] E-posta iletişim türü seçiliyor...")
+    except PlaywrightTimeoutError:
+        print("[HATA] Araç markası dropdown'ı bulunamadı!")
+        return False
+    time.sleep(3)
+    return True
+
+
+def _step_vehicle_model(page, data, inputs):
+    # 6️⃣ Araç Modeli girişi (zorunlu değil - bulunamazsa adım atlanır)
+    if not data.get('arac_modeli'):
+        return True
+    print(f"\n[İŞLEM] Araç modeli alanı kontrol ediliyor...")
+    
+    vehicle_model_input = page.locator(VEHICLE_MODEL_INPUT)
+    
+    try:
+        vehicle_model_input.wait_for(state="visible", timeout=3000)
         
-        email_radio = page.locator("#rblInsuredContactType_1")
-        email_radio.check()
-        print("[BAŞARILI] E-posta iletişim türü seçildi.")
+        print(f"[BİLGİ] Araç modeli alanı bulundu. Dolduruluyor: {data['arac_modeli']}")
         
+        vehicle_model_input.click()
         time.sleep(0.5)
         
-        # 8️⃣ E-posta adresi gir
-        print(f"\n[İŞLEM] E-posta adresi giriliyor: {data['email']}")
+        page.keyboard.press("Control+A")
+        page.keyboard.press("Backspace")
+        time.sleep(0.2)
         
-        email_input = page.locator("#txtInsuredEmailAddress")
-        email_input.wait_for(state="visible", timeout=5000)
-        email_input.click()
-        email_input.fill(data['email'])
-        print(f"[BAŞARILI] E-posta adresi girildi: {data['email']}")
+        vehicle_model_input.type(data['arac_modeli'], delay=100)
+        print(f"[BAŞARILI] Araç modeli written: {data['arac_modeli']}")
+        
+        time.sleep(2)
+        print("[BİLGİ] Autocomplete listesi bekleniyor...")
         
+        try:
+            autocomplete_item = page.locator(AUTOCOMPLETE_ITEMS).first
+            if autocomplete_item.is_visible(timeout=3000):
+                autocomplete_item.click()
+                print("[BAŞARILI] Autocomplete listesinden ilk seçenek seçildi.")
+            else:
+                page.keyboard.press("Enter")
+                print("[BİLGİ] Enter tuşuna basıldı.")
+        except:
+            page.keyboard.press("Enter")
+            print("[BİLGİ] Enter tuşuna basıldı (autocomplete bulunamadı).")
+        inputs['arac_modeli'] = data['arac_modeli']
+    
+    except PlaywrightTimeoutError:
+        print("[UYARI] Araç modeli giriş alanı bulunamadı veya zorunlu değil. Adım atlanıyor.")
+    except Exception as e:
+        print(f"[HATA] Araç modeli girişinde beklenmedik hata: {e}", file=sys.stderr)
+    
+    time.sleep(1)
+    return True
+
+
+def _step_occupation(page, data, inputs):
+    # 7️⃣ MESLEK SEÇİMİ (sadece veri varsa)
+    if not data.get('meslek'):
+        return True
+    print(f"\n[İŞLEM] Meslek bilgisi giriliyor: {data['meslek']}")
+    
+    try:
+        job_input = page.locator(JOB_CODE_INPUT)
+        job_input.wait_for(state="visible", timeout=5000)
+        
+        job_input.click()
         time.sleep(0.5)
         
-        # 9️⃣ Teklif Oluştur butonuna tıkla
+        page.keyboard.press("Control+A")
+        page.keyboard.press("Backspace")
+        time.sleep(0.2)
+        
+        job_input.type(data['meslek'], delay=100)
+        print(f"[BAŞARILI] Meslek written: {data['meslek']}")
+        
+        time.sleep(2)
+        print("[BİLGİ] Meslek autocomplete listesi bekleniyor...")
+        
+        try:
+            autocomplete_items = page.locator(AUTOCOMPLETE_ITEMS)
+            
+            if autocomplete_items.count() > 0:
+                exact_match_found = False
+                for i in range(autocomplete_items.count()):
+                    item_text = autocomplete_items.nth(i).text_content().strip()
+                    if item_text.upper() == data['meslek'].upper():
+                        autocomplete_items.nth(i).click()
+                        print(f"[BAŞARILI] Meslek seçildi: {item_text}")
+                        exact_match_found = True
+                        break
+                
+                if not exact_match_found:
+                    autocomplete_items.first.click()
+                    first_item_text = autocomplete_items.first.text_content().strip()
+                    print(f"[UYARI] Tam eşleşme bulunamadı, ilk meslek seçildi: {first_item_text}")
+            else:
+                page.keyboard.press("Enter")
+                print("[BİLGİ] Enter tuşuna basıldı (autocomplete bulunamadı).")
+                
+        except Exception as e:
+            print(f"[HATA] Meslek autocomplete seçiminde hata: {e}")
+            page.keyboard.press("Enter")
+            print("[BİLGİ] Enter tuşuna basıldı (hata durumunda).")
+        inputs['meslek'] = data['meslek']
+            
+    except PlaywrightTimeoutError:
+        print("[HATA] Meslek input alanı bulunamadı!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Meslek alanı bulunamadı'}
+    
+    time.sleep(1)
+    return True
+
+
+def _step_contact(page, data, inputs):
+    # E-posta iletişim türünü seç
+    print("\n[İŞLEM] E-posta iletişim türü seçiliyor...")
+    
+    email_radio = page.locator(CONTACT_EMAIL_RADIO)
+    email_radio.check()
+    print("[BAŞARILI] E-posta iletişim türü seçildi.")
+    
+    time.sleep(0.5)
+    
+    # E-posta adresi gir
+    print(f"\n[İŞLEM] E-posta adresi giriliyor: {data['email']}")
+    
+    email_input = page.locator(EMAIL_INPUT)
+    email_input.wait_for(state="visible", timeout=5000)
+    email_input.click()
+    email_input.fill(data['email'])
+    print(f"[BAŞARILI] E-posta adresi girildi: {data['email']}")
+    inputs['email'] = data['email']
+    
+    time.sleep(0.5)
+    return True
+
+
+def _create_proposal_step(wait_seconds):
+    def _step_create_proposal(page, data, inputs):
+        # Teklif Oluştur butonuna tıkla
         print("\n[İŞLEM] 'Teklif Oluştur' butonuna tıklanıyor...")
         
-        proposal_button = page.locator("#btnProposalCreate")
+        proposal_button = page.locator(PROPOSAL_CREATE_BUTTON)
         proposal_button.wait_for(state="visible", timeout=5000)
         proposal_button.click()
         print("[BAŞARILI] 'Teklif Oluştur' butonuna tıklandı.")
         
-        print("[BİLGİ] Teklif oluşturma işlemi bekleniyor (7 saniye)...")
-        time.sleep(7)
+        print(f"[BİLGİ] Teklif oluşturma işlemi bekleniyor ({wait_seconds} saniye)...")
+        time.sleep(wait_seconds)
+        return True
+    return _step_create_proposal
+
+
+def _step_maturity_gap_popup(page, data, inputs):
+    # --- VADE BOŞLUĞU POP-UP'INI ELE ALMA ---
+    print("\n[İŞLEM] Vade boşluğu pop-up'ı kontrol ediliyor...")
+    
+    try:
+        page.wait_for_selector(MATURITY_GAP_POPUP_TITLE, timeout=5000, state='visible')
+    except PlaywrightTimeoutError:
+        print("[BİLGİ] Vade boşluğu pop-up'ı görünmedi, normal akış devam ediyor.")
+        return True
+    print("[UYARI] Vade boşluğu beyan pop-up'ı yakalandı!")
+    
+    radio_button = page.locator(MATURITY_GAP_FIRST_DECLARATION)
+    radio_button.check()
+    print("[BAŞARILI] İlk beyan seçeneği işaretlendi.")
+    time.sleep(0.5)
+    
+    print("[BİLGİ] Tamam butonu aranıyor...")
+    
+    tamam_button = page.locator(MATURITY_GAP_OK_BUTTON)
+    
+    if tamam_button.count() > 0:
+        for i in range(tamam_button.count()):
+            if tamam_button.nth(i).is_visible():
+                tamam_button.nth(i).click()
+                print("[BAŞARILI] Pop-up 'Tamam' butonuna tıklandı.")
+                break
+        else:
+            print("[HATA] Görünür 'Tamam' butonu bulunamadı!")
+            return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu görünür değil'}
+    else:
+        print("[HATA] 'Tamam' butonu bulunamadı!")
+        return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu bulunamadı'}
+
+    print("[BİLGİ] Teklifin tamamlanması bekleniyor (5 saniye)...")
+    time.sleep(5)
+    return True
+
+
+def _step_traffic_premium(page, data, inputs):
+    # 🔟 Teklif bilgilerini al
+    print("\n[İŞLEM] Teklif bilgileri alınıyor...")
+    
+    try:
+        print("[BİLGİ] Sayfa aşağı kaydırılıyor...")
+        page.evaluate("window.scrollBy(0, 500)")
+        time.sleep(2)
+        page.evaluate("window.scrollBy(0, 500)")
+        time.sleep(2)
         
-        # 🔟 Teklif bilgilerini al
-        print("\n[İŞLEM] Teklif bilgileri alınıyor...")
+        teklif_tipi = None
+        brut_prim = None
+        teklif_no = None
         
+        print("[BİLGİ] Standart Trafik Teklifi kontrol ediliyor...")
         try:
-            print("[BİLGİ] Sayfa aşağı kaydırılıyor...")
-            page.evaluate("window.scrollBy(0, 500)")
-            time.sleep(2)
-            page.evaluate("window.scrollBy(0, 500)")
-            time.sleep(2)
+            standart_brut_prim_element = page.locator(TRAFFIC_PREMIUM)
             
-            teklif_tipi = None
-            brut_prim = None
-            teklif_no = None
-            
-            print("[BİLGİ] Standart Trafik Teklifi kontrol ediliyor...")
-            try:
-                standart_brut_prim_element = page.locator("#lblTrafficProposalGrossPremium")
+            if standart_brut_prim_element.count() > 0:
+                is_visible = page.evaluate(TRAFFIC_PREMIUM_VISIBLE_JS)
                 
-                if standart_brut_prim_element.count() > 0:
-                    is_visible = page.evaluate("""
-                        () => {
-                            const element = document.querySelector('#lblTrafficProposalGrossPremium');
-                            if (!element) return false;
-                            const style = window.getComputedStyle(element);
-                            const text = element.textContent.trim();
-                            return style.display !== 'none' && text.length > 0;
-                        }
-                    """)
-                    
-                    if is_visible:
-                        brut_prim = standart_brut_prim_element.text_content().strip()
-                        teklif_tipi = "STANDART"
-                        
-                        try:
-                            teklif_no_element = page.locator("#lblTrafficProposalStartEndDateOrProposalNo")
-                            teklif_no = teklif_no_element.text_content().strip()
-                        except:
-                            teklif_no = "Bulunamadı"
-                        
-                        print(f"[BAŞARILI] Standart Trafik Teklifi bulundu!")
-            except Exception as e:
-                print(f"[BİLGİ] Standart teklif bulunamadı: {e}")
-            
-            if not brut_prim:
-                print("[BİLGİ] Ek Teminatlı Trafik Teklifi kontrol ediliyor...")
-                try:
-                    page.evaluate("window.scrollBy(0, 300)")
-                    time.sleep(1)
-                    
-                    ek_teminatli_brut_prim_element = page.locator("#lblTrafficProposalGrossPremiumAlternative")
-                    
-                    ek_teminatli_brut_prim_element.wait_for(state="visible", timeout=15000)
-                    brut_prim = ek_teminatli_brut_prim_element.text_content().strip()
-                    teklif_tipi = "EK_TEMİNATLI"
+                if is_visible:
+                    brut_prim = standart_brut_prim_element.text_content().strip()
+                    teklif_tipi = "STANDART"
                     
                     try:
-                        teklif_no_element = page.locator("#lblTrafficProposalStartEndDateOrProposalNoAlternative")
+                        teklif_no_element = page.locator(TRAFFIC_PROPOSAL_NO)
                         teklif_no = teklif_no_element.text_content().strip()
                     except:
                         teklif_no = "Bulunamadı"
                     
-                    print(f"[BAŞARILI] Ek Teminatlı Trafik Teklifi bulundu!")
-                except Exception as e:
-                    print(f"[BİLGİ] Ek Teminatlı teklif bulunamadı: {e}")
-            
-            if not brut_prim:
-                print("[HATA] Hiçbir teklif bulunamadı!", file=sys.stderr)
-                
-                print("\n[DEBUG] Sayfa içeriği kontrol ediliyor...")
-                page_content = page.content()
-                
-                if "lblTrafficProposalGrossPremium" in page_content:
-                    print("[DEBUG] Standart teklif elementi HTML'de var!")
-                if "lblTrafficProposalGrossPremiumAlternative" in page_content:
-                    print("[DEBUG] Ek Teminatlı teklif elementi HTML'de var!")
-                
-                return {'basarili': False, 'hata': 'Teklif bilgileri bulunamadı'}
-            
-            print("\n" + "="*60)
-            print(f"✅ TRAFİK SİGORTASI TEKLİFİ BAŞARIYLA OLUŞTURULDU!")
-            print(f"📋 Teklif Tipi: {teklif_tipi}")
-            print("="*60)
-            print(f"📄 Teklif No: {teklif_no}")
-            print(f"💰 Brüt Prim: {brut_prim}")
-            print("="*60)
-            
-            return {
-                'basarili': True,
-                'teklif_tipi': teklif_tipi,
-                'teklif_no': teklif_no,
-                'brut_prim': brut_prim
-            }
-            
-        except PlaywrightTimeoutError:
-            print("[HATA] Teklif bilgileri yüklenemedi (timeout)!", file=sys.stderr)
-            return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
+                    print(f"[BAŞARILI] Standart Trafik Teklifi bulundu!")
         except Exception as e:
-            print(f"[HATA] Teklif bilgileri alınırken hata oluştu: {e}", file=sys.stderr)
-            traceback.print_exc()
-            return {'basarili': False, 'hata': str(e)}
-        
-    except Exception as e:
-        print(f"\n[HATA] Trafik sigortası işlemi sırasında hata oluştu: {e}", file=sys.stderr)
-        traceback.print_exc()
-        return False
-
-def process_kasko_sigortasi(page, data):
-    """
-    Kasko Sigortası için teklif sürecini tamamlar.
-    """
-    print("\n" + "="*60)
-    print("KASKO SİGORTASI İŞLEMİ BAŞLATILIYOR")
-    print("="*60)
-    
-    try:
-        # 1️⃣ TCKN girişi
-        if not fill_tckn_field(page, data['tckn']):
-            return False
-        
-        time.sleep(1)
-        
-        # 2️⃣ Kasko checkbox'ını işaretle, Trafik checkbox'ını kaldır
-        print("\n[İŞLEM] Sigorta türü seçiliyor (Kasko)...")
-        
-        casco_checkbox = page.locator("#chkCasco")
-        if not casco_checkbox.is_checked():
-            casco_checkbox.check()
-            print("[BİLGİ] Kasko sigortası seçildi.")
-        
-        time.sleep(0.3)
-        
-        traffic_checkbox = page.locator("#chkTraffic")
-        if traffic_checkbox.is_checked():
-            traffic_checkbox.uncheck()
-            print("[BİLGİ] Trafik sigortası seçimi kaldırıldı.")
-        
-        time.sleep(0.5)
-        
-        # 3️⃣ Plaka girişi
-        print(f"\n[İŞLEM] Plaka bilgisi giriliyor: {data['plaka']}")
-        
-        plaka = data['plaka'].upper().strip()
-        
-        il_kodu = ""
-        kalan_plaka = ""
-        
-        for i, char in enumerate(plaka):
-            if char.isdigit():
-                il_kodu += char
-            else:
-                kalan_plaka = plaka[i:]
-                break
-        
-        if not il_kodu or not kalan_plaka:
-            print(f"[HATA] Geçersiz plaka formatı: {data['plaka']}", file=sys.stderr)
-            return False
-        
-        print(f"[BİLGİ] Plaka parçalandı -> İl: {il_kodu}, Kalan: {kalan_plaka}")
-        
-        plate_city_input = page.locator("#txtPlateNoCityNo")
-        plate_city_input.click()
-        plate_city_input.fill(il_kodu)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] İl kodu girildi: {il_kodu}")
-        
-        plate_input = page.locator("#txtPlateNo")
-        plate_input.click()
-        plate_input.fill(kalan_plaka)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Plate entered: {kalan_plaka}")
-        
-        # 4️⃣ Ruhsat Seri No girişi
-        print(f"\n[İŞLEM] Ruhsat seri no giriliyor: {data['ruhsat_seri_no']}")
-        
-        ruhsat = data['ruhsat_seri_no'].upper().strip()
-        
-        ruhsat_code = ""
-        ruhsat_number = ""
+            print(f"[BİLGİ] Standart teklif bulunamadı: {e}")
         
-        for i, char in enumerate(ruhsat):
-            if char.isalpha():
-                ruhsat_code += char
-            else:
-                ruhsat_number = ruhsat[i:]
-                break
-        
-        if not ruhsat_code or not ruhsat_number:
-            print(f"[HATA] Geçersiz ruhsat seri no formatı: {data['ruhsat_seri_no']}", file=sys.stderr)
-            return False
-        
-        print(f"[BİLGİ] Ruhsat parçalandı -> Seri: {ruhsat_code}, No: {ruhsat_number}")
-        
-        egm_code_input = page.locator("#txtEGMNoCode")
-        egm_code_input.click()
-        egm_code_input.fill(ruhsat_code)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Ruhsat seri kodu girildi: {ruhsat_code}")
-        
-        egm_number_input = page.locator("#txtEGMNoNumber")
-        egm_number_input.click()
-        egm_number_input.fill(ruhsat_number)
-        time.sleep(0.3)
-        print(f"[BAŞARILI] Ruhsat numarası girildi: {ruhsat_number}")
-        
-        # 5️⃣ EGM Sorgula butonuna tıkla
-        print("\n[İŞLEM] EGM sorgusu yapılıyor...")
-        egm_search_button = page.locator("#btnSearchEgm")
-        egm_search_button.click()
-        print("[BAŞARILI] EGM Query button clicked.")
-        
-        print("[BİLGİ] EGM sorgu sonucu bekleniyor (5 saniye)...")
-        time.sleep(5)
-        
-        # 6️⃣ Araç Modeli girişi
-        if 'arac_modeli' in data and data['arac_modeli']:
-            print(f"\n[İŞLEM] Araç modeli alanı kontrol ediliyor...")
-            
-            vehicle_model_input = page.locator("#txtVehicleModels")
-            
+        if not brut_prim:
+            print("[BİLGİ] Ek Teminatlı Trafik Teklifi kontrol ediliyor...")
             try:
-                vehicle_model_input.wait_for(state="visible", timeout=3000)
-                
-                print(f"[BİLGİ] Araç modeli alanı bulundu. Dolduruluyor: {data['arac_modeli']}")
-                
-                vehicle_model_input.click()
-                time.sleep(0.5)
+                page.evaluate("window.scrollBy(0, 300)")
+                time.sleep(1)
                 
-                page.keyboard.press("Control+A")
-                page.keyboard.press("Backspace")
-                time.sleep(0.2)
+                ek_teminatli_brut_prim_element = page.locator(TRAFFIC_PREMIUM_ALT)
                 
-                vehicle_model_input.type(data['arac_modeli'], delay=100)
-                print(f"[BAŞARILI] Araç modeli written: {data['arac_modeli']}")
-                
-                time.sleep(2)
-                print("[BİLGİ] Autocomplete listesi bekleniyor...")
+                ek_teminatli_brut_prim_element.wait_for(state="visible", timeout=15000)
+                brut_prim = ek_teminatli_brut_prim_element.text_content().strip()
+                teklif_tipi = "EK_TEMİNATLI"
                 
                 try:
-                    autocomplete_item = page.locator("ul.ui-autocomplete li.ui-menu-item").first
-                    if autocomplete_item.is_visible(timeout=3000):
-                        autocomplete_item.click()
-                        print("[BAŞARILI] Autocomplete listesinden ilk seçenek seçildi.")
-                    else:
-                        page.keyboard.press("Enter")
-                        print("[BİLGİ] Enter tuşuna basıldı.")
+                    teklif_no_element = page.locator(TRAFFIC_PROPOSAL_NO_ALT)
+                    teklif_no = teklif_no_element.text_content().strip()
                 except:
-                    page.keyboard.press("Enter")
-                    print("[BİLGİ] Enter tuşuna basıldı (autocomplete bulunamadı).")
-            
-            except PlaywrightTimeoutError:
-                print("[UYARI] Araç modeli giriş alanı bulunamadı veya zorunlu değil. Adım atlanıyor.")
-            except Exception as e:
-                print(f"[HATA] Araç modeli girişinde beklenmedik hata: {e}", file=sys.stderr)
-        
-        time.sleep(1)
-        
-        # 7️⃣ MESLEK SEÇİMİ - GÜNCELLENMİŞ VERSİYON
-        if 'meslek' in data and data['meslek']:
-            print(f"\n[İŞLEM] Meslek bilgisi giriliyor: {data['meslek']}")
-            
-            try:
-                job_input = page.locator("#txtCascoNewEntranceJobCode")
-                job_input.wait_for(state="visible", timeout=5000)
-                
-                job_input.click()
-                time.sleep(0.5)
-                
-                page.keyboard.press("Control+A")
-                page.keyboard.press("Backspace")
-                time.sleep(0.2)
+                    teklif_no = "Bulunamadı"
                 
-                job_input.type(data['meslek'], delay=100)
-                print(f"[BAŞARILI] Meslek written: {data['meslek']}")
-                
-                time.sleep(2)
-                print("[BİLGİ] Meslek autocomplete listesi bekleniyor...")
-                
-                try:
-                    autocomplete_items = page.locator("ul.ui-autocomplete li.ui-menu-item")
-                    
-                    if autocomplete_items.count() > 0:
-                        exact_match_found = False
-                        for i in range(autocomplete_items.count()):
-                            item_text = autocomplete_items.nth(i).text_content().strip()
-                            if item_text.upper() == data['meslek'].upper():
-                                autocomplete_items.nth(i).click()
-                                print(f"[BAŞARILI] Meslek seçildi: {item_text}")
-                                exact_match_found = True
-                                break
-                        
-                        if not exact_match_found:
-                            autocomplete_items.first.click()
-                            first_item_text = autocomplete_items.first.text_content().strip()
-                            print(f"[UYARI] Tam eşleşme bulunamadı, ilk meslek seçildi: {first_item_text}")
-                    else:
-                        page.keyboard.press("Enter")
-                        print("[BİLGİ] Enter tuşuna basıldı (autocomplete bulunamadı).")
-                        
-                except Exception as e:
-                    print(f"[HATA] Meslek autocomplete seçiminde hata: {e}")
-                    page.keyboard.press("Enter")
-                    print("[BİLGİ] Enter tuşuna basıldı (hata durumunda).")
-                    
-            except PlaywrightTimeoutError:
-                print("[HATA] Meslek input alanı bulunamadı!", file=sys.stderr)
-                return {'basarili': False, 'hata': 'Meslek alanı bulunamadı'}
+                print(f"[BAŞARILI] Ek Teminatlı Trafik Teklifi bulundu!")
             except Exception as e:
-                print(f"[HATA] Meslek girişinde beklenmedik hata: {e}", file=sys.stderr)
-                return {'basarili': False, 'hata': f'Meslek giriş hatası: {e}'}
-        
-        time.sleep(1)
-        
-        # 8️⃣ E-posta iletişim türünü seç
-        print("\n[İŞLEM] E-posta iletişim türü seçiliyor...")
+                print(f"[BİLGİ] Ek Teminatlı teklif bulunamadı: {e}")
         
-        email_radio = page.locator("#rblInsuredContactType_1")
-        email_radio.check()
-        print("[BAŞARILI] E-posta iletişim türü seçildi.")
-        
-        time.sleep(0.5)
-        
-        # 9️⃣ E-posta adresi gir
-        print(f"\n[İŞLEM] E-posta adresi giriliyor: {data['email']}")
-        
-        email_input = page.locator("#txtInsuredEmailAddress")
-        email_input.wait_for(state="visible", timeout=5000)
-        email_input.click()
-        email_input.fill(data['email'])
-        print(f"[BAŞARILI] E-posta adresi girildi: {data['email']}")
-        
-        time.sleep(0.5)
-        
-        # 🔟 Teklif Oluştur butonuna tıkla
-        print("\n[İŞLEM] 'Teklif Oluştur' butonuna tıklanıyor...")
-        
-        proposal_button = page.locator("#btnProposalCreate")
-        proposal_button.wait_for(state="visible", timeout=5000)
-        proposal_button.click()
-        print("[BAŞARILI] 'Teklif Oluştur' butonuna tıklandı.")
+        if not brut_prim:
+            print("[HATA] Hiçbir teklif bulunamadı!", file=sys.stderr)
+            
+            print("\n[DEBUG] Sayfa içeriği kontrol ediliyor...")
+            page_content = page.content()
+            
+            if "lblTrafficProposalGrossPremium" in page_content:
+                print("[DEBUG] Standart teklif elementi HTML'de var!")
+            if "lblTrafficProposalGrossPremiumAlternative" in page_content:
+                print("[DEBUG] Ek Teminatlı teklif elementi HTML'de var!")
+            
+            return {'basarili': False, 'hata': 'Teklif bilgileri bulunamadı'}
         
-        print("[BİLGİ] İlk teklif sonucu bekleniyor (3 saniye)...")
-        time.sleep(3)
+        print("\n" + "="*60)
+        print(f"✅ TRAFİK SİGORTASI TEKLİFİ BAŞARIYLA OLUŞTURULDU!")
+        print(f"📋 Teklif Tipi: {teklif_tipi}")
+        print("="*60)
+        print(f"📄 Teklif No: {teklif_no}")
+        print(f"💰 Brüt Prim: {brut_prim}")
+        print("="*60)
         
-        # --- VADE BOŞLUĞU POP-UP'INI ELE ALMA ---
+        return {
+            'basarili': True,
+            'teklif_tipi': teklif_tipi,
+            'teklif_no': teklif_no,
+            'brut_prim': brut_prim
+        }
         
-        VADE_BOSLUGU_POPUP_TITLE = 'h3:has-text("Teklifte vade boşluğu bulunmaktadır.")'
-        ILK_BEYAN_RADIO_SELECTOR = '#rbVehicleDamaged_1'
-        TAMAM_BUTTON_SELECTOR = 'button:has-text("Tamam")'
+    except PlaywrightTimeoutError:
+        print("[HATA] Teklif bilgileri yüklenemedi (timeout)!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
 
-        print("\n[İŞLEM] Vade boşluğu pop-up'ı kontrol ediliyor...")
-        
-        try:
-            page.wait_for_selector(VADE_BOSLUGU_POPUP_TITLE, timeout=5000, state='visible')
-            print("[UYARI] Vade boşluğu beyan pop-up'ı yakalandı!")
-            
-            radio_button = page.locator(ILK_BEYAN_RADIO_SELECTOR)
-            radio_button.check()
-            print("[BAŞARILI] İlk beyan seçeneği işaretlendi.")
-            time.sleep(0.5)
-            
-            print("[BİLGİ] Tamam butonu aranıyor...")
-            
-            tamam_button = page.locator(TAMAM_BUTTON_SELECTOR)
-            
-            if tamam_button.count() > 0:
-                for i in range(tamam_button.count()):
-                    if tamam_button.nth(i).is_visible():
-                        tamam_button.nth(i).click()
-                        print("[BAŞARILI] Pop-up 'Tamam' butonuna tıklandı.")
-                        break
-                else:
-                    print("[HATA] Görünür 'Tamam' butonu bulunamadı!")
-                    return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu görünür değil'}
-            else:
-                print("[HATA] 'Tamam' butonu bulunamadı!")
-                return {'basarili': False, 'hata': 'Vade boşluğu Tamam butonu bulunamadı'}
 
-            print("[BİLGİ] Teklifin tamamlanması bekleniyor (5 saniye)...")
-            time.sleep(5)
+def _step_casco_premium(page, data, inputs):
+    # --- TEKLİF BİLGİLERİNİ ALMA ADIMI ---
 
-        except PlaywrightTimeoutError:
-            print("[BİLGİ] Vade boşluğu pop-up'ı görünmedi, normal akış devam ediyor.")
-        except Exception as e:
-            print(f"[HATA] Vade boşluğu pop-up'ı işlenirken beklenmedik hata: {e}", file=sys.stderr)
-            traceback.print_exc()
-            return {'basarili': False, 'hata': f'Vade boşluğu pop-up hatası: {e}'}
+    print("\n[İŞLEM] Teklif bilgileri alınıyor...")
+    
+    try:
+        print("[BİLGİ] Sayfa aşağı kaydırılıyor...")
+        page.evaluate("window.scrollBy(0, 700)")
+        time.sleep(2)
         
-        # --- TEKLİF BİLGİLERİNİ ALMA ADIMI ---
-
-        print("\n[İŞLEM] Teklif bilgileri alınıyor...")
+        teklif_bilgileri = {}
         
+        print("\n[İŞLEM] Standart Kasko Teklifi bilgileri alınıyor...")
         try:
-            print("[BİLGİ] Sayfa aşağı kaydırılıyor...")
-            page.evaluate("window.scrollBy(0, 700)")
-            time.sleep(2)
-            
-            teklif_bilgileri = {}
-            
-            print("\n[İŞLEM] Standart Kasko Teklifi bilgileri alınıyor...")
-            try:
-                standart_teklif_no_element = page.locator("#lblCascoProposal2TransactionNo")
-                if standart_teklif_no_element.count() > 0 and standart_teklif_no_element.is_visible():
-                    standart_teklif_no = standart_teklif_no_element.text_content().strip()
-                    teklif_bilgileri['standart_teklif_no'] = standart_teklif_no
-                    print(f"[BAŞARILI] Standart Teklif No: {standart_teklif_no}")
-                else:
-                    teklif_bilgileri['standart_teklif_no'] = "Bulunamadı"
-                    print("[UYARI] Standart Teklif No bulunamadı")
-                
-                standart_brut_prim_element = page.locator("#lblCascoProposal2GrossPremium")
-                if standart_brut_prim_element.count() > 0 and standart_brut_prim_element.is_visible():
-                    standart_brut_prim = standart_brut_prim_element.text_content().strip()
-                    teklif_bilgileri['standart_brut_prim'] = standart_brut_prim
-                    print(f"[BAŞARILI] Standart Brüt Prim: {standart_brut_prim}")
-                else:
-                    teklif_bilgileri['standart_brut_prim'] = "Bulunamadı"
-                    print("[UYARI] Standart Brüt Prim bulunamadı")
-                    
-            except Exception as e:
-                print(f"[HATA] Standart kasko teklifi bilgileri alınırken hata: {e}")
-                teklif_bilgileri['standart_teklif_no'] = "Hata"
-                teklif_bilgileri['standart_brut_prim'] = "Hata"
-            
-            print("\n[İŞLEM] Bütçe Dostu Kasko Teklifi bilgileri alınıyor...")
-            try:
-                butce_teklif_no_element = page.locator("#lblReasonablePriceCascoProposalTransactionNo")
-                if butce_teklif_no_element.count() > 0 and butce_teklif_no_element.is_visible():
-                    butce_teklif_no = butce_teklif_no_element.text_content().strip()
-                    teklif_bilgileri['butce_dostu_teklif_no'] = butce_teklif_no
-                    print(f"[BAŞARILI] Bütçe Dostu Teklif No: {butce_teklif_no}")
-                else:
-                    teklif_bilgileri['butce_dostu_teklif_no'] = "Bulunamadı"
-                    print("[UYARI] Bütçe Dostu Teklif No bulunamadı")
+            standart_teklif_no_element = page.locator(CASCO_STANDARD_NO)
+            if standart_teklif_no_element.count() > 0 and standart_teklif_no_element.is_visible():
+                standart_teklif_no = standart_teklif_no_element.text_content().strip()
+                teklif_bilgileri['standart_teklif_no'] = standart_teklif_no
+                print(f"[BAŞARILI] Standart Teklif No: {standart_teklif_no}")
+            else:
+                teklif_bilgileri['standart_teklif_no'] = "Bulunamadı"
+                print("[UYARI] Standart Teklif No bulunamadı")
+            
+            standart_brut_prim_element = page.locator(CASCO_STANDARD_PREMIUM)
+            if standart_brut_prim_element.count() > 0 and standart_brut_prim_element.is_visible():
+                standart_brut_prim = standart_brut_prim_element.text_content().strip()
+                teklif_bilgileri['standart_brut_prim'] = standart_brut_prim
+                print(f"[BAŞARILI] Standart Brüt Prim: {standart_brut_prim}")
+            else:
+                teklif_bilgileri['standart_brut_prim'] = "Bulunamadı"
+                print("[UYARI] Standart Brüt Prim bulunamadı")
                 
-                butce_brut_prim_element = page.locator("#lblReasonablePriceCascoProposalGrossPremium")
-                if butce_brut_prim_element.count() > 0 and butce_brut_prim_element.is_visible():
-                    butce_brut_prim = butce_brut_prim_element.text_content().strip()
-                    teklif_bilgileri['butce_dostu_brut_prim'] = butce_brut_prim
-                    print(f"[BAŞARILI] Bütçe Dostu Brüt Prim: {butce_brut_prim}")
-                else:
-                    teklif_bilgileri['butce_dostu_brut_prim'] = "Bulunamadı"
-                    print("[UYARI] Bütçe Dostu Brüt Prim bulunamadı")
-                    
-            except Exception as e:
-                print(f"[HATA] Bütçe dostu kasko teklifi bilgileri alınırken hata: {e}")
-                teklif_bilgileri['butce_dostu_teklif_no'] = "Hata"
-                teklif_bilgileri['butce_dostu_brut_prim'] = "Hata"
-            
-            print("\n[İŞLEM] Teklifler karşılaştırılıyor...")
-            
-            def temizle_prim_degeri(prim_str):
-                if prim_str == "Bulunamadı" or prim_str == "Hata":
-                    return float('inf')
-                try:
-                    temizlenmis = prim_str.replace('TL', '').replace('.', '').replace(',', '.').strip()
-                    return float(temizlenmis)
-                except:
-                    return float('inf')
-            
-            standart_prim = temizle_prim_degeri(teklif_bilgileri.get('standart_brut_prim', 'Bulunamadı'))
-            butce_prim = temizle_prim_degeri(teklif_bilgileri.get('butce_dostu_brut_prim', 'Bulunamadı'))
-            
-            if standart_prim <= butce_prim and standart_prim != float('inf'):
-                en_uygun_teklif = "STANDART_KASKO"
-                en_uygun_prim = teklif_bilgileri['standart_brut_prim']
-                en_uygun_teklif_no = teklif_bilgileri['standart_teklif_no']
-            elif butce_prim != float('inf'):
-                en_uygun_teklif = "BÜTÇE_DOSTU_KASKO"
-                en_uygun_prim = teklif_bilgileri['butce_dostu_brut_prim']
-                en_uygun_teklif_no = teklif_bilgileri['butce_dostu_teklif_no']
+        except Exception as e:
+            print(f"[HATA] Standart kasko teklifi bilgileri alınırken hata: {e}")
+            teklif_bilgileri['standart_teklif_no'] = "Hata"
+            teklif_bilgileri['standart_brut_prim'] = "Hata"
+        
+        print("\n[İŞLEM] Bütçe Dostu Kasko Teklifi bilgileri alınıyor...")
+        try:
+            butce_teklif_no_element = page.locator(CASCO_BUDGET_NO)
+            if butce_teklif_no_element.count() > 0 and butce_teklif_no_element.is_visible():
+                butce_teklif_no = butce_teklif_no_element.text_content().strip()
+                teklif_bilgileri['butce_dostu_teklif_no'] = butce_teklif_no
+                print(f"[BAŞARILI] Bütçe Dostu Teklif No: {butce_teklif_no}")
             else:
-                en_uygun_teklif = "TEKLİF_BULUNAMADI"
-                en_uygun_prim = "Bulunamadı"
-                en_uygun_teklif_no = "Bulunamadı"
-            
-            teklif_bilgileri['en_uygun_teklif'] = en_uygun_teklif
-            teklif_bilgileri['en_uygun_prim'] = en_uygun_prim
-            teklif_bilgileri['en_uygun_teklif_no'] = en_uygun_teklif_no
-            
-            print("\n" + "="*60)
-            print(f"✅ KASKO SİGORTASI TEKLİFLERİ BAŞARIYLA OLUŞTURULDU!")
-            print("="*60)
-            print(f"📋 Standart Kasko:")
-            print(f"  📄 Teklif No: {teklif_bilgileri.get('standart_teklif_no', 'Bulunamadı')}")
-            print(f"  💰 Brüt Prim: {teklif_bilgileri.get('standart_brut_prim', 'Bulunamadı')}")
-            print(f"\n📋 Bütçe Dostu Kasko:")
-            print(f"  📄 Teklif No: {teklif_bilgileri.get('butce_dostu_teklif_no', 'Bulunamadı')}")
-            print(f"  💰 Brüt Prim: {teklif_bilgileri.get('butce_dostu_brut_prim', 'Bulunamadı')}")
-            print(f"\n🏆 En Uygun Teklif: {en_uygun_teklif}")
-            print(f"  📄 Teklif No: {en_uygun_teklif_no}")
-            print(f"  💰 Brüt Prim: {en_uygun_prim}")
-            print("="*60)
-            
-            return {
-                'basarili': True,
-                'teklif_bilgileri': teklif_bilgileri,
-                'standart_teklif_no': teklif_bilgileri.get('standart_teklif_no'),
-                'standart_brut_prim': teklif_bilgileri.get('standart_brut_prim'),
-                'butce_dostu_teklif_no': teklif_bilgileri.get('butce_dostu_teklif_no'),
-                'butce_dostu_brut_prim': teklif_bilgileri.get('butce_dostu_brut_prim'),
-                'en_uygun_teklif': en_uygun_teklif,
-                'en_uygun_prim': en_uygun_prim,
-                'en_uygun_teklif_no': en_uygun_teklif_no
-            }
-
-        except PlaywrightTimeoutError:
-            print("[HATA] Kasko teklif sonuçları yüklenemedi (timeout)!", file=sys.stderr)
-            return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
+                teklif_bilgileri['butce_dostu_teklif_no'] = "Bulunamadı"
+                print("[UYARI] Bütçe Dostu Teklif No bulunamadı")
+            
+            butce_brut_prim_element = page.locator(CASCO_BUDGET_PREMIUM)
+            if butce_brut_prim_element.count() > 0 and butce_brut_prim_element.is_visible():
+                butce_brut_prim = butce_brut_prim_element.text_content().strip()
+                teklif_bilgileri['butce_dostu_brut_prim'] = butce_brut_prim
+                print(f"[BAŞARILI] Bütçe Dostu Brüt Prim: {butce_brut_prim}")
+            else:
+                teklif_bilgileri['butce_dostu_brut_prim'] = "Bulunamadı"
+                print("[UYARI] Bütçe Dostu Brüt Prim bulunamadı")
+                
         except Exception as e:
-            print(f"[HATA] Kasko teklif bilgileri alınırken hata oluştu: {e}", file=sys.stderr)
-            traceback.print_exc()
-            return {'basarili': False, 'hata': str(e)}
+            print(f"[HATA] Bütçe dostu kasko teklifi bilgileri alınırken hata: {e}")
+            teklif_bilgileri['butce_dostu_teklif_no'] = "Hata"
+            teklif_bilgileri['butce_dostu_brut_prim'] = "Hata"
         
-    except Exception as e:
-        print(f"\n[HATA] Kasko sigortası işlemi sırasında hata oluştu: {e}", file=sys.stderr)
-        traceback.print_exc()
-        return {'basarili': False, 'hata': str(e)}
+        print("\n[İŞLEM] Teklifler karşılaştırılıyor...")
+        result = casco_offer_result(teklif_bilgileri)
+        
+        print("\n" + "="*60)
+        print(f"✅ KASKO SİGORTASI TEKLİFLERİ BAŞARIYLA OLUŞTURULDU!")
+        print("="*60)
+        print(f"📋 Standart Kasko:")
+        print(f"  📄 Teklif No: {teklif_bilgileri.get('standart_teklif_no', 'Bulunamadı')}")
+        print(f"  💰 Brüt Prim: {teklif_bilgileri.get('standart_brut_prim', 'Bulunamadı')}")
+        print(f"\n📋 Bütçe Dostu Kasko:")
+        print(f"  📄 Teklif No: {teklif_bilgileri.get('butce_dostu_teklif_no', 'Bulunamadı')}")
+        print(f"  💰 Brüt Prim: {teklif_bilgileri.get('butce_dostu_brut_prim', 'Bulunamadı')}")
+        print(f"\n🏆 En Uygun Teklif: {result['en_uygun_teklif']}")
+        print(f"  📄 Teklif No: {result['en_uygun_teklif_no']}")
+        print(f"  💰 Brüt Prim: {result['en_uygun_prim']}")
+        print("="*60)
+        
+        return result
+
+    except PlaywrightTimeoutError:
+        print("[HATA] Kasko teklif sonuçları yüklenemedi (timeout)!", file=sys.stderr)
+        return {'basarili': False, 'hata': 'Timeout - Teklif bilgileri bulunamadı'}
+
+
+# Adım adı, fonksiyon ve adımın çalışabileceği ekranın selector'ı (kaldığı yerden devam için)
+# Adım planı sync ve async (sompo_async) akışlarda ortaktır: async sürüm aynı adları, ekran
+# selector'larını ve bekleme sürelerini (options) kullanır, sadece adım fonksiyonları farklıdır
+TRAFIK_STEPS = [
+    QuoteStep("tckn", _step_tckn, TCKN_INPUT),
+    QuoteStep("sigorta_turu", _step_select_traffic, TRAFFIC_CHECKBOX),
+    QuoteStep("plaka", _step_plate, PLATE_CITY_INPUT),
+    QuoteStep("ruhsat", _step_registration, EGM_CODE_INPUT),
+    QuoteStep("egm_sorgu", _egm_query_step(10), EGM_SEARCH_BUTTON, wait_seconds=10),
+    QuoteStep("arac_marka", _step_vehicle_brand, VEHICLE_BRAND_DROPDOWN),
+    QuoteStep("arac_modeli", _step_vehicle_model),
+    QuoteStep("iletisim", _step_contact, CONTACT_EMAIL_RADIO),
+    QuoteStep("teklif_olustur", _create_proposal_step(7), PROPOSAL_CREATE_BUTTON, wait_seconds=7),
+    QuoteStep("prim", _step_traffic_premium, PROPOSAL_CREATE_BUTTON),
+]
+
+KASKO_STEPS = [
+    QuoteStep("tckn", _step_tckn, TCKN_INPUT),
+    QuoteStep("sigorta_turu", _step_select_casco, CASCO_CHECKBOX),
+    QuoteStep("plaka", _step_plate, PLATE_CITY_INPUT),
+    QuoteStep("ruhsat", _step_registration, EGM_CODE_INPUT),
+    QuoteStep("egm_sorgu", _egm_query_step(5), EGM_SEARCH_BUTTON, wait_seconds=5),
+    QuoteStep("arac_modeli", _step_vehicle_model),
+    QuoteStep("meslek", _step_occupation, JOB_CODE_INPUT),
+    QuoteStep("iletisim", _step_contact, CONTACT_EMAIL_RADIO),
+    QuoteStep("teklif_olustur", _create_proposal_step(3), PROPOSAL_CREATE_BUTTON, wait_seconds=3),
+    QuoteStep("vade_boslugu", _step_maturity_gap_popup),
+    QuoteStep("prim", _step_casco_premium, PROPOSAL_CREATE_BUTTON),
+]
+
+
+def process_trafik_sigortasi(page, data, checkpoint=None):
+    """
+    Trafik Sigortası için teklif sürecini tamamlar.
+    Geçici bir hatada akış, sayfa uygunsa aynı oturumda başarısız adımdan devam eder.
+    """
+    print("\n" + "="*60)
+    print("TRAFİK SİGORTASI İŞLEMİ BAŞLATILIYOR")
+    print("="*60)
+    return run_quote_flow(page, TRAFIK_STEPS, data, "sompo_trafik", login_url=LOGIN_URL, checkpoint=checkpoint)
+
+
+def process_kasko_sigortasi(page, data, checkpoint=None):
+    """
+    Kasko Sigortası için teklif sürecini tamamlar.
+    Geçici bir hatada akış, sayfa uygunsa aynı oturumda başarısız adımdan devam eder.
+    """
+    print("\n" + "="*60)
+    print("KASKO SİGORTASI İŞLEMİ BAŞLATILIYOR")
+    print("="*60)
+    return run_quote_flow(page, KASKO_STEPS, data, "sompo_kasko", login_url=LOGIN_URL, checkpoint=checkpoint)
 
 def process_saglik_sigortasi(page, data):
     """
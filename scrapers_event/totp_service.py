@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Ortak TOTP servisi - pencere sınırına duyarlı kod üretimi
+
+pyotp.TOTP(...).now() kodu girilirken pencere dolarsa giriş başarısız olur ve akış baştan
+başlar. Bu servis mevcut pencerede yeterli süre kalmadıysa bir sonraki pencereyi bekler ve
+aynı secret için aynı kodun iki kez kullanılmasını engeller (process içinde kilitle, aynı
+makinedeki process'ler arasında dosya kilidiyle).
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import pyotp
+
+try:
+    import fcntl
+except ImportError:  # Windows: sadece process içi koruma
+    fcntl = None
+
+# Mevcut pencerede en az bu kadar saniye kalmalı (kodun yazılıp doğrulanması için)
+TOTP_MIN_REMAINING_SECONDS = float(os.getenv("TOTP_MIN_REMAINING_SECONDS", "8"))
+# Pencere geçişinde sunucu saati farkı için ek bekleme
+TOTP_WINDOW_MARGIN_SECONDS = float(os.getenv("TOTP_WINDOW_MARGIN_SECONDS", "0.5"))
+# Aynı makinedeki process'lerin kullanılan kodları paylaştığı dizin
+TOTP_STATE_DIR = os.getenv("TOTP_STATE_DIR", os.path.join(tempfile.gettempdir(), "totp_state"))
+TOTP_INTERVAL = 30
+
+_lock = threading.Lock()
+_last_used = {}  # secret hash -> son kullanılan pencere sayacı
+
+
+def _secret_id(secret):
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+def remaining_seconds(now=None):
+    """Mevcut TOTP penceresinin bitmesine kalan süre"""
+    now = time.time() if now is None else now
+    return TOTP_INTERVAL - (now % TOTP_INTERVAL)
+
+
+def _claim_shared(secret_id, counter):
+    """Sayaç daha önce (başka process'te) kullanılmadıysa dosyaya yazıp sahiplen"""
+    if fcntl is None:
+        return True
+    os.makedirs(TOTP_STATE_DIR, exist_ok=True)
+    path = os.path.join(TOTP_STATE_DIR, f"{secret_id}.last")
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            content = f.read().strip()
+            last = int(content) if content.isdigit() else -1
+            if counter <= last:
+                return False
+            f.seek(0)
+            f.truncate()
+            f.write(str(counter))
+            f.flush()
+            return True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _try_claim(secret, min_remaining):
+    """
+    Kullanılabilir kod varsa (kod, 0), yoksa (None, beklenecek süre) döndür
+    Kod: mevcut pencerede yeterli süre kalmış ve daha önce kullanılmamış olmalı
+    """
+    now = time.time()
+    remaining = remaining_seconds(now)
+    wait = remaining + TOTP_WINDOW_MARGIN_SECONDS
+    if remaining < min_remaining:
+        return None, wait
+    counter = int(now // TOTP_INTERVAL)
+    secret_id = _secret_id(secret)
+    with _lock:
+        if _last_used.get(secret_id, -1) >= counter:
+            return None, wait
+        if not _claim_shared(secret_id, counter):
+            _last_used[secret_id] = counter
+            return None, wait
+        _last_used[secret_id] = counter
+    return pyotp.TOTP(secret).at(counter * TOTP_INTERVAL), 0
+
+
+def totp_code(secret, min_remaining=TOTP_MIN_REMAINING_SECONDS):
+    """
+    Girilmeye hazır TOTP kodu döndür (gerekirse bir sonraki pencereyi bekler)
+    Dönen kod bu secret için daha önce kullanılmamıştır; tekrar denemede yeni kod istenmelidir
+    """
+    while True:
+        code, wait = _try_claim(secret, min_remaining)
+        if code is not None:
+            return code
+        print(f"[BİLGİ] TOTP penceresi uygun değil, {wait:.1f} sn bekleniyor...")
+        time.sleep(wait)
+
+
+async def totp_code_async(secret, min_remaining=TOTP_MIN_REMAINING_SECONDS):
+    """totp_code'un event loop'u bloklamayan sürümü"""
+    while True:
+        code, wait = _try_claim(secret, min_remaining)
+        if code is not None:
+            return code
+        await asyncio.sleep(wait)
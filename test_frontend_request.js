@@ -48,7 +48,7 @@ const testFrontendRequest = async () => {
     branch: "trafik",
     companies: ["Sompo", "Koru"],
     trafik_data: {
-      tckn: "12345678901",
+      tckn: "10000000146", // kontrol basamakları geçerli örnek TCKN
       email: "test@example.com",
       telefon: "5551234567",
       dogum_tarihi: "01/01/1990",